@@ -184,6 +184,24 @@
 # define USE_WRITEUNRAISABLEMSG
 #endif
 
+#if PY_VERSION_HEX >= 0x03080000
+/* PEP 590: cdata function pointers are called without building an
+   argument tuple.  The slot called 'tp_print' up to Python 3.7 is
+   'tp_vectorcall_offset' from Python 3.8. */
+# define CFFI_HAVE_VECTORCALL
+# if PY_VERSION_HEX < 0x03090000
+#  define PyObject_Vectorcall  _PyObject_Vectorcall
+# endif
+# ifndef Py_TPFLAGS_HAVE_VECTORCALL
+#  define Py_TPFLAGS_HAVE_VECTORCALL _Py_TPFLAGS_HAVE_VECTORCALL
+# endif
+# define CDATA_TPFLAGS_VECTORCALL   Py_TPFLAGS_HAVE_VECTORCALL
+# define CDATA_VECTORCALL_OFFSET    offsetof(CDataObject, c_vectorcall)
+#else
+# define CDATA_TPFLAGS_VECTORCALL   0
+# define CDATA_VECTORCALL_OFFSET    0
+#endif
+
 /************************************************************/
 
 /* base type flag: exactly one of the following: */
@@ -215,6 +233,8 @@
 #define CT_LAZY_FIELD_LIST     0x01000000
 #define CT_WITH_PACKED_CHANGE  0x02000000
 #define CT_IS_SIGNED_WCHAR     0x04000000
+#define CT_IS_VARIADIC         0x08000000 /* function types with '...' */
+#define CT_IS_FAST             0x10000000 /* function types: '__cffi_fast' */
 #define CT_PRIMITIVE_ANY  (CT_PRIMITIVE_SIGNED |        \
                            CT_PRIMITIVE_UNSIGNED |      \
                            CT_PRIMITIVE_CHAR |          \
@@ -232,6 +252,7 @@ typedef struct _ctypedescr {
                                           ptrs: lazily, ctypedescr of array */
     void *ct_extra;                    /* structs: first field (not a ref!)
                                           function types: cif_description
+                                          variadic: lazily, cif_cache_t
                                           primitives: prebuilt "cif" object */
 
     PyObject *ct_weakreflist;    /* weakref support */
@@ -254,6 +275,9 @@ typedef struct {
     CTypeDescrObject *c_type;
     char *c_data;
     PyObject *c_weakreflist;
+#ifdef CFFI_HAVE_VECTORCALL
+    vectorcallfunc c_vectorcall;   /* non-NULL only for CT_FUNCTIONPTR */
+#endif
 } CDataObject;
 
 typedef struct cfieldobject_s {
@@ -277,6 +301,16 @@ static PyTypeObject CDataOwningGC_Type;
 static PyTypeObject CDataFromBuf_Type;
 static PyTypeObject CDataGCP_Type;
 
+#ifdef CFFI_HAVE_VECTORCALL
+static PyObject *cdata_vectorcall(PyObject *, PyObject *const *, size_t,
+                                  PyObject *);     /* forward */
+# define CDATA_INIT_VECTORCALL(cd)                                      \
+    ((cd)->c_vectorcall = ((cd)->c_type->ct_flags & CT_FUNCTIONPTR) ?   \
+                           cdata_vectorcall : NULL)
+#else
+# define CDATA_INIT_VECTORCALL(cd)   /* nothing */
+#endif
+
 #define CTypeDescr_Check(ob)  (Py_TYPE(ob) == &CTypeDescr_Type)
 #define CData_Check(ob)       (Py_TYPE(ob) == &CData_Type ||            \
                                Py_TYPE(ob) == &CDataOwning_Type ||      \
@@ -329,6 +363,8 @@ typedef struct {
     Py_ssize_t length;     /* same as CDataObject_own_length up to here */
     PyObject *origobj;
     PyObject *destructor;
+    Py_ssize_t memsize;    /* counted by memory_stats.h, or 0 */
+    int defer;             /* see deferred_gc.h */
 } CDataObject_gcp;
 
 typedef struct {
@@ -348,6 +384,26 @@ typedef struct {
     Py_ssize_t exchange_offset_arg[1];
 } cif_description_t;
 
+/* A variadic function type has no cif_description of its own: it
+   depends on the types actually passed in the '...' part.  Instead,
+   'ct_extra' points to a small cache of the cifs already prepared,
+   most recently used first. */
+#define CIF_CACHE_SIZE   8
+
+typedef struct {
+    Py_ssize_t ce_refcnt;       /* 1 for the cache, plus 1 for every call
+                                   currently using it */
+    cif_description_t *ce_cif;
+    Py_ssize_t ce_nvarargs;
+    CTypeDescrObject *ce_vartypes[1];  /* 'ce_nvarargs' owned refs */
+} cif_cache_entry_t;
+
+typedef struct {
+    Py_ssize_t cc_hits, cc_misses;
+    int cc_count;
+    cif_cache_entry_t *cc_entries[CIF_CACHE_SIZE];
+} cif_cache_t;
+
 #define ADD_WRAPAROUND(x, y)  ((Py_ssize_t)(((size_t)(x)) + ((size_t)(y))))
 #define MUL_WRAPAROUND(x, y)  ((Py_ssize_t)(((size_t)(x)) * ((size_t)(y))))
 
@@ -359,6 +415,9 @@ typedef struct {
 #endif
 
 #include "minibuffer.h"
+#include "call_stats.h"
+#include "cdata_freelist.h"
+#include "memory_stats.h"
 
 #if PY_MAJOR_VERSION >= 3
 # include "file_emulator.h"
@@ -431,6 +490,25 @@ ctypedescr_repr(CTypeDescrObject *ct)
     return PyText_FromFormat("<ctype '%s'>", ct->ct_name);
 }
 
+static void cif_cache_entry_decref(cif_cache_entry_t *ce)
+{
+    if (--ce->ce_refcnt == 0) {
+        Py_ssize_t i;
+        for (i = 0; i < ce->ce_nvarargs; i++)
+            Py_DECREF(ce->ce_vartypes[i]);
+        PyObject_Free(ce->ce_cif);
+        PyObject_Free(ce);
+    }
+}
+
+static void cif_cache_clear(cif_cache_t *cc)
+{
+    while (cc->cc_count > 0) {
+        cc->cc_count--;
+        cif_cache_entry_decref(cc->cc_entries[cc->cc_count]);
+    }
+}
+
 static void
 ctypedescr_dealloc(CTypeDescrObject *ct)
 {
@@ -448,8 +526,11 @@ ctypedescr_dealloc(CTypeDescrObject *ct)
     }
     Py_XDECREF(ct->ct_itemdescr);
     Py_XDECREF(ct->ct_stuff);
-    if (ct->ct_flags & CT_FUNCTIONPTR)
+    if (ct->ct_flags & CT_FUNCTIONPTR) {
+        if ((ct->ct_flags & CT_IS_VARIADIC) && ct->ct_extra != NULL)
+            cif_cache_clear((cif_cache_t *)ct->ct_extra);
         PyObject_Free(ct->ct_extra);
+    }
     Py_TYPE(ct)->tp_free((PyObject *)ct);
 }
 
@@ -458,6 +539,16 @@ ctypedescr_traverse(CTypeDescrObject *ct, visitproc visit, void *arg)
 {
     Py_VISIT(ct->ct_itemdescr);
     Py_VISIT(ct->ct_stuff);
+    if ((ct->ct_flags & CT_IS_VARIADIC) && ct->ct_extra != NULL) {
+        cif_cache_t *cc = (cif_cache_t *)ct->ct_extra;
+        int j;
+        Py_ssize_t i;
+        for (j = 0; j < cc->cc_count; j++) {
+            cif_cache_entry_t *ce = cc->cc_entries[j];
+            for (i = 0; i < ce->ce_nvarargs; i++)
+                Py_VISIT(ce->ce_vartypes[i]);
+        }
+    }
     return 0;
 }
 
@@ -466,6 +557,8 @@ ctypedescr_clear(CTypeDescrObject *ct)
 {
     Py_CLEAR(ct->ct_itemdescr);
     Py_CLEAR(ct->ct_stuff);
+    if ((ct->ct_flags & CT_IS_VARIADIC) && ct->ct_extra != NULL)
+        cif_cache_clear((cif_cache_t *)ct->ct_extra);
     return 0;
 }
 
@@ -602,13 +695,36 @@ static PyObject *ctypeget_result(CTypeDescrObject *ct, void *context)
 static PyObject *ctypeget_ellipsis(CTypeDescrObject *ct, void *context)
 {
     if (ct->ct_flags & CT_FUNCTIONPTR) {
-        PyObject *res = ct->ct_extra ? Py_False : Py_True;
+        PyObject *res = (ct->ct_flags & CT_IS_VARIADIC) ? Py_True : Py_False;
         Py_INCREF(res);
         return res;
     }
     return nosuchattr("ellipsis");
 }
 
+static PyObject *ctypeget_cif_cache_info(CTypeDescrObject *ct, void *context)
+{
+    if (ct->ct_flags & CT_IS_VARIADIC) {
+        cif_cache_t *cc = (cif_cache_t *)ct->ct_extra;
+        if (cc == NULL)
+            return Py_BuildValue("nnin", (Py_ssize_t)0, (Py_ssize_t)0,
+                                 CIF_CACHE_SIZE, (Py_ssize_t)0);
+        return Py_BuildValue("nnin", cc->cc_hits, cc->cc_misses,
+                             CIF_CACHE_SIZE, (Py_ssize_t)cc->cc_count);
+    }
+    return nosuchattr("cif_cache_info");
+}
+
+static PyObject *ctypeget_fast(CTypeDescrObject *ct, void *context)
+{
+    if (ct->ct_flags & CT_FUNCTIONPTR) {
+        PyObject *res = (ct->ct_flags & CT_IS_FAST) ? Py_True : Py_False;
+        Py_INCREF(res);
+        return res;
+    }
+    return nosuchattr("fast");
+}
+
 static PyObject *ctypeget_abi(CTypeDescrObject *ct, void *context)
 {
     if (ct->ct_flags & CT_FUNCTIONPTR) {
@@ -649,6 +765,9 @@ static PyGetSetDef ctypedescr_getsets[] = {
     {"result", (getter)ctypeget_result, NULL, "function result type"},
     {"ellipsis", (getter)ctypeget_ellipsis, NULL, "function has '...'"},
     {"abi", (getter)ctypeget_abi, NULL, "function ABI"},
+    {"fast", (getter)ctypeget_fast, NULL, "function declared '__cffi_fast'"},
+    {"cif_cache_info", (getter)ctypeget_cif_cache_info, NULL,
+     "variadic function: (hits, misses, maxsize, currsize) of the cifs"},
     {"elements", (getter)ctypeget_elements, NULL, "enum elements"},
     {"relements", (getter)ctypeget_relements, NULL, "enum elements, reverse"},
     {NULL}                        /* sentinel */
@@ -1035,13 +1154,14 @@ write_raw_complex_data(char *target, Py_complex source, int size)
 static PyObject *
 new_simple_cdata(char *data, CTypeDescrObject *ct)
 {
-    CDataObject *cd = PyObject_New(CDataObject, &CData_Type);
-    if (cd == NULL)
+    CDataObject *cd = cdata_freelist_alloc(FL_PYMEM, sizeof(CDataObject));
+    if (PyObject_Init((PyObject *)cd, &CData_Type) == NULL)
         return NULL;
     Py_INCREF(ct);
     cd->c_data = data;
     cd->c_type = ct;
     cd->c_weakreflist = NULL;
+    CDATA_INIT_VECTORCALL(cd);
     return (PyObject *)cd;
 }
 
@@ -1050,7 +1170,7 @@ new_sized_cdata(char *data, CTypeDescrObject *ct, Py_ssize_t length)
 {
     CDataObject_own_length *scd;
 
-    scd = (CDataObject_own_length *)PyObject_Malloc(
+    scd = (CDataObject_own_length *)cdata_freelist_alloc(FL_PYMEM,
         offsetof(CDataObject_own_length, alignment));
     if (PyObject_Init((PyObject *)scd, &CData_Type) == NULL)
         return NULL;
@@ -1058,12 +1178,21 @@ new_sized_cdata(char *data, CTypeDescrObject *ct, Py_ssize_t length)
     scd->head.c_type = ct;
     scd->head.c_data = data;
     scd->head.c_weakreflist = NULL;
+    CDATA_INIT_VECTORCALL(&scd->head);
     scd->length = length;
     return (PyObject *)scd;
 }
 
 static CDataObject *_new_casted_primitive(CTypeDescrObject *ct);  /*forward*/
 
+#ifdef __GNUC__
+# if __GNUC__ >= 4
+/* Don't go inlining this huge function either, for the same reason as
+   convert_from_object(): -Warray-bounds warnings about reading a
+   'long double' or a complex out of a smaller buffer. */
+__attribute__((noinline))
+# endif
+#endif
 static PyObject *
 convert_to_object(char *data, CTypeDescrObject *ct)
 {
@@ -1318,6 +1447,218 @@ convert_from_object(char *data, CTypeDescrObject *ct, PyObject *init);
 static int    /* forward */
 convert_from_object_bitfield(char *data, CFieldObject *cf, PyObject *init);
 
+static const char *_buffer_format_native(const char *format)
+{
+    /* Skip the byte-order prefix of the PEP 3118 'format' of a buffer,
+       if it means the native byte order.  For a simple type, what is
+       left is a single letter. */
+    if (format == NULL)
+        return "B";
+    switch (*format) {
+    case '@':
+    case '=':
+#ifdef WORDS_BIGENDIAN
+    case '>':
+    case '!':
+#else
+    case '<':
+#endif
+        format++;
+        break;
+    }
+    return format;
+}
+
+/* Fast path to initialize arrays of numbers from objects with the
+   buffer interface, like array.array, memoryview or numpy arrays.  The
+   items are copied with memcpy() if they have the same type, or else
+   converted in C, e.g. from int64_t to double; without creating a
+   Python object for each item.  Integers are checked for overflow like
+   in convert_from_object().  Floats are not converted to integers.
+   Only one-dimensional contiguous buffers are handled here; the others
+   go through the generic path, which iterates over the object. */
+
+static int _fetch_numeric_buffer(CTypeDescrObject *ctitem, PyObject *init,
+                                 Py_buffer *view, char *pkind)
+{
+    /* If 'init' has a buffer of numbers that can initialize items of
+       type 'ctitem', fill '*view' and return 1; the caller must call
+       PyBuffer_Release().  '*pkind' is set to 'i', 'u', 'f' or 'b'
+       (for '?').  Returns 0 if not applicable, or -1 on error. */
+    const char *format;
+    char kind;
+
+    if (!(ctitem->ct_flags & (CT_PRIMITIVE_SIGNED | CT_PRIMITIVE_UNSIGNED |
+                              CT_PRIMITIVE_FLOAT)) ||
+            CData_Check(init) || !PyObject_CheckBuffer(init))
+        return 0;
+    if (PyObject_GetBuffer(init, view, PyBUF_FORMAT | PyBUF_STRIDES) < 0) {
+        /* whatever the problem is, the generic path will report it */
+        PyErr_Clear();
+        return 0;
+    }
+    format = _buffer_format_native(view->format);
+    kind = 0;
+    if (format[0] != 0 && format[1] == 0) {
+        if (strchr("bhilqn", format[0]) != NULL)
+            kind = 'i';
+        else if (strchr("BHILQN", format[0]) != NULL)
+            kind = 'u';
+        else if (strchr("fd", format[0]) != NULL)
+            kind = 'f';
+        else if (format[0] == '?')
+            kind = 'b';
+    }
+    switch (kind) {
+    case 'i':
+    case 'u':
+    case 'b':
+        if (view->itemsize != 1 && view->itemsize != 2 &&
+                view->itemsize != 4 && view->itemsize != 8)
+            kind = 0;
+        break;
+    case 'f':
+        if ((view->itemsize != sizeof(float) &&
+             view->itemsize != sizeof(double)) ||
+                !(ctitem->ct_flags & CT_PRIMITIVE_FLOAT))
+            kind = 0;
+        break;
+    }
+    if (kind == 0 || view->ndim != 1 || !PyBuffer_IsContiguous(view, 'C')) {
+        /* not numbers, or a scalar like numpy.int64(5), or several
+           dimensions, or not contiguous like numpy_array[::2] */
+        PyBuffer_Release(view);
+        return 0;
+    }
+    *pkind = kind;
+    return 1;
+}
+
+static int _numeric_buffer_overflow(CTypeDescrObject *ctitem, int negative,
+                                    unsigned PY_LONG_LONG value)
+{
+    PyObject *x;
+    if (negative)
+        x = PyLong_FromLongLong((PY_LONG_LONG)value);
+    else
+        x = PyLong_FromUnsignedLongLong(value);
+    if (x == NULL)
+        return -1;
+    _convert_overflow(x, ctitem->ct_name);
+    Py_DECREF(x);
+    return -1;
+}
+
+static int _convert_array_from_numeric_buffer(char *data,
+                                              CTypeDescrObject *ctitem,
+                                              Py_buffer *view, char kind,
+                                              Py_ssize_t n)
+{
+    /* convert the first 'n' items of the buffer returned by
+       _fetch_numeric_buffer() into 'data' */
+    Py_ssize_t i, srcsize = view->itemsize, dstsize = ctitem->ct_size;
+    char *src = view->buf, *copy = NULL;
+    char buf[sizeof(PY_LONG_LONG)];
+    char dstkind;
+
+    if (ctitem->ct_flags & CT_IS_BOOL)
+        dstkind = 'b';
+    else if (ctitem->ct_flags & CT_PRIMITIVE_SIGNED)
+        dstkind = 'i';
+    else if (ctitem->ct_flags & CT_PRIMITIVE_UNSIGNED)
+        dstkind = 'u';
+    else
+        dstkind = 'f';
+    if (kind == dstkind && srcsize == dstsize) {
+        memmove(data, src, n * srcsize);
+        return 0;
+    }
+    if (src < data + n * dstsize && data < src + n * srcsize) {
+        /* overlapping memory, e.g. with a source from ffi.buffer() */
+        copy = PyMem_Malloc(n * srcsize + 1);
+        if (copy == NULL) {
+            PyErr_NoMemory();
+            return -1;
+        }
+        memcpy(copy, src, n * srcsize);
+        src = copy;
+    }
+
+    for (i = 0; i < n; i++, src += srcsize, data += dstsize) {
+        if (dstkind == 'f') {
+            if (ctitem->ct_flags & CT_IS_LONGDOUBLE) {
+                long double x;
+                if (kind == 'f')      x = read_raw_float_data(src, srcsize);
+                else if (kind == 'i') x = read_raw_signed_data(src, srcsize);
+                else                  x = read_raw_unsigned_data(src, srcsize);
+                write_raw_longdouble_data(data, x);
+            }
+            else {
+                double x;
+                if (kind == 'f')      x = read_raw_float_data(src, srcsize);
+                else if (kind == 'i') x = read_raw_signed_data(src, srcsize);
+                else                  x = read_raw_unsigned_data(src, srcsize);
+                write_raw_float_data(data, x, dstsize);
+            }
+        }
+        else if (dstkind == 'i') {
+            PY_LONG_LONG value;
+            if (kind == 'i') {
+                value = read_raw_signed_data(src, srcsize);
+            }
+            else {
+                unsigned PY_LONG_LONG uvalue;
+                uvalue = read_raw_unsigned_data(src, srcsize);
+                value = (PY_LONG_LONG)uvalue;
+                if (value < 0)
+                    goto overflow_unsigned;
+            }
+            write_raw_integer_data(buf, value, dstsize);
+            if (value != read_raw_signed_data(buf, dstsize)) {
+                _numeric_buffer_overflow(ctitem, value < 0, value);
+                goto error;
+            }
+            write_raw_integer_data(data, value, dstsize);
+        }
+        else {
+            unsigned PY_LONG_LONG value;
+            if (kind == 'i') {
+                PY_LONG_LONG svalue = read_raw_signed_data(src, srcsize);
+                if (svalue < 0) {
+                    _numeric_buffer_overflow(ctitem, 1, svalue);
+                    goto error;
+                }
+                value = svalue;
+            }
+            else {
+                value = read_raw_unsigned_data(src, srcsize);
+            }
+            if (dstkind == 'b') {
+                if (value > 1ULL)
+                    goto overflow_unsigned;
+            }
+            else {
+                write_raw_integer_data(buf, value, dstsize);
+                if (value != read_raw_unsigned_data(buf, dstsize))
+                    goto overflow_unsigned;
+            }
+            write_raw_integer_data(data, value, dstsize);
+        }
+        continue;
+
+     overflow_unsigned:
+        _numeric_buffer_overflow(ctitem, 0,
+                                 read_raw_unsigned_data(src, srcsize));
+        goto error;
+    }
+    PyMem_Free(copy);
+    return 0;
+
+ error:
+    PyMem_Free(copy);
+    return -1;
+}
+
 static Py_ssize_t
 get_new_array_length(CTypeDescrObject *ctitem, PyObject **pvalue)
 {
@@ -1326,8 +1667,12 @@ get_new_array_length(CTypeDescrObject *ctitem, PyObject **pvalue)
     if (PyList_Check(value) || PyTuple_Check(value)) {
         return PySequence_Fast_GET_SIZE(value);
     }
-    else if (PyBytes_Check(value)) {
-        /* from a string, we add the null terminator */
+    else if (PyBytes_Check(value) &&
+             ((ctitem->ct_flags & CT_PRIMITIVE_CHAR) ||
+              ((ctitem->ct_flags & (CT_PRIMITIVE_SIGNED|CT_PRIMITIVE_UNSIGNED))
+               && (ctitem->ct_size == sizeof(char))))) {
+        /* from a string, we add the null terminator; for other items,
+           a string is a buffer of bytes like a bytearray, below */
         return PyBytes_GET_SIZE(value) + 1;
     }
     else if (PyUnicode_Check(value)) {
@@ -1341,6 +1686,17 @@ get_new_array_length(CTypeDescrObject *ctitem, PyObject **pvalue)
     }
     else {
         Py_ssize_t explicitlength;
+        Py_buffer view;
+        char kind;
+        int res = _fetch_numeric_buffer(ctitem, value, &view, &kind);
+        if (res < 0)
+            return -1;
+        if (res > 0) {
+            /* from an array.array or similar */
+            explicitlength = view.len / view.itemsize;
+            PyBuffer_Release(&view);
+            return explicitlength;
+        }
         explicitlength = PyNumber_AsSsize_t(value, PyExc_OverflowError);
         if (explicitlength < 0) {
             if (PyErr_Occurred()) {
@@ -1549,6 +1905,27 @@ convert_array_from_object(char *data, CTypeDescrObject *ct, PyObject *init)
             return 0;
         }
     }
+    else {
+        Py_buffer view;
+        char kind;
+        int res = _fetch_numeric_buffer(ctitem, init, &view, &kind);
+        if (res < 0)
+            return -1;
+        if (res > 0) {
+            Py_ssize_t n = view.len / view.itemsize;
+            if (ct->ct_length >= 0 && n > ct->ct_length) {
+                PyErr_Format(PyExc_IndexError,
+                             "too many initializers for '%s' (got %zd)",
+                             ct->ct_name, n);
+                res = -1;
+            }
+            else
+                res = _convert_array_from_numeric_buffer(data, ctitem, &view,
+                                                         kind, n);
+            PyBuffer_Release(&view);
+            return res;
+        }
+    }
     return _convert_error(init, ct, expected);
 }
 
@@ -1877,12 +2254,27 @@ get_alignment(CTypeDescrObject *ct)
 
 static void cdata_dealloc(CDataObject *cd)
 {
+    Py_ssize_t size = -1;
+
     if (cd->c_weakreflist != NULL)
         PyObject_ClearWeakRefs((PyObject *) cd);
 
+    if (Py_TYPE(cd) == &CData_Type)
+        size = cdata_alloc_size(cd);    /* before the ctype goes away */
+    else if (Py_TYPE(cd) == &CDataOwning_Type) {
+        size = cdata_alloc_size(cd);
+        /* the struct of ffi.new("struct *") is counted, not this wrapper */
+        if (!(cd->c_type->ct_flags & CT_IS_PTR_TO_OWNED))
+            memory_stats_remove(cd->c_type, cd, cdataowning_memory_size(cd));
+    }
     Py_DECREF(cd->c_type);
 #ifndef CFFI_MEM_LEAK     /* never release anything, tests only */
-    Py_TYPE(cd)->tp_free((PyObject *)cd);
+    if (Py_TYPE(cd) == &CData_Type)
+        cdata_freelist_free(FL_PYMEM, cd, size);
+    else if (Py_TYPE(cd) == &CDataOwning_Type)
+        cdata_freelist_free(FL_MALLOC, cd, size);
+    else
+        Py_TYPE(cd)->tp_free((PyObject *)cd);
 #endif
 }
 
@@ -1996,11 +2388,55 @@ static void _my_PyErr_WriteUnraisable(PyObject *t, PyObject *v, PyObject *tb,
                                       char *extra_error_line);
 
 
+typedef void *(*cffi_c_alloc_fn)(size_t);
+typedef void (*cffi_c_free_fn)(void *);
+
+static void *get_c_allocator_function(PyObject *ob, int is_free)
+{
+    /* If 'ob' is a cdata function pointer of type 'T *(*)(size_t)'
+       (is_free == 0) or 'void(*)(void *)' (is_free == 1), with the
+       default calling convention, return the C function; otherwise,
+       return NULL.  Used by ffi.new_allocator() and ffi.gc() to call
+       such functions directly, instead of via cdata_call(). */
+    CTypeDescrObject *ct, *ctres, *ctarg;
+
+    if (ob == NULL || !CData_Check(ob))
+        return NULL;
+    ct = ((CDataObject *)ob)->c_type;
+    if (!(ct->ct_flags & CT_FUNCTIONPTR) || (ct->ct_flags & CT_IS_VARIADIC) ||
+            PyTuple_GET_SIZE(ct->ct_stuff) != 3 ||
+            PyInt_AsLong(PyTuple_GET_ITEM(ct->ct_stuff, 0)) != FFI_DEFAULT_ABI)
+        return NULL;
+    ctres = (CTypeDescrObject *)PyTuple_GET_ITEM(ct->ct_stuff, 1);
+    ctarg = (CTypeDescrObject *)PyTuple_GET_ITEM(ct->ct_stuff, 2);
+    if (is_free) {
+        if (!(ctres->ct_flags & CT_VOID) || !(ctarg->ct_flags & CT_IS_VOID_PTR))
+            return NULL;
+    }
+    else {
+        if (!(ctres->ct_flags & CT_POINTER) ||
+                !(ctarg->ct_flags & CT_PRIMITIVE_UNSIGNED) ||
+                ctarg->ct_size != sizeof(size_t))
+            return NULL;
+    }
+    return ((CDataObject *)ob)->c_data;
+}
+
 static void gcp_finalize(PyObject *destructor, PyObject *origobj)
 {
     /* NOTE: this decrements the reference count of the two arguments */
-
-    if (destructor != NULL) {
+    cffi_c_free_fn c_free;
+
+    if (destructor != NULL && origobj != NULL && CData_Check(origobj) &&
+            (((CDataObject *)origobj)->c_type->ct_flags &
+                                            (CT_POINTER | CT_ARRAY)) &&
+            (c_free = (cffi_c_free_fn)get_c_allocator_function(destructor,
+                                                               1)) != NULL) {
+        /* fast path for a C function like free() */
+        c_free(((CDataObject *)origobj)->c_data);
+        Py_DECREF(destructor);
+    }
+    else if (destructor != NULL) {
         PyObject *result;
         PyObject *error_type, *error_value, *error_traceback;
 
@@ -2030,22 +2466,27 @@ static void gcp_finalize(PyObject *destructor, PyObject *origobj)
     Py_XDECREF(origobj);
 }
 
+#include "deferred_gc.h"
+
 static void cdatagcp_finalize(CDataObject_gcp *cd)
 {
     PyObject *destructor = cd->destructor;
     PyObject *origobj = cd->origobj;
+    gcp_memory_stats_remove(cd);
     cd->destructor = NULL;
     cd->origobj = NULL;
-    gcp_finalize(destructor, origobj);
+    gcp_finalize_or_defer(cd->defer, destructor, origobj);
 }
 
 static void cdatagcp_dealloc(CDataObject_gcp *cd)
 {
     PyObject *destructor = cd->destructor;
     PyObject *origobj = cd->origobj;
+    int defer = cd->defer;
+    gcp_memory_stats_remove(cd);
     cdata_dealloc((CDataObject *)cd);
 
-    gcp_finalize(destructor, origobj);
+    gcp_finalize_or_defer(defer, destructor, origobj);
 }
 
 static int cdatagcp_traverse(CDataObject_gcp *cd, visitproc visit, void *arg)
@@ -2623,6 +3064,35 @@ cdata_ass_slice(CDataObject *cd, PySliceObject *slice, PyObject *v)
     }
    other_types:
 
+    /* A fast path for <int[]>[0:N] = array.array('i', ...) and other
+       buffers of numbers */
+    {
+        Py_buffer view;
+        char kind;
+        err = _fetch_numeric_buffer(ct, v, &view, &kind);
+        if (err < 0)
+            return -1;
+        if (err > 0) {
+            Py_ssize_t srclen = view.len / view.itemsize;
+            if (srclen < length) {
+                PyErr_Format(PyExc_ValueError,
+                             "need %zd values to unpack, got %zd",
+                             length, srclen);
+                err = -1;
+            }
+            else if (srclen > length) {
+                PyErr_Format(PyExc_ValueError,
+                             "got more than %zd values to unpack", length);
+                err = -1;
+            }
+            else
+                err = _convert_array_from_numeric_buffer(cdata, ct, &view,
+                                                         kind, length);
+            PyBuffer_Release(&view);
+            return err;
+        }
+    }
+
     it = PyObject_GetIter(v);
     if (it == NULL)
         return -1;
@@ -2939,14 +3409,28 @@ static CTypeDescrObject *_get_ct_int(void)
     return ct_int;
 }
 
+static int _my_PyObject_GetContiguousBuffer(PyObject *x, Py_buffer *view,
+                                            int writable_only); /* forward */
+static int _fetch_typed_buffer(PyObject *x, CTypeDescrObject *ctitem,
+                               Py_buffer *view, int writable_only,
+                               Py_ssize_t *plength);            /* forward */
+
 static Py_ssize_t
-_prepare_pointer_call_argument(CTypeDescrObject *ctptr, PyObject *init,
-                               char **output_data)
+_prepare_pointer_call_argument_ex(CTypeDescrObject *ctptr, PyObject *init,
+                                  char **output_data, Py_buffer *view)
 {
     /* 'ctptr' is here a pointer type 'ITEM *'.  Accept as argument an
        initializer for an array 'ITEM[]'.  This includes the case of
        passing a Python byte string to a 'char *' argument.
 
+       If 'view' is not NULL, also accept an object with the writable
+       buffer interface whose items are of type 'ITEM', or any writable
+       buffer for 'void *'.  The buffer is not copied; instead '*view' is
+       filled
+       and '*output_data' points inside.  In this case, if 'view->obj'
+       is not NULL on return, the caller must call PyBuffer_Release()
+       after the call.
+
        This function returns -1 if an error occurred,
        0 if conversion succeeded (into *output_data),
        or N > 0 if conversion would require N bytes of storage.
@@ -2996,6 +3480,26 @@ _prepare_pointer_call_argument(CTypeDescrObject *ctptr, PyObject *init,
             return -1;
         return 0;
     }
+    else if (view != NULL && PyObject_CheckBuffer(init)) {
+        /* from a bytearray, array.array, memoryview...: no copy.  The
+           C function may write to it, so read-only buffers are refused
+           like other objects; use ffi.from_buffer() explicitly. */
+        int res;
+        if (ctitem->ct_flags & CT_VOID)
+            res = _my_PyObject_GetContiguousBuffer(init, view, 1);
+        else if (ctitem->ct_flags & CT_PRIMITIVE_ANY)
+            res = _fetch_typed_buffer(init, ctitem, view, 1, &length);
+        else
+            goto convert_default;
+        if (res < 0) {
+            if (!PyErr_ExceptionMatches(PyExc_BufferError))
+                return -1;
+            PyErr_Clear();      /* a read-only buffer */
+            goto convert_default;
+        }
+        *output_data = view->buf;
+        return 0;
+    }
     else {
         /* refuse to receive just an integer (and interpret it
            as the array size) */
@@ -3018,50 +3522,276 @@ _prepare_pointer_call_argument(CTypeDescrObject *ctptr, PyObject *init,
     return convert_from_object((char *)output_data, ctptr, init);
 }
 
+static Py_ssize_t
+_prepare_pointer_call_argument(CTypeDescrObject *ctptr, PyObject *init,
+                               char **output_data)
+{
+    /* the version exported to the modules compiled with cffi < 1.15,
+       which cannot release a buffer after the call */
+    return _prepare_pointer_call_argument_ex(ctptr, init, output_data, NULL);
+}
+
+struct pinned_buffer_s {
+    struct pinned_buffer_s *next;
+    Py_buffer view;
+};
+
+static int _can_pin_buffer(PyObject *init)
+{
+    /* is it worth allocating a 'struct pinned_buffer_s' for the
+       argument 'init' of a pointer type? */
+    return (PyObject_CheckBuffer(init) && !PyBytes_Check(init) &&
+            !CData_Check(init));
+}
+
+static void release_pinned_buffers(struct pinned_buffer_s *pinned)
+{
+    while (pinned != NULL) {
+        PyBuffer_Release(&pinned->view);
+        pinned = pinned->next;
+    }
+}
+
+static Py_ssize_t
+_cffi_prepare_pointer_call_argument_buf(CTypeDescrObject *ctptr,
+                                        PyObject *init, char **output_data,
+                                        void **pinned_list)
+{
+    /* exported to the _cffi_f_*() wrappers.  The pinned buffers are
+       chained to '*pinned_list', which must be released with
+       _cffi_release_pinned_arguments() */
+    struct pinned_buffer_s *pinned;
+    Py_ssize_t result;
+
+    if (!_can_pin_buffer(init))
+        return _prepare_pointer_call_argument_ex(ctptr, init, output_data,
+                                                 NULL);
+    pinned = PyObject_Malloc(sizeof(struct pinned_buffer_s));
+    if (pinned == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    pinned->view.obj = NULL;
+    result = _prepare_pointer_call_argument_ex(ctptr, init, output_data,
+                                               &pinned->view);
+    if (result == 0 && pinned->view.obj != NULL) {
+        pinned->next = (struct pinned_buffer_s *)*pinned_list;
+        *pinned_list = pinned;
+    }
+    else
+        PyObject_Free(pinned);
+    return result;
+}
+
+static void _cffi_release_pinned_arguments(void *pinned_list)
+{
+    struct pinned_buffer_s *pinned = (struct pinned_buffer_s *)pinned_list;
+    while (pinned != NULL) {
+        struct pinned_buffer_s *next = pinned->next;
+        PyBuffer_Release(&pinned->view);
+        PyObject_Free(pinned);
+        pinned = next;
+    }
+}
+
+static ffi_abi fb_get_abi(CTypeDescrObject *fct)
+{
+    PyObject *fabiobj = PyTuple_GET_ITEM(fct->ct_stuff, 0);
+#if PY_MAJOR_VERSION < 3
+    return (ffi_abi)PyInt_AS_LONG(fabiobj);
+#else
+    return (ffi_abi)PyLong_AS_LONG(fabiobj);
+#endif
+}
+
+static cif_cache_entry_t *
+cif_cache_get(CTypeDescrObject *fct, CTypeDescrObject **vartypes,
+              Py_ssize_t nvarargs)
+{
+    /* Return the cif to call the variadic function type 'fct' with the
+       given (already promoted) types in the '...' part.  The result is
+       a new reference: release it with cif_cache_entry_decref(). */
+    cif_cache_t *cc = (cif_cache_t *)fct->ct_extra;
+    cif_cache_entry_t *ce, *evicted = NULL;
+    PyObject *signature = fct->ct_stuff, *fargs;
+    Py_ssize_t i, nargs_declared = PyTuple_GET_SIZE(signature) - 2;
+    int j;
+
+    if (cc == NULL) {
+        cc = (cif_cache_t *)PyObject_Malloc(sizeof(cif_cache_t));
+        if (cc == NULL) {
+            PyErr_NoMemory();
+            return NULL;
+        }
+        memset(cc, 0, sizeof(cif_cache_t));
+        fct->ct_extra = cc;
+    }
+
+    for (j = 0; j < cc->cc_count; j++) {
+        ce = cc->cc_entries[j];
+        if (ce->ce_nvarargs == nvarargs &&
+                memcmp(ce->ce_vartypes, vartypes,
+                       nvarargs * sizeof(CTypeDescrObject *)) == 0) {
+            /* found: move it to the front */
+            memmove(&cc->cc_entries[1], &cc->cc_entries[0],
+                    j * sizeof(cif_cache_entry_t *));
+            cc->cc_entries[0] = ce;
+            cc->cc_hits++;
+            ce->ce_refcnt++;
+            return ce;
+        }
+    }
+    cc->cc_misses++;
+
+    ce = (cif_cache_entry_t *)PyObject_Malloc(
+                offsetof(cif_cache_entry_t, ce_vartypes) +
+                nvarargs * sizeof(CTypeDescrObject *));
+    if (ce == NULL) {
+        PyErr_NoMemory();
+        return NULL;
+    }
+    fargs = PyTuple_New(nargs_declared + nvarargs);
+    if (fargs == NULL) {
+        PyObject_Free(ce);
+        return NULL;
+    }
+    for (i = 0; i < nargs_declared; i++) {
+        PyObject *o = PyTuple_GET_ITEM(signature, 2 + i);
+        Py_INCREF(o);
+        PyTuple_SET_ITEM(fargs, i, o);
+    }
+    for (i = 0; i < nvarargs; i++) {
+        Py_INCREF(vartypes[i]);
+        PyTuple_SET_ITEM(fargs, nargs_declared + i, (PyObject *)vartypes[i]);
+    }
+    ce->ce_cif = fb_prepare_cif(fargs,
+                                (CTypeDescrObject *)PyTuple_GET_ITEM(signature, 1),
+                                nargs_declared, fb_get_abi(fct));
+    Py_DECREF(fargs);
+    if (ce->ce_cif == NULL) {
+        PyObject_Free(ce);
+        return NULL;
+    }
+    for (i = 0; i < nvarargs; i++) {
+        Py_INCREF(vartypes[i]);
+        ce->ce_vartypes[i] = vartypes[i];
+    }
+    ce->ce_nvarargs = nvarargs;
+    ce->ce_refcnt = 2;     /* one for the cache, one for the caller */
+
+    /* insert it at the front, evicting the least recently used entry */
+    if (cc->cc_count == CIF_CACHE_SIZE)
+        evicted = cc->cc_entries[--cc->cc_count];
+    memmove(&cc->cc_entries[1], &cc->cc_entries[0],
+            cc->cc_count * sizeof(cif_cache_entry_t *));
+    cc->cc_entries[0] = ce;
+    cc->cc_count++;
+    if (evicted != NULL)
+        cif_cache_entry_decref(evicted);
+    return ce;
+}
+
+/* The exchange buffer and the temporary copies of the array arguments
+   of _cdata_call() are taken from a per-thread block of scratch memory,
+   used like a stack: nested calls (from callbacks, or from Python code
+   running while converting the arguments) take memory after the part
+   in use by the outer calls, and give it back when they finish.  The
+   block is never moved while in use.  If a request does not fit, we
+   fall back to PyObject_Malloc() and the block is enlarged at the next
+   outermost call, up to SCRATCH_MAX_SIZE. */
+#define SCRATCH_MIN_SIZE   1024
+#define SCRATCH_MAX_SIZE   (256 * 1024)
+
+struct freeme_s {
+    struct freeme_s *next;
+    union_alignment alignment;
+};
+
+static char *scratch_alloc(struct cffi_tls_s *tls, Py_ssize_t size,
+                           struct freeme_s **pfreeme)
+{
+    size_t aligned = ((size_t)size + sizeof(union_alignment) - 1) &
+                     ~(sizeof(union_alignment) - 1);
+    struct freeme_s *fp;
+
+    if (tls != NULL) {
+        size_t needed = tls->scratch_used + aligned;
+        if (needed > tls->scratch_size && needed <= SCRATCH_MAX_SIZE) {
+            /* remember that we would like a bigger block */
+            size_t wanted = tls->scratch_size * 2;
+            if (wanted < needed)
+                wanted = needed;
+            if (wanted < SCRATCH_MIN_SIZE)
+                wanted = SCRATCH_MIN_SIZE;
+            if (wanted > SCRATCH_MAX_SIZE)
+                wanted = SCRATCH_MAX_SIZE;
+            if (tls->scratch_wanted < wanted)
+                tls->scratch_wanted = wanted;
+        }
+        if (tls->scratch_used == 0 &&
+                tls->scratch_wanted > tls->scratch_size) {
+            /* not in use: we can grow it now */
+            free(tls->scratch);
+            tls->scratch = malloc(tls->scratch_wanted);
+            tls->scratch_size = tls->scratch != NULL ? tls->scratch_wanted : 0;
+        }
+        if (needed <= tls->scratch_size) {
+            char *result = tls->scratch + tls->scratch_used;
+            tls->scratch_used = needed;
+            return result;
+        }
+    }
+    fp = (struct freeme_s *)PyObject_Malloc(
+                offsetof(struct freeme_s, alignment) + aligned);
+    if (fp == NULL) {
+        PyErr_NoMemory();
+        return NULL;
+    }
+    fp->next = *pfreeme;
+    *pfreeme = fp;
+    return (char *)&fp->alignment;
+}
+
 static PyObject*
-cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
+_cdata_call(CDataObject *cd, PyObject *const *args, Py_ssize_t nargs)
 {
+    /* 'cd' must be of a CT_FUNCTIONPTR type.  'args' is an array of
+       'nargs' items: either the items of a tuple (from tp_call) or
+       directly the vectorcall arguments. */
     char *buffer;
     void** buffer_array;
     cif_description_t *cif_descr;
-    Py_ssize_t i, nargs, nargs_declared;
-    PyObject *signature, *res = NULL, *fvarargs;
+    cif_cache_entry_t *cif_entry;
+    Py_ssize_t i, nargs_declared;
+    PyObject *signature, *res = NULL;
     CTypeDescrObject *fresult;
+    CTypeDescrObject **vartypes;
     char *resultdata;
     char *errormsg;
-    struct freeme_s {
-        struct freeme_s *next;
-        union_alignment alignment;
-    } *freeme = NULL;
-
-    if (!(cd->c_type->ct_flags & CT_FUNCTIONPTR)) {
-        PyErr_Format(PyExc_TypeError, "cdata '%s' is not callable",
-                     cd->c_type->ct_name);
-        return NULL;
-    }
+    struct freeme_s *freeme = NULL;
+    struct cffi_tls_s *tls;
+    size_t scratch_mark;
+    struct pinned_buffer_s *pinned = NULL;
+    PY_LONG_LONG stats_timestamps[3];
+    int stats = cffi_call_stats_enabled;
+
+    if (stats)
+        stats_timestamps[0] = cffi_clock_ns();
     if (cd->c_data == NULL) {
         PyErr_Format(PyExc_RuntimeError,
                      "cannot call null pointer pointer from cdata '%s'",
                      cd->c_type->ct_name);
         return NULL;
     }
-    if (kwds != NULL && PyDict_Size(kwds) != 0) {
-        PyErr_SetString(PyExc_TypeError,
-                "a cdata function cannot be called with keyword arguments");
-        return NULL;
-    }
     signature = cd->c_type->ct_stuff;
-    nargs = PyTuple_Size(args);
-    if (nargs < 0)
-        return NULL;
     nargs_declared = PyTuple_GET_SIZE(signature) - 2;
     fresult = (CTypeDescrObject *)PyTuple_GET_ITEM(signature, 1);
-    fvarargs = NULL;
-    buffer = NULL;
-
-    cif_descr = (cif_description_t *)cd->c_type->ct_extra;
+    cif_entry = NULL;
+    vartypes = NULL;
+    tls = get_cffi_tls();
+    scratch_mark = tls != NULL ? tls->scratch_used : 0;
 
-    if (cif_descr != NULL) {
+    if (!(cd->c_type->ct_flags & CT_IS_VARIADIC)) {
         /* regular case: this function does not take '...' arguments */
         if (nargs != nargs_declared) {
             errormsg = "'%s' expects %zd arguments, got %zd";
@@ -3070,24 +3800,37 @@ cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
                          cd->c_type->ct_name, nargs_declared, nargs);
             goto error;
         }
+        cif_descr = (cif_description_t *)cd->c_type->ct_extra;
+        if (cif_descr == NULL) {
+            /* unsupported argument or result type: try again, which
+               normally just raises the NotImplementedError */
+            PyObject *fargs = PyTuple_GetSlice(signature, 2,
+                                               2 + nargs_declared);
+            if (fargs == NULL)
+                goto error;
+            cif_descr = fb_prepare_cif(fargs, fresult, -1,
+                                       fb_get_abi(cd->c_type));
+            Py_DECREF(fargs);
+            if (cif_descr == NULL)
+                goto error;
+            cd->c_type->ct_extra = cif_descr;
+        }
     }
     else {
         /* call of a variadic function */
-        ffi_abi fabi;
+        Py_ssize_t nvarargs = nargs - nargs_declared;
         if (nargs < nargs_declared) {
             errormsg = "'%s' expects at least %zd arguments, got %zd";
             goto bad_number_of_arguments;
         }
-        fvarargs = PyTuple_New(nargs);
-        if (fvarargs == NULL)
+        /* the (borrowed) types of the variadic arguments, after
+           promotion, are the key in the cache of prepared cifs */
+        vartypes = (CTypeDescrObject **)scratch_alloc(tls,
+                        nvarargs * sizeof(CTypeDescrObject *), &freeme);
+        if (vartypes == NULL)
             goto error;
-        for (i = 0; i < nargs_declared; i++) {
-            PyObject *o = PyTuple_GET_ITEM(signature, 2 + i);
-            Py_INCREF(o);
-            PyTuple_SET_ITEM(fvarargs, i, o);
-        }
         for (i = nargs_declared; i < nargs; i++) {
-            PyObject *obj = PyTuple_GET_ITEM(args, i);
+            PyObject *obj = args[i];
             CTypeDescrObject *ct;
 
             if (CData_Check(obj)) {
@@ -3103,7 +3846,6 @@ cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
                 else if (ct->ct_flags & CT_ARRAY) {
                     ct = (CTypeDescrObject *)ct->ct_stuff;
                 }
-                Py_INCREF(ct);
             }
             else {
                 PyErr_Format(PyExc_TypeError,
@@ -3112,62 +3854,60 @@ cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
                              i + 1, Py_TYPE(obj)->tp_name);
                 goto error;
             }
-            PyTuple_SET_ITEM(fvarargs, i, (PyObject *)ct);
+            vartypes[i - nargs_declared] = ct;
         }
-#if PY_MAJOR_VERSION < 3
-        fabi = PyInt_AS_LONG(PyTuple_GET_ITEM(signature, 0));
-#else
-        fabi = PyLong_AS_LONG(PyTuple_GET_ITEM(signature, 0));
-#endif
-        cif_descr = fb_prepare_cif(fvarargs, fresult, nargs_declared, fabi);
-        if (cif_descr == NULL)
+        cif_entry = cif_cache_get(cd->c_type, vartypes, nvarargs);
+        if (cif_entry == NULL)
             goto error;
+        cif_descr = cif_entry->ce_cif;
     }
 
-    buffer = PyObject_Malloc(cif_descr->exchange_size);
-    if (buffer == NULL) {
-        PyErr_NoMemory();
+    buffer = scratch_alloc(tls, cif_descr->exchange_size, &freeme);
+    if (buffer == NULL)
         goto error;
-    }
 
     buffer_array = (void **)buffer;
 
     for (i=0; i<nargs; i++) {
         CTypeDescrObject *argtype;
         char *data = buffer + cif_descr->exchange_offset_arg[1 + i];
-        PyObject *obj = PyTuple_GET_ITEM(args, i);
+        PyObject *obj = args[i];
 
         buffer_array[i] = data;
 
         if (i < nargs_declared)
             argtype = (CTypeDescrObject *)PyTuple_GET_ITEM(signature, 2 + i);
         else
-            argtype = (CTypeDescrObject *)PyTuple_GET_ITEM(fvarargs, i);
+            argtype = vartypes[i - nargs_declared];
 
         if (argtype->ct_flags & CT_POINTER) {
             char *tmpbuf;
-            Py_ssize_t datasize = _prepare_pointer_call_argument(
-                                            argtype, obj, (char **)data);
+            Py_ssize_t datasize;
+            struct pinned_buffer_s *p = NULL;
+
+            if (_can_pin_buffer(obj)) {
+                /* if 'obj' is a buffer, it is passed without copy and
+                   released after the call */
+                p = (struct pinned_buffer_s *)scratch_alloc(tls,
+                                  sizeof(struct pinned_buffer_s), &freeme);
+                if (p == NULL)
+                    goto error;
+                p->view.obj = NULL;
+            }
+            datasize = _prepare_pointer_call_argument_ex(
+                         argtype, obj, (char **)data, p ? &p->view : NULL);
+            if (p != NULL && p->view.obj != NULL) {
+                p->next = pinned;
+                pinned = p;
+            }
             if (datasize == 0)
                 ;    /* successfully filled '*data' */
             else if (datasize < 0)
                 goto error;
             else {
-                if (datasize <= 512) {
-                    tmpbuf = alloca(datasize);
-                }
-                else {
-                    struct freeme_s *fp = (struct freeme_s *)PyObject_Malloc(
-                        offsetof(struct freeme_s, alignment) +
-                        (size_t)datasize);
-                    if (fp == NULL) {
-                        PyErr_NoMemory();
-                        goto error;
-                    }
-                    fp->next = freeme;
-                    freeme = fp;
-                    tmpbuf = (char *)&fp->alignment;
-                }
+                tmpbuf = scratch_alloc(tls, datasize, &freeme);
+                if (tmpbuf == NULL)
+                    goto error;
                 memset(tmpbuf, 0, datasize);
                 *(char **)data = tmpbuf;
                 if (convert_array_from_object(tmpbuf, argtype, obj) < 0)
@@ -3181,12 +3921,27 @@ cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
     resultdata = buffer + cif_descr->exchange_offset_arg[0];
     /*READ(cd->c_data, sizeof(void(*)(void)))*/
 
-    Py_BEGIN_ALLOW_THREADS
-    restore_errno();
-    ffi_call(&cif_descr->cif, (void (*)(void))(cd->c_data),
-             resultdata, buffer_array);
-    save_errno();
-    Py_END_ALLOW_THREADS
+    if (cd->c_type->ct_flags & CT_IS_FAST) {
+        /* declared with '__cffi_fast': keep the GIL, ignore errno */
+        if (stats)
+            stats_timestamps[1] = cffi_clock_ns();
+        ffi_call(&cif_descr->cif, (void (*)(void))(cd->c_data),
+                 resultdata, buffer_array);
+        if (stats)
+            stats_timestamps[2] = cffi_clock_ns();
+    }
+    else {
+        Py_BEGIN_ALLOW_THREADS
+        restore_errno();
+        if (stats)
+            stats_timestamps[1] = cffi_clock_ns();
+        ffi_call(&cif_descr->cif, (void (*)(void))(cd->c_data),
+                 resultdata, buffer_array);
+        if (stats)
+            stats_timestamps[2] = cffi_clock_ns();
+        save_errno();
+        Py_END_ALLOW_THREADS
+    }
 
     if (fresult->ct_flags & (CT_PRIMITIVE_CHAR | CT_PRIMITIVE_SIGNED |
                              CT_PRIMITIVE_UNSIGNED)) {
@@ -3209,24 +3964,56 @@ cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
     else {
         res = convert_to_object(resultdata, fresult);
     }
+    if (stats && res != NULL)
+        call_stats_record(cd->c_data, 0, stats_timestamps);
     /* fall-through */
 
  error:
+    release_pinned_buffers(pinned);
     while (freeme != NULL) {
         void *p = (void *)freeme;
         freeme = freeme->next;
         PyObject_Free(p);
     }
-    if (buffer)
-        PyObject_Free(buffer);
-    if (fvarargs != NULL) {
-        Py_DECREF(fvarargs);
-        if (cif_descr != NULL)  /* but only if fvarargs != NULL, if variadic */
-            PyObject_Free(cif_descr);
-    }
+    if (tls != NULL)
+        tls->scratch_used = scratch_mark;
+    if (cif_entry != NULL)
+        cif_cache_entry_decref(cif_entry);
     return res;
 }
 
+static PyObject*
+cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
+{
+    if (!(cd->c_type->ct_flags & CT_FUNCTIONPTR)) {
+        PyErr_Format(PyExc_TypeError, "cdata '%s' is not callable",
+                     cd->c_type->ct_name);
+        return NULL;
+    }
+    if (kwds != NULL && PyDict_Size(kwds) != 0) {
+        PyErr_SetString(PyExc_TypeError,
+                "a cdata function cannot be called with keyword arguments");
+        return NULL;
+    }
+    return _cdata_call(cd, ((PyTupleObject *)args)->ob_item,
+                       PyTuple_GET_SIZE(args));
+}
+
+#ifdef CFFI_HAVE_VECTORCALL
+static PyObject *
+cdata_vectorcall(PyObject *cd, PyObject *const *args, size_t nargsf,
+                 PyObject *kwnames)
+{
+    /* only installed on cdata objects of a CT_FUNCTIONPTR type */
+    if (kwnames != NULL && PyTuple_GET_SIZE(kwnames) != 0) {
+        PyErr_SetString(PyExc_TypeError,
+                "a cdata function cannot be called with keyword arguments");
+        return NULL;
+    }
+    return _cdata_call((CDataObject *)cd, args, PyVectorcall_NARGS(nargsf));
+}
+#endif
+
 static PyObject *cdata_dir(PyObject *cd, PyObject *noarg)
 {
     CTypeDescrObject *ct = ((CDataObject *)cd)->c_type;
@@ -3312,6 +4099,7 @@ static PyObject *cdata_exit(PyObject *cd, PyObject *args)
                 if (Py_TYPE(x) == &CDataGCP_Type) {
                     /* this is a special case for
                        ffi.new_allocator()("struct-or-union *") */
+                    ((CDataObject_gcp *)x)->defer = 0;
                     cdatagcp_finalize((CDataObject_gcp *)x);
                 }
             }
@@ -3323,7 +4111,8 @@ static PyObject *cdata_exit(PyObject *cd, PyObject *args)
             break;
 
         case 2:    /* ffi.gc() or ffi.new_allocator()("not-struct-nor-union") */
-            /* call the destructor immediately */
+            /* call the destructor immediately, even if deferred */
+            ((CDataObject_gcp *)cd)->defer = 0;
             cdatagcp_finalize((CDataObject_gcp *)cd);
             break;
 
@@ -3396,7 +4185,7 @@ static PyTypeObject CData_Type = {
     sizeof(CDataObject),
     0,
     (destructor)cdata_dealloc,                  /* tp_dealloc */
-    0,                                          /* tp_print */
+    CDATA_VECTORCALL_OFFSET,            /* tp_print or tp_vectorcall_offset */
     0,                                          /* tp_getattr */
     0,                                          /* tp_setattr */
     0,                                          /* tp_compare */
@@ -3410,7 +4199,8 @@ static PyTypeObject CData_Type = {
     (getattrofunc)cdata_getattro,               /* tp_getattro */
     (setattrofunc)cdata_setattro,               /* tp_setattro */
     0,                                          /* tp_as_buffer */
-    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_CHECKTYPES, /* tp_flags */
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_CHECKTYPES  /* tp_flags */
+                       | CDATA_TPFLAGS_VECTORCALL,
     "The internal base type for CData objects.  Use FFI.CData to access "
     "it.  Always check with isinstance(): subtypes are sometimes returned "
     "on CPython, for performance reasons.",     /* tp_doc */
@@ -3440,7 +4230,7 @@ static PyTypeObject CDataOwning_Type = {
     sizeof(CDataObject),
     0,
     (destructor)cdataowning_dealloc,            /* tp_dealloc */
-    0,                                          /* tp_print */
+    CDATA_VECTORCALL_OFFSET,            /* tp_print or tp_vectorcall_offset */
     0,                                          /* tp_getattr */
     0,                                          /* tp_setattr */
     0,                                          /* tp_compare */
@@ -3454,7 +4244,8 @@ static PyTypeObject CDataOwning_Type = {
     0,  /* inherited */                         /* tp_getattro */
     0,  /* inherited */                         /* tp_setattro */
     0,                                          /* tp_as_buffer */
-    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_CHECKTYPES, /* tp_flags */
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_CHECKTYPES  /* tp_flags */
+                       | CDATA_TPFLAGS_VECTORCALL,
     "This is an internal subtype of _CDataBase for performance only on "
     "CPython.  Check with isinstance(x, ffi.CData).",   /* tp_doc */
     0,                                          /* tp_traverse */
@@ -3483,7 +4274,7 @@ static PyTypeObject CDataOwningGC_Type = {
     sizeof(CDataObject_own_structptr),
     0,
     (destructor)cdataowninggc_dealloc,          /* tp_dealloc */
-    0,                                          /* tp_print */
+    CDATA_VECTORCALL_OFFSET,            /* tp_print or tp_vectorcall_offset */
     0,                                          /* tp_getattr */
     0,                                          /* tp_setattr */
     0,                                          /* tp_compare */
@@ -3498,6 +4289,7 @@ static PyTypeObject CDataOwningGC_Type = {
     0,  /* inherited */                         /* tp_setattro */
     0,                                          /* tp_as_buffer */
     Py_TPFLAGS_DEFAULT | Py_TPFLAGS_CHECKTYPES  /* tp_flags */
+                       | CDATA_TPFLAGS_VECTORCALL
                        | Py_TPFLAGS_HAVE_GC,
     "This is an internal subtype of _CDataBase for performance only on "
     "CPython.  Check with isinstance(x, ffi.CData).",   /* tp_doc */
@@ -3527,7 +4319,7 @@ static PyTypeObject CDataFromBuf_Type = {
     sizeof(CDataObject_frombuf),
     0,
     (destructor)cdatafrombuf_dealloc,           /* tp_dealloc */
-    0,                                          /* tp_print */
+    CDATA_VECTORCALL_OFFSET,            /* tp_print or tp_vectorcall_offset */
     0,                                          /* tp_getattr */
     0,                                          /* tp_setattr */
     0,                                          /* tp_compare */
@@ -3542,6 +4334,7 @@ static PyTypeObject CDataFromBuf_Type = {
     0,  /* inherited */                         /* tp_setattro */
     0,                                          /* tp_as_buffer */
     Py_TPFLAGS_DEFAULT | Py_TPFLAGS_CHECKTYPES  /* tp_flags */
+                       | CDATA_TPFLAGS_VECTORCALL
                        | Py_TPFLAGS_HAVE_GC,
     "This is an internal subtype of _CDataBase for performance only on "
     "CPython.  Check with isinstance(x, ffi.CData).",   /* tp_doc */
@@ -3571,7 +4364,7 @@ static PyTypeObject CDataGCP_Type = {
     sizeof(CDataObject_gcp),
     0,
     (destructor)cdatagcp_dealloc,               /* tp_dealloc */
-    0,                                          /* tp_print */
+    CDATA_VECTORCALL_OFFSET,            /* tp_print or tp_vectorcall_offset */
     0,                                          /* tp_getattr */
     0,                                          /* tp_setattr */
     0,                                          /* tp_compare */
@@ -3586,6 +4379,7 @@ static PyTypeObject CDataGCP_Type = {
     0,  /* inherited */                         /* tp_setattro */
     0,                                          /* tp_as_buffer */
     Py_TPFLAGS_DEFAULT | Py_TPFLAGS_CHECKTYPES  /* tp_flags */
+                       | CDATA_TPFLAGS_VECTORCALL
 #ifdef Py_TPFLAGS_HAVE_FINALIZE
                        | Py_TPFLAGS_HAVE_FINALIZE
 #endif
@@ -3711,9 +4505,15 @@ static CDataObject *allocate_owning_object(Py_ssize_t size,
                                            int dont_clear)
 {
     /* note: objects with &CDataOwning_Type are always allocated with
-       either a plain malloc() or calloc(), and freed with free(). */
+       either a plain malloc() or calloc(), and freed with free().  The
+       small ones go through the freelists. */
     CDataObject *cd;
-    if (dont_clear)
+    if (size <= CDATA_FREELIST_MAX_SIZE) {
+        cd = cdata_freelist_alloc(FL_MALLOC, size);
+        if (cd != NULL && !dont_clear)
+            memset(cd, 0, size);
+    }
+    else if (dont_clear)
         cd = malloc(size);
     else
         cd = calloc(size, 1);
@@ -3723,6 +4523,7 @@ static CDataObject *allocate_owning_object(Py_ssize_t size,
     Py_INCREF(ct);
     cd->c_type = ct;
     cd->c_weakreflist = NULL;
+    CDATA_INIT_VECTORCALL(cd);
     return cd;
 }
 
@@ -3748,6 +4549,7 @@ convert_struct_to_owning_object(char *data, CTypeDescrObject *ct)
     if (cd == NULL)
         return NULL;
     cd->c_data = ((char *)cd) + dataoffset;
+    memory_stats_add(ct, cd, datasize);
 
     memcpy(cd->c_data, data, datasize);
     return (PyObject *)cd;
@@ -3767,8 +4569,11 @@ static CDataObject *allocate_gcp_object(CDataObject *origobj,
     cd->head.c_data = origobj->c_data;
     cd->head.c_type = ct;
     cd->head.c_weakreflist = NULL;
+    CDATA_INIT_VECTORCALL(&cd->head);
     cd->origobj = (PyObject *)origobj;
     cd->destructor = destructor;
+    cd->memsize = 0;
+    cd->defer = 0;
 
     PyObject_GC_Track(cd);
     return (CDataObject *)cd;
@@ -3787,9 +4592,36 @@ static CDataObject *allocate_with_allocator(Py_ssize_t basesize,
         if (cd == NULL)
             return NULL;
         cd->c_data = ((char *)cd) + basesize;
+        memory_stats_add(ct, cd, datasize);
     }
     else {
-        PyObject *res = PyObject_CallFunction(allocator->ca_alloc, "n", datasize);
+        PyObject *res;
+        cffi_c_alloc_fn c_alloc;
+
+        c_alloc = (cffi_c_alloc_fn)get_c_allocator_function(
+                                                    allocator->ca_alloc, 0);
+        if (c_alloc != NULL) {
+            /* a C function like malloc(): call it directly, and wrap the
+               result with the function's return type */
+            CTypeDescrObject *ctres = (CTypeDescrObject *)PyTuple_GET_ITEM(
+                ((CDataObject *)allocator->ca_alloc)->c_type->ct_stuff, 1);
+            char *p = c_alloc((size_t)datasize);
+            if (p == NULL) {
+                PyErr_SetString(PyExc_MemoryError, "alloc() returned NULL");
+                return NULL;
+            }
+            res = new_simple_cdata(p, ctres);
+            if (res == NULL) {
+                cffi_c_free_fn c_free = (cffi_c_free_fn)
+                    get_c_allocator_function(allocator->ca_free, 1);
+                if (c_free != NULL)
+                    c_free(p);
+                return NULL;
+            }
+        }
+        else {
+            res = PyObject_CallFunction(allocator->ca_alloc, "n", datasize);
+        }
         if (res == NULL)
             return NULL;
 
@@ -3816,75 +4648,106 @@ static CDataObject *allocate_with_allocator(Py_ssize_t basesize,
 
         cd = allocate_gcp_object(cd, ct, allocator->ca_free);
         Py_DECREF(res);
+        if (cd == NULL)
+            return NULL;
+        gcp_memory_stats_add((CDataObject_gcp *)cd, datasize);
         if (!allocator->ca_dont_clear)
             memset(cd->c_data, 0, datasize);
     }
     return cd;
 }
 
-static PyObject *direct_newp(CTypeDescrObject *ct, PyObject *init,
-                             const cffi_allocator_t *allocator)
+static Py_ssize_t newp_data_size(CTypeDescrObject *ct, PyObject **pinit,
+                                 Py_ssize_t *pexplicitlength,
+                                 int *pvarsizestruct)
 {
+    /* Compute the number of bytes of data that ffi.new(ct, *pinit) needs.
+       For arrays of unspecified length, '*pexplicitlength' is set to the
+       length (and '*pinit' may be replaced); otherwise it is set to -1.
+       '*pvarsizestruct' is set to 1 for pointers to structs that end
+       with a var-sized array.  Returns -1 with an exception set. */
     CTypeDescrObject *ctitem;
-    CDataObject *cd;
-    Py_ssize_t dataoffset, datasize, explicitlength;
+    Py_ssize_t datasize;
 
-    explicitlength = -1;
+    *pexplicitlength = -1;
+    *pvarsizestruct = 0;
     if (ct->ct_flags & CT_POINTER) {
-        dataoffset = offsetof(CDataObject_own_nolength, alignment);
         ctitem = ct->ct_itemdescr;
         datasize = ctitem->ct_size;
         if (datasize < 0) {
             PyErr_Format(PyExc_TypeError,
                          "cannot instantiate ctype '%s' of unknown size",
                          ctitem->ct_name);
-            return NULL;
+            return -1;
         }
         if (ctitem->ct_flags & CT_PRIMITIVE_CHAR)
             datasize *= 2;   /* forcefully add another character: a null */
 
         if (ctitem->ct_flags & (CT_STRUCT | CT_UNION)) {
             if (force_lazy_struct(ctitem) < 0)   /* for CT_WITH_VAR_ARRAY */
-                return NULL;
+                return -1;
 
             if (ctitem->ct_flags & CT_WITH_VAR_ARRAY) {
                 assert(ct->ct_flags & CT_IS_PTR_TO_OWNED);
-                dataoffset = offsetof(CDataObject_own_length, alignment);
+                *pvarsizestruct = 1;
 
-                if (init != Py_None) {
+                if (*pinit != Py_None) {
                     Py_ssize_t optvarsize = datasize;
-                    if (convert_struct_from_object(NULL, ctitem, init,
+                    if (convert_struct_from_object(NULL, ctitem, *pinit,
                                                    &optvarsize) < 0)
-                        return NULL;
+                        return -1;
                     datasize = optvarsize;
                 }
             }
         }
     }
     else if (ct->ct_flags & CT_ARRAY) {
-        dataoffset = offsetof(CDataObject_own_nolength, alignment);
         datasize = ct->ct_size;
         if (datasize < 0) {
-            explicitlength = get_new_array_length(ct->ct_itemdescr, &init);
+            Py_ssize_t explicitlength;
+            explicitlength = get_new_array_length(ct->ct_itemdescr, pinit);
             if (explicitlength < 0)
-                return NULL;
+                return -1;
             ctitem = ct->ct_itemdescr;
-            dataoffset = offsetof(CDataObject_own_length, alignment);
             datasize = MUL_WRAPAROUND(explicitlength, ctitem->ct_size);
             if (explicitlength > 0 &&
                     (datasize / explicitlength) != ctitem->ct_size) {
                 PyErr_SetString(PyExc_OverflowError,
                                 "array size would overflow a Py_ssize_t");
-                return NULL;
+                return -1;
             }
+            *pexplicitlength = explicitlength;
         }
     }
     else {
         PyErr_Format(PyExc_TypeError,
                      "expected a pointer or array ctype, got '%s'",
                      ct->ct_name);
-        return NULL;
+        return -1;
     }
+    return datasize;
+}
+
+#include "mapping.h"
+
+static PyObject *direct_newp(CTypeDescrObject *ct, PyObject *init,
+                             const cffi_allocator_t *allocator)
+{
+    CDataObject *cd;
+    Py_ssize_t dataoffset, datasize, explicitlength;
+    int varsizestruct;
+
+    datasize = newp_data_size(ct, &init, &explicitlength, &varsizestruct);
+    if (datasize < 0)
+        return NULL;
+    if (mmap_threshold > 0 && datasize >= mmap_threshold &&
+            allocator == &default_allocator && (ct->ct_flags & CT_ARRAY))
+        return new_mapped_cdata(ct, init, datasize, explicitlength,
+                                mmap_threshold_advice);
+    if (explicitlength >= 0 || varsizestruct)
+        dataoffset = offsetof(CDataObject_own_length, alignment);
+    else
+        dataoffset = offsetof(CDataObject_own_nolength, alignment);
 
     if (ct->ct_flags & CT_IS_PTR_TO_OWNED) {
         /* common case of ptr-to-struct (or ptr-to-union): for this case
@@ -3897,6 +4760,10 @@ static PyObject *direct_newp(CTypeDescrObject *ct, PyObject *init,
                                       allocator);
         if (cds == NULL)
             return NULL;
+        /* store information about the allocated size of the struct */
+        if (dataoffset == offsetof(CDataObject_own_length, alignment)) {
+            ((CDataObject_own_length *)cds)->length = datasize;
+        }
 
         cd = allocate_owning_object(sizeof(CDataObject_own_structptr), ct,
                                     /*dont_clear=*/1);
@@ -3906,10 +4773,6 @@ static PyObject *direct_newp(CTypeDescrObject *ct, PyObject *init,
         }
         /* store the only reference to cds into cd */
         ((CDataObject_own_structptr *)cd)->structobj = (PyObject *)cds;
-        /* store information about the allocated size of the struct */
-        if (dataoffset == offsetof(CDataObject_own_length, alignment)) {
-            ((CDataObject_own_length *)cds)->length = datasize;
-        }
         assert(explicitlength < 0);
 
         cd->c_data = cds->c_data;
@@ -3933,6 +4796,8 @@ static PyObject *direct_newp(CTypeDescrObject *ct, PyObject *init,
     return (PyObject *)cd;
 }
 
+#include "arena.h"
+
 static PyObject *b_newp(PyObject *self, PyObject *args)
 {
     CTypeDescrObject *ct;
@@ -3942,6 +4807,93 @@ static PyObject *b_newp(PyObject *self, PyObject *args)
     return direct_newp(ct, init, &default_allocator);
 }
 
+static PyObject *direct_new_many(CTypeDescrObject *ct, Py_ssize_t n,
+                                 PyObject *init)
+{
+    /* ffi.new_many(ct, n, init): allocate a single 'item[n]' array, and
+       return a list of n pointers to its items.  Each of them keeps the
+       array alive, like the result of ffi.gc() without destructor. */
+    CTypeDescrObject *ctarray;
+    CDataObject *block;
+    PyObject *result = NULL, *seq = NULL, *lengthobj;
+    Py_ssize_t i, itemsize;
+
+    if (!(ct->ct_flags & CT_POINTER)) {
+        PyErr_Format(PyExc_TypeError, "expected a pointer ctype, got '%s'",
+                     ct->ct_name);
+        return NULL;
+    }
+    if (n < 0) {
+        PyErr_SetString(PyExc_ValueError, "negative number of items");
+        return NULL;
+    }
+    if (init != Py_None) {
+        seq = PySequence_Fast(init, "expected a list or tuple or None");
+        if (seq == NULL)
+            return NULL;
+        if (PySequence_Fast_GET_SIZE(seq) > n) {
+            PyErr_Format(PyExc_IndexError,
+                         "too many initializers for %zd items (got %zd)",
+                         n, PySequence_Fast_GET_SIZE(seq));
+            goto error0;
+        }
+    }
+
+    ctarray = (CTypeDescrObject *)new_array_type(ct, -1);
+    if (ctarray == NULL)
+        goto error0;
+    lengthobj = PyInt_FromSsize_t(n);
+    if (lengthobj == NULL) {
+        Py_DECREF(ctarray);
+        goto error0;
+    }
+    block = (CDataObject *)direct_newp(ctarray, lengthobj,
+                                       &default_allocator);
+    Py_DECREF(lengthobj);
+    Py_DECREF(ctarray);
+    if (block == NULL)
+        goto error0;
+
+    itemsize = ct->ct_itemdescr->ct_size;
+    if (seq != NULL) {
+        for (i = 0; i < PySequence_Fast_GET_SIZE(seq); i++) {
+            if (convert_from_object(block->c_data + i * itemsize,
+                                    ct->ct_itemdescr,
+                                    PySequence_Fast_GET_ITEM(seq, i)) < 0)
+                goto error1;
+        }
+    }
+
+    result = PyList_New(n);
+    if (result == NULL)
+        goto error1;
+    for (i = 0; i < n; i++) {
+        CDataObject *cd = allocate_gcp_object(block, ct, NULL);
+        if (cd == NULL) {
+            Py_CLEAR(result);
+            break;
+        }
+        cd->c_data = block->c_data + i * itemsize;
+        PyList_SET_ITEM(result, i, (PyObject *)cd);
+    }
+ error1:
+    Py_DECREF(block);
+ error0:
+    Py_XDECREF(seq);
+    return result;
+}
+
+static PyObject *b_new_many(PyObject *self, PyObject *args)
+{
+    CTypeDescrObject *ct;
+    Py_ssize_t n;
+    PyObject *init = Py_None;
+    if (!PyArg_ParseTuple(args, "O!n|O:new_many", &CTypeDescr_Type, &ct, &n,
+                          &init))
+        return NULL;
+    return direct_new_many(ct, n, init);
+}
+
 static int
 _my_PyObject_AsBool(PyObject *ob)
 {
@@ -4004,13 +4956,15 @@ _my_PyObject_AsBool(PyObject *ob)
 static CDataObject *_new_casted_primitive(CTypeDescrObject *ct)
 {
     int dataoffset = offsetof(CDataObject_casted_primitive, alignment);
-    CDataObject *cd = (CDataObject *)PyObject_Malloc(dataoffset + ct->ct_size);
+    CDataObject *cd = (CDataObject *)cdata_freelist_alloc(FL_PYMEM,
+                                                  dataoffset + ct->ct_size);
     if (PyObject_Init((PyObject *)cd, &CData_Type) == NULL)
         return NULL;
     Py_INCREF(ct);
     cd->c_type = ct;
     cd->c_data = ((char*)cd) + dataoffset;
     cd->c_weakreflist = NULL;
+    CDATA_INIT_VECTORCALL(cd);
     return cd;
 }
 
@@ -5806,11 +6760,11 @@ static int fb_build_name(struct funcbuilder_s *fb, const char *repl,
 static CTypeDescrObject *fb_prepare_ctype(struct funcbuilder_s *fb,
                                           PyObject *fargs,
                                           CTypeDescrObject *fresult,
-                                          int ellipsis, int fabi)
+                                          int ellipsis, int fabi, int fast)
 {
     CTypeDescrObject *fct, **pfargs;
     Py_ssize_t nargs;
-    char *repl = "(*)";
+    char *repl = fast ? "(__cffi_fast *)" : "(*)";
 
     fb->nb_bytes = 0;
     fb->bufferp = NULL;
@@ -5820,7 +6774,7 @@ static CTypeDescrObject *fb_prepare_ctype(struct funcbuilder_s *fb,
     nargs = PyTuple_GET_SIZE(fargs);
 #if defined(MS_WIN32) && !defined(_WIN64)
     if (fabi == FFI_STDCALL)
-        repl = "(__stdcall *)";
+        repl = fast ? "(__stdcall __cffi_fast *)" : "(__stdcall *)";
 #endif
 
     /* compute the total size needed for the name */
@@ -5842,6 +6796,8 @@ static CTypeDescrObject *fb_prepare_ctype(struct funcbuilder_s *fb,
     fct->ct_extra = NULL;
     fct->ct_size = sizeof(void(*)(void));
     fct->ct_flags = CT_FUNCTIONPTR;
+    if (fast)
+        fct->ct_flags |= CT_IS_FAST;
     return fct;
 
  error:
@@ -5912,7 +6868,7 @@ static cif_description_t *fb_prepare_cif(PyObject *fargs,
 
 static PyObject *new_function_type(PyObject *fargs,   /* tuple */
                                    CTypeDescrObject *fresult,
-                                   int ellipsis, int fabi)
+                                   int ellipsis, int fabi, int fast)
 {
     PyObject *fabiobj;
     CTypeDescrObject *fct;
@@ -5931,15 +6887,19 @@ static PyObject *new_function_type(PyObject *fargs,   /* tuple */
         return NULL;
     }
 
-    fct = fb_prepare_ctype(&funcbuilder, fargs, fresult, ellipsis, fabi);
+    fct = fb_prepare_ctype(&funcbuilder, fargs, fresult, ellipsis, fabi,
+                           fast);
     if (fct == NULL)
         return NULL;
 
-    if (!ellipsis) {
+    if (ellipsis) {
         /* Functions with '...' varargs are stored without a cif_descr
-           at all.  The cif is computed on every call from the actual
-           types passed in.  For all other functions, the cif_descr
-           is computed here. */
+           at all.  The cif is computed when calling, from the actual
+           types passed in, and kept in a cif_cache_t. */
+        fct->ct_flags |= CT_IS_VARIADIC;
+    }
+    else {
+        /* For all other functions, the cif_descr is computed here. */
         cif_description_t *cif_descr;
 
         cif_descr = fb_prepare_cif(fargs, fresult, -1, fabi);
@@ -5975,10 +6935,11 @@ static PyObject *new_function_type(PyObject *fargs,   /* tuple */
         PyTuple_SET_ITEM(fct->ct_stuff, 2 + i, o);
     }
 
-    /* [ctresult, ellipsis+abi, num_args, ctargs...] */
+    /* [ctresult, ellipsis+fast+abi, num_args, ctargs...] */
     unique_key = alloca((3 + funcbuilder.nargs) * sizeof(void *));
     unique_key[0] = fresult;
-    unique_key[1] = (const void *)(Py_ssize_t)((fabi << 1) | !!ellipsis);
+    unique_key[1] = (const void *)(Py_ssize_t)((fabi << 2) | (!!fast << 1) |
+                                               !!ellipsis);
     unique_key[2] = (const void *)(Py_ssize_t)(funcbuilder.nargs);
     for (i=0; i<funcbuilder.nargs; i++)
         unique_key[3 + i] = PyTuple_GET_ITEM(fct->ct_stuff, 2 + i);
@@ -5993,16 +6954,17 @@ static PyObject *b_new_function_type(PyObject *self, PyObject *args)
 {
     PyObject *fargs;
     CTypeDescrObject *fresult;
-    int ellipsis = 0, fabi = FFI_DEFAULT_ABI;
+    int ellipsis = 0, fabi = FFI_DEFAULT_ABI, fast = 0;
 
-    if (!PyArg_ParseTuple(args, "O!O!|ii:new_function_type",
+    if (!PyArg_ParseTuple(args, "O!O!|iii:new_function_type",
                           &PyTuple_Type, &fargs,
                           &CTypeDescr_Type, &fresult,
                           &ellipsis,
-                          &fabi))
+                          &fabi,
+                          &fast))
         return NULL;
 
-    return new_function_type(fargs, fresult, ellipsis, fabi);
+    return new_function_type(fargs, fresult, ellipsis, fabi, fast);
 }
 
 static int convert_from_object_fficallback(char *result,
@@ -6135,6 +7097,8 @@ static void _my_PyErr_WriteUnraisable(PyObject *t, PyObject *v, PyObject *tb,
 #endif
 }
 
+#define CALLBACK_STACK_ARGS  8
+
 static void general_invoke_callback(int decode_args_from_libffi,
                                     void *result, char *args, void *userdata)
 {
@@ -6142,7 +7106,17 @@ static void general_invoke_callback(int decode_args_from_libffi,
     CTypeDescrObject *ct = (CTypeDescrObject *)PyTuple_GET_ITEM(cb_args, 0);
     PyObject *signature = ct->ct_stuff;
     PyObject *py_ob = PyTuple_GET_ITEM(cb_args, 1);
+#ifdef CFFI_HAVE_VECTORCALL
+    /* the arguments are passed with vectorcall, from an array which is
+       on the stack unless there are more than CALLBACK_STACK_ARGS.  The
+       item 0 is free for the callee (PY_VECTORCALL_ARGUMENTS_OFFSET),
+       which makes calling bound methods cheaper. */
+    PyObject *stack_args[1 + CALLBACK_STACK_ARGS];
+    PyObject **py_argv = stack_args;
+    Py_ssize_t n_converted = 0;
+#else
     PyObject *py_args = NULL;
+#endif
     PyObject *py_res = NULL;
     PyObject *py_rawerr;
     PyObject *onerror_cb;
@@ -6154,9 +7128,19 @@ static void general_invoke_callback(int decode_args_from_libffi,
     Py_INCREF(cb_args);
 
     n = PyTuple_GET_SIZE(signature) - 2;
+#ifdef CFFI_HAVE_VECTORCALL
+    if (n > CALLBACK_STACK_ARGS) {
+        py_argv = PyMem_Malloc((1 + n) * sizeof(PyObject *));
+        if (py_argv == NULL) {
+            PyErr_NoMemory();
+            goto error;
+        }
+    }
+#else
     py_args = PyTuple_New(n);
     if (py_args == NULL)
         goto error;
+#endif
 
     for (i=0; i<n; i++) {
         char *a_src;
@@ -6174,10 +7158,20 @@ static void general_invoke_callback(int decode_args_from_libffi,
         a = convert_to_object(a_src, a_ct);
         if (a == NULL)
             goto error;
+#ifdef CFFI_HAVE_VECTORCALL
+        py_argv[1 + i] = a;
+        n_converted = i + 1;
+#else
         PyTuple_SET_ITEM(py_args, i, a);
+#endif
     }
 
+#ifdef CFFI_HAVE_VECTORCALL
+    py_res = PyObject_Vectorcall(py_ob, py_argv + 1,
+                                 n | PY_VECTORCALL_ARGUMENTS_OFFSET, NULL);
+#else
     py_res = PyObject_Call(py_ob, py_args, NULL);
+#endif
     if (py_res == NULL)
         goto error;
     if (convert_from_object_fficallback(result, SIGNATURE(1), py_res,
@@ -6190,7 +7184,14 @@ static void general_invoke_callback(int decode_args_from_libffi,
         goto error;
     }
  done:
+#ifdef CFFI_HAVE_VECTORCALL
+    for (i = 0; i < n_converted; i++)
+        Py_DECREF(py_argv[1 + i]);
+    if (py_argv != stack_args)
+        PyMem_Free(py_argv);
+#else
     Py_XDECREF(py_args);
+#endif
     Py_XDECREF(py_res);
     Py_DECREF(cb_args);
     return;
@@ -6256,6 +7257,8 @@ static void general_invoke_callback(int decode_args_from_libffi,
 #undef SIGNATURE
 }
 
+#include "callback_queue.h"
+
 static void invoke_callback(ffi_cif *cif, void *result, void **args,
                             void *userdata)
 {
@@ -6342,19 +7345,29 @@ static PyObject *b_callback(PyObject *self, PyObject *args)
     CTypeDescrObject *ct;
     CDataObject_closure *cd;
     PyObject *ob, *error_ob = Py_None, *onerror_ob = Py_None;
+    PyObject *queue = Py_None;
     PyObject *infotuple;
     cif_description_t *cif_descr;
     ffi_closure *closure;
     ffi_status status;
     void *closure_exec;
+    void (*invoke)(ffi_cif *, void *, void **, void *) = invoke_callback;
 
-    if (!PyArg_ParseTuple(args, "O!O|OO:callback", &CTypeDescr_Type, &ct, &ob,
-                          &error_ob, &onerror_ob))
+    if (!PyArg_ParseTuple(args, "O!O|OOO:callback", &CTypeDescr_Type, &ct, &ob,
+                          &error_ob, &onerror_ob, &queue))
         return NULL;
 
     infotuple = prepare_callback_info_tuple(ct, ob, error_ob, onerror_ob, 1);
     if (infotuple == NULL)
         return NULL;
+    if (queue != Py_None) {
+        PyObject *x = callback_queue_attach(queue, infotuple);
+        Py_DECREF(infotuple);
+        if (x == NULL)
+            return NULL;
+        infotuple = x;
+        invoke = invoke_deferred_callback;
+    }
 
 #if CFFI_CHECK_FFI_CLOSURE_ALLOC_MAYBE
     if (CFFI_CHECK_FFI_CLOSURE_ALLOC) {
@@ -6382,11 +7395,12 @@ static PyObject *b_callback(PyObject *self, PyObject *args)
     cd->head.c_type = ct;
     cd->head.c_data = (char *)closure_exec;
     cd->head.c_weakreflist = NULL;
+    CDATA_INIT_VECTORCALL(&cd->head);
     closure->user_data = NULL;
     cd->closure = closure;
 
     cif_descr = (cif_description_t *)ct->ct_extra;
-    if (cif_descr == NULL) {
+    if (cif_descr == NULL || (ct->ct_flags & CT_IS_VARIADIC)) {
         PyErr_Format(PyExc_NotImplementedError,
                      "%s: callback with unsupported argument or "
                      "return type or with '...'", ct->ct_name);
@@ -6396,7 +7410,7 @@ static PyObject *b_callback(PyObject *self, PyObject *args)
 #if CFFI_CHECK_FFI_PREP_CLOSURE_LOC_MAYBE
     if (CFFI_CHECK_FFI_PREP_CLOSURE_LOC) {
         status = ffi_prep_closure_loc(closure, &cif_descr->cif,
-                                      invoke_callback, infotuple, closure_exec);
+                                      invoke, infotuple, closure_exec);
     }
     else
 #endif
@@ -6406,7 +7420,7 @@ static PyObject *b_callback(PyObject *self, PyObject *args)
         goto error;
 #else
         status = ffi_prep_closure(closure, &cif_descr->cif,
-                                  invoke_callback, infotuple);
+                                  invoke, infotuple);
 #endif
     }
 
@@ -7004,6 +8018,520 @@ static PyObject *b_unpack(PyObject *self, PyObject *args, PyObject *kwds)
     return result;
 }
 
+/* ffi.unpack_fields(): a columnar version of ffi.unpack() for arrays of
+   structs or unions.  Every requested field, which must be of a
+   primitive type, is copied from all the items to its own compact
+   array.array (or bytes for 'char').  The copy is done in a single pass
+   over the items. */
+
+struct unpack_field_s {
+    CTypeDescrObject *uf_type;   /* not a reference */
+    Py_ssize_t uf_offset;        /* from the start of the item */
+    char uf_typecode;            /* for array.array(), or 'c' for bytes */
+    PyObject *uf_data;           /* a bytes object of 'length' items */
+};
+
+static char _unpack_field_typecode(CTypeDescrObject *ct)
+{
+    /* the array.array typecode for 'ct', or 'c' for bytes, or 0 if not
+       supported.  char16_t and char32_t give their unsigned code. */
+    Py_ssize_t size = ct->ct_size;
+    int sign = (ct->ct_flags & CT_PRIMITIVE_SIGNED) != 0;
+
+    if (ct->ct_flags & CT_PRIMITIVE_CHAR && size == 1)
+        return 'c';
+    if (ct->ct_flags & (CT_PRIMITIVE_SIGNED | CT_PRIMITIVE_UNSIGNED |
+                        CT_PRIMITIVE_CHAR)) {
+        if (size == sizeof(char))  return sign ? 'b' : 'B';
+        if (size == sizeof(short)) return sign ? 'h' : 'H';
+        if (size == sizeof(int))   return sign ? 'i' : 'I';
+        if (size == sizeof(long))  return sign ? 'l' : 'L';
+#if PY_MAJOR_VERSION >= 3
+        if (size == sizeof(PY_LONG_LONG)) return sign ? 'q' : 'Q';
+#endif
+    }
+    else if ((ct->ct_flags & CT_PRIMITIVE_FLOAT) &&
+             !(ct->ct_flags & CT_IS_LONGDOUBLE)) {
+        if (size == sizeof(double)) return 'd';
+        if (size == sizeof(float))  return 'f';
+    }
+    return 0;
+}
+
+static int _unpack_fields_all(CTypeDescrObject *ct, PyObject *prefix,
+                              PyObject *names)
+{
+    /* append to 'names' the name of all fields of 'ct' that can be
+       unpacked, as "a.b" for the fields of nested structs */
+    CFieldObject *cf;
+    PyObject *name;
+    int res;
+
+    if (force_lazy_struct(ct) <= 0)
+        return PyErr_Occurred() ? -1 : 0;
+
+    for (cf = (CFieldObject *)ct->ct_extra; cf != NULL; cf = cf->cf_next) {
+        if (cf->cf_bitshift != BS_REGULAR)
+            continue;
+        if (!(cf->cf_type->ct_flags & (CT_STRUCT | CT_UNION)) &&
+                _unpack_field_typecode(cf->cf_type) == 0)
+            continue;
+        if (prefix != NULL)
+            name = PyText_FromFormat("%s.%s", PyText_AS_UTF8(prefix),
+                                     PyText_AS_UTF8(get_field_name(ct, cf)));
+        else {
+            name = get_field_name(ct, cf);
+            Py_INCREF(name);
+        }
+        if (name == NULL)
+            return -1;
+        if (cf->cf_type->ct_flags & (CT_STRUCT | CT_UNION))
+            res = _unpack_fields_all(cf->cf_type, name, names);
+        else
+            res = PyList_Append(names, name);
+        Py_DECREF(name);
+        if (res < 0)
+            return -1;
+    }
+    return 0;
+}
+
+static int _unpack_field_lookup(CTypeDescrObject *ct, PyObject *name,
+                                struct unpack_field_s *uf)
+{
+    /* find the field 'name', which may be "a.b.c" */
+    const char *p, *dot;
+    PyObject *part;
+    Py_ssize_t offset;
+
+    if (!PyText_Check(name)) {
+        PyErr_Format(PyExc_TypeError, "field names must be strings, not %.200s",
+                     Py_TYPE(name)->tp_name);
+        return -1;
+    }
+    uf->uf_offset = 0;
+    p = PyText_AS_UTF8(name);
+    if (p == NULL)
+        return -1;
+    while (1) {
+        dot = strchr(p, '.');
+        if (dot != NULL)
+            part = PyText_FromStringAndSize(p, dot - p);
+        else
+            part = PyText_FromString(p);
+        if (part == NULL)
+            return -1;
+        ct = direct_typeoffsetof(ct, part, 1, &offset);
+        Py_DECREF(part);
+        if (ct == NULL)
+            return -1;
+        uf->uf_offset += offset;
+        if (dot == NULL)
+            break;
+        p = dot + 1;
+    }
+    uf->uf_type = ct;
+    uf->uf_typecode = _unpack_field_typecode(ct);
+    if (uf->uf_typecode == 0) {
+        PyErr_Format(PyExc_TypeError,
+                     "field '%s' is of type '%s', which cannot be unpacked",
+                     PyText_AS_UTF8(name), ct->ct_name);
+        return -1;
+    }
+    return 0;
+}
+
+static PyObject *b_unpack_fields(PyObject *self, PyObject *args,
+                                 PyObject *kwds)
+{
+    CDataObject *cd;
+    CTypeDescrObject *ctitem;
+    Py_ssize_t i, j, length, nfields = 0;
+    PyObject *fields = Py_None, *names = NULL, *array_type = NULL;
+    PyObject *result = NULL;
+    struct unpack_field_s *uf = NULL;
+    char *src;
+    static char *keywords[] = {"cdata", "length", "fields", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!n|O:unpack_fields",
+                                     keywords, &CData_Type, &cd, &length,
+                                     &fields))
+        return NULL;
+
+    if (!(cd->c_type->ct_flags & (CT_ARRAY|CT_POINTER)) ||
+            !(cd->c_type->ct_itemdescr->ct_flags & (CT_STRUCT|CT_UNION))) {
+        PyErr_Format(PyExc_TypeError,
+                     "expected a pointer or array of structs or unions, "
+                     "got '%s'", cd->c_type->ct_name);
+        return NULL;
+    }
+    if (length < 0) {
+        PyErr_SetString(PyExc_ValueError, "'length' cannot be negative");
+        return NULL;
+    }
+    if (cd->c_data == NULL) {
+        PyObject *s = cdata_repr(cd);
+        if (s != NULL) {
+            PyErr_Format(PyExc_RuntimeError,
+                         "cannot use unpack_fields() on %s",
+                         PyText_AS_UTF8(s));
+            Py_DECREF(s);
+        }
+        return NULL;
+    }
+    ctitem = cd->c_type->ct_itemdescr;
+    if (force_lazy_struct(ctitem) <= 0) {
+        if (!PyErr_Occurred())
+            PyErr_Format(PyExc_TypeError, "'%s' is opaque", ctitem->ct_name);
+        return NULL;
+    }
+
+    if (fields == Py_None) {
+        names = PyList_New(0);
+        if (names == NULL || _unpack_fields_all(ctitem, NULL, names) < 0)
+            goto done;
+    }
+    else if (PyTextAny_Check(fields)) {
+        PyErr_SetString(PyExc_TypeError,
+                        "'fields' must be a list of field names");
+        goto done;
+    }
+    else {
+        names = PySequence_Fast(fields, "'fields' must be a list of "
+                                        "field names");
+        if (names == NULL)
+            goto done;
+    }
+    nfields = PySequence_Fast_GET_SIZE(names);
+    uf = PyMem_Malloc((nfields + 1) * sizeof(struct unpack_field_s));
+    if (uf == NULL) {
+        PyErr_NoMemory();
+        goto done;
+    }
+    for (j = 0; j < nfields; j++)
+        uf[j].uf_data = NULL;
+    for (j = 0; j < nfields; j++) {
+        if (_unpack_field_lookup(ctitem, PySequence_Fast_GET_ITEM(names, j),
+                                 &uf[j]) < 0)
+            goto done;
+        if (length > PY_SSIZE_T_MAX / uf[j].uf_type->ct_size) {
+            PyErr_NoMemory();
+            goto done;
+        }
+        uf[j].uf_data = PyBytes_FromStringAndSize(NULL,
+                                        length * uf[j].uf_type->ct_size);
+        if (uf[j].uf_data == NULL)
+            goto done;
+    }
+
+    /* the single pass over the items */
+    src = cd->c_data;
+    for (i = 0; i < length; i++) {
+        for (j = 0; j < nfields; j++) {
+            Py_ssize_t size = uf[j].uf_type->ct_size;
+            char *dst = PyBytes_AS_STRING(uf[j].uf_data) + i * size;
+            char *field = src + uf[j].uf_offset;
+            switch (size) {
+            case 1: *dst = *field; break;
+            case 2: memcpy(dst, field, 2); break;
+            case 4: memcpy(dst, field, 4); break;
+            case 8: memcpy(dst, field, 8); break;
+            default: memcpy(dst, field, size); break;
+            }
+        }
+        src += ctitem->ct_size;
+    }
+
+    result = PyDict_New();
+    if (result == NULL)
+        goto done;
+    for (j = 0; j < nfields; j++) {
+        PyObject *x;
+        if (uf[j].uf_typecode == 'c') {
+            x = uf[j].uf_data;
+            Py_INCREF(x);
+        }
+        else {
+            char typecode[2] = { uf[j].uf_typecode, 0 };
+            if (array_type == NULL) {
+                PyObject *array_mod = PyImport_ImportModule("array");
+                if (array_mod == NULL)
+                    goto error;
+                array_type = PyObject_GetAttrString(array_mod, "array");
+                Py_DECREF(array_mod);
+                if (array_type == NULL)
+                    goto error;
+            }
+            x = PyObject_CallFunction(array_type, "sO", typecode,
+                                      uf[j].uf_data);
+            if (x == NULL)
+                goto error;
+        }
+        if (PyDict_SetItem(result, PySequence_Fast_GET_ITEM(names, j),
+                           x) < 0) {
+            Py_DECREF(x);
+            goto error;
+        }
+        Py_DECREF(x);
+    }
+    goto done;
+
+ error:
+    Py_CLEAR(result);
+ done:
+    if (uf != NULL) {
+        for (j = 0; j < nfields; j++)
+            Py_XDECREF(uf[j].uf_data);
+        PyMem_Free(uf);
+    }
+    Py_XDECREF(array_type);
+    Py_XDECREF(names);
+    return result;
+}
+
+/* PEP 3118 formats for ffi.buffer(), see minibuffer.h */
+
+struct fmtbuf_s {
+    char *data;
+    size_t length, allocated;
+};
+
+static int fmtbuf_add(struct fmtbuf_s *b, const char *s)
+{
+    size_t n = strlen(s);
+    if (b->length + n + 1 > b->allocated) {
+        size_t allocated = (b->length + n + 1) * 2;
+        char *data = PyMem_Realloc(b->data, allocated);
+        if (data == NULL) {
+            PyErr_NoMemory();
+            return -1;
+        }
+        b->data = data;
+        b->allocated = allocated;
+    }
+    memcpy(b->data + b->length, s, n + 1);
+    b->length += n;
+    return 0;
+}
+
+static const char *_primitive_buffer_format(CTypeDescrObject *ct,
+                                            int standard)
+{
+    /* the format character(s) for a primitive or pointer type, or NULL.
+       If 'standard', we're inside a struct after '=': the sizes are
+       then the standard ones of the 'struct' module, not the native
+       ones. */
+    int is_unsigned = (ct->ct_flags & CT_PRIMITIVE_UNSIGNED) != 0;
+
+    if (ct->ct_flags & CT_IS_BOOL)
+        return ct->ct_size == 1 ? "?" : NULL;
+    if (ct->ct_flags & (CT_PRIMITIVE_SIGNED | CT_PRIMITIVE_UNSIGNED)) {
+        switch (ct->ct_size) {
+        case 1: return is_unsigned ? "B" : "b";
+        case 2: return is_unsigned ? "H" : "h";
+        case 4: return is_unsigned ? "I" : "i";
+        case 8: return is_unsigned ? "Q" : "q";
+        }
+        return NULL;
+    }
+    if (ct->ct_flags & CT_PRIMITIVE_CHAR) {
+        switch (ct->ct_size) {
+        case 1: return standard ? "c" : "B";   /* bytes, like before */
+        case 2: return "H";   /* "u" is not supported by NumPy */
+        case 4: return "w";
+        }
+        return NULL;
+    }
+    if (ct->ct_flags & CT_PRIMITIVE_FLOAT) {
+        if (ct->ct_flags & CT_IS_LONGDOUBLE)
+            return standard ? NULL : "g";
+        switch (ct->ct_size) {
+        case 4: return "f";
+        case 8: return "d";
+        }
+        return NULL;
+    }
+    if (ct->ct_flags & CT_PRIMITIVE_COMPLEX) {
+        switch (ct->ct_size) {
+        case 8:  return "Zf";
+        case 16: return "Zd";
+        }
+        return NULL;
+    }
+    if (ct->ct_flags & (CT_POINTER | CT_FUNCTIONPTR)) {
+        /* not "P", which NumPy does not support */
+        switch (ct->ct_size) {
+        case 4: return "I";
+        case 8: return "Q";
+        }
+        return NULL;
+    }
+    return NULL;
+}
+
+static int _item_buffer_format(CTypeDescrObject *ct, struct fmtbuf_s *b,
+                               int standard);
+
+static int _struct_buffer_format(CTypeDescrObject *ct, struct fmtbuf_s *b)
+{
+    /* "T{=i:a:4x(2)=d:b:}", with explicit padding; returns 0 if done, 1 if
+       there is no format for this struct, or -1 with an exception */
+    CFieldObject *cf;
+    Py_ssize_t position = 0;
+    char padding[32];
+    int res;
+
+    if (!(ct->ct_flags & CT_STRUCT) ||
+            (ct->ct_flags & (CT_IS_OPAQUE | CT_WITH_VAR_ARRAY)))
+        return 1;
+    if (force_lazy_struct(ct) < 0)
+        return -1;
+    if (fmtbuf_add(b, "T{") < 0)
+        return -1;
+    for (cf = (CFieldObject *)ct->ct_extra; cf != NULL; cf = cf->cf_next) {
+        PyObject *name;
+        if (cf->cf_bitshift != BS_REGULAR || cf->cf_offset < position)
+            return 1;   /* bitfields, empty arrays or overlapping fields */
+        if (cf->cf_offset > position) {
+            sprintf(padding, "%llux",
+                    (unsigned PY_LONG_LONG)(cf->cf_offset - position));
+            if (fmtbuf_add(b, padding) < 0)
+                return -1;
+        }
+        res = _item_buffer_format(cf->cf_type, b, 1);
+        if (res != 0)
+            return res;
+        name = get_field_name(ct, cf);
+        if (!PyText_Check(name) || PyText_AS_UTF8(name) == NULL)
+            return 1;
+        if (fmtbuf_add(b, ":") < 0 ||
+                fmtbuf_add(b, PyText_AS_UTF8(name)) < 0 ||
+                fmtbuf_add(b, ":") < 0)
+            return -1;
+        position = cf->cf_offset + cf->cf_type->ct_size;
+    }
+    if (ct->ct_size > position) {
+        sprintf(padding, "%llux",
+                (unsigned PY_LONG_LONG)(ct->ct_size - position));
+        if (fmtbuf_add(b, padding) < 0)
+            return -1;
+    }
+    return fmtbuf_add(b, "}");
+}
+
+static int _item_buffer_format(CTypeDescrObject *ct, struct fmtbuf_s *b,
+                               int standard)
+{
+    /* the format of one item of type 'ct', with "(n,m)" in front for
+       arrays, and then "=" if 'standard' for primitives; same results
+       as _struct_buffer_format() */
+    const char *prim;
+    char dim[32];
+
+    if (ct->ct_flags & CT_ARRAY) {
+        const char *sep = "(";
+        while (ct->ct_flags & CT_ARRAY) {
+            if (ct->ct_length < 0)
+                return 1;
+            sprintf(dim, "%s%llu", sep, (unsigned PY_LONG_LONG)ct->ct_length);
+            if (fmtbuf_add(b, dim) < 0)
+                return -1;
+            sep = ",";
+            ct = ct->ct_itemdescr;
+        }
+        if (fmtbuf_add(b, ")") < 0)
+            return -1;
+    }
+    if (ct->ct_flags & CT_STRUCT)
+        return _struct_buffer_format(ct, b);
+    prim = _primitive_buffer_format(ct, standard);
+    if (prim == NULL)
+        return 1;
+    if (standard && fmtbuf_add(b, "=") < 0)
+        return -1;
+    return fmtbuf_add(b, prim);
+}
+
+static int _cdata_buffer_format(MiniBufferObj *self)
+{
+    /* Compute the format, itemsize and shape of the items of the array
+       or pointer cdata 'self->mb_keepalive', for the consumers of
+       ffi.buffer() that ask for it.  The array is split in items of
+       the type of the array or pointer; the fixed-length arrays inside
+       are exported as more dimensions, and structs with "T{}".
+       'self->mb_format' is set to None if there is no format, e.g. for
+       unions or bitfields, or if the size of the buffer is not a
+       multiple of the item size. */
+    CTypeDescrObject *ct, *itemct;
+    struct fmtbuf_s b = { NULL, 0, 0 };
+    Py_ssize_t *shape, stride;
+    int ndim, i, res = 1;
+
+    if (self->mb_keepalive != NULL && CData_Check(self->mb_keepalive)) {
+        ct = ((CDataObject *)self->mb_keepalive)->c_type;
+        if (ct->ct_flags & (CT_ARRAY | CT_POINTER)) {
+            itemct = ct->ct_itemdescr;
+            if (itemct->ct_size > 0 && self->mb_size % itemct->ct_size == 0) {
+                ndim = 1;
+                for (ct = itemct; ct->ct_flags & CT_ARRAY;
+                     ct = ct->ct_itemdescr) {
+                    if (ct->ct_length < 0 || ndim >= PyBUF_MAX_NDIM)
+                        break;
+                    ndim++;
+                }
+                if (ct->ct_flags & CT_STRUCT) {
+                    res = _struct_buffer_format(ct, &b);
+                }
+                else {
+                    const char *prim = _primitive_buffer_format(ct, 0);
+                    res = (prim == NULL) ? 1 : fmtbuf_add(&b, prim);
+                }
+                if (res == 0 && ct->ct_size <= 0)
+                    res = 1;
+            }
+        }
+    }
+    if (res < 0)
+        goto error;
+    if (res > 0) {
+        PyMem_Free(b.data);
+        Py_INCREF(Py_None);
+        self->mb_format = Py_None;
+        return 0;
+    }
+
+    shape = PyMem_Malloc(2 * ndim * sizeof(Py_ssize_t));
+    if (shape == NULL) {
+        PyErr_NoMemory();
+        goto error;
+    }
+    /* here, 'ct' is the innermost item type */
+    shape[0] = self->mb_size / itemct->ct_size;
+    for (i = 1; i < ndim; i++) {
+        shape[i] = itemct->ct_length;
+        itemct = itemct->ct_itemdescr;
+    }
+    stride = ct->ct_size;
+    for (i = ndim - 1; i >= 0; i--) {
+        shape[ndim + i] = stride;
+        stride *= shape[i];
+    }
+    self->mb_format = PyBytes_FromString(b.data);
+    if (self->mb_format == NULL) {
+        PyMem_Free(shape);
+        goto error;
+    }
+    PyMem_Free(b.data);
+    self->mb_itemsize = ct->ct_size;
+    self->mb_ndim = ndim;
+    self->mb_shape = shape;
+    return 0;
+
+ error:
+    PyMem_Free(b.data);
+    return -1;
+}
+
 static PyObject *
 b_buffer_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
 {
@@ -7079,6 +8607,7 @@ static PyObject *newp_handle(CTypeDescrObject *ct_voidp, PyObject *x)
     cd->head.c_type = ct_voidp;
     cd->head.c_data = (char *)cd;
     cd->head.c_weakreflist = NULL;
+    CDATA_INIT_VECTORCALL(&cd->head);
     Py_INCREF(x);
     cd->structobj = x;
     PyObject_GC_Track(cd);
@@ -7133,6 +8662,9 @@ static PyObject *b_from_handle(PyObject *self, PyObject *arg)
     return x;
 }
 
+#include "handle_table.h"
+#include "dtype.h"
+
 static int _my_PyObject_GetContiguousBuffer(PyObject *x, Py_buffer *view,
                                             int writable_only)
 {
@@ -7272,6 +8804,7 @@ static PyObject *direct_from_buffer(CTypeDescrObject *ct, PyObject *x,
     cd->c_type = ct;
     cd->c_data = view->buf;
     cd->c_weakreflist = NULL;
+    CDATA_INIT_VECTORCALL(cd);
     ((CDataObject_frombuf *)cd)->length = arraylength;
     ((CDataObject_frombuf *)cd)->bufferview = view;
     PyObject_GC_Track(cd);
@@ -7347,6 +8880,335 @@ static PyObject *b_memmove(PyObject *self, PyObject *args, PyObject *kwds)
     return Py_None;
 }
 
+static int _buffer_format_matches(CTypeDescrObject *ct, const char *format)
+{
+    /* Check that the PEP 3118 'format' of a buffer describes items of the
+       primitive type 'ct'.  The itemsize must be checked separately. */
+    const char *accepted;
+
+    format = _buffer_format_native(format);
+    if (ct->ct_flags & CT_IS_BOOL)
+        accepted = "?";
+    else if (ct->ct_size == 1)
+        accepted = "cbB";    /* any kind of bytes */
+    else if (ct->ct_flags & CT_PRIMITIVE_SIGNED)
+        accepted = "bhilqn";
+    else if (ct->ct_flags & CT_PRIMITIVE_UNSIGNED)
+        accepted = "BHILQN";
+    else if (ct->ct_flags & CT_PRIMITIVE_CHAR)
+        accepted = "uwHI";
+    else if (ct->ct_flags & CT_PRIMITIVE_FLOAT)
+        accepted = "efdg";
+    else if (ct->ct_flags & CT_PRIMITIVE_COMPLEX) {
+        if (*format != 'Z')
+            return 0;
+        format++;
+        accepted = "fdg";
+    }
+    else
+        return 0;
+    return format[0] != 0 && format[1] == 0 &&
+           strchr(accepted, format[0]) != NULL;
+}
+
+static int _fetch_typed_buffer(PyObject *x, CTypeDescrObject *ctitem,
+                               Py_buffer *view, int writable_only,
+                               Py_ssize_t *plength)
+{
+    /* Get a view of 'x' as a contiguous array of items of the primitive
+       type 'ctitem'.  'x' is either a cdata array of a compatible type,
+       or an object with the buffer interface whose format and itemsize
+       match.  Stores the number of items in '*plength'.  The view must
+       be released with PyBuffer_Release(). */
+    if (CData_Check(x)) {
+        CTypeDescrObject *ct = ((CDataObject *)x)->c_type;
+        if ((ct->ct_flags & CT_ARRAY) &&
+                (ct->ct_itemdescr == ctitem ||
+                 (ct->ct_itemdescr->ct_size == ctitem->ct_size &&
+                  (ct->ct_itemdescr->ct_flags & (CT_PRIMITIVE_ANY|CT_IS_BOOL))
+                  == (ctitem->ct_flags & (CT_PRIMITIVE_ANY|CT_IS_BOOL))))) {
+            view->buf = ((CDataObject *)x)->c_data;
+            view->obj = NULL;
+            *plength = get_array_length((CDataObject *)x);
+            return 0;
+        }
+        PyErr_Format(PyExc_TypeError,
+                     "expected an array of '%s', got cdata '%s'",
+                     ctitem->ct_name, ct->ct_name);
+        return -1;
+    }
+    if (PyObject_GetBuffer(x, view, PyBUF_FORMAT | PyBUF_C_CONTIGUOUS |
+                           (writable_only ? PyBUF_WRITABLE : 0)) < 0)
+        return -1;
+    if (view->itemsize != ctitem->ct_size ||
+            !_buffer_format_matches(ctitem, view->format)) {
+        PyErr_Format(PyExc_TypeError,
+                     "expected a buffer of '%s', got a buffer of format "
+                     "'%s' with itemsize %zd", ctitem->ct_name,
+                     view->format != NULL ? view->format : "B",
+                     view->itemsize);
+        PyBuffer_Release(view);
+        return -1;
+    }
+    *plength = view->len / view->itemsize;
+    return 0;
+}
+
+static PyObject *b_call_many(PyObject *self, PyObject *args, PyObject *kwds)
+{
+    /* call_many(func, *buffers, out=None): call 'func' once for every
+       index in the buffers, without going through Python objects */
+    CDataObject *cd;
+    CTypeDescrObject *fct, *fresult;
+    cif_description_t *cif_descr;
+    PyObject *signature, *out = Py_None, *res = NULL;
+    Py_ssize_t i, k, nargs, length = -1, nviews = 0, resultoffset = 0;
+    Py_buffer *views = NULL;
+    char *outdata = NULL;
+    void **avalues = NULL;
+    Py_ssize_t *asizes = NULL;
+    union {
+        ffi_arg a;
+        union_alignment u;
+    } resultbuf;
+
+    if (kwds != NULL) {
+        Py_ssize_t nkwds = PyDict_Size(kwds);
+        if (nkwds > 0) {
+            out = PyDict_GetItemString(kwds, "out");
+            if (out == NULL || nkwds > 1) {
+                PyErr_SetString(PyExc_TypeError,
+                    "call_many() only accepts the keyword argument 'out'");
+                return NULL;
+            }
+        }
+    }
+    if (PyTuple_GET_SIZE(args) < 1 || !CData_Check(PyTuple_GET_ITEM(args, 0))
+        || !(((CDataObject *)PyTuple_GET_ITEM(args, 0))->c_type->ct_flags &
+             CT_FUNCTIONPTR)) {
+        PyErr_SetString(PyExc_TypeError,
+                        "call_many() expects a cdata function as first "
+                        "argument");
+        return NULL;
+    }
+    cd = (CDataObject *)PyTuple_GET_ITEM(args, 0);
+    fct = cd->c_type;
+    signature = fct->ct_stuff;
+    nargs = PyTuple_GET_SIZE(signature) - 2;
+    fresult = (CTypeDescrObject *)PyTuple_GET_ITEM(signature, 1);
+    cif_descr = (cif_description_t *)fct->ct_extra;
+
+    if (cd->c_data == NULL) {
+        PyErr_Format(PyExc_RuntimeError,
+                     "cannot call null pointer pointer from cdata '%s'",
+                     fct->ct_name);
+        return NULL;
+    }
+    if ((fct->ct_flags & CT_IS_VARIADIC) || cif_descr == NULL ||
+            !(fresult->ct_flags & (CT_PRIMITIVE_ANY | CT_VOID)) ||
+            (fresult->ct_flags & CT_PRIMITIVE_COMPLEX))
+        goto unsupported;
+    for (i = 0; i < nargs; i++) {
+        CTypeDescrObject *argtype;
+        argtype = (CTypeDescrObject *)PyTuple_GET_ITEM(signature, 2 + i);
+        if (!(argtype->ct_flags & CT_PRIMITIVE_ANY) ||
+                (argtype->ct_flags & CT_PRIMITIVE_COMPLEX))
+            goto unsupported;
+    }
+    if (PyTuple_GET_SIZE(args) - 1 != nargs) {
+        PyErr_Format(PyExc_TypeError,
+                     "call_many(): '%s' expects %zd buffers, got %zd",
+                     fct->ct_name, nargs, PyTuple_GET_SIZE(args) - 1);
+        return NULL;
+    }
+    if ((fresult->ct_flags & CT_VOID) && out != Py_None) {
+        PyErr_Format(PyExc_TypeError,
+                     "call_many(): 'out' given but '%s' returns void",
+                     fct->ct_name);
+        return NULL;
+    }
+
+    views = PyMem_Malloc((nargs + 1) * sizeof(Py_buffer));
+    avalues = PyMem_Malloc((nargs + 1) * sizeof(void *));
+    asizes = PyMem_Malloc((nargs + 1) * sizeof(Py_ssize_t));
+    if (views == NULL || avalues == NULL || asizes == NULL) {
+        PyErr_NoMemory();
+        goto done;
+    }
+    for (i = 0; i <= nargs; i++) {
+        CTypeDescrObject *ct;
+        PyObject *x;
+        Py_ssize_t n;
+        if (i < nargs) {
+            ct = (CTypeDescrObject *)PyTuple_GET_ITEM(signature, 2 + i);
+            x = PyTuple_GET_ITEM(args, 1 + i);
+        }
+        else if (out != Py_None) {
+            ct = fresult;
+            x = out;
+        }
+        else
+            break;
+        if (_fetch_typed_buffer(x, ct, &views[i], i == nargs, &n) < 0)
+            goto done;
+        nviews++;
+        if (length < 0)
+            length = n;
+        else if (n != length) {
+            PyErr_Format(PyExc_ValueError,
+                         "call_many(): %s has length %zd, expected %zd",
+                         i < nargs ? "a buffer argument" : "'out'",
+                         n, length);
+            goto done;
+        }
+        avalues[i] = views[i].buf;
+        asizes[i] = ct->ct_size;
+    }
+    if (length < 0) {
+        PyErr_Format(PyExc_TypeError,
+                     "call_many(): '%s' takes no argument, so 'out' must "
+                     "be given", fct->ct_name);
+        goto done;
+    }
+
+    if (fresult->ct_flags & CT_VOID) {
+        res = Py_None;
+        Py_INCREF(res);
+    }
+    else if (out != Py_None) {
+        res = out;
+        Py_INCREF(res);
+        outdata = views[nargs].buf;
+    }
+    else {
+        static const cffi_allocator_t noclear_allocator = { NULL, NULL, 1 };
+        PyObject *ctptr, *ctarray, *pylength;
+        ctptr = new_pointer_type(fresult);
+        if (ctptr == NULL)
+            goto done;
+        ctarray = new_array_type((CTypeDescrObject *)ctptr, -1);
+        Py_DECREF(ctptr);
+        if (ctarray == NULL)
+            goto done;
+        pylength = PyInt_FromSsize_t(length);
+        if (pylength != NULL) {
+            res = direct_newp((CTypeDescrObject *)ctarray, pylength,
+                              &noclear_allocator);
+            Py_DECREF(pylength);
+        }
+        Py_DECREF(ctarray);
+        if (res == NULL)
+            goto done;
+        outdata = ((CDataObject *)res)->c_data;
+    }
+
+#ifdef WORDS_BIGENDIAN
+    /* see the comment in _cdata_call() */
+    if ((fresult->ct_flags & (CT_PRIMITIVE_CHAR | CT_PRIMITIVE_SIGNED |
+                              CT_PRIMITIVE_UNSIGNED)) &&
+            fresult->ct_size < sizeof(ffi_arg))
+        resultoffset = sizeof(ffi_arg) - fresult->ct_size;
+#endif
+
+#define CALL_MANY_LOOP                                                  \
+    for (k = 0; k < length; k++) {                                      \
+        ffi_call(&cif_descr->cif, (void (*)(void))(cd->c_data),         \
+                 &resultbuf, avalues);                                  \
+        for (i = 0; i < nargs; i++)                                     \
+            avalues[i] = ((char *)avalues[i]) + asizes[i];              \
+        if (outdata != NULL) {                                          \
+            memcpy(outdata, ((char *)&resultbuf) + resultoffset,        \
+                   fresult->ct_size);                                   \
+            outdata += fresult->ct_size;                                \
+        }                                                               \
+    }
+
+    if (fct->ct_flags & CT_IS_FAST) {
+        CALL_MANY_LOOP
+    }
+    else {
+        Py_BEGIN_ALLOW_THREADS
+        restore_errno();
+        CALL_MANY_LOOP
+        save_errno();
+        Py_END_ALLOW_THREADS
+    }
+#undef CALL_MANY_LOOP
+
+ done:
+    for (i = 0; i < nviews; i++)
+        PyBuffer_Release(&views[i]);
+    PyMem_Free(asizes);
+    PyMem_Free(avalues);
+    PyMem_Free(views);
+    return res;
+
+ unsupported:
+    PyErr_Format(PyExc_TypeError,
+                 "call_many(): '%s' must be a non-variadic function whose "
+                 "arguments and result are all primitive (non-complex) types",
+                 fct->ct_name);
+    return NULL;
+}
+
+static PyObject *b_enable_call_stats(PyObject *self, PyObject *args,
+                                     PyObject *kwds)
+{
+    int enable = 1;
+    static char *keywords[] = {"enable", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|i:enable_call_stats",
+                                     keywords, &enable))
+        return NULL;
+    cffi_call_stats_enabled = (enable != 0);
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
+static PyObject *b_call_stats(PyObject *self, PyObject *args, PyObject *kwds)
+{
+    int reset = 0;
+    static char *keywords[] = {"reset", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|i:call_stats",
+                                     keywords, &reset))
+        return NULL;
+    return call_stats_snapshot(reset);
+}
+
+static PyObject *b_reserve_callbacks(PyObject *self, PyObject *args)
+{
+    Py_ssize_t n;
+    if (!PyArg_ParseTuple(args, "n:reserve_callbacks", &n))
+        return NULL;
+#if CFFI_CHECK_FFI_CLOSURE_ALLOC_MAYBE
+    if (CFFI_CHECK_FFI_CLOSURE_ALLOC) {
+        /* the closures come from libffi's ffi_closure_alloc(): no pool */
+    } else
+#endif
+    if (cffi_closure_reserve(n) < 0)
+        return PyErr_NoMemory();
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
+static PyObject *b_callback_pool_stats(PyObject *self, PyObject *noarg)
+{
+    return Py_BuildValue("{s:n,s:n,s:n}",
+                         "free", closures_total - closures_in_use,
+                         "in_use", closures_in_use,
+                         "pages", closure_pages);
+}
+
+static PyObject *b_trim_callback_pool(PyObject *self, PyObject *args,
+                                      PyObject *kwds)
+{
+    Py_ssize_t keep = 0;
+    static char *keywords[] = {"keep", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|n:trim_callback_pool",
+                                     keywords, &keep))
+        return NULL;
+    return PyInt_FromSsize_t(cffi_closure_trim(keep));
+}
+
 static PyObject *b__get_types(PyObject *self, PyObject *noarg)
 {
     return PyTuple_Pack(2, (PyObject *)&CData_Type,
@@ -7361,12 +9223,13 @@ static PyObject *b_gcp(PyObject *self, PyObject *args, PyObject *kwds)
     CDataObject *cd;
     CDataObject *origobj;
     PyObject *destructor;
-    Py_ssize_t ignored;   /* for pypy */
-    static char *keywords[] = {"cdata", "destructor", "size", NULL};
+    Py_ssize_t size = 0;
+    int defer = 0;
+    static char *keywords[] = {"cdata", "destructor", "size", "defer", NULL};
 
-    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!O|n:gc", keywords,
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!O|ni:gc", keywords,
                                      &CData_Type, &origobj, &destructor,
-                                     &ignored))
+                                     &size, &defer))
         return NULL;
 
     if (destructor == Py_None) {
@@ -7377,10 +9240,15 @@ static PyObject *b_gcp(PyObject *self, PyObject *args, PyObject *kwds)
 	    return NULL;
 	}
 	Py_CLEAR(((CDataObject_gcp *)origobj)->destructor);
+	gcp_memory_stats_remove((CDataObject_gcp *)origobj);
 	Py_RETURN_NONE;
     }
 
     cd = allocate_gcp_object(origobj, origobj->c_type, destructor);
+    if (cd != NULL) {
+        ((CDataObject_gcp *)cd)->defer = defer;
+        gcp_memory_stats_add((CDataObject_gcp *)cd, size);
+    }
     return (PyObject *)cd;
 }
 
@@ -7701,6 +9569,25 @@ static PyMethodDef FFIBackendMethods[] = {
     {"new_function_type", b_new_function_type, METH_VARARGS},
     {"new_enum_type", b_new_enum_type, METH_VARARGS},
     {"newp", b_newp, METH_VARARGS},
+    {"new_many", b_new_many, METH_VARARGS},
+    {"new_arena", (PyCFunction)b_new_arena, METH_VARARGS | METH_KEYWORDS},
+    {"set_freelist_size", b_set_freelist_size, METH_VARARGS},
+    {"memory_stats", b_memory_stats, METH_NOARGS},
+    {"set_memory_pressure_threshold", b_set_memory_pressure_threshold,
+                                                METH_VARARGS},
+    {"start_deferred_gc_thread", b_start_deferred_gc_thread, METH_NOARGS},
+    {"new_mapped", (PyCFunction)b_new_mapped, METH_VARARGS | METH_KEYWORDS},
+    {"map_file", (PyCFunction)b_map_file, METH_VARARGS | METH_KEYWORDS},
+    {"msync", (PyCFunction)b_msync, METH_VARARGS | METH_KEYWORDS},
+    {"to_dtype", b_to_dtype, METH_O},
+    {"from_dtype", (PyCFunction)b_from_dtype, METH_VARARGS | METH_KEYWORDS},
+    {"set_mmap_threshold", (PyCFunction)b_set_mmap_threshold,
+                                                METH_VARARGS | METH_KEYWORDS},
+    {"run_deferred_gc", b_run_deferred_gc, METH_NOARGS},
+    {"deferred_gc_stats", (PyCFunction)b_deferred_gc_stats,
+                                                METH_VARARGS | METH_KEYWORDS},
+    {"freelist_stats", (PyCFunction)b_freelist_stats,
+                                                METH_VARARGS | METH_KEYWORDS},
     {"cast", b_cast, METH_VARARGS},
     {"callback", b_callback, METH_VARARGS},
     {"alignof", b_alignof, METH_O},
@@ -7711,12 +9598,25 @@ static PyMethodDef FFIBackendMethods[] = {
     {"getcname", b_getcname, METH_VARARGS},
     {"string", (PyCFunction)b_string, METH_VARARGS | METH_KEYWORDS},
     {"unpack", (PyCFunction)b_unpack, METH_VARARGS | METH_KEYWORDS},
+    {"unpack_fields", (PyCFunction)b_unpack_fields,
+                                                METH_VARARGS | METH_KEYWORDS},
     {"get_errno", b_get_errno, METH_NOARGS},
     {"set_errno", b_set_errno, METH_O},
     {"newp_handle", b_newp_handle, METH_VARARGS},
     {"from_handle", b_from_handle, METH_O},
+    {"new_handle_table", b_new_handle_table, METH_VARARGS},
     {"from_buffer", b_from_buffer, METH_VARARGS},
     {"memmove", (PyCFunction)b_memmove, METH_VARARGS | METH_KEYWORDS},
+    {"call_many", (PyCFunction)b_call_many, METH_VARARGS | METH_KEYWORDS},
+    {"enable_call_stats", (PyCFunction)b_enable_call_stats,
+                                                 METH_VARARGS | METH_KEYWORDS},
+    {"call_stats", (PyCFunction)b_call_stats, METH_VARARGS | METH_KEYWORDS},
+    {"reserve_callbacks", b_reserve_callbacks, METH_VARARGS},
+    {"callback_pool_stats", b_callback_pool_stats, METH_NOARGS},
+    {"trim_callback_pool", (PyCFunction)b_trim_callback_pool,
+                                                 METH_VARARGS | METH_KEYWORDS},
+    {"new_callback_queue", (PyCFunction)b_new_callback_queue,
+                                                 METH_VARARGS | METH_KEYWORDS},
     {"gcp", (PyCFunction)b_gcp, METH_VARARGS | METH_KEYWORDS},
     {"release", b_release, METH_O},
 #ifdef MS_WIN32
@@ -7910,6 +9810,11 @@ static void *cffi_exports[] = {
     cffi_call_python,
     _cffi_to_c_wchar3216_t,
     _cffi_from_c_wchar3216_t,
+    &cffi_call_stats_enabled,
+    cffi_clock_ns,
+    _cffi_call_stats_record,
+    _cffi_prepare_pointer_call_argument_buf,
+    _cffi_release_pinned_arguments,
 };
 
 static struct { const char *name; int value; } all_dlopen_flags[] = {
@@ -7974,6 +9879,10 @@ init_cffi_backend(void)
         &CDataGCP_Type,
         &CDataIter_Type,
         &MiniBuffer_Type,
+        &CallbackQueue_Type,
+        &HandleTable_Type,
+        &Arena_Type,
+        &Mapping_Type,
         &FFI_Type,
         &Lib_Type,
         &GlobSupport_Type,
@@ -8075,6 +9984,15 @@ init_cffi_backend(void)
     if (init_ffi_lib(m) < 0)
         INITERROR;
 
+    if (init_deferred_gc() < 0)
+        INITERROR;
+
+    {
+        char *env = Py_GETENV("CFFI_CALL_STATS");
+        if (env != NULL && *env != '\0' && strcmp(env, "0") != 0)
+            cffi_call_stats_enabled = 1;
+    }
+
 #if PY_MAJOR_VERSION >= 3
     if (init_file_emulator() < 0)
         INITERROR;
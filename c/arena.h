@@ -0,0 +1,394 @@
+/************************************************************/
+/* Arenas, created by ffi.new_arena().
+
+   An arena allocates the memory for 'arena.new(cdecl)' by bumping a
+   pointer in a large block, and frees all of it at once in
+   arena.release().  The blocks are obtained with calloc(), so the
+   memory is zero-initialized like with ffi.new().  If a request does
+   not fit in the current block, a new block of at least the arena's
+   capacity is added.  release() keeps the first block for reuse.
+
+   The cdata objects returned by arena.new() keep the arena object
+   alive, but not the memory after release().  In debug mode, the
+   released blocks are filled with 0xDD bytes and kept, made entirely
+   inaccessible if the OS supports it, instead of being freed or
+   reused: using a cdata after release() then crashes immediately
+   instead of silently reading or corrupting newer data.  The list of
+   these dead blocks is kept in a separate array, because their
+   header cannot be read any more.
+*/
+
+struct arena_block_s {
+    struct arena_block_s *ab_next;
+    size_t ab_size;             /* total number of bytes, with the header */
+    union_alignment ab_data[1];
+};
+
+struct arena_aligncheck_s { char c; union_alignment u; };
+
+#define ARENA_ALIGN         offsetof(struct arena_aligncheck_s, u)
+#define ARENA_HEADER_SIZE   offsetof(struct arena_block_s, ab_data)
+
+struct arena_dead_s {
+    void *ad_block;
+    size_t ad_size;
+};
+
+typedef struct {
+    PyObject_HEAD
+    struct arena_block_s *a_blocks;    /* the current block is first */
+    struct arena_dead_s *a_dead;       /* in debug mode, released blocks */
+    size_t a_num_dead, a_max_dead;
+    char *a_next, *a_end;       /* the free space in the current block */
+    Py_ssize_t a_capacity;
+    Py_ssize_t a_used;          /* bytes allocated since the last release */
+    int a_debug;
+    PyObject *a_typeof;         /* to get the ctype from a string, or NULL */
+} ArenaObject;
+
+static PyTypeObject Arena_Type;
+
+static struct arena_block_s *arena_alloc_block(ArenaObject *a, size_t size)
+{
+    struct arena_block_s *block;
+
+    if (!a->a_debug) {
+        block = calloc(size, 1);
+    }
+    else {
+#ifdef MS_WIN32
+        block = VirtualAlloc(NULL, size, MEM_COMMIT | MEM_RESERVE,
+                             PAGE_READWRITE);
+#else
+        block = mmap(NULL, size, PROT_READ | PROT_WRITE,
+                     MAP_PRIVATE | MAP_ANONYMOUS, -1, 0);
+        if (block == (void *)MAP_FAILED)
+            block = NULL;
+#endif
+    }
+    if (block == NULL)
+        return NULL;
+    block->ab_size = size;
+    return block;
+}
+
+static void arena_unmap(void *block, size_t size)
+{
+#ifdef MS_WIN32
+    VirtualFree(block, 0, MEM_RELEASE);
+#else
+    munmap(block, size);
+#endif
+}
+
+static void arena_free_block(ArenaObject *a, struct arena_block_s *block)
+{
+    if (!a->a_debug)
+        free(block);
+    else
+        arena_unmap(block, block->ab_size);
+}
+
+static void arena_kill_block(ArenaObject *a, struct arena_block_s *block)
+{
+    /* debug mode: poison the block and make it inaccessible, but keep
+       it reserved so that the addresses are not reused */
+    size_t size = block->ab_size;
+
+    if (a->a_num_dead == a->a_max_dead) {
+        size_t max_dead = a->a_max_dead * 2 + 8;
+        struct arena_dead_s *dead = PyMem_Realloc(a->a_dead,
+                                      max_dead * sizeof(struct arena_dead_s));
+        if (dead == NULL) {
+            /* out of memory: give up on keeping this block */
+            arena_unmap(block, size);
+            return;
+        }
+        a->a_dead = dead;
+        a->a_max_dead = max_dead;
+    }
+    a->a_dead[a->a_num_dead].ad_block = block;
+    a->a_dead[a->a_num_dead].ad_size = size;
+    a->a_num_dead++;
+
+    memset(block, 0xDD, size);
+#ifdef MS_WIN32
+    {
+        DWORD old_protect;
+        VirtualProtect(block, size, PAGE_NOACCESS, &old_protect);
+    }
+#else
+    mprotect(block, size, PROT_NONE);
+#endif
+}
+
+static char *arena_allocate(ArenaObject *a, Py_ssize_t datasize)
+{
+    char *result;
+    size_t size = (datasize + ARENA_ALIGN - 1) & ~(ARENA_ALIGN - 1);
+
+    if (size > (size_t)(a->a_end - a->a_next)) {
+        struct arena_block_s *block;
+        size_t blocksize = ARENA_HEADER_SIZE + size;
+        if (blocksize < (size_t)a->a_capacity)
+            blocksize = a->a_capacity;
+        if (size > (size_t)PY_SSIZE_T_MAX - ARENA_HEADER_SIZE ||
+                (block = arena_alloc_block(a, blocksize)) == NULL) {
+            PyErr_NoMemory();
+            return NULL;
+        }
+        block->ab_next = a->a_blocks;
+        a->a_blocks = block;
+        a->a_next = (char *)block->ab_data;
+        a->a_end = ((char *)block) + blocksize;
+    }
+    result = a->a_next;
+    a->a_next += size;
+    a->a_used += size;
+    return result;
+}
+
+static PyObject *arena_new(ArenaObject *a, PyObject *args, PyObject *kwds)
+{
+    PyObject *arg, *init = Py_None;
+    CTypeDescrObject *ct;
+    CDataObject_gcp *cd;
+    Py_ssize_t datasize, explicitlength;
+    int varsizestruct;
+    char *data;
+    static char *keywords[] = {"cdecl", "init", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|O:new", keywords,
+                                     &arg, &init))
+        return NULL;
+
+    if (CTypeDescr_Check(arg)) {
+        Py_INCREF(arg);
+        ct = (CTypeDescrObject *)arg;
+    }
+    else if (a->a_typeof != NULL) {
+        ct = (CTypeDescrObject *)PyObject_CallFunctionObjArgs(a->a_typeof,
+                                                              arg, NULL);
+        if (ct == NULL)
+            return NULL;
+        if (!CTypeDescr_Check(ct)) {
+            PyErr_SetString(PyExc_TypeError, "typeof() must return a ctype");
+            Py_DECREF(ct);
+            return NULL;
+        }
+    }
+    else {
+        PyErr_SetString(PyExc_TypeError, "expected a ctype");
+        return NULL;
+    }
+
+    datasize = newp_data_size(ct, &init, &explicitlength, &varsizestruct);
+    if (datasize < 0)
+        goto error;
+    data = arena_allocate(a, datasize);
+    if (data == NULL)
+        goto error;
+
+    /* the result is a cdata that keeps the arena alive, like ffi.gc()
+       without destructor */
+    cd = PyObject_GC_New(CDataObject_gcp, &CDataGCP_Type);
+    if (cd == NULL)
+        goto error;
+    Py_INCREF(a);
+    cd->head.c_data = data;
+    cd->head.c_type = ct;      /* steals the reference */
+    cd->head.c_weakreflist = NULL;
+    CDATA_INIT_VECTORCALL(&cd->head);
+    cd->length = explicitlength;
+    cd->origobj = (PyObject *)a;
+    cd->destructor = NULL;
+    cd->memsize = 0;
+    cd->defer = 0;
+    PyObject_GC_Track(cd);
+
+    if (init != Py_None) {
+        if (convert_from_object(data,
+              (ct->ct_flags & CT_POINTER) ? ct->ct_itemdescr : ct, init) < 0) {
+            Py_DECREF(cd);
+            return NULL;
+        }
+    }
+    return (PyObject *)cd;
+
+ error:
+    Py_DECREF(ct);
+    return NULL;
+}
+
+static void arena_release_blocks(ArenaObject *a, int keep_first)
+{
+    /* if 'keep_first', this is release(); otherwise, we're deallocating */
+    struct arena_block_s *block = a->a_blocks, *first = NULL;
+
+    while (block != NULL) {
+        struct arena_block_s *next = block->ab_next;
+        if (a->a_debug && keep_first)
+            arena_kill_block(a, block);
+        else if (keep_first && next == NULL)
+            first = block;      /* the oldest one is the last in the list */
+        else
+            arena_free_block(a, block);
+        block = next;
+    }
+    a->a_blocks = first;
+    if (first != NULL) {
+        /* clear the part that was used, to give zeroed memory again */
+        size_t used = first->ab_size - ARENA_HEADER_SIZE;
+        if ((size_t)a->a_used < used)
+            used = (size_t)a->a_used;
+        memset(first->ab_data, 0, used);
+        a->a_next = (char *)first->ab_data;
+        a->a_end = ((char *)first) + first->ab_size;
+    }
+    else {
+        a->a_next = a->a_end = NULL;
+    }
+    a->a_used = 0;
+}
+
+static PyObject *arena_release(ArenaObject *a, PyObject *noarg)
+{
+    arena_release_blocks(a, 1);
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
+static PyObject *arena_enter(ArenaObject *a, PyObject *noarg)
+{
+    Py_INCREF(a);
+    return (PyObject *)a;
+}
+
+static PyObject *arena_exit(ArenaObject *a, PyObject *args)
+{
+    return arena_release(a, NULL);
+}
+
+static PyObject *arena_get_used(ArenaObject *a, void *context)
+{
+    return PyInt_FromSsize_t(a->a_used);
+}
+
+static PyObject *arena_get_capacity(ArenaObject *a, void *context)
+{
+    return PyInt_FromSsize_t(a->a_capacity);
+}
+
+static int arena_traverse(ArenaObject *a, visitproc visit, void *arg)
+{
+    Py_VISIT(a->a_typeof);
+    return 0;
+}
+
+static void arena_dealloc(ArenaObject *a)
+{
+    size_t i;
+
+    PyObject_GC_UnTrack(a);
+    arena_release_blocks(a, 0);
+    for (i = 0; i < a->a_num_dead; i++)
+        arena_unmap(a->a_dead[i].ad_block, a->a_dead[i].ad_size);
+    PyMem_Free(a->a_dead);
+    Py_XDECREF(a->a_typeof);
+    PyObject_GC_Del(a);
+}
+
+static PyObject *b_new_arena(PyObject *self, PyObject *args, PyObject *kwds)
+{
+    Py_ssize_t capacity = 65536;
+    int debug = 0;
+    PyObject *typeof_fn = Py_None;
+    ArenaObject *a;
+    static char *keywords[] = {"capacity", "debug", "typeof", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|niO:new_arena", keywords,
+                                     &capacity, &debug, &typeof_fn))
+        return NULL;
+    if (capacity <= 0) {
+        PyErr_SetString(PyExc_ValueError, "'capacity' must be positive");
+        return NULL;
+    }
+    if (capacity > PY_SSIZE_T_MAX - (Py_ssize_t)ARENA_HEADER_SIZE)
+        return PyErr_NoMemory();
+
+    a = PyObject_GC_New(ArenaObject, &Arena_Type);
+    if (a == NULL)
+        return NULL;
+    a->a_blocks = NULL;
+    a->a_dead = NULL;
+    a->a_num_dead = a->a_max_dead = 0;
+    a->a_next = a->a_end = NULL;
+    a->a_capacity = ARENA_HEADER_SIZE + capacity;
+    a->a_used = 0;
+    a->a_debug = debug;
+    if (typeof_fn == Py_None) {
+        a->a_typeof = NULL;
+    }
+    else {
+        Py_INCREF(typeof_fn);
+        a->a_typeof = typeof_fn;
+    }
+    PyObject_GC_Track(a);
+    return (PyObject *)a;
+}
+
+static PyMethodDef arena_methods[] = {
+    {"new",       (PyCFunction)arena_new,     METH_VARARGS | METH_KEYWORDS},
+    {"release",   (PyCFunction)arena_release, METH_NOARGS},
+    {"__enter__", (PyCFunction)arena_enter,   METH_NOARGS},
+    {"__exit__",  (PyCFunction)arena_exit,    METH_VARARGS},
+    {NULL,        NULL}           /* sentinel */
+};
+
+static PyGetSetDef arena_getsets[] = {
+    {"used", (getter)arena_get_used, NULL,
+        "number of bytes allocated since the last release()"},
+    {"capacity", (getter)arena_get_capacity, NULL,
+        "size of the blocks of memory, including a small header"},
+    {NULL}
+};
+
+PyDoc_STRVAR(arena_doc,
+"An arena, made by ffi.new_arena().\n"
+"\n"
+"arena.new(cdecl, init=None) is like ffi.new(), but the memory comes\n"
+"from the arena.  arena.release(), or the end of a 'with arena:' block,\n"
+"frees all of it at once.");
+
+static PyTypeObject Arena_Type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "_cffi_backend.Arena",
+    sizeof(ArenaObject),
+    0,
+    (destructor)arena_dealloc,                  /* tp_dealloc */
+    0,                                          /* tp_print */
+    0,                                          /* tp_getattr */
+    0,                                          /* tp_setattr */
+    0,                                          /* tp_compare */
+    0,                                          /* tp_repr */
+    0,                                          /* tp_as_number */
+    0,                                          /* tp_as_sequence */
+    0,                                          /* tp_as_mapping */
+    0,                                          /* tp_hash */
+    0,                                          /* tp_call */
+    0,                                          /* tp_str */
+    PyObject_GenericGetAttr,                    /* tp_getattro */
+    0,                                          /* tp_setattro */
+    0,                                          /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,    /* tp_flags */
+    arena_doc,                                  /* tp_doc */
+    (traverseproc)arena_traverse,               /* tp_traverse */
+    0,                                          /* tp_clear */
+    0,                                          /* tp_richcompare */
+    0,                                          /* tp_weaklistoffset */
+    0,                                          /* tp_iter */
+    0,                                          /* tp_iternext */
+    arena_methods,                              /* tp_methods */
+    0,                                          /* tp_members */
+    arena_getsets,                              /* tp_getset */
+};
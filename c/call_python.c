@@ -69,21 +69,31 @@ static PyObject *_get_interpstate_dict(void)
     return NULL;
 }
 
+static int _update_cache_to_call_python(struct _cffi_externpy_s *externpy);
+
+/* the value of 'reserved1' when the function is attached to a queue with
+   @ffi.def_extern(queue=...).  Then 'reserved2' is the infotuple, and
+   neither field is modified or released any more: they are read without
+   the GIL by cffi_call_python(). */
+static char _externpy_queued_marker;
+#define EXTERNPY_QUEUED  ((void *)&_externpy_queued_marker)
+
 static PyObject *_ffi_def_extern_decorator(PyObject *outer_args, PyObject *fn)
 {
     const char *s;
-    PyObject *error, *onerror, *infotuple, *old1;
+    PyObject *error, *onerror, *queue, *infotuple, *old1;
     int index, err;
     const struct _cffi_global_s *g;
     struct _cffi_externpy_s *externpy;
     CTypeDescrObject *ct;
     FFIObject *ffi;
     builder_c_t *types_builder;
-    PyObject *name = NULL;
+    PyObject *name = NULL, *old2;
     PyObject *interpstate_dict;
     PyObject *interpstate_key;
 
-    if (!PyArg_ParseTuple(outer_args, "OzOO", &ffi, &s, &error, &onerror))
+    if (!PyArg_ParseTuple(outer_args, "OzOOO", &ffi, &s, &error, &onerror,
+                          &queue))
         return NULL;
 
     if (s == NULL) {
@@ -104,6 +114,13 @@ static PyObject *_ffi_def_extern_decorator(PyObject *outer_args, PyObject *fn)
     g = &types_builder->ctx.globals[index];
     if (_CFFI_GETOP(g->type_op) != _CFFI_OP_EXTERN_PYTHON)
         goto not_found;
+    externpy = (struct _cffi_externpy_s *)g->address;
+    if (externpy->reserved1 == EXTERNPY_QUEUED) {
+        PyErr_Format(FFIError, "ffi.def_extern('%s'): this function is "
+                     "attached to a queue and cannot be redefined", s);
+        Py_XDECREF(name);
+        return NULL;
+    }
     Py_XDECREF(name);
 
     ct = realize_c_type(types_builder, types_builder->ctx.types,
@@ -115,6 +132,13 @@ static PyObject *_ffi_def_extern_decorator(PyObject *outer_args, PyObject *fn)
     Py_DECREF(ct);
     if (infotuple == NULL)
         return NULL;
+    if (queue != Py_None) {
+        PyObject *x = callback_queue_attach(queue, infotuple);
+        Py_DECREF(infotuple);
+        if (x == NULL)
+            return NULL;
+        infotuple = x;
+    }
 
     /* don't directly attach infotuple to externpy: in the presence of
        subinterpreters, each time we switch to a different
@@ -127,7 +151,6 @@ static PyObject *_ffi_def_extern_decorator(PyObject *outer_args, PyObject *fn)
         return PyErr_NoMemory();
     }
 
-    externpy = (struct _cffi_externpy_s *)g->address;
     interpstate_key = PyLong_FromVoidPtr((void *)externpy);
     if (interpstate_key == NULL) {
         Py_DECREF(infotuple);
@@ -140,12 +163,26 @@ static PyObject *_ffi_def_extern_decorator(PyObject *outer_args, PyObject *fn)
     if (err < 0)
         return NULL;
 
-    /* force _update_cache_to_call_python() to be called the next time
-       the C function invokes cffi_call_python, to update the cache */
-    old1 = externpy->reserved1;
-    externpy->reserved1 = Py_None;   /* a non-NULL value */
-    Py_INCREF(Py_None);
-    Py_XDECREF(old1);
+    if (queue != Py_None) {
+        /* deferred calls use the infotuple without the GIL, so they can't
+           look up the current subinterpreter: attach it for good now */
+        old1 = externpy->reserved1;
+        old2 = externpy->reserved2;
+        Py_INCREF(infotuple);
+        externpy->reserved2 = infotuple;
+        cq_memory_barrier();
+        externpy->reserved1 = EXTERNPY_QUEUED;
+        Py_XDECREF(old1);
+        Py_XDECREF(old2);
+    }
+    else {
+        /* force _update_cache_to_call_python() to be called the next time
+           the C function invokes cffi_call_python, to update the cache */
+        old1 = externpy->reserved1;
+        externpy->reserved1 = Py_None;   /* a non-NULL value */
+        Py_INCREF(Py_None);
+        Py_XDECREF(old1);
+    }
 
     /* return the function object unmodified */
     Py_INCREF(fn);
@@ -235,7 +272,7 @@ static void cffi_call_python(struct _cffi_externpy_s *externpy, char *args)
        (directly, even if more than 8 bytes).  In all cases, 'args' is
        at least 8 bytes in size.
     */
-    int err = 0;
+    int err = 0, queued = 0;
 
     /* This read barrier is needed for _embedding.h.  It is paired
        with the write_barrier() there.  Without this barrier, we can
@@ -251,6 +288,13 @@ static void cffi_call_python(struct _cffi_externpy_s *externpy, char *args)
     */
     read_barrier();
 
+    if (externpy->reserved1 == EXTERNPY_QUEUED) {
+        /* attached to a queue with @ffi.def_extern(queue=...) */
+        read_barrier();
+        callback_queue_push((PyObject *)externpy->reserved2, 0, args, args);
+        return;
+    }
+
     save_errno();
 
     /* We need the infotuple here.  We could always go through
@@ -266,13 +310,17 @@ static void cffi_call_python(struct _cffi_externpy_s *externpy, char *args)
     }
     else {
         PyGILState_STATE state = gil_ensure();
-        if (externpy->reserved1 != _current_interp_key()) {
+        if (externpy->reserved1 == EXTERNPY_QUEUED) {
+            /* attached to a queue by another thread in the meantime */
+            queued = 1;
+        }
+        else if (externpy->reserved1 != _current_interp_key()) {
             /* Update the (reserved1, reserved2) cache.  This will fail
                if we didn't call @ffi.def_extern() in this particular
                subinterpreter. */
             err = _update_cache_to_call_python(externpy);
         }
-        if (!err) {
+        if (!err && !queued) {
             general_invoke_callback(0, args, args, externpy->reserved2);
         }
         gil_release(state);
@@ -289,4 +337,6 @@ static void cffi_call_python(struct _cffi_externpy_s *externpy, char *args)
         memset(args, 0, externpy->size_of_result);
     }
     restore_errno();
+    if (queued)
+        callback_queue_push((PyObject *)externpy->reserved2, 0, args, args);
 }
@@ -0,0 +1,197 @@
+/************************************************************/
+/* Per-function call statistics, enabled with
+   ffi.enable_call_stats() or by setting the environment variable
+   CFFI_CALL_STATS.  The cdata function calls and the _cffi_f_*()
+   wrappers of out-of-line API modules take three timestamps: on
+   entry, just before the C call, and just after it.  Then they call
+   call_stats_record(), which takes the final timestamp and updates the
+   entry of the function in a hash table.  All of this is done with the
+   GIL held, apart from reading the clock.
+
+   A function is identified either by its address (cdata calls) or by
+   the address of its C name (the string literal passed by the
+   _cffi_f_*() wrappers).  The names of the former are found with
+   dladdr() when making a snapshot of the statistics.
+*/
+
+#ifdef MS_WIN32
+static PY_LONG_LONG cffi_clock_ns(void)
+{
+    static double ns_per_tick = 0.0;
+    LARGE_INTEGER now;
+
+    if (ns_per_tick == 0.0) {
+        LARGE_INTEGER freq;
+        QueryPerformanceFrequency(&freq);
+        ns_per_tick = 1E9 / (double)freq.QuadPart;
+    }
+    QueryPerformanceCounter(&now);
+    return (PY_LONG_LONG)(now.QuadPart * ns_per_tick);
+}
+#else
+# include <time.h>
+static PY_LONG_LONG cffi_clock_ns(void)
+{
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return ts.tv_sec * (PY_LONG_LONG)1000000000 + ts.tv_nsec;
+}
+#endif
+
+typedef struct {
+    const void *cs_key;     /* the function address, or its C name */
+    int cs_key_is_name;
+    PY_LONG_LONG cs_calls, cs_call_ns, cs_conversion_ns;
+} call_stats_entry_t;
+
+static int cffi_call_stats_enabled = 0;
+static call_stats_entry_t *call_stats_table = NULL;
+static size_t call_stats_mask = 0;    /* the table size, minus 1 */
+static size_t call_stats_count = 0;
+
+static size_t call_stats_hash(const void *key)
+{
+    size_t h = (size_t)key;
+    return h ^ (h >> 4) ^ (h >> 12);
+}
+
+static call_stats_entry_t *call_stats_find(const void *key)
+{
+    size_t i = call_stats_hash(key) & call_stats_mask;
+    while (call_stats_table[i].cs_key != NULL &&
+           call_stats_table[i].cs_key != key)
+        i = (i + 1) & call_stats_mask;
+    return &call_stats_table[i];
+}
+
+static int call_stats_grow(void)
+{
+    call_stats_entry_t *old_table = call_stats_table;
+    size_t i, old_size = call_stats_table != NULL ? call_stats_mask + 1 : 0;
+    size_t new_size = old_size > 0 ? old_size * 2 : 64;
+
+    call_stats_table = PyMem_Malloc(new_size * sizeof(call_stats_entry_t));
+    if (call_stats_table == NULL) {
+        call_stats_table = old_table;
+        return -1;
+    }
+    memset(call_stats_table, 0, new_size * sizeof(call_stats_entry_t));
+    call_stats_mask = new_size - 1;
+    for (i = 0; i < old_size; i++) {
+        if (old_table[i].cs_key != NULL)
+            *call_stats_find(old_table[i].cs_key) = old_table[i];
+    }
+    PyMem_Free(old_table);
+    return 0;
+}
+
+static void call_stats_record(const void *key, int key_is_name,
+                              PY_LONG_LONG *timestamps)
+{
+    /* 'timestamps' are taken on entry, before the C call and after the
+       C call; the end is now */
+    PY_LONG_LONG end = cffi_clock_ns();
+    call_stats_entry_t *entry;
+
+    if (3 * (call_stats_count + 1) > 2 * (call_stats_mask + 1) ||
+            call_stats_table == NULL) {
+        if (call_stats_grow() < 0)
+            return;     /* out of memory: drop this call silently */
+    }
+    entry = call_stats_find(key);
+    if (entry->cs_key == NULL) {
+        entry->cs_key = key;
+        entry->cs_key_is_name = key_is_name;
+        call_stats_count++;
+    }
+    entry->cs_calls++;
+    entry->cs_call_ns += timestamps[2] - timestamps[1];
+    entry->cs_conversion_ns += (timestamps[1] - timestamps[0]) +
+                               (end - timestamps[2]);
+}
+
+static void _cffi_call_stats_record(const char *name,
+                                    PY_LONG_LONG *timestamps)
+{
+    /* exported to the _cffi_f_*() wrappers */
+    call_stats_record(name, 1, timestamps);
+}
+
+static PyObject *call_stats_entry_name(call_stats_entry_t *entry)
+{
+#ifndef MS_WIN32
+    Dl_info info;
+#endif
+    if (entry->cs_key_is_name)
+        return PyText_FromString((const char *)entry->cs_key);
+#ifndef MS_WIN32
+    if (dladdr((void *)entry->cs_key, &info) != 0 &&
+            info.dli_sname != NULL && info.dli_saddr == entry->cs_key)
+        return PyText_FromString(info.dli_sname);
+#endif
+    return PyText_FromFormat("%p", entry->cs_key);
+}
+
+static PyObject *call_stats_snapshot(int reset)
+{
+    /* returns a dict {name: (calls, call_time, conversion_time)}, with
+       the times in seconds.  Functions with the same name are merged. */
+    PyObject *result = PyDict_New();
+    PyObject *name, *prev, *stats;
+    Py_ssize_t pos;
+    size_t i;
+
+    if (result == NULL)
+        return NULL;
+    for (i = 0; call_stats_table != NULL && i <= call_stats_mask; i++) {
+        call_stats_entry_t *entry = &call_stats_table[i];
+        PY_LONG_LONG calls, call_ns, conversion_ns;
+
+        if (entry->cs_key == NULL || entry->cs_calls == 0)
+            continue;
+        name = call_stats_entry_name(entry);
+        if (name == NULL)
+            goto error;
+        calls = entry->cs_calls;
+        call_ns = entry->cs_call_ns;
+        conversion_ns = entry->cs_conversion_ns;
+        prev = PyDict_GetItem(result, name);
+        if (prev != NULL) {
+            calls += PyLong_AsLongLong(PyTuple_GET_ITEM(prev, 0));
+            call_ns += PyLong_AsLongLong(PyTuple_GET_ITEM(prev, 1));
+            conversion_ns += PyLong_AsLongLong(PyTuple_GET_ITEM(prev, 2));
+        }
+        stats = Py_BuildValue("LLL", calls, call_ns, conversion_ns);
+        if (stats == NULL || PyDict_SetItem(result, name, stats) < 0) {
+            Py_XDECREF(stats);
+            Py_DECREF(name);
+            goto error;
+        }
+        Py_DECREF(stats);
+        Py_DECREF(name);
+    }
+    /* convert the times from nanoseconds to seconds */
+    pos = 0;
+    while (PyDict_Next(result, &pos, &name, &prev)) {
+        stats = Py_BuildValue("Odd", PyTuple_GET_ITEM(prev, 0),
+                    PyLong_AsLongLong(PyTuple_GET_ITEM(prev, 1)) * 1E-9,
+                    PyLong_AsLongLong(PyTuple_GET_ITEM(prev, 2)) * 1E-9);
+        if (stats == NULL || PyDict_SetItem(result, name, stats) < 0) {
+            Py_XDECREF(stats);
+            goto error;
+        }
+        Py_DECREF(stats);
+    }
+    if (reset) {
+        for (i = 0; call_stats_table != NULL && i <= call_stats_mask; i++) {
+            call_stats_table[i].cs_calls = 0;
+            call_stats_table[i].cs_call_ns = 0;
+            call_stats_table[i].cs_conversion_ns = 0;
+        }
+    }
+    return result;
+
+ error:
+    Py_DECREF(result);
+    return NULL;
+}
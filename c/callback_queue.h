@@ -0,0 +1,559 @@
+/************************************************************/
+/* Queues for deferred callbacks, created by ffi.new_callback_queue().
+
+   A callback or an extern "Python" function attached to a queue does
+   not run the Python function when it is called from C.  Instead, it
+   copies the raw arguments into the next free slot of the queue and
+   immediately returns the 'error' value, without taking the GIL.  The
+   Python functions are later invoked by queue.drain(), in the thread
+   that calls it.
+
+   The queue is a bounded ring buffer of fixed-size slots, usable from
+   any number of threads without locks: each slot has got a sequence
+   number that tells if it is free for the producer with a given
+   position, or ready for the consumer (this is Dmitry Vyukov's
+   bounded MPMC queue).  When the queue is full, the event is dropped
+   and counted in 'queue.dropped'.
+
+   If the queue is created with notify=True, the producers also write
+   one byte to a pipe when the queue becomes non-empty, so that an
+   event loop can wait for 'queue.fileno()' to be readable.
+*/
+
+#ifndef MS_WIN32
+# include <fcntl.h>
+#endif
+
+#ifdef _MSC_VER
+# ifdef _WIN64
+#  define cq_compare_and_swap(p, old, new)                              \
+    (InterlockedCompareExchange64((volatile LONG64 *)(p),               \
+                                  (LONG64)(new), (LONG64)(old)) == (LONG64)(old))
+# else
+#  define cq_compare_and_swap(p, old, new)                              \
+    (InterlockedCompareExchange((volatile LONG *)(p),                   \
+                                (LONG)(new), (LONG)(old)) == (LONG)(old))
+# endif
+# define cq_memory_barrier()  MemoryBarrier()
+#else
+# define cq_compare_and_swap(p, old, new)                               \
+    __sync_bool_compare_and_swap(p, old, new)
+# define cq_memory_barrier()  __sync_synchronize()
+#endif
+
+typedef struct {
+    volatile size_t cs_seq;
+    PyObject *cs_infotuple;     /* borrowed; kept alive by cq_callbacks */
+} cq_slot_t;
+
+/* the arguments are copied after the slot header, aligned to 16 bytes */
+#define CQ_HEADER_SIZE   ((sizeof(cq_slot_t) + 15) & ~(size_t)15)
+
+typedef struct {
+    PyObject_HEAD
+    char *cq_slots;
+    size_t cq_mask;             /* the number of slots, minus 1 */
+    size_t cq_item_size;        /* the number of bytes for the arguments */
+    size_t cq_stride;           /* CQ_HEADER_SIZE + cq_item_size */
+    volatile size_t cq_enqueue_pos;
+    volatile size_t cq_dequeue_pos;
+    volatile size_t cq_dropped;
+    volatile size_t cq_notify_pending;
+    int cq_notify_fd[2];        /* the pipe, or -1 */
+    PyObject *cq_callbacks;     /* list of the infotuples using this queue */
+} CallbackQueueObject;
+
+static PyTypeObject CallbackQueue_Type;
+
+#define CallbackQueue_Check(ob)  (Py_TYPE(ob) == &CallbackQueue_Type)
+
+static size_t cq_load(volatile size_t *p)
+{
+    size_t result = *p;
+    cq_memory_barrier();
+    return result;
+}
+
+static void cq_store(volatile size_t *p, size_t value)
+{
+    cq_memory_barrier();
+    *p = value;
+}
+
+static cq_slot_t *cq_get_slot(CallbackQueueObject *q, size_t pos)
+{
+    return (cq_slot_t *)(q->cq_slots + (pos & q->cq_mask) * q->cq_stride);
+}
+
+static Py_ssize_t cq_align(Py_ssize_t offset, Py_ssize_t size)
+{
+    /* a power of two that is at least the alignment of any C type of
+       the given size */
+    Py_ssize_t align = 16;
+    while (align > 1 && align > size)
+        align >>= 1;
+    return (offset + align - 1) & ~(align - 1);
+}
+
+static Py_ssize_t cq_args_size(CTypeDescrObject *ct)
+{
+    /* 'ct' is a function type; returns the number of bytes needed to
+       store a copy of all the arguments */
+    PyObject *signature = ct->ct_stuff;
+    Py_ssize_t i, n = PyTuple_GET_SIZE(signature) - 2;
+    Py_ssize_t offset = 0;
+
+    for (i = 0; i < n; i++) {
+        CTypeDescrObject *a_ct;
+        a_ct = (CTypeDescrObject *)PyTuple_GET_ITEM(signature, 2 + i);
+        offset = cq_align(offset, a_ct->ct_size) + a_ct->ct_size;
+    }
+    return offset;
+}
+
+static void cq_notify(CallbackQueueObject *q)
+{
+#ifndef MS_WIN32
+    if (q->cq_notify_fd[1] >= 0 &&
+            cq_compare_and_swap(&q->cq_notify_pending, 0, 1)) {
+        char c = 0;
+        if (write(q->cq_notify_fd[1], &c, 1) < 0) {
+            /* ignore errors: the pipe is non-blocking and if it is full,
+               there are already bytes for the reader to see */
+        }
+    }
+#endif
+}
+
+static void callback_queue_push(PyObject *infotuple,
+                                int decode_args_from_libffi,
+                                void *result, char *args)
+{
+    /* Called from any thread, without the GIL.  This only reads the
+       ctypes and doesn't touch any reference count.  Like the callbacks
+       that are not deferred, it leaves the C errno unchanged. */
+    int saved_errno = errno;
+    CTypeDescrObject *ct = (CTypeDescrObject *)PyTuple_GET_ITEM(infotuple, 0);
+    CallbackQueueObject *q;
+    PyObject *signature = ct->ct_stuff;
+    CTypeDescrObject *ctresult;
+    cq_slot_t *slot;
+    size_t pos, seq;
+
+    q = (CallbackQueueObject *)PyTuple_GET_ITEM(infotuple, 4);
+    pos = cq_load(&q->cq_enqueue_pos);
+    while (1) {
+        slot = cq_get_slot(q, pos);
+        seq = cq_load(&slot->cs_seq);
+        if (seq == pos) {
+            if (cq_compare_and_swap(&q->cq_enqueue_pos, pos, pos + 1))
+                break;
+            pos = cq_load(&q->cq_enqueue_pos);
+        }
+        else if ((Py_ssize_t)(seq - pos) < 0) {
+            /* the queue is full: drop this event */
+            size_t dropped;
+            do {
+                dropped = q->cq_dropped;
+            } while (!cq_compare_and_swap(&q->cq_dropped, dropped,
+                                          dropped + 1));
+            slot = NULL;
+            break;
+        }
+        else {
+            pos = cq_load(&q->cq_enqueue_pos);
+        }
+    }
+
+    if (slot != NULL) {
+        char *data = ((char *)slot) + CQ_HEADER_SIZE;
+        Py_ssize_t i, n = PyTuple_GET_SIZE(signature) - 2;
+        Py_ssize_t offset = 0;
+
+        for (i = 0; i < n; i++) {
+            CTypeDescrObject *a_ct;
+            char *a_src;
+
+            a_ct = (CTypeDescrObject *)PyTuple_GET_ITEM(signature, 2 + i);
+            if (decode_args_from_libffi) {
+                a_src = ((void **)args)[i];
+            }
+            else {
+                a_src = args + i * 8;
+                if (a_ct->ct_flags & (CT_IS_LONGDOUBLE | CT_STRUCT | CT_UNION))
+                    a_src = *(char **)a_src;
+            }
+            offset = cq_align(offset, a_ct->ct_size);
+            memcpy(data + offset, a_src, a_ct->ct_size);
+            offset += a_ct->ct_size;
+        }
+        slot->cs_infotuple = infotuple;
+        cq_store(&slot->cs_seq, pos + 1);
+        cq_notify(q);
+    }
+
+    /* return the 'error' value */
+    ctresult = (CTypeDescrObject *)PyTuple_GET_ITEM(signature, 1);
+    if (ctresult->ct_size > 0) {
+        PyObject *py_rawerr = PyTuple_GET_ITEM(infotuple, 2);
+        memcpy(result, PyBytes_AS_STRING(py_rawerr),
+                       PyBytes_GET_SIZE(py_rawerr));
+    }
+    errno = saved_errno;
+}
+
+static void invoke_deferred_callback(ffi_cif *cif, void *result, void **args,
+                                     void *userdata)
+{
+    callback_queue_push((PyObject *)userdata, 1, result, (char *)args);
+}
+
+static int callback_queue_pop(CallbackQueueObject *q, PyObject **pinfotuple,
+                              char *data)
+{
+    /* returns 1 and copies the next event into '*pinfotuple' and 'data',
+       or returns 0 if the queue is empty */
+    cq_slot_t *slot;
+    size_t pos, seq;
+
+    pos = cq_load(&q->cq_dequeue_pos);
+    while (1) {
+        slot = cq_get_slot(q, pos);
+        seq = cq_load(&slot->cs_seq);
+        if (seq == pos + 1) {
+            if (cq_compare_and_swap(&q->cq_dequeue_pos, pos, pos + 1))
+                break;
+            pos = cq_load(&q->cq_dequeue_pos);
+        }
+        else if ((Py_ssize_t)(seq - (pos + 1)) < 0) {
+            return 0;
+        }
+        else {
+            pos = cq_load(&q->cq_dequeue_pos);
+        }
+    }
+    *pinfotuple = slot->cs_infotuple;
+    memcpy(data, ((char *)slot) + CQ_HEADER_SIZE, q->cq_item_size);
+    cq_store(&slot->cs_seq, pos + q->cq_mask + 1);
+    return 1;
+}
+
+static PyObject *callback_queue_attach(PyObject *queue, PyObject *infotuple)
+{
+    /* check that the callback can use this queue, and returns a new
+       infotuple with the queue as an extra item */
+    CallbackQueueObject *q = (CallbackQueueObject *)queue;
+    CTypeDescrObject *ct = (CTypeDescrObject *)PyTuple_GET_ITEM(infotuple, 0);
+    Py_ssize_t size;
+    PyObject *result;
+
+    if (!CallbackQueue_Check(queue)) {
+        PyErr_Format(PyExc_TypeError,
+                     "expected a queue from ffi.new_callback_queue() "
+                     "for 'queue', not %.200s", Py_TYPE(queue)->tp_name);
+        return NULL;
+    }
+    if (PyTuple_GET_ITEM(infotuple, 3) != Py_None) {
+        PyErr_SetString(PyExc_ValueError,
+                        "'onerror' cannot be used together with 'queue': "
+                        "the exceptions propagate out of queue.drain()");
+        return NULL;
+    }
+    size = cq_args_size(ct);
+    if (size > (Py_ssize_t)q->cq_item_size) {
+        PyErr_Format(PyExc_ValueError,
+                     "%s: the arguments need %zd bytes, but the queue was "
+                     "created with item_size=%zd", ct->ct_name, size,
+                     (Py_ssize_t)q->cq_item_size);
+        return NULL;
+    }
+    result = Py_BuildValue("OOOOO", PyTuple_GET_ITEM(infotuple, 0),
+                                     PyTuple_GET_ITEM(infotuple, 1),
+                                     PyTuple_GET_ITEM(infotuple, 2),
+                                     PyTuple_GET_ITEM(infotuple, 3),
+                                     queue);
+    if (result == NULL)
+        return NULL;
+    /* the events in the queue only have borrowed references to the
+       infotuple, which must stay alive as long as the queue */
+    if (PyList_Append(q->cq_callbacks, result) < 0) {
+        Py_DECREF(result);
+        return NULL;
+    }
+    return result;
+}
+
+static int callback_queue_invoke(PyObject *infotuple, char *data)
+{
+    CTypeDescrObject *ct = (CTypeDescrObject *)PyTuple_GET_ITEM(infotuple, 0);
+    PyObject *signature = ct->ct_stuff;
+    PyObject *py_args, *py_res;
+    Py_ssize_t i, n = PyTuple_GET_SIZE(signature) - 2;
+    Py_ssize_t offset = 0;
+
+    py_args = PyTuple_New(n);
+    if (py_args == NULL)
+        return -1;
+    for (i = 0; i < n; i++) {
+        CTypeDescrObject *a_ct;
+        PyObject *a;
+
+        a_ct = (CTypeDescrObject *)PyTuple_GET_ITEM(signature, 2 + i);
+        offset = cq_align(offset, a_ct->ct_size);
+        a = convert_to_object(data + offset, a_ct);
+        if (a == NULL) {
+            Py_DECREF(py_args);
+            return -1;
+        }
+        PyTuple_SET_ITEM(py_args, i, a);
+        offset += a_ct->ct_size;
+    }
+    py_res = PyObject_Call(PyTuple_GET_ITEM(infotuple, 1), py_args, NULL);
+    Py_DECREF(py_args);
+    if (py_res == NULL)
+        return -1;
+    Py_DECREF(py_res);   /* the result was already given to C */
+    return 0;
+}
+
+static PyObject *cq_drain(CallbackQueueObject *q, PyObject *args,
+                          PyObject *kwds)
+{
+    Py_ssize_t count = 0, max_count = -1;
+    PyObject *infotuple;
+    char *data;
+    int res;
+    static char *keywords[] = {"max", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|n:drain", keywords,
+                                     &max_count))
+        return NULL;
+
+#ifndef MS_WIN32
+    if (q->cq_notify_fd[0] >= 0) {
+        /* reset the notification before looking at the queue */
+        char buf[64];
+        cq_store(&q->cq_notify_pending, 0);
+        while (read(q->cq_notify_fd[0], buf, sizeof(buf)) > 0)
+            ;
+    }
+#endif
+
+    data = PyMem_Malloc(q->cq_item_size + 1);
+    if (data == NULL)
+        return PyErr_NoMemory();
+
+    while (max_count < 0 || count < max_count) {
+        if (!callback_queue_pop(q, &infotuple, data))
+            break;
+        count++;
+        Py_INCREF(infotuple);
+        res = callback_queue_invoke(infotuple, data);
+        Py_DECREF(infotuple);
+        if (res < 0) {
+            PyMem_Free(data);
+            return NULL;
+        }
+    }
+    PyMem_Free(data);
+    return PyInt_FromSsize_t(count);
+}
+
+static PyObject *cq_fileno(CallbackQueueObject *q, PyObject *noarg)
+{
+    if (q->cq_notify_fd[0] < 0) {
+        PyErr_SetString(PyExc_ValueError,
+                        "this queue was not created with notify=True");
+        return NULL;
+    }
+    return PyInt_FromLong(q->cq_notify_fd[0]);
+}
+
+static Py_ssize_t cq_length(CallbackQueueObject *q)
+{
+    /* approximate if other threads are pushing events concurrently */
+    size_t length = cq_load(&q->cq_enqueue_pos) - cq_load(&q->cq_dequeue_pos);
+    if ((Py_ssize_t)length < 0)
+        return 0;
+    if (length > q->cq_mask + 1)
+        length = q->cq_mask + 1;
+    return (Py_ssize_t)length;
+}
+
+static PyObject *cq_get_dropped(CallbackQueueObject *q, void *context)
+{
+    return PyInt_FromSsize_t((Py_ssize_t)cq_load(&q->cq_dropped));
+}
+
+static PyObject *cq_get_size(CallbackQueueObject *q, void *context)
+{
+    return PyInt_FromSsize_t((Py_ssize_t)(q->cq_mask + 1));
+}
+
+static PyObject *cq_get_item_size(CallbackQueueObject *q, void *context)
+{
+    return PyInt_FromSsize_t((Py_ssize_t)q->cq_item_size);
+}
+
+static int cq_traverse(CallbackQueueObject *q, visitproc visit, void *arg)
+{
+    Py_VISIT(q->cq_callbacks);
+    return 0;
+}
+
+static int cq_clear(CallbackQueueObject *q)
+{
+    Py_CLEAR(q->cq_callbacks);
+    return 0;
+}
+
+static void cq_dealloc(CallbackQueueObject *q)
+{
+    PyObject_GC_UnTrack(q);
+    Py_XDECREF(q->cq_callbacks);
+#ifndef MS_WIN32
+    if (q->cq_notify_fd[0] >= 0) {
+        close(q->cq_notify_fd[0]);
+        close(q->cq_notify_fd[1]);
+    }
+#endif
+    PyMem_Free(q->cq_slots);
+    PyObject_GC_Del(q);
+}
+
+static PyObject *b_new_callback_queue(PyObject *self, PyObject *args,
+                                      PyObject *kwds)
+{
+    Py_ssize_t size = 1024, item_size = 64;
+    size_t num_slots, i;
+    int notify = 0;
+    CallbackQueueObject *q;
+    static char *keywords[] = {"size", "item_size", "notify", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|nni:new_callback_queue",
+                                     keywords, &size, &item_size, &notify))
+        return NULL;
+    if (size <= 0 || item_size < 0) {
+        PyErr_SetString(PyExc_ValueError,
+                        "'size' must be positive and 'item_size' must not "
+                        "be negative");
+        return NULL;
+    }
+#ifdef MS_WIN32
+    if (notify) {
+        PyErr_SetString(PyExc_NotImplementedError,
+                        "notify=True is not supported on Windows");
+        return NULL;
+    }
+#endif
+    num_slots = 1;
+    while (num_slots < (size_t)size) {
+        num_slots <<= 1;
+        if (num_slots > PY_SSIZE_T_MAX / (CQ_HEADER_SIZE + 16))
+            return PyErr_NoMemory();
+    }
+    item_size = (item_size + 15) & ~(Py_ssize_t)15;
+    if ((size_t)item_size > (PY_SSIZE_T_MAX / num_slots) - CQ_HEADER_SIZE)
+        return PyErr_NoMemory();
+
+    q = PyObject_GC_New(CallbackQueueObject, &CallbackQueue_Type);
+    if (q == NULL)
+        return NULL;
+    q->cq_mask = num_slots - 1;
+    q->cq_item_size = item_size;
+    q->cq_stride = CQ_HEADER_SIZE + item_size;
+    q->cq_enqueue_pos = 0;
+    q->cq_dequeue_pos = 0;
+    q->cq_dropped = 0;
+    q->cq_notify_pending = 0;
+    q->cq_notify_fd[0] = -1;
+    q->cq_notify_fd[1] = -1;
+    q->cq_callbacks = PyList_New(0);
+    q->cq_slots = PyMem_Malloc(num_slots * q->cq_stride);
+    if (q->cq_callbacks == NULL || q->cq_slots == NULL) {
+        Py_DECREF(q);
+        return PyErr_NoMemory();
+    }
+    for (i = 0; i < num_slots; i++)
+        cq_get_slot(q, i)->cs_seq = i;
+
+#ifndef MS_WIN32
+    if (notify) {
+        if (pipe(q->cq_notify_fd) < 0) {
+            q->cq_notify_fd[0] = -1;
+            q->cq_notify_fd[1] = -1;
+            Py_DECREF(q);
+            return PyErr_SetFromErrno(PyExc_OSError);
+        }
+        for (i = 0; i < 2; i++) {
+            int flags = fcntl(q->cq_notify_fd[i], F_GETFL);
+            fcntl(q->cq_notify_fd[i], F_SETFL, flags | O_NONBLOCK);
+            flags = fcntl(q->cq_notify_fd[i], F_GETFD);
+            fcntl(q->cq_notify_fd[i], F_SETFD, flags | FD_CLOEXEC);
+        }
+    }
+#endif
+
+    PyObject_GC_Track(q);
+    return (PyObject *)q;
+}
+
+static PyMethodDef cq_methods[] = {
+    {"drain", (PyCFunction)cq_drain, METH_VARARGS | METH_KEYWORDS},
+    {"fileno", (PyCFunction)cq_fileno, METH_NOARGS},
+    {NULL,    NULL}           /* sentinel */
+};
+
+static PyGetSetDef cq_getsets[] = {
+    {"dropped", (getter)cq_get_dropped, NULL,
+        "number of events lost because the queue was full"},
+    {"size", (getter)cq_get_size, NULL, "number of slots in the queue"},
+    {"item_size", (getter)cq_get_item_size, NULL,
+        "number of bytes available for the arguments in every slot"},
+    {NULL}
+};
+
+static PySequenceMethods cq_as_sequence = {
+    (lenfunc)cq_length, /*sq_length*/
+};
+
+PyDoc_STRVAR(cq_doc,
+"A queue of deferred callbacks, made by ffi.new_callback_queue().\n"
+"\n"
+"The callbacks attached to it with ffi.callback(..., queue=q) or\n"
+"@ffi.def_extern(queue=q) only record their arguments when called\n"
+"from C.  q.drain(max=-1) then invokes the Python functions and\n"
+"returns the number of events processed.");
+
+static PyTypeObject CallbackQueue_Type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "_cffi_backend.CallbackQueue",
+    sizeof(CallbackQueueObject),
+    0,
+    (destructor)cq_dealloc,                     /* tp_dealloc */
+    0,                                          /* tp_print */
+    0,                                          /* tp_getattr */
+    0,                                          /* tp_setattr */
+    0,                                          /* tp_compare */
+    0,                                          /* tp_repr */
+    0,                                          /* tp_as_number */
+    &cq_as_sequence,                            /* tp_as_sequence */
+    0,                                          /* tp_as_mapping */
+    0,                                          /* tp_hash */
+    0,                                          /* tp_call */
+    0,                                          /* tp_str */
+    PyObject_GenericGetAttr,                    /* tp_getattro */
+    0,                                          /* tp_setattro */
+    0,                                          /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,    /* tp_flags */
+    cq_doc,                                     /* tp_doc */
+    (traverseproc)cq_traverse,                  /* tp_traverse */
+    (inquiry)cq_clear,                          /* tp_clear */
+    0,                                          /* tp_richcompare */
+    0,                                          /* tp_weaklistoffset */
+    0,                                          /* tp_iter */
+    0,                                          /* tp_iternext */
+    cq_methods,                                 /* tp_methods */
+    0,                                          /* tp_members */
+    cq_getsets,                                 /* tp_getset */
+};
@@ -0,0 +1,174 @@
+/************************************************************/
+/* Freelists for the memory of small cdata objects.
+
+   Most cdata objects are small and short-lived: pointers returned by
+   C functions, casts, pointer arithmetic, struct field access, or
+   ffi.new("int *").  Instead of returning their memory to the
+   allocator, cdata_dealloc() keeps up to 'cdata_freelist_size' blocks
+   per size class, and the next cdata object of the same size class
+   reuses one.  The size classes are multiples of CDATA_FREELIST_GRAIN
+   up to CDATA_FREELIST_MAX_SIZE bytes; such objects are always
+   allocated with the full size of their class.
+
+   There are two sets of freelists: one for CData_Type objects, which
+   are allocated with PyObject_Malloc(), and one for CDataOwning_Type
+   objects, which are allocated with malloc().  The size of an object is
+   not stored anywhere, but computed again from its ctype when it is
+   freed; see cdata_alloc_size().  Everything is done with the GIL.
+*/
+
+#define CDATA_FREELIST_GRAIN      16
+#define CDATA_FREELIST_CLASSES    8
+#define CDATA_FREELIST_MAX_SIZE   (CDATA_FREELIST_GRAIN * CDATA_FREELIST_CLASSES)
+
+#define FL_PYMEM    0     /* CData_Type, with PyObject_Malloc() */
+#define FL_MALLOC   1     /* CDataOwning_Type, with malloc() */
+
+struct cdata_freelist_s {
+    void *fl_first;             /* chained through their first word */
+    Py_ssize_t fl_count;
+};
+
+static struct cdata_freelist_s cdata_freelists[2][CDATA_FREELIST_CLASSES];
+static Py_ssize_t cdata_freelist_size = 100;
+static PY_LONG_LONG cdata_freelist_hits = 0, cdata_freelist_misses = 0;
+
+static void *cdata_freelist_alloc(int kind, size_t size)
+{
+    /* returns NULL without setting an exception if out of memory */
+    void *p;
+    size_t index = (size - 1) / CDATA_FREELIST_GRAIN;
+
+    if (index < CDATA_FREELIST_CLASSES) {
+        struct cdata_freelist_s *fl = &cdata_freelists[kind][index];
+        p = fl->fl_first;
+        if (p != NULL) {
+            fl->fl_first = *(void **)p;
+            fl->fl_count--;
+            cdata_freelist_hits++;
+            return p;
+        }
+        cdata_freelist_misses++;
+        size = (index + 1) * CDATA_FREELIST_GRAIN;
+    }
+    if (kind == FL_MALLOC)
+        return malloc(size);
+    else
+        return PyObject_Malloc(size);
+}
+
+static void cdata_freelist_free(int kind, void *p, Py_ssize_t size)
+{
+    /* 'size' is the size originally passed to cdata_freelist_alloc(),
+       or -1 if it is not known (then it is never in a size class) */
+    size_t index = (size_t)(size - 1) / CDATA_FREELIST_GRAIN;
+
+    if (size > 0 && index < CDATA_FREELIST_CLASSES) {
+        struct cdata_freelist_s *fl = &cdata_freelists[kind][index];
+        if (fl->fl_count < cdata_freelist_size) {
+            *(void **)p = fl->fl_first;
+            fl->fl_first = p;
+            fl->fl_count++;
+            return;
+        }
+    }
+    if (kind == FL_MALLOC)
+        free(p);
+    else
+        PyObject_Free(p);
+}
+
+static Py_ssize_t cdata_alloc_size(CDataObject *cd)
+{
+    /* the size of a CData_Type or CDataOwning_Type object, computed
+       like in new_simple_cdata(), new_sized_cdata(),
+       _new_casted_primitive() and direct_newp(); or -1 for the
+       objects whose size depends on a length */
+    CTypeDescrObject *ct = cd->c_type;
+    Py_ssize_t datasize;
+
+    if (Py_TYPE(cd) == &CData_Type) {
+        if (ct->ct_flags & CT_PRIMITIVE_ANY)
+            return offsetof(CDataObject_casted_primitive, alignment) +
+                   ct->ct_size;
+        if ((ct->ct_flags & CT_ARRAY) && ct->ct_length < 0)
+            return offsetof(CDataObject_own_length, alignment);
+        return sizeof(CDataObject);
+    }
+
+    assert(Py_TYPE(cd) == &CDataOwning_Type);
+    if (ct->ct_flags & CT_IS_PTR_TO_OWNED)
+        return sizeof(CDataObject_own_structptr);
+    if (ct->ct_flags & CT_POINTER) {
+        datasize = ct->ct_itemdescr->ct_size;
+        if (ct->ct_itemdescr->ct_flags & CT_PRIMITIVE_CHAR)
+            datasize *= 2;
+    }
+    else if ((ct->ct_flags & CT_WITH_VAR_ARRAY) ||
+             ((ct->ct_flags & CT_ARRAY) && ct->ct_length < 0)) {
+        return -1;
+    }
+    else
+        datasize = ct->ct_size;
+    return offsetof(CDataObject_own_nolength, alignment) + datasize;
+}
+
+static void cdata_freelist_trim(Py_ssize_t keep)
+{
+    int kind, i;
+    for (kind = 0; kind < 2; kind++) {
+        for (i = 0; i < CDATA_FREELIST_CLASSES; i++) {
+            struct cdata_freelist_s *fl = &cdata_freelists[kind][i];
+            while (fl->fl_count > keep) {
+                void *p = fl->fl_first;
+                fl->fl_first = *(void **)p;
+                fl->fl_count--;
+                if (kind == FL_MALLOC)
+                    free(p);
+                else
+                    PyObject_Free(p);
+            }
+        }
+    }
+}
+
+static PyObject *b_set_freelist_size(PyObject *self, PyObject *args)
+{
+    Py_ssize_t size, old_size = cdata_freelist_size;
+
+    if (!PyArg_ParseTuple(args, "n:set_freelist_size", &size))
+        return NULL;
+    if (size < 0) {
+        PyErr_SetString(PyExc_ValueError, "the size must not be negative");
+        return NULL;
+    }
+    cdata_freelist_size = size;
+    cdata_freelist_trim(size);
+    return PyInt_FromSsize_t(old_size);
+}
+
+static PyObject *b_freelist_stats(PyObject *self, PyObject *args,
+                                  PyObject *kwds)
+{
+    int reset = 0, kind, i;
+    Py_ssize_t cached = 0;
+    PyObject *result;
+    static char *keywords[] = {"reset", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|i:freelist_stats",
+                                     keywords, &reset))
+        return NULL;
+    for (kind = 0; kind < 2; kind++)
+        for (i = 0; i < CDATA_FREELIST_CLASSES; i++)
+            cached += cdata_freelists[kind][i].fl_count;
+    result = Py_BuildValue("{s:L,s:L,s:n,s:n}",
+                           "hits", cdata_freelist_hits,
+                           "misses", cdata_freelist_misses,
+                           "cached", cached,
+                           "size", cdata_freelist_size);
+    if (result != NULL && reset) {
+        cdata_freelist_hits = 0;
+        cdata_freelist_misses = 0;
+    }
+    return result;
+}
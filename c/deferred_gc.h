@@ -0,0 +1,298 @@
+/************************************************************/
+/* Deferred destructors, for ffi.gc(cdata, destructor, defer=True).
+
+   When such a cdata object is freed, the call to its destructor is not
+   done immediately, in whatever thread drops the last reference, but
+   appended to a global queue together with a timestamp.  The queue is
+   run as a batch later:
+
+   * by default, at the next safe point of the main thread, by a
+     pending call (Py_AddPendingCall());
+
+   * or, after ffi.start_deferred_gc_thread(), by a native background
+     thread that waits on 'deferred_gc_wakeup';
+
+   * or explicitly, by ffi.run_deferred_gc().
+
+   When running a batch, the destructors that are C functions like
+   free() (see get_c_allocator_function()) are called first, without
+   the GIL; then the other destructors are called with the GIL.  The
+   queue itself is only accessed with the GIL.  ffi.release() still
+   calls the destructor immediately.
+
+   At exit, a function registered with the 'atexit' module stops the
+   background thread and runs the queue.  From then on, for the objects
+   that die while the interpreter shuts down (like module globals), the
+   destructors are called immediately.
+*/
+
+typedef struct {
+    PyObject *dg_destructor;    /* references */
+    PyObject *dg_origobj;
+    PY_LONG_LONG dg_time;       /* cffi_clock_ns() when queued */
+} deferred_gc_entry_t;
+
+static deferred_gc_entry_t *deferred_gc_queue = NULL;
+static Py_ssize_t deferred_gc_count = 0, deferred_gc_allocated = 0;
+static Py_ssize_t deferred_gc_max_queued = 0;
+static PY_LONG_LONG deferred_gc_run_count = 0;
+static PY_LONG_LONG deferred_gc_total_lag = 0, deferred_gc_max_lag = 0;
+
+static int deferred_gc_pending_call = 0;  /* a pending call is scheduled */
+static PyThread_type_lock deferred_gc_wakeup = NULL;   /* if thread started */
+static int deferred_gc_signalled = 0;     /* 'deferred_gc_wakeup' released */
+static int deferred_gc_stopping = 0;      /* the thread must stop */
+static PyThread_type_lock deferred_gc_stopped = NULL;  /* released by it */
+static int deferred_gc_exiting = 0;       /* no more deferring */
+
+static Py_ssize_t deferred_gc_run(void)
+{
+    /* run all the destructors queued so far; returns how many */
+    deferred_gc_entry_t *batch = deferred_gc_queue;
+    Py_ssize_t i, n = deferred_gc_count, n_c_free = 0;
+    cffi_c_free_fn *c_free;
+    PY_LONG_LONG now;
+
+    if (n == 0)
+        return 0;
+    /* the destructors may queue more entries: they go to a new queue */
+    deferred_gc_queue = NULL;
+    deferred_gc_count = 0;
+    deferred_gc_allocated = 0;
+
+    c_free = PyMem_Malloc(n * sizeof(cffi_c_free_fn));
+    if (c_free != NULL) {
+        for (i = 0; i < n; i++) {
+            PyObject *origobj = batch[i].dg_origobj;
+            c_free[i] = NULL;
+            if (CData_Check(origobj) &&
+                    (((CDataObject *)origobj)->c_type->ct_flags &
+                                            (CT_POINTER | CT_ARRAY))) {
+                c_free[i] = (cffi_c_free_fn)get_c_allocator_function(
+                                                 batch[i].dg_destructor, 1);
+                if (c_free[i] != NULL)
+                    n_c_free++;
+            }
+        }
+    }
+    if (n_c_free > 0) {
+        Py_BEGIN_ALLOW_THREADS
+        for (i = 0; i < n; i++) {
+            if (c_free[i] != NULL) {
+                batch[i].dg_time = cffi_clock_ns() - batch[i].dg_time;
+                c_free[i](((CDataObject *)batch[i].dg_origobj)->c_data);
+            }
+        }
+        Py_END_ALLOW_THREADS
+    }
+
+    for (i = 0; i < n; i++) {
+        PY_LONG_LONG lag;
+        if (c_free != NULL && c_free[i] != NULL) {
+            lag = batch[i].dg_time;
+            Py_DECREF(batch[i].dg_destructor);
+            Py_DECREF(batch[i].dg_origobj);
+        }
+        else {
+            now = cffi_clock_ns();
+            lag = now - batch[i].dg_time;
+            gcp_finalize(batch[i].dg_destructor, batch[i].dg_origobj);
+        }
+        deferred_gc_run_count++;
+        deferred_gc_total_lag += lag;
+        if (lag > deferred_gc_max_lag)
+            deferred_gc_max_lag = lag;
+    }
+    PyMem_Free(c_free);
+    PyMem_Free(batch);
+    return n;
+}
+
+static int deferred_gc_pending(void *arg)
+{
+    deferred_gc_pending_call = 0;
+    deferred_gc_run();
+    return 0;
+}
+
+static void deferred_gc_push(PyObject *destructor, PyObject *origobj)
+{
+    /* NOTE: this steals the references to the two arguments */
+    if (deferred_gc_count == deferred_gc_allocated) {
+        Py_ssize_t allocated = deferred_gc_allocated * 2 + 16;
+        deferred_gc_entry_t *queue = PyMem_Realloc(deferred_gc_queue,
+                                   allocated * sizeof(deferred_gc_entry_t));
+        if (queue == NULL) {
+            /* out of memory: call the destructor now */
+            gcp_finalize(destructor, origobj);
+            return;
+        }
+        deferred_gc_queue = queue;
+        deferred_gc_allocated = allocated;
+    }
+    deferred_gc_queue[deferred_gc_count].dg_destructor = destructor;
+    deferred_gc_queue[deferred_gc_count].dg_origobj = origobj;
+    deferred_gc_queue[deferred_gc_count].dg_time = cffi_clock_ns();
+    deferred_gc_count++;
+    if (deferred_gc_count > deferred_gc_max_queued)
+        deferred_gc_max_queued = deferred_gc_count;
+
+    if (deferred_gc_wakeup != NULL) {
+        if (!deferred_gc_signalled) {
+            deferred_gc_signalled = 1;
+            PyThread_release_lock(deferred_gc_wakeup);
+        }
+    }
+    else if (!deferred_gc_pending_call) {
+        if (Py_AddPendingCall(deferred_gc_pending, NULL) == 0)
+            deferred_gc_pending_call = 1;
+    }
+}
+
+static void gcp_finalize_or_defer(int defer, PyObject *destructor,
+                                  PyObject *origobj)
+{
+    /* NOTE: this decrements the reference count of the two arguments */
+    if (defer && destructor != NULL && origobj != NULL &&
+            !deferred_gc_exiting)
+        deferred_gc_push(destructor, origobj);
+    else
+        gcp_finalize(destructor, origobj);
+}
+
+static void deferred_gc_thread(void *arg)
+{
+    /* this thread keeps its thread state until deferred_gc_atexit() */
+    PyGILState_STATE state = PyGILState_Ensure();
+    while (1) {
+        Py_BEGIN_ALLOW_THREADS
+        PyThread_acquire_lock(deferred_gc_wakeup, WAIT_LOCK);
+        Py_END_ALLOW_THREADS
+        deferred_gc_signalled = 0;
+        if (deferred_gc_stopping)
+            break;
+        deferred_gc_run();
+    }
+    PyGILState_Release(state);
+    PyThread_release_lock(deferred_gc_stopped);
+}
+
+static PyObject *b_start_deferred_gc_thread(PyObject *self, PyObject *noarg)
+{
+    PyThread_type_lock lock, stopped;
+
+    if (deferred_gc_wakeup != NULL || deferred_gc_exiting)
+        Py_RETURN_NONE;     /* already started, or too late */
+
+    lock = PyThread_allocate_lock();
+    stopped = PyThread_allocate_lock();
+    if (lock == NULL || stopped == NULL) {
+        if (lock != NULL)
+            PyThread_free_lock(lock);
+        if (stopped != NULL)
+            PyThread_free_lock(stopped);
+        PyErr_SetString(PyExc_MemoryError, "out of memory for a lock");
+        return NULL;
+    }
+    PyThread_acquire_lock(lock, WAIT_LOCK);
+    PyThread_acquire_lock(stopped, WAIT_LOCK);
+#if PY_VERSION_HEX < 0x03070000
+    PyEval_InitThreads();
+#endif
+    deferred_gc_wakeup = lock;
+    deferred_gc_stopped = stopped;
+    if (PyThread_start_new_thread(deferred_gc_thread, NULL) == (unsigned long)-1) {
+        deferred_gc_wakeup = NULL;
+        deferred_gc_stopped = NULL;
+        PyThread_free_lock(lock);
+        PyThread_free_lock(stopped);
+        PyErr_SetString(PyExc_RuntimeError, "can't start new thread");
+        return NULL;
+    }
+    /* entries already in the queue are run by the thread too */
+    if (deferred_gc_count > 0) {
+        deferred_gc_signalled = 1;
+        PyThread_release_lock(deferred_gc_wakeup);
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject *b_run_deferred_gc(PyObject *self, PyObject *noarg)
+{
+    return PyInt_FromSsize_t(deferred_gc_run());
+}
+
+static PyObject *deferred_gc_atexit(PyObject *self, PyObject *noarg)
+{
+    deferred_gc_exiting = 1;
+    if (deferred_gc_wakeup != NULL) {
+        /* stop the thread and wait for it */
+        deferred_gc_stopping = 1;
+        if (!deferred_gc_signalled) {
+            deferred_gc_signalled = 1;
+            PyThread_release_lock(deferred_gc_wakeup);
+        }
+        Py_BEGIN_ALLOW_THREADS
+        PyThread_acquire_lock(deferred_gc_stopped, WAIT_LOCK);
+        Py_END_ALLOW_THREADS
+        PyThread_free_lock(deferred_gc_stopped);
+        PyThread_free_lock(deferred_gc_wakeup);
+        deferred_gc_stopped = NULL;
+        deferred_gc_wakeup = NULL;
+    }
+    while (deferred_gc_run() > 0)
+        ;
+    Py_RETURN_NONE;
+}
+
+static PyMethodDef deferred_gc_atexit_def = {
+    "_deferred_gc_atexit", deferred_gc_atexit, METH_NOARGS
+};
+
+static int init_deferred_gc(void)
+{
+    PyObject *atexit, *func, *res = NULL;
+
+    atexit = PyImport_ImportModule("atexit");
+    if (atexit == NULL)
+        return -1;
+    func = PyCFunction_New(&deferred_gc_atexit_def, NULL);
+    if (func != NULL) {
+        res = PyObject_CallMethod(atexit, "register", "O", func);
+        Py_DECREF(func);
+    }
+    Py_DECREF(atexit);
+    if (res == NULL)
+        return -1;
+    Py_DECREF(res);
+    return 0;
+}
+
+static PyObject *b_deferred_gc_stats(PyObject *self, PyObject *args,
+                                     PyObject *kwds)
+{
+    /* returns a dict {'queued': n, 'max_queued': n, 'run': n,
+       'total_lag': seconds, 'max_lag': seconds, 'thread': bool} */
+    int reset = 0;
+    PyObject *result;
+    static char *keywords[] = {"reset", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|i:deferred_gc_stats",
+                                     keywords, &reset))
+        return NULL;
+    result = Py_BuildValue("{s:n,s:n,s:L,s:d,s:d,s:O}",
+                           "queued", deferred_gc_count,
+                           "max_queued", deferred_gc_max_queued,
+                           "run", deferred_gc_run_count,
+                           "total_lag", deferred_gc_total_lag * 1e-9,
+                           "max_lag", deferred_gc_max_lag * 1e-9,
+                           "thread", deferred_gc_wakeup != NULL ?
+                                         Py_True : Py_False);
+    if (result != NULL && reset) {
+        deferred_gc_max_queued = deferred_gc_count;
+        deferred_gc_run_count = 0;
+        deferred_gc_total_lag = 0;
+        deferred_gc_max_lag = 0;
+    }
+    return result;
+}
@@ -0,0 +1,429 @@
+/************************************************************/
+/* A bridge between ctypes and NumPy dtypes, for ffi.to_dtype() and
+   ffi.from_dtype().
+
+   ffi.to_dtype() builds a description of the layout of a ctype from
+   the same information as ctype.fields, and passes it to numpy.dtype():
+   a string like "=i4" for primitive types, a tuple (item, length) for
+   arrays, and a dict {'names', 'formats', 'offsets', 'itemsize'} for
+   structs and unions.  Bitfields cannot be described; empty or open
+   arrays at the end of structs are ignored.
+
+   ffi.from_dtype() does the reverse: it builds primitive, array and
+   struct ctypes from the 'kind', 'itemsize', 'subdtype', 'names' and
+   'fields' of the dtype.  The structs get the offsets and total size of
+   the dtype, and the natural alignment if all these offsets are
+   aligned, or else an alignment of 1 (like a dtype without align=True).
+
+   NumPy is only imported when these functions are called.
+*/
+
+static PyObject *_numpy_dtype(PyObject *spec)
+{
+    /* returns numpy.dtype(spec), importing numpy now */
+    PyObject *numpy, *dtype_type, *result;
+
+    numpy = PyImport_ImportModule("numpy");
+    if (numpy == NULL)
+        return NULL;
+    dtype_type = PyObject_GetAttrString(numpy, "dtype");
+    Py_DECREF(numpy);
+    if (dtype_type == NULL)
+        return NULL;
+    result = PyObject_CallFunctionObjArgs(dtype_type, spec, NULL);
+    Py_DECREF(dtype_type);
+    return result;
+}
+
+static PyObject *_ctype_dtype_spec(CTypeDescrObject *ct);
+
+static PyObject *_struct_dtype_spec(CTypeDescrObject *ct)
+{
+    CFieldObject *cf;
+    PyObject *names, *formats, *offsets, *x, *result = NULL;
+
+    names = PyList_New(0);
+    formats = PyList_New(0);
+    offsets = PyList_New(0);
+    if (names == NULL || formats == NULL || offsets == NULL)
+        goto done;
+
+    for (cf = (CFieldObject *)ct->ct_extra; cf != NULL; cf = cf->cf_next) {
+        if (cf->cf_bitshift == BS_EMPTY_ARRAY)
+            continue;
+        if (cf->cf_bitshift != BS_REGULAR) {
+            PyErr_Format(PyExc_TypeError,
+                         "field '%s.%s' is a bitfield, which cannot be "
+                         "described by a NumPy dtype", ct->ct_name,
+                         PyText_AS_UTF8(get_field_name(ct, cf)));
+            goto done;
+        }
+        if (PyList_Append(names, get_field_name(ct, cf)) < 0)
+            goto done;
+        x = _ctype_dtype_spec(cf->cf_type);
+        if (x == NULL)
+            goto done;
+        if (PyList_Append(formats, x) < 0) {
+            Py_DECREF(x);
+            goto done;
+        }
+        Py_DECREF(x);
+        x = PyInt_FromSsize_t(cf->cf_offset);
+        if (x == NULL)
+            goto done;
+        if (PyList_Append(offsets, x) < 0) {
+            Py_DECREF(x);
+            goto done;
+        }
+        Py_DECREF(x);
+    }
+    result = Py_BuildValue("{s:O,s:O,s:O,s:n}", "names", names,
+                           "formats", formats, "offsets", offsets,
+                           "itemsize", ct->ct_size);
+ done:
+    Py_XDECREF(offsets);
+    Py_XDECREF(formats);
+    Py_XDECREF(names);
+    return result;
+}
+
+static PyObject *_ctype_dtype_spec(CTypeDescrObject *ct)
+{
+    /* returns the argument to pass to numpy.dtype() to describe 'ct' */
+    if (ct->ct_flags & CT_PRIMITIVE_ANY) {
+        if (ct->ct_flags & CT_IS_BOOL)
+            return PyText_FromString("?");
+        if (ct->ct_flags & CT_PRIMITIVE_SIGNED)
+            return PyText_FromFormat("=i%d", (int)ct->ct_size);
+        if (ct->ct_flags & CT_PRIMITIVE_UNSIGNED)
+            return PyText_FromFormat("=u%d", (int)ct->ct_size);
+        if (ct->ct_flags & CT_PRIMITIVE_CHAR) {
+            if (ct->ct_size == 1)
+                return PyText_FromString("S1");
+            if (ct->ct_size == 4)
+                return PyText_FromString("=U1");
+            return PyText_FromFormat("=u%d", (int)ct->ct_size);
+        }
+        if (ct->ct_flags & CT_IS_LONGDOUBLE)
+            return PyText_FromString("=g");
+        if (ct->ct_flags & CT_PRIMITIVE_FLOAT)
+            return PyText_FromFormat("=f%d", (int)ct->ct_size);
+        if (ct->ct_flags & CT_PRIMITIVE_COMPLEX)
+            return PyText_FromFormat("=c%d", (int)ct->ct_size);
+    }
+    else if (ct->ct_flags & (CT_POINTER | CT_FUNCTIONPTR)) {
+        return PyText_FromFormat("=u%d", (int)sizeof(void *));
+    }
+    else if ((ct->ct_flags & CT_ARRAY) && ct->ct_length >= 0) {
+        /* (item, (n, m, ...)) for nested arrays */
+        CTypeDescrObject *ctitem;
+        PyObject *item, *shape;
+        Py_ssize_t i, ndim = 0;
+
+        for (ctitem = ct; ctitem->ct_flags & CT_ARRAY;
+             ctitem = ctitem->ct_itemdescr)
+            ndim++;
+        item = _ctype_dtype_spec(ctitem);
+        if (item == NULL)
+            return NULL;
+        shape = PyTuple_New(ndim);
+        if (shape == NULL) {
+            Py_DECREF(item);
+            return NULL;
+        }
+        for (i = 0; i < ndim; i++) {
+            PyObject *x = PyInt_FromSsize_t(ct->ct_length);
+            if (x == NULL) {
+                Py_DECREF(shape);
+                Py_DECREF(item);
+                return NULL;
+            }
+            PyTuple_SET_ITEM(shape, i, x);
+            ct = ct->ct_itemdescr;
+        }
+        return Py_BuildValue("NN", item, shape);
+    }
+    else if (ct->ct_flags & (CT_STRUCT | CT_UNION)) {
+        int res = force_lazy_struct(ct);
+        if (res < 0)
+            return NULL;
+        if (res > 0)
+            return _struct_dtype_spec(ct);
+    }
+    PyErr_Format(PyExc_TypeError,
+                 "ctype '%s' cannot be described by a NumPy dtype",
+                 ct->ct_name);
+    return NULL;
+}
+
+static PyObject *b_to_dtype(PyObject *self, PyObject *arg)
+{
+    PyObject *spec, *result;
+
+    if (!CTypeDescr_Check(arg)) {
+        PyErr_SetString(PyExc_TypeError, "expected a 'ctype' object");
+        return NULL;
+    }
+    spec = _ctype_dtype_spec((CTypeDescrObject *)arg);
+    if (spec == NULL)
+        return NULL;
+    result = _numpy_dtype(spec);
+    Py_DECREF(spec);
+    return result;
+}
+
+static PyObject *_dtype_to_ctype(PyObject *dtype, const char *name);
+
+static PyObject *_primitive_from_dtype(PyObject *dtype)
+{
+    PyObject *x, *ct, *ctptr;
+    char kind;
+    Py_ssize_t itemsize, length = -1;
+    const char *tname = NULL;
+
+    x = PyObject_GetAttrString(dtype, "kind");
+    if (x == NULL)
+        return NULL;
+    kind = PyText_Check(x) && PyText_GetSize(x) == 1 ? PyText_AS_UTF8(x)[0]
+                                                    : '\0';
+    Py_DECREF(x);
+    x = PyObject_GetAttrString(dtype, "itemsize");
+    if (x == NULL)
+        return NULL;
+    itemsize = PyInt_AsSsize_t(x);
+    Py_DECREF(x);
+    if (itemsize == -1 && PyErr_Occurred())
+        return NULL;
+
+    switch (kind) {
+    case 'b':
+        if (itemsize == 1) tname = "_Bool";
+        break;
+    case 'i':
+    case 'u':
+        switch (itemsize) {
+        case 1: tname = kind == 'i' ? "int8_t" : "uint8_t"; break;
+        case 2: tname = kind == 'i' ? "int16_t" : "uint16_t"; break;
+        case 4: tname = kind == 'i' ? "int32_t" : "uint32_t"; break;
+        case 8: tname = kind == 'i' ? "int64_t" : "uint64_t"; break;
+        }
+        break;
+    case 'f':
+        if (itemsize == sizeof(float)) tname = "float";
+        else if (itemsize == sizeof(double)) tname = "double";
+        else if (itemsize == sizeof(long double)) tname = "long double";
+        break;
+    case 'c':
+        if (itemsize == 2 * sizeof(float)) tname = "float _Complex";
+        else if (itemsize == 2 * sizeof(double)) tname = "double _Complex";
+        break;
+    case 'S':
+        tname = "char";
+        if (itemsize != 1)
+            length = itemsize;
+        break;
+    case 'U':
+        tname = "char32_t";
+        if (itemsize != 4)
+            length = itemsize / 4;
+        break;
+    }
+    if (tname == NULL) {
+        PyErr_Format(PyExc_TypeError,
+                     "NumPy dtype '%c' of size %zd has no equivalent ctype",
+                     kind != '\0' ? kind : '?', itemsize);
+        return NULL;
+    }
+    ct = new_primitive_type(tname);
+    if (ct == NULL || length < 0)
+        return ct;
+    ctptr = new_pointer_type((CTypeDescrObject *)ct);
+    Py_DECREF(ct);
+    if (ctptr == NULL)
+        return NULL;
+    ct = new_array_type((CTypeDescrObject *)ctptr, length);
+    Py_DECREF(ctptr);
+    return ct;
+}
+
+static PyObject *_struct_from_dtype(PyObject *dtype, PyObject *names,
+                                    const char *name)
+{
+    PyObject *fields, *fieldlist, *seq = NULL, *args, *res, *ct = NULL;
+    Py_ssize_t i, itemsize, offset;
+    int falign, alignment = 1, aligned = 1;
+
+    fields = PyObject_GetAttrString(dtype, "fields");
+    if (fields == NULL)
+        return NULL;
+    fieldlist = PyList_New(0);
+    if (fieldlist == NULL)
+        goto error;
+    seq = PySequence_Fast(names, "'names' must be a sequence");
+    if (seq == NULL)
+        goto error;
+    for (i = 0; i < PySequence_Fast_GET_SIZE(seq); i++) {
+        PyObject *fname = PySequence_Fast_GET_ITEM(seq, i);
+        PyObject *info, *fct, *item;
+
+        info = PyObject_GetItem(fields, fname);
+        if (info == NULL)
+            goto error;
+        if (!PyTuple_Check(info) || PyTuple_GET_SIZE(info) < 2) {
+            Py_DECREF(info);
+            PyErr_SetString(PyExc_TypeError, "unexpected 'fields' item");
+            goto error;
+        }
+        offset = PyInt_AsSsize_t(PyTuple_GET_ITEM(info, 1));
+        if (offset == -1 && PyErr_Occurred()) {
+            Py_DECREF(info);
+            goto error;
+        }
+        fct = _dtype_to_ctype(PyTuple_GET_ITEM(info, 0), "struct $dtype");
+        Py_DECREF(info);
+        if (fct == NULL)
+            goto error;
+        falign = get_alignment((CTypeDescrObject *)fct);
+        if (falign < 0) {
+            Py_DECREF(fct);
+            goto error;
+        }
+        if (offset % falign != 0)
+            aligned = 0;
+        if (alignment < falign)
+            alignment = falign;
+        item = Py_BuildValue("(ONin)", fname, fct, -1, offset);
+        if (item == NULL)
+            goto error;
+        if (PyList_Append(fieldlist, item) < 0) {
+            Py_DECREF(item);
+            goto error;
+        }
+        Py_DECREF(item);
+    }
+    res = PyObject_GetAttrString(dtype, "itemsize");
+    if (res == NULL)
+        goto error;
+    itemsize = PyInt_AsSsize_t(res);
+    Py_DECREF(res);
+    if (itemsize == -1 && PyErr_Occurred())
+        goto error;
+    if (itemsize % alignment != 0)
+        aligned = 0;
+
+    ct = new_struct_or_union_type(name, CT_STRUCT);
+    if (ct == NULL)
+        goto error;
+    args = Py_BuildValue("(OOOni)", ct, fieldlist, Py_None, itemsize,
+                         aligned ? -1 : 1);
+    if (args == NULL)
+        goto error;
+    res = b_complete_struct_or_union(NULL, args);
+    Py_DECREF(args);
+    if (res == NULL)
+        goto error;
+    Py_DECREF(res);
+
+    Py_DECREF(seq);
+    Py_DECREF(fieldlist);
+    Py_DECREF(fields);
+    return ct;
+
+ error:
+    Py_XDECREF(ct);
+    Py_XDECREF(seq);
+    Py_XDECREF(fieldlist);
+    Py_DECREF(fields);
+    return NULL;
+}
+
+static PyObject *_dtype_to_ctype(PyObject *dtype, const char *name)
+{
+    PyObject *x, *ct, *ctptr, *shape;
+    Py_ssize_t i, length;
+
+    x = PyObject_GetAttrString(dtype, "subdtype");
+    if (x == NULL)
+        return NULL;
+    if (x != Py_None) {
+        /* (base dtype, shape) */
+        if (!PyTuple_Check(x) || PyTuple_GET_SIZE(x) != 2 ||
+                !PyTuple_Check(PyTuple_GET_ITEM(x, 1))) {
+            Py_DECREF(x);
+            PyErr_SetString(PyExc_TypeError, "unexpected 'subdtype'");
+            return NULL;
+        }
+        ct = _dtype_to_ctype(PyTuple_GET_ITEM(x, 0), name);
+        shape = PyTuple_GET_ITEM(x, 1);
+        for (i = PyTuple_GET_SIZE(shape) - 1; i >= 0 && ct != NULL; i--) {
+            length = PyInt_AsSsize_t(PyTuple_GET_ITEM(shape, i));
+            if (length == -1 && PyErr_Occurred()) {
+                Py_CLEAR(ct);
+                break;
+            }
+            ctptr = new_pointer_type((CTypeDescrObject *)ct);
+            Py_DECREF(ct);
+            if (ctptr == NULL)
+                break;
+            ct = new_array_type((CTypeDescrObject *)ctptr, length);
+            Py_DECREF(ctptr);
+        }
+        Py_DECREF(x);
+        return ct;
+    }
+    Py_DECREF(x);
+
+    x = PyObject_GetAttrString(dtype, "names");
+    if (x == NULL)
+        return NULL;
+    if (x != Py_None)
+        ct = _struct_from_dtype(dtype, x, name);
+    else
+        ct = _primitive_from_dtype(dtype);
+    Py_DECREF(x);
+    return ct;
+}
+
+static PyObject *b_from_dtype(PyObject *self, PyObject *args, PyObject *kwds)
+{
+    PyObject *dtype, *x, *result = NULL;
+    char *name = NULL, *fullname;
+    int native;
+    static char *keywords[] = {"dtype", "name", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|z:from_dtype", keywords,
+                                     &dtype, &name))
+        return NULL;
+
+    dtype = _numpy_dtype(dtype);
+    if (dtype == NULL)
+        return NULL;
+
+    x = PyObject_GetAttrString(dtype, "isnative");
+    if (x == NULL)
+        goto done;
+    native = PyObject_IsTrue(x);
+    Py_DECREF(x);
+    if (native < 0)
+        goto done;
+    if (!native) {
+        PyErr_SetString(PyExc_ValueError,
+                        "the NumPy dtype is not in the native byte order");
+        goto done;
+    }
+
+    if (name == NULL)
+        name = "$dtype";
+    fullname = PyMem_Malloc(strlen(name) + 8);
+    if (fullname == NULL) {
+        PyErr_NoMemory();
+        goto done;
+    }
+    strcpy(fullname, "struct ");
+    strcat(fullname, name);
+    result = _dtype_to_ctype(dtype, fullname);
+    PyMem_Free(fullname);
+ done:
+    Py_DECREF(dtype);
+    return result;
+}
@@ -354,6 +354,124 @@ static PyObject *ffi_new(FFIObject *self, PyObject *args, PyObject *kwds)
     return _ffi_new(self, args, kwds, &default_allocator);
 }
 
+PyDoc_STRVAR(ffi_new_many_doc,
+"ffi.new_many(cdecl, n, init=None) -> list.  Allocate n objects at once,\n"
+"in a single block of memory, and return a list of n owning pointers to\n"
+"them.  'cdecl' must be a pointer type like ffi.new(); 'init', if given,\n"
+"is a list of initializers for the first objects.  The block is freed\n"
+"when all the pointers are gone.");
+
+static PyObject *ffi_new_many(FFIObject *self, PyObject *args, PyObject *kwds)
+{
+    CTypeDescrObject *ct;
+    PyObject *arg, *init = Py_None;
+    Py_ssize_t n;
+    static char *keywords[] = {"cdecl", "n", "init", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "On|O:new_many", keywords,
+                                     &arg, &n, &init))
+        return NULL;
+
+    ct = _ffi_type(self, arg, ACCEPT_STRING|ACCEPT_CTYPE);
+    if (ct == NULL)
+        return NULL;
+
+    return direct_new_many(ct, n, init);
+}
+
+PyDoc_STRVAR(ffi_new_mapped_doc,
+"Like ffi.new(), but the memory is a new anonymous mapping obtained\n"
+"with mmap().  The pages are zero-initialized by the OS when they are\n"
+"first used, so allocating a huge array is fast and uses no memory\n"
+"until it is accessed.  'advice' is a string or a sequence of strings\n"
+"among 'normal', 'random', 'sequential', 'willneed', 'hugepage',\n"
+"'nohugepage', 'dontdump' and 'dodump', passed to madvise() if\n"
+"supported on this platform.  ffi.release() unmaps the memory.");
+
+static PyObject *ffi_new_mapped(FFIObject *self, PyObject *args,
+                                PyObject *kwds)
+{
+    CTypeDescrObject *ct;
+    PyObject *arg, *init = Py_None, *advice = Py_None;
+    static char *keywords[] = {"cdecl", "init", "advice", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|OO:new_mapped", keywords,
+                                     &arg, &init, &advice))
+        return NULL;
+
+    ct = _ffi_type(self, arg, ACCEPT_STRING|ACCEPT_CTYPE);
+    if (ct == NULL)
+        return NULL;
+
+    return direct_new_mapped(ct, init, advice);
+}
+
+PyDoc_STRVAR(ffi_map_file_doc,
+"Map a file into memory with mmap(), and return a cdata of type\n"
+"'cdecl' (an array or pointer type) for it.  'file' is a file name,\n"
+"or a file descriptor, or an object with a fileno() method.  'mode'\n"
+"is 'r' (read-only), 'c' (copy-on-write) or 'w' (shared: changes are\n"
+"written to the file).  'offset' and 'length' give the range of bytes\n"
+"to map; by default, up to the end of the file.  For an open array\n"
+"type like 'struct rec[]', the length of the array is the number of\n"
+"items that fit in the range.  'advice' is like in ffi.new_mapped().\n"
+"ffi.release() unmaps the file.");
+
+static PyObject *ffi_map_file(FFIObject *self, PyObject *args,
+                              PyObject *kwds)
+{
+    CTypeDescrObject *ct;
+    PyObject *arg, *file, *advice = Py_None;
+    char *mode = "r";
+    PY_LONG_LONG offset = 0, length = -1;
+    static char *keywords[] = {"cdecl", "file", "mode", "offset", "length",
+                               "advice", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "OO|sLLO:map_file",
+                                     keywords, &arg, &file, &mode, &offset,
+                                     &length, &advice))
+        return NULL;
+
+    ct = _ffi_type(self, arg, ACCEPT_STRING|ACCEPT_CTYPE);
+    if (ct == NULL)
+        return NULL;
+
+    return direct_map_file(ct, file, mode, offset, length, advice);
+}
+
+PyDoc_STRVAR(ffi_msync_doc,
+"ffi.msync(cdata, wait=True): write back to the file the changes done\n"
+"to a cdata returned by ffi.map_file(cdecl, file, 'w').  If 'wait' is\n"
+"false, only schedule the writes.");
+
+#define ffi_msync  b_msync
+
+PyDoc_STRVAR(ffi_to_dtype_doc,
+"ffi.to_dtype(cdecl) -> numpy.dtype.  Return a NumPy dtype with the same\n"
+"layout as the C type: the same size, and for structs and unions, the\n"
+"same field names and offsets.  Bitfields are not supported.  NumPy is\n"
+"imported when this is called.");
+
+static PyObject *ffi_to_dtype(FFIObject *self, PyObject *arg)
+{
+    CTypeDescrObject *ct = _ffi_type(self, arg, ACCEPT_STRING|ACCEPT_CTYPE);
+    if (ct == NULL)
+        return NULL;
+    return b_to_dtype(NULL, (PyObject *)ct);
+}
+
+PyDoc_STRVAR(ffi_from_dtype_doc,
+"ffi.from_dtype(dtype, name=None) -> ctype.  Return a new C type with the\n"
+"same layout as the NumPy dtype.  Structured dtypes give new struct\n"
+"types, called 'struct name' if a name is given.");
+
+#define ffi_from_dtype  b_from_dtype
+
+PyDoc_STRVAR(ffi_set_mmap_threshold_doc,
+"ffi.set_mmap_threshold(nbytes, advice=None) -> int.  Make ffi.new()\n"
+"of arrays of 'nbytes' or more work like ffi.new_mapped(cdecl, init,\n"
+"advice).  0 disables this, which is the default.  Returns the\n"
+"previous threshold.");
+
+#define ffi_set_mmap_threshold  b_set_mmap_threshold
+
 static PyObject *_ffi_new_with_allocator(PyObject *allocator, PyObject *args,
                                          PyObject *kwds)
 {
@@ -376,7 +494,9 @@ PyDoc_STRVAR(ffi_new_allocator_doc,
 "'alloc' is called with the size as argument.  If it returns NULL, a\n"
 "MemoryError is raised.  'free' is called with the result of 'alloc'\n"
 "as argument.  Both can be either Python functions or directly C\n"
-"functions.  If 'free' is None, then no free function is called.\n"
+"functions.  C functions of types 'void *(*)(size_t)' and\n"
+"'void(*)(void *)' are called directly, without going through Python.\n"
+"If 'free' is None, then no free function is called.\n"
 "If both 'alloc' and 'free' are None, the default is used.\n"
 "\n"
 "If 'should_clear_after_alloc' is set to False, then the memory\n"
@@ -419,6 +539,38 @@ static PyObject *ffi_new_allocator(FFIObject *self, PyObject *args,
     return result;
 }
 
+PyDoc_STRVAR(ffi_new_arena_doc,
+"ffi.new_arena(capacity=65536, debug=False) -> arena.  An arena is a\n"
+"bump allocator: arena.new(cdecl, init=None) behaves like ffi.new(), but\n"
+"takes the memory from blocks of 'capacity' bytes, which are all freed\n"
+"at once by arena.release() or at the end of a 'with arena:' block.\n"
+"The cdata objects must not be used after that.  In debug mode, the\n"
+"released memory is poisoned and not reused, to catch such mistakes.");
+
+static PyObject *ffi_new_arena(FFIObject *self, PyObject *args,
+                               PyObject *kwds)
+{
+    Py_ssize_t capacity = 65536;
+    int debug = 0;
+    PyObject *typeof_fn, *result;
+    static char *keywords[] = {"capacity", "debug", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|ni:new_arena", keywords,
+                                     &capacity, &debug))
+        return NULL;
+
+    /* the arena turns strings into ctypes by calling self.typeof() */
+    typeof_fn = PyObject_GetAttrString((PyObject *)self, "typeof");
+    if (typeof_fn == NULL)
+        return NULL;
+    args = Py_BuildValue("(niO)", capacity, debug, typeof_fn);
+    Py_DECREF(typeof_fn);
+    if (args == NULL)
+        return NULL;
+    result = b_new_arena(NULL, args, NULL);
+    Py_DECREF(args);
+    return result;
+}
+
 PyDoc_STRVAR(ffi_cast_doc,
 "Similar to a C cast: returns an instance of the named C\n"
 "type initialized with the given 'source'.  The source is\n"
@@ -475,6 +627,16 @@ PyDoc_STRVAR(ffi_unpack_doc,
 #define ffi_unpack  b_unpack     /* ffi_unpack() => b_unpack()
                                     from _cffi_backend.c */
 
+PyDoc_STRVAR(ffi_unpack_fields_doc,
+"Unpack the fields of an array of structs or unions of the given\n"
+"length, returning a dict {field name: array.array}.  The fields are\n"
+"given as a list of names like 'x' or 'a.b' for nested structs; by\n"
+"default, all fields of primitive types are returned.  Fields of type\n"
+"'char' give a byte string.  This is a much faster equivalent to:\n"
+"{name: array.array(tc, [cdata[i].name for i in range(length)])}");
+
+#define ffi_unpack_fields  b_unpack_fields
+
 
 PyDoc_STRVAR(ffi_offsetof_doc,
 "Return the offset of the named field inside the given structure or\n"
@@ -689,6 +851,32 @@ PyDoc_STRVAR(ffi_from_handle_doc,
 #define ffi_from_handle  b_from_handle   /* ffi_from_handle => b_from_handle
                                             from _cffi_backend.c */
 
+PyDoc_STRVAR(ffi_new_handle_table_doc,
+"ffi.new_handle_table(size=0) -> table.  An alternative to new_handle()\n"
+"and from_handle() for many objects: t.add(x) returns a 'void *' handle\n"
+"for 'x', without creating a new object to keep alive; t.get(handle)\n"
+"returns 'x'; t.remove(handle) returns 'x' and releases the handle; and\n"
+"t.clear() releases all handles.  Using a handle that was released\n"
+"raises ValueError instead of crashing.  'size' preallocates room for\n"
+"that many handles.");
+
+static PyObject *ffi_new_handle_table(FFIObject *self, PyObject *args,
+                                      PyObject *kwds)
+{
+    Py_ssize_t size = 0;
+    static char *keywords[] = {"size", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|n:new_handle_table",
+                                     keywords, &size))
+        return NULL;
+    /* g_ct_voidp is equal to <ctype 'void *'> */
+    args = Py_BuildValue("(On)", (PyObject *)g_ct_voidp, size);
+    if (args == NULL)
+        return NULL;
+    kwds = b_new_handle_table(NULL, args);
+    Py_DECREF(args);
+    return kwds;
+}
+
 PyDoc_STRVAR(ffi_from_buffer_doc,
 "Return a <cdata 'char[]'> that points to the data of the given Python\n"
 "object, which must support the buffer interface.  Note that this is\n"
@@ -728,9 +916,40 @@ PyDoc_STRVAR(ffi_gc_doc,
 "'destructor(old_cdata_object)' will be called.\n"
 "\n"
 "The optional 'size' gives an estimate of the size, used to\n"
-"trigger the garbage collection more eagerly.  So far only used\n"
-"on PyPy.  It tells the GC that the returned object keeps alive\n"
-"roughly 'size' bytes of external memory.");
+"trigger the garbage collection more eagerly.  It tells the GC\n"
+"that the returned object keeps alive roughly 'size' bytes of\n"
+"external memory.\n"
+"\n"
+"If 'defer' is true, the destructor is not called immediately but\n"
+"queued, and called later by ffi.run_deferred_gc() or by the thread\n"
+"of ffi.start_deferred_gc_thread(), or else at the next safe point\n"
+"of the main thread.");
+
+PyDoc_STRVAR(ffi_run_deferred_gc_doc,
+"ffi.run_deferred_gc() -> int.  Call now the destructors queued by\n"
+"ffi.gc(..., defer=True), and return how many were called.");
+
+#define ffi_run_deferred_gc  b_run_deferred_gc
+
+PyDoc_STRVAR(ffi_start_deferred_gc_thread_doc,
+"Start a background thread that calls the destructors queued by\n"
+"ffi.gc(..., defer=True).  The destructors that are C functions with\n"
+"the signature 'void(void *)', like free(), are called without the\n"
+"GIL.  Does nothing if the thread was already started.");
+
+#define ffi_start_deferred_gc_thread  b_start_deferred_gc_thread
+
+PyDoc_STRVAR(ffi_deferred_gc_stats_doc,
+"ffi.deferred_gc_stats(reset=False) -> dict.  Return statistics about\n"
+"the destructors queued by ffi.gc(..., defer=True): 'queued' is the\n"
+"current number of queued destructors, 'max_queued' the highest\n"
+"number so far, 'run' the number of destructors called, 'total_lag'\n"
+"and 'max_lag' the total and highest time (in seconds) that they\n"
+"waited in the queue, and 'thread' tells if the background thread was\n"
+"started.  If 'reset' is true, all numbers but 'queued' are reset\n"
+"afterwards.");
+
+#define ffi_deferred_gc_stats  b_deferred_gc_stats
 
 #define ffi_gc  b_gcp     /* ffi_gc() => b_gcp()
                              from _cffi_backend.c */
@@ -743,7 +962,8 @@ PyDoc_STRVAR(ffi_def_extern_doc,
 "Optional arguments: 'name' is the name of the C function, if\n"
 "different from the Python function; and 'error' and 'onerror'\n"
 "handle what occurs if the Python function raises an exception\n"
-"(see the docs for details).");
+"(see the docs for details).  With 'queue', a queue made by\n"
+"ffi.new_callback_queue(), the calls are deferred until queue.drain().");
 
 /* forward; see call_python.c */
 static PyObject *_ffi_def_extern_decorator(PyObject *, PyObject *);
@@ -754,14 +974,21 @@ static PyObject *ffi_def_extern(FFIObject *self, PyObject *args,
     static PyMethodDef md = {"def_extern_decorator",
                              (PyCFunction)_ffi_def_extern_decorator, METH_O};
     PyObject *name = Py_None, *error = Py_None;
-    PyObject *res, *onerror = Py_None;
-    static char *keywords[] = {"name", "error", "onerror", NULL};
+    PyObject *res, *onerror = Py_None, *queue = Py_None;
+    static char *keywords[] = {"name", "error", "onerror", "queue", NULL};
 
-    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|OOO", keywords,
-                                     &name, &error, &onerror))
+    if (PyTuple_GET_SIZE(args) > 3) {
+        /* 'queue' is keyword-only */
+        PyErr_SetString(PyExc_TypeError,
+                        "def_extern() takes at most 3 positional arguments");
+        return NULL;
+    }
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|OOOO", keywords,
+                                     &name, &error, &onerror, &queue))
         return NULL;
 
-    args = Py_BuildValue("(OOOO)", (PyObject *)self, name, error, onerror);
+    args = Py_BuildValue("(OOOOO)", (PyObject *)self, name, error, onerror,
+                         queue);
     if (args == NULL)
         return NULL;
 
@@ -775,7 +1002,9 @@ PyDoc_STRVAR(ffi_callback_doc,
 "'cdecl' must name a C function pointer type.  The callback invokes the\n"
 "specified 'python_callable' (which may be provided either directly or\n"
 "via a decorator).  Important: the callback object must be manually\n"
-"kept alive for as long as the callback may be invoked from the C code.");
+"kept alive for as long as the callback may be invoked from the C code.\n"
+"With 'queue', a queue made by ffi.new_callback_queue(), the calls are\n"
+"deferred until queue.drain().");
 
 static PyObject *_ffi_callback_decorator(PyObject *outer_args, PyObject *fn)
 {
@@ -791,13 +1020,13 @@ static PyObject *_ffi_callback_decorator(PyObject *outer_args, PyObject *fn)
 static PyObject *ffi_callback(FFIObject *self, PyObject *args, PyObject *kwds)
 {
     PyObject *c_decl, *python_callable = Py_None, *error = Py_None;
-    PyObject *res, *onerror = Py_None;
+    PyObject *res, *onerror = Py_None, *queue = Py_None;
     static char *keywords[] = {"cdecl", "python_callable", "error",
-                               "onerror", NULL};
+                               "onerror", "queue", NULL};
 
-    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|OOO", keywords,
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|OOOO", keywords,
                                      &c_decl, &python_callable, &error,
-                                     &onerror))
+                                     &onerror, &queue))
         return NULL;
 
     c_decl = (PyObject *)_ffi_type(self, c_decl, ACCEPT_STRING | ACCEPT_CTYPE |
@@ -805,7 +1034,8 @@ static PyObject *ffi_callback(FFIObject *self, PyObject *args, PyObject *kwds)
     if (c_decl == NULL)
         return NULL;
 
-    args = Py_BuildValue("(OOOO)", c_decl, python_callable, error, onerror);
+    args = Py_BuildValue("(OOOOO)", c_decl, python_callable, error, onerror,
+                         queue);
     if (args == NULL)
         return NULL;
 
@@ -961,6 +1191,136 @@ PyDoc_STRVAR(ffi_memmove_doc,
 #define ffi_memmove  b_memmove     /* ffi_memmove() => b_memmove()
                                       from _cffi_backend.c */
 
+PyDoc_STRVAR(ffi_call_many_doc,
+"ffi.call_many(func, *buffers, out=None): call 'func' once per index.\n"
+"\n"
+"'func' is a C function taking and returning primitive types (or void).\n"
+"There must be one buffer per argument: either a cdata array or any\n"
+"contiguous Python buffer (array.array, memoryview, ...) whose items\n"
+"have the argument's type.  All buffers must have the same length n.\n"
+"The whole loop runs in C with the GIL released.  The results are\n"
+"stored into 'out', which must then be a writable buffer of n items,\n"
+"or otherwise into a new cdata array which is returned.");
+
+static PyObject *_cpyextfunc_as_cdata(PyObject *x);  /* forward */
+
+static PyObject *ffi_call_many(FFIObject *self, PyObject *args,
+                               PyObject *kwds)
+{
+    PyObject *func, *newargs, *res;
+    Py_ssize_t i, nargs = PyTuple_GET_SIZE(args);
+
+    if (nargs < 1)
+        return b_call_many(NULL, args, kwds);
+
+    func = _cpyextfunc_as_cdata(PyTuple_GET_ITEM(args, 0));
+    if (func == NULL)
+        return NULL;
+    newargs = PyTuple_New(nargs);
+    if (newargs == NULL) {
+        Py_DECREF(func);
+        return NULL;
+    }
+    PyTuple_SET_ITEM(newargs, 0, func);   /* steals the reference */
+    for (i = 1; i < nargs; i++) {
+        PyObject *x = PyTuple_GET_ITEM(args, i);
+        Py_INCREF(x);
+        PyTuple_SET_ITEM(newargs, i, x);
+    }
+    res = b_call_many(NULL, newargs, kwds);
+    Py_DECREF(newargs);
+    return res;
+}
+
+PyDoc_STRVAR(ffi_enable_call_stats_doc,
+"ffi.enable_call_stats(enable=True): start or stop recording statistics\n"
+"about the calls to C functions.  It can also be enabled from the start\n"
+"by setting the environment variable CFFI_CALL_STATS=1.  See\n"
+"ffi.call_stats().");
+
+#define ffi_enable_call_stats  b_enable_call_stats  /* from _cffi_backend.c */
+
+PyDoc_STRVAR(ffi_call_stats_doc,
+"ffi.call_stats(reset=False) -> dict of {name: (calls, call_time,\n"
+"conversion_time)}.  For every C function called since the statistics\n"
+"were enabled, gives the number of calls, the time spent in the C\n"
+"function itself and the time spent converting the arguments and the\n"
+"result, both in seconds.  If 'reset' is true, clear the statistics.");
+
+#define ffi_call_stats  b_call_stats     /* ffi_call_stats() => b_call_stats()
+                                            from _cffi_backend.c */
+
+PyDoc_STRVAR(ffi_reserve_callbacks_doc,
+"ffi.reserve_callbacks(n): make sure that at least 'n' more callbacks can\n"
+"be created by ffi.callback() without requesting more executable memory\n"
+"from the OS.");
+
+#define ffi_reserve_callbacks  b_reserve_callbacks  /* from _cffi_backend.c */
+
+PyDoc_STRVAR(ffi_callback_pool_stats_doc,
+"ffi.callback_pool_stats() -> dict with the keys 'free', 'in_use' and\n"
+"'pages': the number of callbacks that can still be created from the\n"
+"pool, the number of callbacks alive, and the number of memory pages\n"
+"that the pool currently holds.");
+
+#define ffi_callback_pool_stats  b_callback_pool_stats
+
+PyDoc_STRVAR(ffi_trim_callback_pool_doc,
+"ffi.trim_callback_pool(keep=0) -> int.  Give back to the OS the memory\n"
+"pages of the callback pool that contain no live callback, but without\n"
+"going below 'keep' free callbacks.  Returns the number of pages\n"
+"released.");
+
+#define ffi_trim_callback_pool  b_trim_callback_pool
+
+PyDoc_STRVAR(ffi_memory_stats_doc,
+"ffi.memory_stats() -> dict with the keys 'objects' and 'bytes', the\n"
+"number of live cdata objects that own memory and the total size of\n"
+"that memory; 'by_type', a dict {ctype name: (objects, bytes)}; and\n"
+"'tracemalloc_domain', the tracemalloc domain in which this memory is\n"
+"also registered.  This counts the memory from ffi.new(), from the\n"
+"allocators of ffi.new_allocator(), and given as 'size' to ffi.gc().");
+
+#define ffi_memory_stats  b_memory_stats     /* from _cffi_backend.c */
+
+PyDoc_STRVAR(ffi_set_memory_pressure_threshold_doc,
+"ffi.set_memory_pressure_threshold(nbytes) -> int.  When the memory\n"
+"counted by ffi.memory_stats() grows by more than 'nbytes' since the\n"
+"last time, run a full gc.collect().  0 disables this, which is the\n"
+"default.  Returns the previous threshold.  This is global, i.e. not\n"
+"specific to this 'ffi' instance.");
+
+#define ffi_set_memory_pressure_threshold  b_set_memory_pressure_threshold
+
+PyDoc_STRVAR(ffi_set_freelist_size_doc,
+"ffi.set_freelist_size(size) -> int.  Set how many freed small cdata\n"
+"objects are kept, per size class, to be reused by the next ones; 0\n"
+"disables the freelists.  Returns the previous size.");
+
+#define ffi_set_freelist_size  b_set_freelist_size  /* from _cffi_backend.c */
+
+PyDoc_STRVAR(ffi_freelist_stats_doc,
+"ffi.freelist_stats(reset=False) -> dict with the keys 'hits', 'misses',\n"
+"'cached' and 'size': how many small cdata objects were allocated from\n"
+"the freelists or not, how many free ones are kept now, and the current\n"
+"size set with ffi.set_freelist_size().  If 'reset' is true, the hits\n"
+"and misses are cleared.");
+
+#define ffi_freelist_stats  b_freelist_stats
+
+PyDoc_STRVAR(ffi_new_callback_queue_doc,
+"ffi.new_callback_queue(size=1024, item_size=64, notify=False) -> queue.\n"
+"Callbacks attached to it with ffi.callback(..., queue=q) or\n"
+"@ffi.def_extern(queue=q) don't run the Python function when called\n"
+"from C: they copy their arguments into the queue, without taking the\n"
+"GIL, and return their 'error' value.  q.drain() runs the Python\n"
+"functions for the queued events.  The queue has 'size' slots of\n"
+"'item_size' bytes for the arguments; events are dropped when it is\n"
+"full.  With notify=True, q.fileno() is a file descriptor that becomes\n"
+"readable when events are pending.");
+
+#define ffi_new_callback_queue  b_new_callback_queue
+
 PyDoc_STRVAR(ffi_init_once_doc,
 "init_once(function, tag): run function() once.  More precisely,\n"
 "'function()' is called the first time we see a given 'tag'.\n"
@@ -1104,10 +1464,21 @@ static PyMethodDef ffi_methods[] = {
  {"alignof",    (PyCFunction)ffi_alignof,    METH_O,       ffi_alignof_doc},
  {"def_extern", (PyCFunction)ffi_def_extern, METH_VKW,     ffi_def_extern_doc},
  {"callback",   (PyCFunction)ffi_callback,   METH_VKW,     ffi_callback_doc},
+{"callback_pool_stats",(PyCFunction)ffi_callback_pool_stats,METH_NOARGS,
+                                                 ffi_callback_pool_stats_doc},
+ {"call_many",  (PyCFunction)ffi_call_many,  METH_VKW,     ffi_call_many_doc},
+ {"call_stats", (PyCFunction)ffi_call_stats, METH_VKW,     ffi_call_stats_doc},
  {"cast",       (PyCFunction)ffi_cast,       METH_VARARGS, ffi_cast_doc},
  {"dlclose",    (PyCFunction)ffi_dlclose,    METH_VARARGS, ffi_dlclose_doc},
  {"dlopen",     (PyCFunction)ffi_dlopen,     METH_VARARGS, ffi_dlopen_doc},
+{"deferred_gc_stats",(PyCFunction)ffi_deferred_gc_stats,METH_VKW,
+                                                 ffi_deferred_gc_stats_doc},
+{"enable_call_stats",(PyCFunction)ffi_enable_call_stats,METH_VKW,
+                                                 ffi_enable_call_stats_doc},
+{"freelist_stats",(PyCFunction)ffi_freelist_stats,METH_VKW,
+                                                 ffi_freelist_stats_doc},
  {"from_buffer",(PyCFunction)ffi_from_buffer,METH_VKW,     ffi_from_buffer_doc},
+ {"from_dtype", (PyCFunction)ffi_from_dtype, METH_VKW,     ffi_from_dtype_doc},
  {"from_handle",(PyCFunction)ffi_from_handle,METH_O,       ffi_from_handle_doc},
  {"gc",         (PyCFunction)ffi_gc,         METH_VKW,     ffi_gc_doc},
  {"getctype",   (PyCFunction)ffi_getctype,   METH_VKW,     ffi_getctype_doc},
@@ -1117,16 +1488,43 @@ static PyMethodDef ffi_methods[] = {
  {"init_once",  (PyCFunction)ffi_init_once,  METH_VKW,     ffi_init_once_doc},
  {"integer_const",(PyCFunction)ffi_int_const,METH_VKW,     ffi_int_const_doc},
  {"list_types", (PyCFunction)ffi_list_types, METH_NOARGS,  ffi_list_types_doc},
+ {"map_file",   (PyCFunction)ffi_map_file,   METH_VKW,     ffi_map_file_doc},
  {"memmove",    (PyCFunction)ffi_memmove,    METH_VKW,     ffi_memmove_doc},
+{"memory_stats",(PyCFunction)ffi_memory_stats,METH_NOARGS, ffi_memory_stats_doc},
+ {"msync",      (PyCFunction)ffi_msync,      METH_VKW,     ffi_msync_doc},
  {"new",        (PyCFunction)ffi_new,        METH_VKW,     ffi_new_doc},
 {"new_allocator",(PyCFunction)ffi_new_allocator,METH_VKW,ffi_new_allocator_doc},
+ {"new_arena",  (PyCFunction)ffi_new_arena,  METH_VKW,     ffi_new_arena_doc},
+{"new_callback_queue",(PyCFunction)ffi_new_callback_queue,METH_VKW,
+                                                 ffi_new_callback_queue_doc},
  {"new_handle", (PyCFunction)ffi_new_handle, METH_O,       ffi_new_handle_doc},
+{"new_handle_table",(PyCFunction)ffi_new_handle_table,METH_VKW,
+                                                 ffi_new_handle_table_doc},
+ {"new_many",   (PyCFunction)ffi_new_many,   METH_VKW,     ffi_new_many_doc},
+ {"new_mapped", (PyCFunction)ffi_new_mapped, METH_VKW,     ffi_new_mapped_doc},
  {"offsetof",   (PyCFunction)ffi_offsetof,   METH_VARARGS, ffi_offsetof_doc},
  {"release",    (PyCFunction)ffi_release,    METH_O,       ffi_release_doc},
+{"reserve_callbacks",(PyCFunction)ffi_reserve_callbacks,METH_VARARGS,
+                                                 ffi_reserve_callbacks_doc},
+{"run_deferred_gc",(PyCFunction)ffi_run_deferred_gc,METH_NOARGS,
+                                                 ffi_run_deferred_gc_doc},
+{"set_freelist_size",(PyCFunction)ffi_set_freelist_size,METH_VARARGS,
+                                                 ffi_set_freelist_size_doc},
+{"set_mmap_threshold",(PyCFunction)ffi_set_mmap_threshold,METH_VKW,
+                                                 ffi_set_mmap_threshold_doc},
+{"set_memory_pressure_threshold",(PyCFunction)ffi_set_memory_pressure_threshold,
+                       METH_VARARGS, ffi_set_memory_pressure_threshold_doc},
+{"start_deferred_gc_thread",(PyCFunction)ffi_start_deferred_gc_thread,
+                       METH_NOARGS, ffi_start_deferred_gc_thread_doc},
  {"sizeof",     (PyCFunction)ffi_sizeof,     METH_O,       ffi_sizeof_doc},
  {"string",     (PyCFunction)ffi_string,     METH_VKW,     ffi_string_doc},
+{"trim_callback_pool",(PyCFunction)ffi_trim_callback_pool,METH_VKW,
+                                                 ffi_trim_callback_pool_doc},
+ {"to_dtype",   (PyCFunction)ffi_to_dtype,   METH_O,       ffi_to_dtype_doc},
  {"typeof",     (PyCFunction)ffi_typeof,     METH_O,       ffi_typeof_doc},
  {"unpack",     (PyCFunction)ffi_unpack,     METH_VKW,     ffi_unpack_doc},
+{"unpack_fields",(PyCFunction)ffi_unpack_fields,METH_VKW,
+                                                 ffi_unpack_fields_doc},
  {NULL}
 };
 
@@ -0,0 +1,313 @@
+/************************************************************/
+/* Handle tables, created by ffi.new_handle_table().
+
+   This is an alternative to ffi.new_handle() for programs that pass
+   many Python objects to C.  The objects are stored in a dense array
+   of entries, and the 'void *' handle given to C is not an address
+   but the index of the entry, combined with a generation counter.
+   The counter of an entry is incremented whenever the entry is
+   released, so that a handle that was already released (or that was
+   never returned by this table) is detected and gives an exception,
+   instead of reading random memory.  The free entries are chained
+   together to be reused first.
+*/
+
+#if SIZEOF_VOID_P >= 8
+# define HT_INDEX_BITS   32
+#else
+# define HT_INDEX_BITS   22
+#endif
+#define HT_INDEX_MASK    (((uintptr_t)1 << HT_INDEX_BITS) - 1)
+#define HT_MAX_ENTRIES   ((Py_ssize_t)(HT_INDEX_MASK - 1))
+#define HT_GEN_MASK      ((~(uintptr_t)0) >> HT_INDEX_BITS)
+
+typedef struct {
+    PyObject *he_obj;           /* NULL if the entry is free */
+    Py_ssize_t he_next_free;    /* if free, the index of the next free one */
+    uintptr_t he_generation;
+} ht_entry_t;
+
+typedef struct {
+    PyObject_HEAD
+    CTypeDescrObject *ht_ct;    /* <ctype 'void *'> */
+    ht_entry_t *ht_entries;
+    Py_ssize_t ht_allocated;
+    Py_ssize_t ht_used;         /* entries that have been used at all */
+    Py_ssize_t ht_count;        /* live entries */
+    Py_ssize_t ht_first_free;   /* -1 if no free entry below ht_used */
+} HandleTableObject;
+
+static PyTypeObject HandleTable_Type;
+
+static Py_ssize_t ht_decode(HandleTableObject *t, PyObject *handle)
+{
+    /* returns the index of the live entry that 'handle' refers to, or
+       -1 with an exception set */
+    uintptr_t value;
+    Py_ssize_t index;
+
+    if (CData_Check(handle) &&
+            (((CDataObject *)handle)->c_type->ct_flags & CT_POINTER)) {
+        value = (uintptr_t)((CDataObject *)handle)->c_data;
+    }
+    else {
+        value = (uintptr_t)_my_PyLong_AsUnsignedLongLong(handle, 1);
+        if (value == (uintptr_t)-1 && PyErr_Occurred()) {
+            if (!PyErr_ExceptionMatches(PyExc_TypeError))
+                goto invalid;
+            PyErr_Format(PyExc_TypeError,
+                         "expected a pointer cdata or an integer, "
+                         "got %.200s", Py_TYPE(handle)->tp_name);
+            return -1;
+        }
+    }
+    index = (Py_ssize_t)(value & HT_INDEX_MASK) - 1;
+    if (index < 0 || index >= t->ht_used ||
+            t->ht_entries[index].he_obj == NULL ||
+            t->ht_entries[index].he_generation !=
+                ((value >> HT_INDEX_BITS) & HT_GEN_MASK))
+        goto invalid;
+    return index;
+
+ invalid:
+    PyErr_Clear();
+    PyErr_SetString(PyExc_ValueError,
+                    "this handle is not in the handle table (it was "
+                    "released, or it comes from somewhere else)");
+    return -1;
+}
+
+static int ht_grow(HandleTableObject *t, Py_ssize_t minimum)
+{
+    Py_ssize_t allocated = t->ht_allocated;
+    ht_entry_t *entries;
+
+    if (allocated < 16)
+        allocated = 16;
+    while (allocated < minimum)
+        allocated *= 2;
+    if (allocated > HT_MAX_ENTRIES)
+        allocated = HT_MAX_ENTRIES;
+    if (allocated < minimum ||
+            (size_t)allocated > PY_SSIZE_T_MAX / sizeof(ht_entry_t)) {
+        PyErr_SetString(PyExc_MemoryError, "the handle table is full");
+        return -1;
+    }
+    entries = PyMem_Realloc(t->ht_entries, allocated * sizeof(ht_entry_t));
+    if (entries == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    t->ht_entries = entries;
+    t->ht_allocated = allocated;
+    return 0;
+}
+
+static PyObject *ht_detach(HandleTableObject *t, Py_ssize_t index);
+
+static PyObject *ht_add(HandleTableObject *t, PyObject *obj)
+{
+    Py_ssize_t index = t->ht_first_free;
+    ht_entry_t *entry;
+    PyObject *result;
+
+    if (index >= 0) {
+        entry = &t->ht_entries[index];
+        t->ht_first_free = entry->he_next_free;
+    }
+    else {
+        if (t->ht_used == t->ht_allocated && ht_grow(t, t->ht_used + 1) < 0)
+            return NULL;
+        index = t->ht_used++;
+        entry = &t->ht_entries[index];
+        entry->he_generation = 0;
+    }
+    Py_INCREF(obj);
+    entry->he_obj = obj;
+    t->ht_count++;
+    result = new_simple_cdata((char *)(((uintptr_t)(index + 1)) |
+                                       (entry->he_generation << HT_INDEX_BITS)),
+                              t->ht_ct);
+    if (result == NULL)
+        Py_DECREF(ht_detach(t, index));
+    return result;
+}
+
+static PyObject *ht_get(HandleTableObject *t, PyObject *handle)
+{
+    Py_ssize_t index = ht_decode(t, handle);
+    PyObject *obj;
+    if (index < 0)
+        return NULL;
+    obj = t->ht_entries[index].he_obj;
+    Py_INCREF(obj);
+    return obj;
+}
+
+static PyObject *ht_detach(HandleTableObject *t, Py_ssize_t index)
+{
+    /* release the entry, and return the reference to its object */
+    ht_entry_t *entry = &t->ht_entries[index];
+    PyObject *obj = entry->he_obj;
+    entry->he_obj = NULL;
+    entry->he_generation = (entry->he_generation + 1) & HT_GEN_MASK;
+    entry->he_next_free = t->ht_first_free;
+    t->ht_first_free = index;
+    t->ht_count--;
+    return obj;
+}
+
+static PyObject *ht_remove(HandleTableObject *t, PyObject *handle)
+{
+    Py_ssize_t index = ht_decode(t, handle);
+    if (index < 0)
+        return NULL;
+    return ht_detach(t, index);
+}
+
+static int ht_clear(HandleTableObject *t)
+{
+    /* detach all the objects first, and only then release them, because
+       this can run arbitrary code which might use the table */
+    PyObject **objs;
+    Py_ssize_t i, n = 0;
+
+    if (t->ht_count == 0)
+        return 0;
+    objs = PyMem_Malloc(t->ht_count * sizeof(PyObject *));
+    if (objs == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    for (i = t->ht_used - 1; i >= 0; i--) {
+        if (t->ht_entries[i].he_obj != NULL)
+            objs[n++] = ht_detach(t, i);
+    }
+    for (i = 0; i < n; i++)
+        Py_DECREF(objs[i]);
+    PyMem_Free(objs);
+    return 0;
+}
+
+static PyObject *ht_clear_meth(HandleTableObject *t, PyObject *noarg)
+{
+    if (ht_clear(t) < 0)
+        return NULL;
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
+static Py_ssize_t ht_length(HandleTableObject *t)
+{
+    return t->ht_count;
+}
+
+static int ht_traverse(HandleTableObject *t, visitproc visit, void *arg)
+{
+    Py_ssize_t i;
+    Py_VISIT(t->ht_ct);
+    for (i = 0; i < t->ht_used; i++)
+        Py_VISIT(t->ht_entries[i].he_obj);
+    return 0;
+}
+
+static int ht_tp_clear(HandleTableObject *t)
+{
+    if (ht_clear(t) < 0)
+        PyErr_Clear();
+    return 0;
+}
+
+static void ht_dealloc(HandleTableObject *t)
+{
+    Py_ssize_t i;
+    PyObject_GC_UnTrack(t);
+    for (i = 0; i < t->ht_used; i++)
+        Py_XDECREF(t->ht_entries[i].he_obj);
+    PyMem_Free(t->ht_entries);
+    Py_DECREF(t->ht_ct);
+    PyObject_GC_Del(t);
+}
+
+static PyObject *b_new_handle_table(PyObject *self, PyObject *args)
+{
+    CTypeDescrObject *ct;
+    Py_ssize_t size = 0;
+    HandleTableObject *t;
+
+    if (!PyArg_ParseTuple(args, "O!|n:new_handle_table",
+                          &CTypeDescr_Type, &ct, &size))
+        return NULL;
+    if (!(ct->ct_flags & CT_IS_VOID_PTR)) {
+        PyErr_Format(PyExc_TypeError, "needs 'void *', got '%s'", ct->ct_name);
+        return NULL;
+    }
+
+    t = PyObject_GC_New(HandleTableObject, &HandleTable_Type);
+    if (t == NULL)
+        return NULL;
+    Py_INCREF(ct);
+    t->ht_ct = ct;
+    t->ht_entries = NULL;
+    t->ht_allocated = 0;
+    t->ht_used = 0;
+    t->ht_count = 0;
+    t->ht_first_free = -1;
+    if (size > 0 && ht_grow(t, size) < 0) {
+        Py_DECREF(t);
+        return NULL;
+    }
+    PyObject_GC_Track(t);
+    return (PyObject *)t;
+}
+
+static PyMethodDef ht_methods[] = {
+    {"add",    (PyCFunction)ht_add,    METH_O},
+    {"get",    (PyCFunction)ht_get,    METH_O},
+    {"remove", (PyCFunction)ht_remove, METH_O},
+    {"clear",  (PyCFunction)ht_clear_meth, METH_NOARGS},
+    {NULL,     NULL}           /* sentinel */
+};
+
+static PySequenceMethods ht_as_sequence = {
+    (lenfunc)ht_length, /*sq_length*/
+};
+
+PyDoc_STRVAR(ht_doc,
+"A table of handles, made by ffi.new_handle_table().\n"
+"\n"
+"t.add(x) returns a 'void *' handle for the Python object 'x'.  Then\n"
+"t.get(handle) returns 'x', and t.remove(handle) returns 'x' and\n"
+"releases the handle.  t.clear() releases all handles at once.  Using\n"
+"a handle that was released raises ValueError.");
+
+static PyTypeObject HandleTable_Type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "_cffi_backend.HandleTable",
+    sizeof(HandleTableObject),
+    0,
+    (destructor)ht_dealloc,                     /* tp_dealloc */
+    0,                                          /* tp_print */
+    0,                                          /* tp_getattr */
+    0,                                          /* tp_setattr */
+    0,                                          /* tp_compare */
+    0,                                          /* tp_repr */
+    0,                                          /* tp_as_number */
+    &ht_as_sequence,                            /* tp_as_sequence */
+    0,                                          /* tp_as_mapping */
+    0,                                          /* tp_hash */
+    0,                                          /* tp_call */
+    0,                                          /* tp_str */
+    PyObject_GenericGetAttr,                    /* tp_getattro */
+    0,                                          /* tp_setattro */
+    0,                                          /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,    /* tp_flags */
+    ht_doc,                                     /* tp_doc */
+    (traverseproc)ht_traverse,                  /* tp_traverse */
+    (inquiry)ht_tp_clear,                       /* tp_clear */
+    0,                                          /* tp_richcompare */
+    0,                                          /* tp_weaklistoffset */
+    0,                                          /* tp_iter */
+    0,                                          /* tp_iternext */
+    ht_methods,                                 /* tp_methods */
+};
@@ -85,6 +85,27 @@ static PyObject *_cpyextfunc_type_index(PyObject *x)
     return _cpyextfunc_type(lib, exf);
 }
 
+static PyObject *_cpyextfunc_as_cdata(PyObject *x)
+{
+    /* if 'x' is a built-in function from a 'lib', return a new reference
+       to a cdata function pointer to it; otherwise return a new reference
+       to 'x' itself */
+    struct CPyExtFunc_s *exf;
+    PyObject *ct;
+
+    exf = _cpyextfunc_get(x);
+    if (exf == NULL || exf->direct_fn == NULL) {
+        Py_INCREF(x);
+        return x;
+    }
+    ct = _cpyextfunc_type((LibObject *)PyCFunction_GET_SELF(x), exf);
+    if (ct == NULL)
+        return NULL;
+    x = new_simple_cdata(exf->direct_fn, (CTypeDescrObject *)ct);
+    Py_DECREF(ct);
+    return x;
+}
+
 static void cdlopen_close_ignore_errors(void *libhandle);  /* forward */
 static void *cdlopen_fetch(PyObject *libname, void *libhandle,
                            const char *symbol);
@@ -288,6 +309,12 @@ static PyObject *lib_build_and_cache_attr(LibObject *lib, PyObject *name,
         x = lib_build_cpython_func(lib, g, s, METH_O);
         break;
 
+#if defined(METH_FASTCALL) && PY_VERSION_HEX >= 0x03070000
+    case _CFFI_OP_CPYTHON_BLTN_F:
+        x = lib_build_cpython_func(lib, g, s, METH_FASTCALL);
+        break;
+#endif
+
     case _CFFI_OP_CONSTANT_INT:
     case _CFFI_OP_ENUM:
     {
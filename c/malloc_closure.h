@@ -85,11 +85,22 @@ union mmaped_block {
 static union mmaped_block *free_list = 0;
 static Py_ssize_t _pagesize = 0;
 
-static void more_core(void)
-{
-    union mmaped_block *item;
-    Py_ssize_t count, i;
+/* the blocks of pages obtained from mmap(), with statistics */
+struct closure_chunk_s {
+    struct closure_chunk_s *next;
+    union mmaped_block *start;
+    Py_ssize_t count;       /* number of mmaped_blocks */
+    Py_ssize_t num_pages;
+    Py_ssize_t num_free;    /* only computed by cffi_closure_trim() */
+};
+
+static struct closure_chunk_s *closure_chunks = NULL;
+static Py_ssize_t closures_total = 0;
+static Py_ssize_t closures_in_use = 0;
+static Py_ssize_t closure_pages = 0;
 
+static Py_ssize_t get_pagesize(void)
+{
 /* determine the pagesize */
 #ifdef MS_WIN32
     if (!_pagesize) {
@@ -108,13 +119,22 @@ static void more_core(void)
 #endif
     if (_pagesize <= 0)
         _pagesize = 4096;
+    return _pagesize;
+}
 
-    /* bump 'allocate_num_pages' */
-    allocate_num_pages = 1 + (
-        (Py_ssize_t)(allocate_num_pages * PAGE_ALLOCATION_GROWTH_RATE));
+static int more_core_pages(Py_ssize_t num_pages)
+{
+    union mmaped_block *item;
+    struct closure_chunk_s *chunk;
+    Py_ssize_t count, i;
+    Py_ssize_t pagesize = get_pagesize();
 
     /* calculate the number of mmaped_blocks to allocate */
-    count = (allocate_num_pages * _pagesize) / sizeof(union mmaped_block);
+    count = (num_pages * pagesize) / sizeof(union mmaped_block);
+
+    chunk = (struct closure_chunk_s *)malloc(sizeof(struct closure_chunk_s));
+    if (chunk == NULL)
+        return -1;
 
     /* allocate a memory block */
 #ifdef MS_WIN32
@@ -122,34 +142,56 @@ static void more_core(void)
                                            count * sizeof(union mmaped_block),
                                            MEM_COMMIT,
                                            PAGE_EXECUTE_READWRITE);
-    if (item == NULL)
-        return;
+    if (item == NULL) {
+        free(chunk);
+        return -1;
+    }
 #else
     {
     int prot = PROT_READ | PROT_WRITE | PROT_EXEC;
     if (is_emutramp_enabled ())
         prot &= ~PROT_EXEC;
     item = (union mmaped_block *)mmap(NULL,
-                        allocate_num_pages * _pagesize,
+                        num_pages * pagesize,
                         prot,
                         MAP_PRIVATE | MAP_ANONYMOUS,
                         -1,
                         0);
-    if (item == (void *)MAP_FAILED)
-        return;
+    if (item == (void *)MAP_FAILED) {
+        free(chunk);
+        return -1;
+    }
     }
 #endif
 
 #ifdef MALLOC_CLOSURE_DEBUG
     printf("block at %p allocated (%ld bytes), %ld mmaped_blocks\n",
-           item, (long)(allocate_num_pages * _pagesize), (long)count);
+           item, (long)(num_pages * pagesize), (long)count);
 #endif
+    chunk->start = item;
+    chunk->count = count;
+    chunk->num_pages = num_pages;
+    chunk->next = closure_chunks;
+    closure_chunks = chunk;
+    closures_total += count;
+    closure_pages += num_pages;
+
     /* put them into the free list */
     for (i = 0; i < count; ++i) {
         item->next = free_list;
         free_list = item;
         ++item;
     }
+    return 0;
+}
+
+static void more_core(void)
+{
+    /* bump 'allocate_num_pages' */
+    allocate_num_pages = 1 + (
+        (Py_ssize_t)(allocate_num_pages * PAGE_ALLOCATION_GROWTH_RATE));
+
+    more_core_pages(allocate_num_pages);
 }
 
 /******************************************************************/
@@ -160,6 +202,7 @@ static void cffi_closure_free(ffi_closure *p)
     union mmaped_block *item = (union mmaped_block *)p;
     item->next = free_list;
     free_list = item;
+    closures_in_use--;
 }
 
 /* return one item from the free list, allocating more if needed */
@@ -172,5 +215,85 @@ static ffi_closure *cffi_closure_alloc(void)
         return NULL;
     item = free_list;
     free_list = item->next;
+    closures_in_use++;
     return &item->closure;
 }
+
+/* make sure that at least 'num_free' items are in the free list, by
+   allocating exactly the number of pages needed in one block */
+static int cffi_closure_reserve(Py_ssize_t num_free)
+{
+    Py_ssize_t missing = num_free - (closures_total - closures_in_use);
+    Py_ssize_t pagesize = get_pagesize();
+
+    if (missing <= 0)
+        return 0;
+    return more_core_pages((missing * sizeof(union mmaped_block) +
+                            pagesize - 1) / pagesize);
+}
+
+static struct closure_chunk_s *_closure_find_chunk(union mmaped_block *item)
+{
+    struct closure_chunk_s *chunk;
+    for (chunk = closure_chunks; chunk != NULL; chunk = chunk->next) {
+        if (chunk->start <= item && item < chunk->start + chunk->count)
+            return chunk;
+    }
+    return NULL;
+}
+
+/* give back to the OS the blocks of pages whose items are all free,
+   as long as at least 'keep_free' items remain in the free list.
+   Returns the number of pages released. */
+static Py_ssize_t cffi_closure_trim(Py_ssize_t keep_free)
+{
+    struct closure_chunk_s *chunk, **pchunk;
+    union mmaped_block *item, **pitem;
+    Py_ssize_t num_free = closures_total - closures_in_use;
+    Py_ssize_t released_pages = 0;
+
+    for (chunk = closure_chunks; chunk != NULL; chunk = chunk->next)
+        chunk->num_free = 0;
+    for (item = free_list; item != NULL; item = item->next) {
+        chunk = _closure_find_chunk(item);
+        if (chunk != NULL)
+            chunk->num_free++;
+    }
+    /* mark the chunks to release by setting 'num_free' to -1 */
+    for (chunk = closure_chunks; chunk != NULL; chunk = chunk->next) {
+        if (chunk->num_free == chunk->count &&
+                num_free - chunk->count >= keep_free) {
+            num_free -= chunk->count;
+            chunk->num_free = -1;
+        }
+    }
+    /* remove their items from the free list */
+    pitem = &free_list;
+    while (*pitem != NULL) {
+        chunk = _closure_find_chunk(*pitem);
+        if (chunk != NULL && chunk->num_free < 0)
+            *pitem = (*pitem)->next;
+        else
+            pitem = &(*pitem)->next;
+    }
+    /* release them */
+    pchunk = &closure_chunks;
+    while (*pchunk != NULL) {
+        chunk = *pchunk;
+        if (chunk->num_free >= 0) {
+            pchunk = &chunk->next;
+            continue;
+        }
+        *pchunk = chunk->next;
+#ifdef MS_WIN32
+        VirtualFree(chunk->start, 0, MEM_RELEASE);
+#else
+        munmap(chunk->start, chunk->num_pages * get_pagesize());
+#endif
+        closures_total -= chunk->count;
+        closure_pages -= chunk->num_pages;
+        released_pages += chunk->num_pages;
+        free(chunk);
+    }
+    return released_pages;
+}
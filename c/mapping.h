@@ -0,0 +1,626 @@
+/************************************************************/
+/* Memory obtained directly from the OS with mmap(), for
+   ffi.new_mapped(), for ffi.new() when the size is above the
+   threshold given to ffi.set_mmap_threshold(), and for ffi.map_file().
+
+   Anonymous mappings are zero-initialized by the OS, and their pages
+   are only allocated when they are first touched, so creating a huge
+   array is fast and doesn't use memory for the parts that are never
+   used.  The mapping belongs to a Mapping object, which unmaps it when
+   freed.  The cdata object returned to the user is a CDataGCP_Type
+   object with the Mapping object as 'origobj' and no destructor, like
+   the result of arena.new().  The 'advice' given by name is passed to
+   madvise(); the advices that don't exist on this platform are
+   ignored.  On Windows, VirtualAlloc() is used and the advices are
+   ignored.
+
+   ffi.map_file() maps a range of a file in the same way.  mmap()
+   needs an offset that is a multiple of the page size (of the
+   allocation granularity on Windows), so the mapping may start a bit
+   before the requested offset.  The file descriptor is not needed any
+   more after mmap().  ffi.msync() flushes the changes of a shared
+   mapping back to the file.
+*/
+
+#ifdef MS_WIN32
+# include <io.h>
+# include <fcntl.h>
+#else
+# include <fcntl.h>
+# include <sys/stat.h>
+# include <unistd.h>
+#endif
+
+typedef struct {
+    PyObject_HEAD
+    char *mp_data;
+    size_t mp_size;
+    int mp_file;                /* mapping of a file, not anonymous */
+} MappingObject;
+
+static PyTypeObject Mapping_Type;
+
+#ifndef MS_WIN32
+# ifndef MADV_NORMAL
+#  define MADV_NORMAL      -1
+# endif
+# ifndef MADV_RANDOM
+#  define MADV_RANDOM      -1
+# endif
+# ifndef MADV_SEQUENTIAL
+#  define MADV_SEQUENTIAL  -1
+# endif
+# ifndef MADV_WILLNEED
+#  define MADV_WILLNEED    -1
+# endif
+# ifndef MADV_HUGEPAGE
+#  define MADV_HUGEPAGE    -1
+# endif
+# ifndef MADV_NOHUGEPAGE
+#  define MADV_NOHUGEPAGE  -1
+# endif
+# ifndef MADV_DONTDUMP
+#  define MADV_DONTDUMP    -1
+# endif
+# ifndef MADV_DODUMP
+#  define MADV_DODUMP      -1
+# endif
+#endif
+
+static const struct {
+    const char *name;
+    int advice;     /* -1 if not supported on this platform */
+} mapping_advices[] = {
+#ifndef MS_WIN32
+    { "normal",      MADV_NORMAL },
+    { "random",      MADV_RANDOM },
+    { "sequential",  MADV_SEQUENTIAL },
+    { "willneed",    MADV_WILLNEED },
+    { "hugepage",    MADV_HUGEPAGE },
+    { "nohugepage",  MADV_NOHUGEPAGE },
+    { "dontdump",    MADV_DONTDUMP },
+    { "dodump",      MADV_DODUMP },
+#else
+    { "normal",      -1 },
+    { "random",      -1 },
+    { "sequential",  -1 },
+    { "willneed",    -1 },
+    { "hugepage",    -1 },
+    { "nohugepage",  -1 },
+    { "dontdump",    -1 },
+    { "dodump",      -1 },
+#endif
+    { NULL,          0 }
+};
+
+static Py_ssize_t mmap_threshold = 0;     /* 0: disabled */
+static unsigned int mmap_threshold_advice = 0;
+
+static int mapping_parse_advice(PyObject *advice, unsigned int *pmask)
+{
+    /* 'advice' is None, a string, or a sequence of strings; returns a
+       bitmask of indices in mapping_advices[] */
+    PyObject *seq, *name;
+    Py_ssize_t i;
+    int j;
+
+    *pmask = 0;
+    if (advice == Py_None)
+        return 0;
+    if (PyText_Check(advice))
+        seq = PyTuple_Pack(1, advice);
+    else
+        seq = PySequence_Fast(advice, "'advice' must be a string or a "
+                                      "sequence of strings");
+    if (seq == NULL)
+        return -1;
+    for (i = 0; i < PySequence_Fast_GET_SIZE(seq); i++) {
+        const char *s;
+        name = PySequence_Fast_GET_ITEM(seq, i);
+        s = PyText_Check(name) ? PyText_AS_UTF8(name) : NULL;
+        if (s == NULL) {
+            if (!PyErr_Occurred())
+                PyErr_SetString(PyExc_TypeError,
+                                "'advice' must be a string or a sequence "
+                                "of strings");
+            goto error;
+        }
+        for (j = 0; mapping_advices[j].name != NULL; j++) {
+            if (strcmp(s, mapping_advices[j].name) == 0)
+                break;
+        }
+        if (mapping_advices[j].name == NULL) {
+            PyErr_Format(PyExc_ValueError, "unknown advice '%s'", s);
+            goto error;
+        }
+        *pmask |= 1U << j;
+    }
+    Py_DECREF(seq);
+    return 0;
+
+ error:
+    Py_DECREF(seq);
+    return -1;
+}
+
+static void mapping_apply_advice(char *data, size_t size, unsigned int mask)
+{
+#ifndef MS_WIN32
+    int j;
+    for (j = 0; mapping_advices[j].name != NULL; j++) {
+        if ((mask & (1U << j)) && mapping_advices[j].advice != -1)
+            (void)madvise(data, size, mapping_advices[j].advice);
+    }
+#endif
+}
+
+static MappingObject *mapping_new_anonymous(Py_ssize_t size,
+                                            unsigned int advice)
+{
+    MappingObject *mp;
+    char *data;
+
+    if (size <= 0)
+        size = 1;      /* mmap() doesn't accept 0 bytes */
+#ifdef MS_WIN32
+    data = VirtualAlloc(NULL, size, MEM_COMMIT | MEM_RESERVE, PAGE_READWRITE);
+#else
+    data = mmap(NULL, size, PROT_READ | PROT_WRITE,
+                MAP_PRIVATE | MAP_ANONYMOUS, -1, 0);
+    if (data == (char *)MAP_FAILED)
+        data = NULL;
+#endif
+    if (data == NULL) {
+        PyErr_NoMemory();
+        return NULL;
+    }
+    mapping_apply_advice(data, size, advice);
+
+    mp = PyObject_New(MappingObject, &Mapping_Type);
+    if (mp == NULL) {
+#ifdef MS_WIN32
+        VirtualFree(data, 0, MEM_RELEASE);
+#else
+        munmap(data, size);
+#endif
+        return NULL;
+    }
+    mp->mp_data = data;
+    mp->mp_size = size;
+    mp->mp_file = 0;
+    return mp;
+}
+
+static void mapping_dealloc(MappingObject *mp)
+{
+#ifdef MS_WIN32
+    if (mp->mp_file)
+        UnmapViewOfFile(mp->mp_data);
+    else
+        VirtualFree(mp->mp_data, 0, MEM_RELEASE);
+#else
+    munmap(mp->mp_data, mp->mp_size);
+#endif
+    PyObject_Del(mp);
+}
+
+static CDataObject_gcp *new_mapping_cdata(CTypeDescrObject *ct,
+                                          MappingObject *mp, char *data,
+                                          Py_ssize_t length)
+{
+    /* NOTE: this steals the reference to 'mp', even in case of error */
+    CDataObject_gcp *cd = PyObject_GC_New(CDataObject_gcp, &CDataGCP_Type);
+    if (cd == NULL) {
+        Py_DECREF(mp);
+        return NULL;
+    }
+    Py_INCREF(ct);
+    cd->head.c_data = data;
+    cd->head.c_type = ct;
+    cd->head.c_weakreflist = NULL;
+    CDATA_INIT_VECTORCALL(&cd->head);
+    cd->length = length;
+    cd->origobj = (PyObject *)mp;
+    cd->destructor = NULL;
+    cd->memsize = 0;
+    cd->defer = 0;
+    PyObject_GC_Track(cd);
+    return cd;
+}
+
+static PyObject *new_mapped_cdata(CTypeDescrObject *ct, PyObject *init,
+                                  Py_ssize_t datasize,
+                                  Py_ssize_t explicitlength,
+                                  unsigned int advice)
+{
+    /* like direct_newp(), but with the memory from a new anonymous
+       mapping.  'datasize' and 'explicitlength' are the results of
+       newp_data_size(), which may also have replaced 'init'. */
+    MappingObject *mp;
+    CDataObject_gcp *cd;
+
+    mp = mapping_new_anonymous(datasize, advice);
+    if (mp == NULL)
+        return NULL;
+    cd = new_mapping_cdata(ct, mp, mp->mp_data, explicitlength);
+    if (cd == NULL)
+        return NULL;
+    gcp_memory_stats_add(cd, datasize);
+
+    if (init != Py_None) {
+        if (convert_from_object(cd->head.c_data,
+              (ct->ct_flags & CT_POINTER) ? ct->ct_itemdescr : ct, init) < 0) {
+            Py_DECREF(cd);
+            return NULL;
+        }
+    }
+    return (PyObject *)cd;
+}
+
+static PyObject *direct_new_mapped(CTypeDescrObject *ct, PyObject *init,
+                                   PyObject *advice)
+{
+    Py_ssize_t datasize, explicitlength;
+    int varsizestruct;
+    unsigned int mask;
+
+    if (mapping_parse_advice(advice, &mask) < 0)
+        return NULL;
+    datasize = newp_data_size(ct, &init, &explicitlength, &varsizestruct);
+    if (datasize < 0)
+        return NULL;
+    return new_mapped_cdata(ct, init, datasize, explicitlength, mask);
+}
+
+static PyObject *b_new_mapped(PyObject *self, PyObject *args, PyObject *kwds)
+{
+    CTypeDescrObject *ct;
+    PyObject *init = Py_None, *advice = Py_None;
+    static char *keywords[] = {"cdecl", "init", "advice", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!|OO:new_mapped", keywords,
+                                     &CTypeDescr_Type, &ct, &init, &advice))
+        return NULL;
+    return direct_new_mapped(ct, init, advice);
+}
+
+static int mapping_open_file(PyObject *file, int writable, int *pfd)
+{
+    /* 'file' is a file name, or a file descriptor or an object with a
+       fileno() method.  Returns 1 if the file was opened here and
+       must be closed by the caller, 0 if not, or -1 with an exception */
+    int fd;
+#if PY_MAJOR_VERSION >= 3
+    PyObject *bytes;
+#endif
+
+    if (!PyText_Check(file) && !PyBytes_Check(file)) {
+        fd = PyObject_AsFileDescriptor(file);
+        if (fd < 0)
+            return -1;
+        *pfd = fd;
+        return 0;
+    }
+#if PY_MAJOR_VERSION >= 3
+    if (!PyUnicode_FSConverter(file, &bytes))
+        return -1;
+#else
+    Py_INCREF(file);
+    bytes = file;
+#endif
+    fd = open(PyBytes_AS_STRING(bytes), writable ? O_RDWR : O_RDONLY
+#ifdef O_BINARY
+              | O_BINARY
+#endif
+              );
+    if (fd < 0) {
+        PyErr_SetFromErrnoWithFilename(PyExc_OSError,
+                                       PyBytes_AS_STRING(bytes));
+        Py_DECREF(bytes);
+        return -1;
+    }
+    Py_DECREF(bytes);
+    *pfd = fd;
+    return 1;
+}
+
+static MappingObject *mapping_new_file(int fd, char mode, PY_LONG_LONG start,
+                                       size_t size, unsigned int advice)
+{
+    /* 'start' must be a multiple of the page size */
+    MappingObject *mp;
+    char *data;
+
+#ifdef MS_WIN32
+    HANDLE fh = (HANDLE)_get_osfhandle(fd), mh;
+    DWORD protect, access;
+
+    switch (mode) {
+    case 'w': protect = PAGE_READWRITE; access = FILE_MAP_WRITE; break;
+    case 'c': protect = PAGE_WRITECOPY; access = FILE_MAP_COPY;  break;
+    default:  protect = PAGE_READONLY;  access = FILE_MAP_READ;  break;
+    }
+    mh = CreateFileMapping(fh, NULL, protect, 0, 0, NULL);
+    if (mh == NULL) {
+        PyErr_SetFromWindowsErr(0);
+        return NULL;
+    }
+    data = MapViewOfFile(mh, access, (DWORD)(start >> 32), (DWORD)start,
+                         size);
+    CloseHandle(mh);
+    if (data == NULL) {
+        PyErr_SetFromWindowsErr(0);
+        return NULL;
+    }
+#else
+    int prot = (mode == 'r') ? PROT_READ : PROT_READ | PROT_WRITE;
+    int flags = (mode == 'c') ? MAP_PRIVATE : MAP_SHARED;
+
+    data = mmap(NULL, size, prot, flags, fd, (off_t)start);
+    if (data == (char *)MAP_FAILED) {
+        PyErr_SetFromErrno(PyExc_OSError);
+        return NULL;
+    }
+#endif
+    mapping_apply_advice(data, size, advice);
+
+    mp = PyObject_New(MappingObject, &Mapping_Type);
+    if (mp == NULL) {
+#ifdef MS_WIN32
+        UnmapViewOfFile(data);
+#else
+        munmap(data, size);
+#endif
+        return NULL;
+    }
+    mp->mp_data = data;
+    mp->mp_size = size;
+    mp->mp_file = 1;
+    return mp;
+}
+
+static PyObject *direct_map_file(CTypeDescrObject *ct, PyObject *file,
+                                 const char *mode, PY_LONG_LONG offset,
+                                 PY_LONG_LONG length, PyObject *advice)
+{
+    unsigned int mask;
+    int fd, must_close;
+    PY_LONG_LONG filesize, granularity, delta;
+    Py_ssize_t arraylength = -1;
+    MappingObject *mp;
+
+    if (!(ct->ct_flags & (CT_ARRAY | CT_POINTER))) {
+        PyErr_Format(PyExc_TypeError,
+                     "expected a pointer or array ctype, got '%s'",
+                     ct->ct_name);
+        return NULL;
+    }
+    if (strcmp(mode, "r") != 0 && strcmp(mode, "c") != 0 &&
+            strcmp(mode, "w") != 0) {
+        PyErr_SetString(PyExc_ValueError, "mode must be 'r', 'c' or 'w'");
+        return NULL;
+    }
+    if (offset < 0) {
+        PyErr_SetString(PyExc_ValueError, "negative offset");
+        return NULL;
+    }
+    if (mapping_parse_advice(advice, &mask) < 0)
+        return NULL;
+
+    must_close = mapping_open_file(file, mode[0] == 'w', &fd);
+    if (must_close < 0)
+        return NULL;
+    {
+#ifdef MS_WIN32
+        struct _stati64 st;
+        int err = _fstati64(fd, &st);
+#else
+        struct stat st;
+        int err = fstat(fd, &st);
+#endif
+        if (err < 0) {
+            PyErr_SetFromErrno(PyExc_OSError);
+            goto error;
+        }
+        filesize = st.st_size;
+    }
+    if (offset > filesize) {
+        PyErr_SetString(PyExc_ValueError,
+                        "offset is beyond the end of the file");
+        goto error;
+    }
+    if (length < 0)
+        length = filesize - offset;
+    if (length > filesize - offset) {
+        PyErr_SetString(PyExc_ValueError,
+                        "offset + length is beyond the end of the file");
+        goto error;
+    }
+    if (length == 0 || length > PY_SSIZE_T_MAX) {
+        PyErr_SetString(PyExc_ValueError, length == 0 ?
+                        "cannot map an empty range" : "the range is too large");
+        goto error;
+    }
+
+    if (ct->ct_flags & CT_ARRAY) {
+        if (ct->ct_length >= 0) {
+            if (length < ct->ct_size) {
+                PyErr_Format(PyExc_ValueError,
+                    "range is too small (%lld bytes) for '%s' (%zd bytes)",
+                    length, ct->ct_name, ct->ct_size);
+                goto error;
+            }
+        }
+        else if (ct->ct_itemdescr->ct_size > 0) {
+            /* as many items as fit in the range */
+            arraylength = (Py_ssize_t)length / ct->ct_itemdescr->ct_size;
+        }
+        else {
+            PyErr_Format(PyExc_ZeroDivisionError,
+                "map_file('%s', ..): the actual length of the array "
+                "cannot be computed", ct->ct_name);
+            goto error;
+        }
+    }
+    else if (ct->ct_itemdescr->ct_size <= 0) {
+        PyErr_Format(PyExc_ValueError,
+                     "'%s' points to items of unknown size", ct->ct_name);
+        goto error;
+    }
+    else if (length < ct->ct_itemdescr->ct_size) {
+        PyErr_Format(PyExc_ValueError,
+            "range is too small (%lld bytes) for '%s' (%zd bytes)",
+            length, ct->ct_itemdescr->ct_name, ct->ct_itemdescr->ct_size);
+        goto error;
+    }
+
+#ifdef MS_WIN32
+    {
+        SYSTEM_INFO si;
+        GetSystemInfo(&si);
+        granularity = si.dwAllocationGranularity;
+    }
+#else
+    granularity = sysconf(_SC_PAGESIZE);
+#endif
+    delta = offset % granularity;
+    mp = mapping_new_file(fd, mode[0], offset - delta,
+                          (size_t)(length + delta), mask);
+    if (mp == NULL)
+        goto error;
+    if (must_close)
+        close(fd);
+    return (PyObject *)new_mapping_cdata(ct, mp, mp->mp_data + delta,
+                                         arraylength);
+
+ error:
+    if (must_close)
+        close(fd);
+    return NULL;
+}
+
+static PyObject *b_map_file(PyObject *self, PyObject *args, PyObject *kwds)
+{
+    CTypeDescrObject *ct;
+    PyObject *file, *advice = Py_None;
+    char *mode = "r";
+    PY_LONG_LONG offset = 0, length = -1;
+    static char *keywords[] = {"cdecl", "file", "mode", "offset", "length",
+                               "advice", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!O|sLLO:map_file",
+                                     keywords, &CTypeDescr_Type, &ct, &file,
+                                     &mode, &offset, &length, &advice))
+        return NULL;
+    return direct_map_file(ct, file, mode, offset, length, advice);
+}
+
+static PyObject *b_msync(PyObject *self, PyObject *args, PyObject *kwds)
+{
+    PyObject *arg;
+    MappingObject *mp;
+    int wait = 1, err;
+    static char *keywords[] = {"cdata", "wait", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|i:msync", keywords,
+                                     &arg, &wait))
+        return NULL;
+    if (Py_TYPE(arg) != &CDataGCP_Type ||
+            (((CDataObject_gcp *)arg)->origobj != NULL &&
+             Py_TYPE(((CDataObject_gcp *)arg)->origobj) != &Mapping_Type)) {
+        PyErr_SetString(PyExc_TypeError,
+                        "expected a cdata returned by ffi.map_file()");
+        return NULL;
+    }
+    mp = (MappingObject *)((CDataObject_gcp *)arg)->origobj;
+    if (mp == NULL) {
+        PyErr_SetString(PyExc_ValueError, "the mapping was released");
+        return NULL;
+    }
+    Py_BEGIN_ALLOW_THREADS
+#ifdef MS_WIN32
+    err = FlushViewOfFile(mp->mp_data, mp->mp_size) ? 0 : -1;
+#else
+    err = msync(mp->mp_data, mp->mp_size, wait ? MS_SYNC : MS_ASYNC);
+#endif
+    Py_END_ALLOW_THREADS
+    if (err < 0) {
+#ifdef MS_WIN32
+        PyErr_SetFromWindowsErr(0);
+#else
+        PyErr_SetFromErrno(PyExc_OSError);
+#endif
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject *b_set_mmap_threshold(PyObject *self, PyObject *args,
+                                      PyObject *kwds)
+{
+    Py_ssize_t threshold, old_threshold = mmap_threshold;
+    PyObject *advice = Py_None;
+    unsigned int mask;
+    static char *keywords[] = {"nbytes", "advice", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "n|O:set_mmap_threshold",
+                                     keywords, &threshold, &advice))
+        return NULL;
+    if (threshold < 0) {
+        PyErr_SetString(PyExc_ValueError,
+                        "the threshold must not be negative");
+        return NULL;
+    }
+    if (mapping_parse_advice(advice, &mask) < 0)
+        return NULL;
+    mmap_threshold = threshold;
+    mmap_threshold_advice = mask;
+    return PyInt_FromSsize_t(old_threshold);
+}
+
+static PyObject *mapping_get_size(MappingObject *mp, void *context)
+{
+    return PyInt_FromSsize_t((Py_ssize_t)mp->mp_size);
+}
+
+static PyGetSetDef mapping_getsets[] = {
+    {"size", (getter)mapping_get_size, NULL, "size of the mapping in bytes"},
+    {NULL}
+};
+
+PyDoc_STRVAR(mapping_doc,
+"Memory obtained with mmap(), owned by the cdata objects returned by\n"
+"ffi.new_mapped() and ffi.map_file().");
+
+static PyTypeObject Mapping_Type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "_cffi_backend.Mapping",
+    sizeof(MappingObject),
+    0,
+    (destructor)mapping_dealloc,                /* tp_dealloc */
+    0,                                          /* tp_print */
+    0,                                          /* tp_getattr */
+    0,                                          /* tp_setattr */
+    0,                                          /* tp_compare */
+    0,                                          /* tp_repr */
+    0,                                          /* tp_as_number */
+    0,                                          /* tp_as_sequence */
+    0,                                          /* tp_as_mapping */
+    0,                                          /* tp_hash */
+    0,                                          /* tp_call */
+    0,                                          /* tp_str */
+    PyObject_GenericGetAttr,                    /* tp_getattro */
+    0,                                          /* tp_setattro */
+    0,                                          /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT,                         /* tp_flags */
+    mapping_doc,                                /* tp_doc */
+    0,                                          /* tp_traverse */
+    0,                                          /* tp_clear */
+    0,                                          /* tp_richcompare */
+    0,                                          /* tp_weaklistoffset */
+    0,                                          /* tp_iter */
+    0,                                          /* tp_iternext */
+    0,                                          /* tp_methods */
+    0,                                          /* tp_members */
+    mapping_getsets,                            /* tp_getset */
+};
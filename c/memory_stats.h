@@ -0,0 +1,257 @@
+/************************************************************/
+/* Accounting of the memory owned by cdata objects, reported by
+   ffi.memory_stats().
+
+   This counts the objects and bytes allocated by ffi.new() (the
+   CDataOwning_Type objects, which are allocated with malloc(); only
+   the size of their C data is counted, and ffi.new("struct *") counts
+   as the struct alone, not the pointer object that wraps it), by
+   the allocators of ffi.new_allocator(), and declared with
+   ffi.gc(cdata, destructor, size).  The counters are global and
+   grouped by ctype, in a hash table similar to the one of
+   call_stats.h; the entries stay in the table when their counters go
+   back to zero.  Every cdata object keeps its ctype alive, so the
+   ctypes of the entries with live objects are alive too.
+
+   The same blocks of memory are also registered with
+   PyTraceMalloc_Track() in the domain CFFI_TRACEMALLOC_DOMAIN, so that
+   tracemalloc snapshots include them.  Everything is done with the GIL.
+
+   Finally, if a threshold is set with ffi.set_memory_pressure_threshold(),
+   then the net number of bytes added since the last collection is
+   tracked too.  When it goes over the threshold, memory_stats_add()
+   runs a full gc.collect(), like CPython's GC does when too many
+   objects are allocated.  This frees the cycles that keep large
+   amounts of C memory alive but few Python objects.
+*/
+
+#define CFFI_TRACEMALLOC_DOMAIN   0x63666669    /* "cffi" */
+
+typedef struct {
+    CTypeDescrObject *ms_key;   /* not a reference */
+    Py_ssize_t ms_objects, ms_bytes;
+} memory_stats_entry_t;
+
+static memory_stats_entry_t *memory_stats_table = NULL;
+static size_t memory_stats_mask = 0;    /* the table size, minus 1 */
+static size_t memory_stats_count = 0;
+static Py_ssize_t memory_stats_objects = 0, memory_stats_bytes = 0;
+static Py_ssize_t memory_pressure_threshold = 0;    /* 0: disabled */
+static Py_ssize_t memory_pressure = 0;     /* net bytes since last collect */
+static Py_ssize_t memory_pressure_collections = 0;
+
+static memory_stats_entry_t *memory_stats_find(CTypeDescrObject *key)
+{
+    size_t h = (size_t)key;
+    size_t i = (h ^ (h >> 4) ^ (h >> 12)) & memory_stats_mask;
+    while (memory_stats_table[i].ms_key != NULL &&
+           memory_stats_table[i].ms_key != key)
+        i = (i + 1) & memory_stats_mask;
+    return &memory_stats_table[i];
+}
+
+static int memory_stats_grow(void)
+{
+    memory_stats_entry_t *old_table = memory_stats_table;
+    size_t i, old_size = old_table != NULL ? memory_stats_mask + 1 : 0;
+    size_t new_size = old_size > 0 ? old_size * 2 : 64;
+
+    memory_stats_table = PyMem_Malloc(new_size * sizeof(memory_stats_entry_t));
+    if (memory_stats_table == NULL) {
+        memory_stats_table = old_table;
+        return -1;
+    }
+    memset(memory_stats_table, 0, new_size * sizeof(memory_stats_entry_t));
+    memory_stats_mask = new_size - 1;
+    for (i = 0; i < old_size; i++) {
+        if (old_table[i].ms_key != NULL)
+            *memory_stats_find(old_table[i].ms_key) = old_table[i];
+    }
+    PyMem_Free(old_table);
+    return 0;
+}
+
+static void memory_pressure_collect(void)
+{
+    /* run gc.collect(), unless the GC is disabled */
+    PyObject *gc, *res;
+    PyObject *error_type, *error_value, *error_traceback;
+
+    memory_pressure = 0;
+    PyErr_Fetch(&error_type, &error_value, &error_traceback);
+    gc = PyImport_ImportModule("gc");
+    if (gc != NULL) {
+        res = PyObject_CallMethod(gc, "isenabled", NULL);
+        if (res != NULL) {
+            int enabled = PyObject_IsTrue(res);
+            Py_DECREF(res);
+            if (enabled == 1) {
+                res = PyObject_CallMethod(gc, "collect", NULL);
+                if (res != NULL) {
+                    memory_pressure_collections++;
+                    Py_DECREF(res);
+                }
+            }
+        }
+        Py_DECREF(gc);
+    }
+    if (PyErr_Occurred())
+        PyErr_WriteUnraisable(NULL);
+    PyErr_Restore(error_type, error_value, error_traceback);
+}
+
+static void memory_stats_add(CTypeDescrObject *ct, void *ptr, Py_ssize_t size)
+{
+    memory_stats_entry_t *entry;
+
+    if (3 * (memory_stats_count + 1) > 2 * (memory_stats_mask + 1) ||
+            memory_stats_table == NULL) {
+        if (memory_stats_grow() < 0)
+            return;     /* out of memory: don't count this object */
+    }
+    entry = memory_stats_find(ct);
+    if (entry->ms_key == NULL) {
+        entry->ms_key = ct;
+        memory_stats_count++;
+    }
+    entry->ms_objects++;
+    entry->ms_bytes += size;
+    memory_stats_objects++;
+    memory_stats_bytes += size;
+#if PY_VERSION_HEX >= 0x03070000
+    PyTraceMalloc_Track(CFFI_TRACEMALLOC_DOMAIN, (uintptr_t)ptr, size);
+#endif
+    if (memory_pressure_threshold > 0) {
+        memory_pressure += size;
+        if (memory_pressure >= memory_pressure_threshold)
+            memory_pressure_collect();
+    }
+}
+
+static void memory_stats_remove(CTypeDescrObject *ct, void *ptr,
+                                Py_ssize_t size)
+{
+    memory_stats_entry_t *entry;
+
+    if (memory_stats_table == NULL)
+        return;
+    entry = memory_stats_find(ct);
+    if (entry->ms_key == NULL || entry->ms_objects == 0)
+        return;     /* not counted by memory_stats_add() */
+    entry->ms_objects--;
+    entry->ms_bytes -= size;
+    memory_stats_objects--;
+    memory_stats_bytes -= size;
+    memory_pressure -= size;
+    if (memory_pressure < 0)
+        memory_pressure = 0;
+#if PY_VERSION_HEX >= 0x03070000
+    PyTraceMalloc_Untrack(CFFI_TRACEMALLOC_DOMAIN, (uintptr_t)ptr);
+#endif
+}
+
+static Py_ssize_t cdataowning_memory_size(CDataObject *cd)
+{
+    /* the size of the C data passed to memory_stats_add() for 'cd',
+       i.e. the size given to allocate_owning_object() without the
+       header of the object */
+    CTypeDescrObject *ct = cd->c_type;
+    Py_ssize_t size = cdata_alloc_size(cd);
+
+    if (size < 0) {
+        size = ((CDataObject_own_length *)cd)->length;
+        if (ct->ct_flags & CT_ARRAY)
+            size *= ct->ct_itemdescr->ct_size;
+    }
+    else {
+        size -= offsetof(CDataObject_own_nolength, alignment);
+    }
+    return size;
+}
+
+static PyObject *b_memory_stats(PyObject *self, PyObject *noarg)
+{
+    /* returns a dict {'objects': n, 'bytes': n, 'by_type': {name:
+       (objects, bytes)}, 'tracemalloc_domain': n, 'pressure': n,
+       'gc_collections': n}.  Different ctypes with the same name are
+       merged. */
+    PyObject *by_type = PyDict_New();
+    PyObject *name, *prev, *stats, *result;
+    size_t i;
+
+    if (by_type == NULL)
+        return NULL;
+    for (i = 0; memory_stats_table != NULL && i <= memory_stats_mask; i++) {
+        memory_stats_entry_t *entry = &memory_stats_table[i];
+        Py_ssize_t objects, bytes;
+
+        if (entry->ms_key == NULL || entry->ms_objects == 0)
+            continue;
+        name = PyText_FromString(entry->ms_key->ct_name);
+        if (name == NULL)
+            goto error;
+        objects = entry->ms_objects;
+        bytes = entry->ms_bytes;
+        prev = PyDict_GetItem(by_type, name);
+        if (prev != NULL) {
+            objects += PyInt_AsSsize_t(PyTuple_GET_ITEM(prev, 0));
+            bytes += PyInt_AsSsize_t(PyTuple_GET_ITEM(prev, 1));
+        }
+        stats = Py_BuildValue("nn", objects, bytes);
+        if (stats == NULL || PyDict_SetItem(by_type, name, stats) < 0) {
+            Py_XDECREF(stats);
+            Py_DECREF(name);
+            goto error;
+        }
+        Py_DECREF(stats);
+        Py_DECREF(name);
+    }
+    result = Py_BuildValue("{s:n,s:n,s:O,s:i,s:n,s:n}",
+                           "objects", memory_stats_objects,
+                           "bytes", memory_stats_bytes,
+                           "by_type", by_type,
+                           "tracemalloc_domain", CFFI_TRACEMALLOC_DOMAIN,
+                           "pressure", memory_pressure,
+                           "gc_collections", memory_pressure_collections);
+    Py_DECREF(by_type);
+    return result;
+
+ error:
+    Py_DECREF(by_type);
+    return NULL;
+}
+
+static PyObject *b_set_memory_pressure_threshold(PyObject *self,
+                                                PyObject *args)
+{
+    Py_ssize_t threshold, old_threshold = memory_pressure_threshold;
+
+    if (!PyArg_ParseTuple(args, "n:set_memory_pressure_threshold",
+                          &threshold))
+        return NULL;
+    if (threshold < 0) {
+        PyErr_SetString(PyExc_ValueError,
+                        "the threshold must not be negative");
+        return NULL;
+    }
+    memory_pressure_threshold = threshold;
+    memory_pressure = 0;
+    return PyInt_FromSsize_t(old_threshold);
+}
+
+static void gcp_memory_stats_add(CDataObject_gcp *cd, Py_ssize_t size)
+{
+    /* for ffi.gc(.., size) and ffi.new_allocator() */
+    if (size > 0) {
+        memory_stats_add(cd->head.c_type, cd->head.c_data, size);
+        cd->memsize = size;
+    }
+}
+
+static void gcp_memory_stats_remove(CDataObject_gcp *cd)
+{
+    if (cd->memsize > 0) {
+        memory_stats_remove(cd->head.c_type, cd->head.c_data, cd->memsize);
+        cd->memsize = 0;
+    }
+}
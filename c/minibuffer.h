@@ -3,6 +3,10 @@
  * interface at C-level (as approriate for the version of Python we're
  * compiling for), but only a minimal but *consistent* part of the
  * 'buffer' interface at application level.
+ *
+ * Consumers that ask for the format and the shape (like memoryview or
+ * NumPy) get the items of the array as typed by the cdata, if
+ * possible: see _cdata_buffer_format().  The others see bytes.
  */
 
 typedef struct {
@@ -11,6 +15,10 @@ typedef struct {
     Py_ssize_t mb_size;
     PyObject  *mb_keepalive;
     PyObject  *mb_weakreflist;    /* weakref support */
+    PyObject  *mb_format;   /* NULL: not computed yet; None: only bytes */
+    Py_ssize_t mb_itemsize;
+    int        mb_ndim;
+    Py_ssize_t *mb_shape;   /* 'mb_ndim' items, followed by the strides */
 } MiniBufferObj;
 
 static Py_ssize_t mb_length(MiniBufferObj *self)
@@ -108,8 +116,32 @@ static PyObject *mb_str(MiniBufferObj *self)
 }
 #endif
 
+/* forward: from _cffi_backend.c */
+static int _cdata_buffer_format(MiniBufferObj *self);
+
 static int mb_getbuf(MiniBufferObj *self, Py_buffer *view, int flags)
 {
+    if ((flags & PyBUF_FORMAT) && (flags & PyBUF_ND) == PyBUF_ND) {
+        if (self->mb_format == NULL && _cdata_buffer_format(self) < 0)
+            return -1;
+        if (self->mb_format != Py_None) {
+            view->buf = self->mb_data;
+            view->obj = (PyObject *)self;
+            Py_INCREF(self);
+            view->len = self->mb_size;
+            view->readonly = 0;
+            view->itemsize = self->mb_itemsize;
+            view->format = PyBytes_AS_STRING(self->mb_format);
+            view->ndim = self->mb_ndim;
+            view->shape = self->mb_shape;
+            view->strides = NULL;
+            if ((flags & PyBUF_STRIDES) == PyBUF_STRIDES)
+                view->strides = self->mb_shape + self->mb_ndim;
+            view->suboffsets = NULL;
+            view->internal = NULL;
+            return 0;
+        }
+    }
     return PyBuffer_FillInfo(view, (PyObject *)self,
                              self->mb_data, self->mb_size,
                              /*readonly=*/0, flags);
@@ -143,6 +175,8 @@ mb_dealloc(MiniBufferObj *ob)
     if (ob->mb_weakreflist != NULL)
         PyObject_ClearWeakRefs((PyObject *)ob);
     Py_XDECREF(ob->mb_keepalive);
+    Py_XDECREF(ob->mb_format);
+    PyMem_Free(ob->mb_shape);
     Py_TYPE(ob)->tp_free((PyObject *)ob);
 }
 
@@ -336,7 +370,10 @@ PyDoc_STRVAR(ffi_buffer_doc,
 "    buf[:]          get a copy of it in a regular string, or\n"
 "    buf[idx]        as a single character\n"
 "    buf[:] = ...\n"
-"    buf[idx] = ...  change the content");
+"    buf[idx] = ...  change the content\n"
+"\n"
+"On Python 3, arrays of primitives or structs are exported to the\n"
+"buffer interface with the format, itemsize and shape of their items.");
 
 static PyObject *            /* forward, implemented in _cffi_backend.c */
 b_buffer_new(PyTypeObject *type, PyObject *args, PyObject *kwds);
@@ -402,6 +439,8 @@ static PyObject *minibuffer_new(char *data, Py_ssize_t size,
         ob->mb_size = size;
         ob->mb_keepalive = keepalive; Py_INCREF(keepalive);
         ob->mb_weakreflist = NULL;
+        ob->mb_format = NULL;
+        ob->mb_shape = NULL;
         PyObject_GC_Track(ob);
     }
     return (PyObject *)ob;
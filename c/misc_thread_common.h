@@ -20,6 +20,15 @@ struct cffi_tls_s {
     /* The saved lasterror, on Windows. */
     int saved_lasterror;
 #endif
+
+    /* Scratch memory reused by the calls to cdata function pointers
+       done in this thread; see scratch_alloc() in _cffi_backend.c.
+       It is allocated with malloc() because it is freed by
+       cffi_thread_shutdown(), which runs without the GIL. */
+    char *scratch;
+    size_t scratch_size;        /* allocated size of 'scratch' */
+    size_t scratch_used;        /* bytes in use by the calls in progress */
+    size_t scratch_wanted;      /* size to grow to when not in use */
 };
 
 static struct cffi_tls_s *get_cffi_tls(void);   /* in misc_thread_posix.h 
@@ -266,6 +275,7 @@ static void cffi_thread_shutdown(void *p)
     }
     TLS_ZOM_UNLOCK();
     //fprintf(stderr, "thread_shutdown(%p)\n", tls);
+    free(tls->scratch);
     free(tls);
 }
 
@@ -43,6 +43,7 @@ enum token_e {
 
     TOK_CDECL,
     TOK_STDCALL,
+    TOK_CFFI_FAST,
 };
 
 typedef struct {
@@ -159,6 +160,8 @@ static void next_token(token_t *tok)
         if (tok->size == 5 && !memcmp(p, "_Bool", 5))  tok->kind = TOK__BOOL;
         if (tok->size == 7 && !memcmp(p,"__cdecl",7))  tok->kind = TOK_CDECL;
         if (tok->size == 9 && !memcmp(p,"__stdcall",9))tok->kind = TOK_STDCALL;
+        if (tok->size == 11 && !memcmp(p, "__cffi_fast", 11))
+            tok->kind = TOK_CFFI_FAST;
         if (tok->size == 8 && !memcmp(p,"_Complex",8)) tok->kind = TOK__COMPLEX;
         break;
     case 'c':
@@ -233,7 +236,7 @@ static int parse_sequel(token_t *tok, int outer)
        type).  The 'outer' argument is the index of the opcode outside
        this "sequel".
      */
-    int check_for_grouping, abi=0;
+    int check_for_grouping, abi=0, fast=0;
     _cffi_opcode_t result, *p_current;
 
  header:
@@ -256,6 +259,11 @@ static int parse_sequel(token_t *tok, int outer)
         abi = tok->kind;
         next_token(tok);
         goto header;
+    case TOK_CFFI_FAST:
+        /* must be in a function too */
+        fast = 1;
+        next_token(tok);
+        goto header;
     default:
         break;
     }
@@ -272,8 +280,12 @@ static int parse_sequel(token_t *tok, int outer)
     while (tok->kind == TOK_OPEN_PAREN) {
         next_token(tok);
 
-        if (tok->kind == TOK_CDECL || tok->kind == TOK_STDCALL) {
-            abi = tok->kind;
+        while (tok->kind == TOK_CDECL || tok->kind == TOK_STDCALL ||
+               tok->kind == TOK_CFFI_FAST) {
+            if (tok->kind == TOK_CFFI_FAST)
+                fast = 1;
+            else
+                abi = tok->kind;
             next_token(tok);
         }
 
@@ -354,6 +366,9 @@ static int parse_sequel(token_t *tok, int outer)
                     next_token(tok);
                 }
             }
+            if (fast)
+                flags |= 0x100;   /* '__cffi_fast' */
+            fast = 0;
             tok->output[arg_next] = _CFFI_OP(_CFFI_OP_FUNCTION_END, flags);
         }
 
@@ -362,7 +377,7 @@ static int parse_sequel(token_t *tok, int outer)
         next_token(tok);
     }
 
-    if (abi != 0)
+    if (abi != 0 || fast != 0)
         return parse_error(tok, "expected '('");
 
     while (tok->kind == TOK_OPEN_BRACKET) {
@@ -554,7 +554,7 @@ realize_c_type_or_func_now(builder_c_t *builder, _cffi_opcode_t op,
     case _CFFI_OP_FUNCTION:
     {
         PyObject *fargs;
-        int i, base_index, num_args, ellipsis, abi;
+        int i, base_index, num_args, ellipsis, abi, fast;
 
         y = (PyObject *)realize_c_type(builder, opcodes, _CFFI_GETARG(op));
         if (y == NULL)
@@ -572,6 +572,7 @@ realize_c_type_or_func_now(builder_c_t *builder, _cffi_opcode_t op,
 
         ellipsis = _CFFI_GETARG(opcodes[base_index + num_args]) & 0x01;
         abi      = _CFFI_GETARG(opcodes[base_index + num_args]) & 0xFE;
+        fast     = _CFFI_GETARG(opcodes[base_index + num_args]) & 0x100;
         switch (abi) {
         case 0:
             abi = FFI_DEFAULT_ABI;
@@ -605,7 +606,8 @@ realize_c_type_or_func_now(builder_c_t *builder, _cffi_opcode_t op,
             PyTuple_SET_ITEM(fargs, i, z);
         }
 
-        z = new_function_type(fargs, (CTypeDescrObject *)y, ellipsis, abi);
+        z = new_function_type(fargs, (CTypeDescrObject *)y, ellipsis, abi,
+                              fast);
         Py_DECREF(fargs);
         Py_DECREF(y);
         if (z == NULL)
@@ -958,6 +958,25 @@ def test_inspect_function_type():
     assert BFunc.ellipsis is False
     assert BFunc.abi == FFI_DEFAULT_ABI
 
+def test_fast_function_type():
+    BInt = new_primitive_type("int")
+    BFunc = new_function_type((BInt, BInt), BInt, False)
+    BFastFunc = new_function_type((BInt, BInt), BInt, False,
+                                  FFI_DEFAULT_ABI, True)
+    assert BFastFunc is not BFunc
+    assert BFastFunc is new_function_type((BInt, BInt), BInt, False,
+                                          FFI_DEFAULT_ABI, True)
+    assert BFastFunc.cname == "int(__cffi_fast *)(int, int)"
+    assert BFastFunc.fast is True
+    assert BFunc.fast is False
+    py.test.raises(AttributeError, getattr, BInt, 'fast')
+    f = cast(BFastFunc, _testfunc(0))
+    assert f(40, 2) == 42
+    BFastFunc9 = new_function_type((BInt,), BInt, True, FFI_DEFAULT_ABI, True)
+    assert BFastFunc9.cname == "int(__cffi_fast *)(int, ...)"
+    f = cast(BFastFunc9, _testfunc(9))
+    assert f(2, cast(BInt, 40), cast(BInt, 2)) == 42
+
 def test_function_type_taking_struct():
     BChar = new_primitive_type("char")
     BShort = new_primitive_type("short")
@@ -1169,6 +1188,65 @@ def test_call_function_23_bool_array():
     assert res == 1000
     py.test.raises(ValueError, f, b"\x02\x02")
 
+def test_call_function_with_buffer_argument():
+    import array
+    BChar = new_primitive_type("char")
+    BCharP = new_pointer_type(BChar)
+    BInt = new_primitive_type("int")
+    BFunc23 = new_function_type((BCharP,), BInt, False)
+    f = cast(BFunc23, _testfunc(23))
+    assert f(bytearray(b"foo")) == 1000 * ord(b'f')
+    assert f(memoryview(bytearray(b"bar"))) == 1000 * ord(b'b')
+    # read-only buffers are refused, as before: the C function could
+    # write to them
+    py.test.raises(TypeError, f, memoryview(b"bar"))
+    assert f(from_buffer(new_array_type(BCharP, None),
+                         memoryview(b"bar"))) == 1000 * ord(b'b')
+    assert f(array.array('b', [5, 6])) == 5000
+    py.test.raises(TypeError, f, array.array('i', [5, 6]))
+    # 'void *' accepts any buffer
+    BVoidP = new_pointer_type(new_void_type())
+    BFunc23 = new_function_type((BVoidP,), BInt, False)
+    f = cast(BFunc23, _testfunc(23))
+    assert f(array.array('h', [7, 7])) == 7000 * (sys.byteorder == 'little')
+    #
+    BIntPtr = new_pointer_type(BInt)
+    BFunc6 = new_function_type((BIntPtr,), BIntPtr, False)
+    f = cast(BFunc6, _testfunc(6))
+    assert f(array.array('i', [142]))[0] == 142 - 1000
+    e = py.test.raises(TypeError, f, array.array('h', [142]))
+    assert str(e.value) == ("expected a buffer of 'int', got a buffer of "
+                            "format 'h' with itemsize 2")
+    py.test.raises(TypeError, f, bytearray(b"abcd"))
+    # no copy: the C function can write into the buffer
+    BFunc = new_function_type((BIntPtr, BInt), BInt, False)
+    def cb(p, n):
+        p[n] += 1
+        return 0
+    c = callback(BFunc, cb)
+    a = array.array('i', [10, 20, 30])
+    c(a, 1)
+    assert list(a) == [10, 21, 30]
+
+def test_call_function_with_buffer_argument_pinned():
+    # the buffer cannot be resized during the call
+    BVoidP = new_pointer_type(new_void_type())
+    BInt = new_primitive_type("int")
+    BFunc = new_function_type((BVoidP,), BInt, False)
+    seen = []
+    def cb(p):
+        try:
+            ba.extend(b"x" * 1000)
+        except BufferError:
+            seen.append("BufferError")
+        return 42
+    c = callback(BFunc, cb)
+    ba = bytearray(b"foo")
+    assert c(ba) == 42
+    assert seen == ["BufferError"]
+    ba.extend(b"bar")     # released after the call
+    assert ba == bytearray(b"foobar")
+
 def test_cannot_pass_struct_with_array_of_length_0():
     BInt = new_primitive_type("int")
     BArray0 = new_array_type(new_pointer_type(BInt), 0)
@@ -1195,6 +1273,33 @@ def test_call_function_9():
     BSShort = new_primitive_type("short")
     assert f(3, cast(BSChar, -3), cast(BUChar, 200), cast(BSShort, -5)) == 192
 
+def test_call_function_9_cif_cache():
+    BInt = new_primitive_type("int")
+    BSChar = new_primitive_type("signed char")
+    BFunc9 = new_function_type((BInt,), BInt, True)    # vararg
+    assert BFunc9.cif_cache_info == (0, 0, 8, 0)
+    py.test.raises(AttributeError, getattr,
+                   new_function_type((BInt,), BInt, False), 'cif_cache_info')
+    f = cast(BFunc9, _testfunc(9))
+    assert f(1, cast(BInt, 42)) == 42
+    assert f(1, cast(BInt, 43)) == 43
+    # 'signed char' is promoted to 'int', so it reuses the same cif
+    assert f(1, cast(BSChar, 44)) == 44
+    assert BFunc9.cif_cache_info == (2, 1, 8, 1)
+    assert f(2, cast(BInt, 40), cast(BInt, 2)) == 42
+    assert f(0) == 0
+    assert BFunc9.cif_cache_info == (2, 3, 8, 3)
+    # fill the cache; the least recently used entry is evicted
+    for n in range(3, 9):
+        assert f(n, *[cast(BInt, 1)] * n) == n
+    assert BFunc9.cif_cache_info == (2, 9, 8, 8)
+    assert f(1, cast(BInt, 42)) == 42      # evicted, so a miss again
+    assert f(0) == 0
+    assert BFunc9.cif_cache_info == (3, 10, 8, 8)
+    # errors in the variadic part don't change the counters
+    py.test.raises(TypeError, f, 1, 42)
+    assert BFunc9.cif_cache_info == (3, 10, 8, 8)
+
 def test_call_function_24():
     BFloat = new_primitive_type("float")
     BFloatComplex = new_primitive_type("float _Complex")
@@ -1325,6 +1430,23 @@ def test_callback():
     e = py.test.raises(TypeError, f)
     assert str(e.value) == "'int(*)(int)' expects 1 arguments, got 0"
 
+def test_callback_reentrant_call_with_arrays():
+    # the exchange buffers and the temporary arrays of the outer calls
+    # must not be overwritten by the nested calls
+    BInt = new_primitive_type("int")
+    BIntP = new_pointer_type(BInt)
+    BFunc = new_function_type((BIntP, BInt, BInt), BInt, False)
+    def cb(p, n, depth):
+        before = [p[i] for i in range(n)]
+        if depth > 0:
+            for size in [3, 200, 5000, 20000]:
+                assert f(list(range(size)), size, depth - 1) == sum(range(size))
+        assert [p[i] for i in range(n)] == before
+        return sum(before)
+    f = callback(BFunc, cb)
+    for size in [2, 300, 10000]:
+        assert f([-i for i in range(size)], size, 2) == -sum(range(size))
+
 def test_callback_exception():
     try:
         import cStringIO
@@ -1518,6 +1640,21 @@ def test_a_lot_of_callbacks():
     for i, f in enumerate(flist):
         assert f(-142) == -142 + i
 
+def test_callback_number_of_arguments():
+    BInt = new_primitive_type("int")
+    class Summer(object):
+        def sum(self, *args):
+            return sum(args) + len(args) * 1000
+    summer = Summer()
+    for n in [0, 1, 7, 8, 9, 20]:
+        BFunc = new_function_type((BInt,) * n, BInt, False)
+        f = callback(BFunc, summer.sum)     # a bound method
+        assert f(*range(n)) == sum(range(n)) + n * 1000
+        f = callback(BFunc, lambda *args: args[-1] // args[0], -1)
+        if n > 0:
+            assert f(*range(n)) == -1    # ZeroDivisionError
+            assert f(*range(1, n + 1)) == n
+
 def test_callback_receiving_tiny_struct():
     BSChar = new_primitive_type("signed char")
     BInt = new_primitive_type("int")
@@ -4573,3 +4710,1029 @@ def test_unaligned_types():
         assert pbuf1[0] == num
         assert buf[0] == b'\x00'
         assert buf[1 + size] == b'\x00'
+
+def test_call_function_vectorcall_paths():
+    BInt = new_primitive_type("int")
+    BLong = new_primitive_type("long")
+    BFunc1 = new_function_type((BInt, BLong), BLong, False)
+    f = cast(BFunc1, _testfunc(1))
+    assert f(40, 2) == 42
+    assert f(*(40, 2)) == 42
+    assert f.__call__(40, 2) == 42     # always goes via tp_call
+    e = py.test.raises(TypeError, f, 40, b=2)
+    assert str(e.value) == (
+        "a cdata function cannot be called with keyword arguments")
+    e = py.test.raises(TypeError, f.__call__, 40, b=2)
+    assert str(e.value) == (
+        "a cdata function cannot be called with keyword arguments")
+    e = py.test.raises(TypeError, f, 40)
+    assert str(e.value) == "'long(*)(int, long)' expects 2 arguments, got 1"
+    # the same function pointer, but returned by ffi.gc()
+    g = gcp(f, lambda x: None)
+    assert g(40, 2) == 42
+    # cdata objects that are not function pointers are not callable
+    p = cast(new_pointer_type(BInt), 0)
+    e = py.test.raises(TypeError, p)
+    assert str(e.value) == "cdata 'int *' is not callable"
+    e = py.test.raises(TypeError, type(f).__call__, p)
+    assert str(e.value) == "cdata 'int *' is not callable"
+    # null function pointer
+    h = cast(BFunc1, 0)
+    e = py.test.raises(RuntimeError, h, 40, 2)
+    assert str(e.value) == ("cannot call null pointer pointer from cdata "
+                            "'long(*)(int, long)'")
+
+def test_call_many():
+    import array
+    BInt = new_primitive_type("int")
+    BLong = new_primitive_type("long")
+    BFunc1 = new_function_type((BInt, BLong), BLong, False)
+    f = cast(BFunc1, _testfunc(1))
+    BIntArray = new_array_type(new_pointer_type(BInt), None)
+    BLongArray = new_array_type(new_pointer_type(BLong), None)
+    a = newp(BIntArray, [1, 2, 3, 4])
+    b = array.array('l', [10, 20, 30, 40])
+    res = call_many(f, a, b)
+    assert typeof(res) is new_array_type(new_pointer_type(BLong), None)
+    assert list(res) == [11, 22, 33, 44]
+    # 'out' can be a cdata array or a writable buffer
+    out = newp(BLongArray, 4)
+    assert call_many(f, a, b, out=out) is out
+    assert list(out) == [11, 22, 33, 44]
+    out = array.array('l', [0] * 4)
+    assert call_many(f, array.array('i', [5, 6, 7, 8]), b, out=out) is out
+    assert list(out) == [15, 26, 37, 48]
+    # empty buffers
+    assert len(call_many(f, newp(BIntArray, 0), array.array('l'))) == 0
+    # float and double arguments
+    BFloat = new_primitive_type("float")
+    BDouble = new_primitive_type("double")
+    BFunc3 = new_function_type((BFloat, BDouble), BDouble, False)
+    f3 = cast(BFunc3, _testfunc(3))
+    res = call_many(f3, array.array('f', [1.25, 2.5]),
+                    memoryview(array.array('d', [5.5, 0.25])))
+    assert list(res) == [6.75, 2.75]
+    # small integer results
+    BChar = new_primitive_type("char")
+    BFunc0 = new_function_type((BChar, BChar), BChar, False)
+    f0 = cast(BFunc0, _testfunc(0))
+    res = call_many(f0, bytearray(b'ABC'), bytearray(b'\x20\x01\x00'))
+    assert list(res) == [b'a', b'C', b'C']
+
+def test_call_many_errors():
+    import array
+    BInt = new_primitive_type("int")
+    BLong = new_primitive_type("long")
+    BFunc1 = new_function_type((BInt, BLong), BLong, False)
+    f = cast(BFunc1, _testfunc(1))
+    a = array.array('i', [1, 2, 3])
+    b = array.array('l', [10, 20, 30])
+    e = py.test.raises(TypeError, call_many, f, a)
+    assert str(e.value) == ("call_many(): 'long(*)(int, long)' expects "
+                            "2 buffers, got 1")
+    e = py.test.raises(ValueError, call_many, f, a, b[:2])
+    assert str(e.value) == ("call_many(): a buffer argument has length 2, "
+                            "expected 3")
+    e = py.test.raises(ValueError, call_many, f, a, b,
+                       out=array.array('l', [0]))
+    assert str(e.value) == "call_many(): 'out' has length 1, expected 3"
+    e = py.test.raises(TypeError, call_many, f, b, b)
+    assert "expected a buffer of 'int'" in str(e.value)
+    py.test.raises(BufferError, call_many, f, a, b, out=b"xxxxxxxxxxxx")
+    py.test.raises(TypeError, call_many, f, a, b, foo=b)
+    py.test.raises(TypeError, call_many, 42, a, b)
+    BIntArray = new_array_type(new_pointer_type(BInt), None)
+    e = py.test.raises(TypeError, call_many, f, newp(BIntArray, 3),
+                       newp(BIntArray, 3))
+    assert str(e.value) == "expected an array of 'long', got cdata 'int[]'"
+    BFunc9 = new_function_type((BInt,), BInt, True)
+    e = py.test.raises(TypeError, call_many, cast(BFunc9, _testfunc(9)), a)
+    assert "must be a non-variadic function" in str(e.value)
+    BVoid = new_void_type()
+    BFunc5 = new_function_type((), BVoid, False)
+    f5 = cast(BFunc5, _testfunc(5))
+    e = py.test.raises(TypeError, call_many, f5)
+    assert "so 'out' must be given" in str(e.value)
+    e = py.test.raises(TypeError, call_many, f5, out=b)
+    assert "returns void" in str(e.value)
+
+def test_call_stats():
+    BInt = new_primitive_type("int")
+    BLong = new_primitive_type("long")
+    BFunc1 = new_function_type((BInt, BLong), BLong, False)
+    f = cast(BFunc1, _testfunc(1))
+    name = '0x%x' % int(cast(new_primitive_type("intptr_t"), f))
+    call_stats(reset=True)
+    f(40, 2)
+    assert name not in call_stats()
+    enable_call_stats()
+    try:
+        for i in range(5):
+            assert f(40, i) == 40 + i
+        py.test.raises(OverflowError, f, 40, 1 << 100)  # not recorded
+    finally:
+        enable_call_stats(False)
+    f(40, 2)
+    stats = call_stats()
+    # _testfunc1() is a static function: dladdr() cannot find its name
+    assert name in stats
+    calls, call_time, conversion_time = stats[name]
+    assert calls == 5
+    assert 0.0 <= call_time < 10.0
+    assert 0.0 <= conversion_time < 10.0
+    stats = call_stats(reset=True)
+    assert stats[name][0] == 5
+    assert name not in call_stats()
+
+def test_callback_pool():
+    BInt = new_primitive_type("int")
+    BFunc = new_function_type((BInt,), BInt, False)
+    def cb(n):
+        return n + 1
+    stats = callback_pool_stats()
+    assert sorted(stats) == ['free', 'in_use', 'pages']
+    if stats['pages'] == 0 and stats['in_use'] == 0:
+        c = callback(BFunc, cb)
+        if callback_pool_stats()['in_use'] == 0:
+            py.test.skip("callbacks are allocated by libffi")
+        del c
+    trim_callback_pool()
+    stats = callback_pool_stats()
+    assert stats['free'] == 0 or stats['pages'] > 0
+    in_use = stats['in_use']
+    reserve_callbacks(stats['free'] + 1000)
+    stats = callback_pool_stats()
+    assert stats['free'] >= 1000
+    pages = stats['pages']
+    callbacks = [callback(BFunc, cb) for i in range(1000)]
+    stats = callback_pool_stats()
+    assert stats['in_use'] == in_use + 1000
+    assert stats['pages'] == pages     # no more memory was requested
+    assert callbacks[-1](41) == 42
+    del callbacks
+    import gc; gc.collect()
+    assert callback_pool_stats()['in_use'] == in_use
+    assert trim_callback_pool(keep=1000) == 0
+    assert callback_pool_stats()['pages'] == pages
+    released = trim_callback_pool()
+    stats = callback_pool_stats()
+    assert released > 0
+    assert stats['pages'] == pages - released
+    assert stats['in_use'] == in_use
+    # the remaining free callbacks can still be used
+    c = callback(BFunc, cb)
+    assert c(5) == 6
+
+def test_callback_queue():
+    BInt = new_primitive_type("int")
+    BDouble = new_primitive_type("double")
+    BStruct = new_struct_type("struct foo")
+    complete_struct_or_union(BStruct, [('a', BInt, -1), ('b', BDouble, -1)])
+    BFunc = new_function_type((BInt, BStruct, BDouble), BInt, False)
+    seen = []
+    def cb(n, s, x):
+        seen.append((n, s.a, s.b, x))
+        return 42      # ignored
+    q = new_callback_queue(size=5)
+    assert q.size == 8
+    assert q.item_size == 64
+    assert len(q) == 0
+    f = callback(BFunc, cb, -1, None, q)
+    s = newp(new_pointer_type(BStruct), [10, 2.5])
+    for i in range(3):
+        assert f(i, s[0], i * 0.5) == -1
+    assert seen == []
+    assert len(q) == 3
+    assert q.drain() == 3
+    assert seen == [(0, 10, 2.5, 0.0), (1, 10, 2.5, 0.5), (2, 10, 2.5, 1.0)]
+    assert q.drain() == 0
+    # when the queue is full, the events are dropped
+    del seen[:]
+    for i in range(10):
+        f(i, s[0], 0.0)
+    assert len(q) == 8
+    assert q.dropped == 2
+    assert q.drain(max=3) == 3
+    assert q.drain() == 5
+    assert [n for (n, _, _, _) in seen] == list(range(8))
+    # exceptions propagate out of drain(), and the rest stays queued
+    def raising(n, s, x):
+        if n == 1:
+            raise ValueError(n)
+        seen.append(n)
+    del seen[:]
+    g = callback(BFunc, raising, 0, None, q)
+    for i in range(3):
+        g(i, s[0], 0.0)
+    py.test.raises(ValueError, q.drain)
+    assert seen == [0]
+    assert q.drain() == 1
+    assert seen == [0, 2]
+    py.test.raises(ValueError, q.fileno)
+
+def test_callback_queue_errors():
+    BInt = new_primitive_type("int")
+    BFunc = new_function_type((BInt, BInt), BInt, False)
+    def cb(a, b):
+        pass
+    q = new_callback_queue(item_size=4)
+    assert q.item_size == 16
+    e = py.test.raises(ValueError, callback, BFunc, cb, 0,
+                       lambda *args: 0, q)
+    assert "'onerror'" in str(e.value)
+    py.test.raises(TypeError, callback, BFunc, cb, 0, None, 42)
+    BFunc5 = new_function_type((BInt,) * 5, BInt, False)
+    e = py.test.raises(ValueError, callback, BFunc5, cb, 0, None, q)
+    assert str(e.value) == ("int(*)(int, int, int, int, int): the arguments "
+                            "need 20 bytes, but the queue was created with "
+                            "item_size=16")
+    py.test.raises(ValueError, new_callback_queue, 0)
+
+def test_callback_queue_notify():
+    if sys.platform == 'win32':
+        py.test.skip("notify=True is not supported on Windows")
+    import os, select
+    BInt = new_primitive_type("int")
+    BFunc = new_function_type((BInt,), new_void_type(), False)
+    seen = []
+    q = new_callback_queue(notify=True)
+    f = callback(BFunc, seen.append, None, None, q)
+    fd = q.fileno()
+    assert select.select([fd], [], [], 0)[0] == []
+    f(5)
+    f(6)
+    assert select.select([fd], [], [], 0)[0] == [fd]
+    assert q.drain() == 2
+    assert seen == [5, 6]
+    assert select.select([fd], [], [], 0)[0] == []
+
+def test_handle_table():
+    import _weakref
+    BVoidP = new_pointer_type(new_void_type())
+    BCharP = new_pointer_type(new_primitive_type("char"))
+    class A(object):
+        pass
+    t = new_handle_table(BVoidP)
+    assert len(t) == 0
+    a, b = A(), A()
+    ha = t.add(a)
+    hb = t.add(b)
+    assert typeof(ha) is BVoidP
+    assert ha and hb and ha != hb
+    assert len(t) == 2
+    assert t.get(ha) is a
+    assert t.get(cast(BCharP, hb)) is b
+    assert t.get(int(cast(new_primitive_type("uintptr_t"), hb))) is b
+    assert t.remove(ha) is a
+    assert len(t) == 1
+    # stale handles are detected, even when the entry is reused
+    e = py.test.raises(ValueError, t.get, ha)
+    assert "not in the handle table" in str(e.value)
+    py.test.raises(ValueError, t.remove, ha)
+    hc = t.add(a)
+    assert hc != ha
+    py.test.raises(ValueError, t.get, ha)
+    assert t.get(hc) is a
+    # invalid handles
+    py.test.raises(ValueError, t.get, cast(BVoidP, 0))
+    py.test.raises(ValueError, t.get, cast(BVoidP, 12345))
+    py.test.raises(ValueError, t.get, -1)
+    py.test.raises(TypeError, t.get, "foo")
+    py.test.raises(ValueError, new_handle_table(BVoidP).get, hc)
+    # the table keeps the objects alive, until clear()
+    wr = _weakref.ref(a)
+    del a
+    import gc; gc.collect()
+    assert wr() is not None
+    t.clear()
+    assert len(t) == 0
+    gc.collect()
+    assert wr() is None
+    py.test.raises(ValueError, t.get, hb)
+    py.test.raises(ValueError, t.get, hc)
+    py.test.raises(TypeError, new_handle_table, BCharP)
+
+def test_handle_table_many():
+    BVoidP = new_pointer_type(new_void_type())
+    t = new_handle_table(BVoidP, 100)
+    handles = [t.add(i) for i in range(10000)]
+    assert len(set(handles)) == 10000
+    for i in range(0, 10000, 2):
+        assert t.remove(handles[i]) == i
+    for i in range(10000):
+        if i % 2:
+            assert t.get(handles[i]) == i
+        else:
+            py.test.raises(ValueError, t.get, handles[i])
+    assert len(t) == 5000
+
+def test_handle_table_cycle():
+    import _weakref
+    BVoidP = new_pointer_type(new_void_type())
+    class A(object):
+        pass
+    o = A()
+    o.table = new_handle_table(BVoidP)
+    o.handle = o.table.add(o)
+    wr = _weakref.ref(o)
+    del o
+    for i in range(3):
+        if wr() is not None:
+            import gc; gc.collect()
+    assert wr() is None
+
+def test_arena():
+    BInt = new_primitive_type("int")
+    BIntP = new_pointer_type(BInt)
+    BIntArray = new_array_type(BIntP, None)
+    BStruct = new_struct_type("struct foo")
+    BStructPtr = new_pointer_type(BStruct)
+    complete_struct_or_union(BStruct, [('a1', BInt, -1),
+                                       ('a2', BInt, -1)])
+    a = new_arena(1000)
+    assert a.used == 0
+    p = a.new(BStructPtr, [5, 6])
+    assert typeof(p) is BStructPtr
+    assert p.a1 == 5 and p.a2 == 6
+    q = a.new(BIntArray, 10)
+    assert len(q) == 10
+    assert list(q) == [0] * 10
+    r = a.new(BIntP, 42)
+    assert r[0] == 42
+    assert a.used >= sizeof(BStruct) + 11 * sizeof(BInt)
+    used = a.used
+    big = a.new(BIntArray, 5000)       # doesn't fit in the capacity
+    assert big[4999] == 0
+    big[4999] = 7
+    assert a.used >= used + 5000 * sizeof(BInt)
+    del p, q, r, big
+    a.release()
+    assert a.used == 0
+    # the first block is reused, and cleared again
+    p = a.new(BStructPtr)
+    assert p.a1 == 0 and p.a2 == 0
+    py.test.raises(TypeError, a.new, "struct foo *")
+    py.test.raises(TypeError, a.new, BInt)
+    py.test.raises(ValueError, new_arena, 0)
+
+def test_arena_with_and_keepalive():
+    BInt = new_primitive_type("int")
+    BIntArray = new_array_type(new_pointer_type(BInt), None)
+    seen = []
+    a = new_arena(typeof=lambda cdecl: seen.append(cdecl) or BIntArray)
+    with a:
+        p = a.new("int[]", [1, 2, 3])
+        assert list(p) == [1, 2, 3]
+        assert seen == ["int[]"]
+        assert a.used >= 3 * sizeof(BInt)
+    assert a.used == 0
+    del p
+    rc = sys.getrefcount(a)
+    p = a.new(BIntArray, 3)
+    assert sys.getrefcount(a) == rc + 1     # 'p' keeps the arena alive
+    del p
+    assert sys.getrefcount(a) == rc
+
+def test_arena_debug():
+    BInt = new_primitive_type("int")
+    BIntArray = new_array_type(new_pointer_type(BInt), None)
+    a = new_arena(100, debug=True)
+    p = a.new(BIntArray, 10)
+    p[9] = 42
+    a.release()
+    # the memory is not reused
+    q = a.new(BIntArray, 10)
+    assert list(q) == [0] * 10
+    assert cast(new_primitive_type("intptr_t"), q) != \
+           cast(new_primitive_type("intptr_t"), p)
+
+def test_arena_debug_use_after_release():
+    import os, subprocess, _cffi_backend
+    if sys.platform == 'win32':
+        py.test.skip("posix-only test")
+    # using a cdata after release() crashes, even if it is at the start
+    # of the block or if the block is only one page
+    for capacity in [1 << 20, 100]:
+        src = '''if 1:
+            from _cffi_backend import *
+            BInt = new_primitive_type("int")
+            a = new_arena(%d, debug=True)
+            p = a.new(new_pointer_type(BInt), 5)
+            assert p[0] == 5
+            a.release()
+            print(p[0])
+        ''' % (capacity,)
+        env = os.environ.copy()
+        env['PYTHONPATH'] = os.path.dirname(_cffi_backend.__file__)
+        popen = subprocess.Popen([sys.executable, '-c', src], env=env,
+                                 stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE)
+        out, err = popen.communicate()
+        assert popen.returncode < 0      # killed by a signal
+        assert out == b''
+
+def test_freelists():
+    BInt = new_primitive_type("int")
+    BIntP = new_pointer_type(BInt)
+    BChar = new_primitive_type("char")
+    BCharP = new_pointer_type(BChar)
+    BStruct = new_struct_type("struct foo")
+    BStructPtr = new_pointer_type(BStruct)
+    complete_struct_or_union(BStruct, [('a1', BInt, -1),
+                                       ('a2', BIntP, -1)])
+    old_size = set_freelist_size(100)
+    try:
+        p = newp(BIntP, 42)
+        q = p + 1          # a CData_Type object
+        del p, q
+        freelist_stats(reset=True)
+        for i in range(1000):
+            p = newp(BIntP, i)
+            q = p + 1
+            assert q - p == 1 and p[0] == i
+            s = newp(BStructPtr, [i, p])
+            assert s.a1 == i and s.a2 == p
+            c = newp(BCharP, b"x")
+            assert c[0] == b"x"
+        del p, q, s, c
+        p = newp(BIntP)
+        assert p[0] == 0       # reused memory is cleared too
+        del p
+        stats = freelist_stats()
+        assert stats['hits'] > 0.9 * (stats['hits'] + stats['misses'])
+        assert stats['cached'] > 0
+        assert stats['size'] == 100
+        # disabling them releases the cached objects
+        assert set_freelist_size(0) == 100
+        assert freelist_stats()['cached'] == 0
+        p = newp(BIntP)
+        del p
+        assert freelist_stats()['cached'] == 0
+        py.test.raises(ValueError, set_freelist_size, -1)
+    finally:
+        set_freelist_size(old_size)
+
+def test_new_many():
+    BInt = new_primitive_type("int")
+    BIntP = new_pointer_type(BInt)
+    BStruct = new_struct_type("struct foo")
+    BStructPtr = new_pointer_type(BStruct)
+    complete_struct_or_union(BStruct, [('a1', BInt, -1),
+                                       ('a2', BStructPtr, -1)])
+    lst = new_many(BStructPtr, 100, [[1], [2, cast(BStructPtr, 0)]])
+    assert type(lst) is list and len(lst) == 100
+    assert [typeof(p) for p in lst] == [BStructPtr] * 100
+    assert [p.a1 for p in lst[:3]] == [1, 2, 0]
+    # all in one block of memory
+    BIntPtr = new_primitive_type("intptr_t")
+    addr0 = int(cast(BIntPtr, lst[0]))
+    for i in range(100):
+        assert int(cast(BIntPtr, lst[i])) == addr0 + i * sizeof(BStruct)
+    for i in range(99):
+        lst[i].a2 = lst[i + 1]
+    # the block stays alive as long as one pointer is alive
+    last = lst[-1]
+    first = lst[50]
+    del lst
+    import gc; gc.collect()
+    p = first
+    for i in range(49):
+        p = p.a2
+    assert p == last
+    last.a1 = 42
+    assert p.a1 == 42
+    #
+    ints = new_many(BIntP, 3, [7, 8])
+    assert [p[0] for p in ints] == [7, 8, 0]
+    assert new_many(BIntP, 0) == []
+    py.test.raises(IndexError, new_many, BIntP, 2, [1, 2, 3])
+    py.test.raises(ValueError, new_many, BIntP, -1)
+    py.test.raises(TypeError, new_many, BInt, 5)
+
+def test_memory_stats():
+    BInt = new_primitive_type("int")
+    BIntP = new_pointer_type(BInt)
+    BIntArray = new_array_type(BIntP, None)
+    BVoidP = new_pointer_type(new_void_type())
+    start = memory_stats()
+    p = newp(BIntArray, 1000)
+    stats = memory_stats()
+    assert stats['objects'] == start['objects'] + 1
+    assert stats['bytes'] >= start['bytes'] + 4000
+    objects, nbytes = stats['by_type']['int[]']
+    assert objects >= 1 and nbytes >= 4000
+    q = gcp(cast(BVoidP, 12345), lambda x: None, 50000)
+    stats = memory_stats()
+    assert stats['bytes'] >= start['bytes'] + 54000
+    assert stats['by_type']['void *'][1] >= 50000
+    gcp(q, None)        # no longer owned
+    assert memory_stats()['bytes'] < start['bytes'] + 54000
+    del p, q
+    assert memory_stats()['objects'] == start['objects']
+    assert memory_stats()['bytes'] == start['bytes']
+
+def test_memory_stats_struct_ptr():
+    BInt = new_primitive_type("int")
+    BStruct = new_struct_type("struct memstats_s")
+    BStructPtr = new_pointer_type(BStruct)
+    complete_struct_or_union(BStruct, [('a', BInt, -1), ('b', BInt, -1)])
+    start = memory_stats()
+    p = newp(BStructPtr)
+    stats = memory_stats()
+    assert stats['objects'] == start['objects'] + 1
+    assert stats['bytes'] == start['bytes'] + sizeof(BStruct)
+    assert stats['by_type']['struct memstats_s'] == (1, sizeof(BStruct))
+    assert 'struct memstats_s *' not in stats['by_type']
+    del p
+    assert memory_stats()['objects'] == start['objects']
+    assert memory_stats()['bytes'] == start['bytes']
+
+def test_memory_stats_tracemalloc():
+    tracemalloc = pytest.importorskip("tracemalloc")
+    if sys.version_info < (3, 7):
+        py.test.skip("PyTraceMalloc_Track() is new in Python 3.7")
+    BChar = new_primitive_type("char")
+    BCharArray = new_array_type(new_pointer_type(BChar), None)
+    domain = memory_stats()['tracemalloc_domain']
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    try:
+        p = newp(BCharArray, 123456)
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.DomainFilter(True, domain)])
+        sizes = [trace.size for trace in snapshot.traces]
+        assert max(sizes) >= 123456
+        del p
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.DomainFilter(True, domain)])
+        assert all(trace.size < 123456 for trace in snapshot.traces)
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+def test_memory_pressure():
+    import gc
+    BVoidP = new_pointer_type(new_void_type())
+    class Cycle(object):
+        pass
+    freed = []
+    assert set_memory_pressure_threshold(1000000) == 0
+    try:
+        start = memory_stats()['gc_collections']
+        for i in range(10):
+            x = Cycle()
+            x.x = x     # only freed by the GC
+            x.p = gcp(cast(BVoidP, 123), freed.append, 300000)
+            del x
+        stats = memory_stats()
+        assert stats['gc_collections'] - start in (2, 3)
+        assert stats['pressure'] < 1000000
+        assert len(freed) >= 6
+        #
+        gc.disable()
+        try:
+            x = gcp(cast(BVoidP, 123), freed.append, 5000000)
+            assert memory_stats()['gc_collections'] == stats['gc_collections']
+            del x
+        finally:
+            gc.enable()
+    finally:
+        assert set_memory_pressure_threshold(0) == 1000000
+    py.test.raises(ValueError, set_memory_pressure_threshold, -1)
+    gc.collect()
+
+def test_gc_defer():
+    BVoidP = new_pointer_type(new_void_type())
+    seen = []
+    run_deferred_gc()
+    deferred_gc_stats(reset=True)
+    p = gcp(cast(BVoidP, 42), seen.append, defer=True)
+    q = gcp(cast(BVoidP, 43), seen.append, defer=True)
+    del p, q
+    # the queue is run at the next safe point, or by the thread
+    for i in range(1000):
+        if len(seen) == 2:
+            break
+        sum(range(100))
+    assert len(seen) == 2
+    assert cast(BVoidP, 42) in seen and cast(BVoidP, 43) in seen
+    assert run_deferred_gc() == 0
+    stats = deferred_gc_stats(reset=True)
+    assert stats['queued'] == 0 and stats['run'] == 2
+    assert stats['max_queued'] >= 1
+    assert stats['max_lag'] >= 0 and stats['total_lag'] >= stats['max_lag']
+    assert deferred_gc_stats()['run'] == 0
+    #
+    # ffi.release() calls the destructor immediately
+    p = gcp(cast(BVoidP, 44), seen.append, defer=True)
+    release(p)
+    assert len(seen) == 3
+    assert deferred_gc_stats()['queued'] == 0
+
+def test_gc_defer_at_exit():
+    import os, subprocess, _cffi_backend
+    # the queue is run at exit, and the objects freed later (like the
+    # module globals) are not deferred at all
+    for start_thread in [False, True]:
+        src = '''if 1:
+            import os
+            from _cffi_backend import *
+            BVoidP = new_pointer_type(new_void_type())
+            def d(p):
+                os.write(1, ("%%d\\n" %% int(cast(new_primitive_type(
+                    "intptr_t"), p))).encode('ascii'))
+            if %r:
+                start_deferred_gc_thread()
+            p = gcp(cast(BVoidP, 42), d, defer=True)
+            del p
+            x = gcp(cast(BVoidP, 43), d, defer=True)
+        ''' % (start_thread,)
+        env = os.environ.copy()
+        env['PYTHONPATH'] = os.path.dirname(_cffi_backend.__file__)
+        popen = subprocess.Popen([sys.executable, '-c', src], env=env,
+                                 stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE)
+        out, err = popen.communicate()
+        assert popen.returncode == 0
+        assert sorted(out.split()) == [b'42', b'43']
+
+def test_new_mapped():
+    BInt = new_primitive_type("int")
+    BIntArray = new_array_type(new_pointer_type(BInt), None)
+    start = memory_stats()['bytes']
+    p = new_mapped(BIntArray, 10**8, advice=("hugepage", "dontdump"))
+    assert len(p) == 10**8
+    assert p[0] == p[12345678] == p[10**8 - 1] == 0
+    p[12345678] = 42
+    assert p[12345678] == 42
+    assert memory_stats()['bytes'] >= start + 4 * 10**8
+    release(p)
+    assert memory_stats()['bytes'] == start
+    q = new_mapped(BIntArray, [5, 6, 7], advice="sequential")
+    assert list(q) == [5, 6, 7]
+    py.test.raises(ValueError, new_mapped, BIntArray, 10, advice="foo")
+    py.test.raises(TypeError, new_mapped, BIntArray, 10, advice=[42])
+
+def test_mmap_threshold():
+    BInt = new_primitive_type("int")
+    BIntArray = new_array_type(new_pointer_type(BInt), None)
+    BIntPtr = new_pointer_type(BInt)
+    assert set_mmap_threshold(100000, advice="hugepage") == 0
+    try:
+        p = newp(BIntArray, 100000)
+        assert repr(p).startswith("<cdata 'int[]' sliced length 100000>")
+        assert p[99999] == 0
+        q = newp(BIntArray, 1000)
+        assert repr(q) == "<cdata 'int[]' owning 4000 bytes>"
+        r = newp(BIntPtr)
+        assert repr(r) == "<cdata 'int *' owning 4 bytes>"
+    finally:
+        assert set_mmap_threshold(0) == 100000
+    p = newp(BIntArray, 100000)
+    assert repr(p) == "<cdata 'int[]' owning 400000 bytes>"
+
+def test_map_file(tmpdir):
+    BInt = new_primitive_type("int")
+    BIntP = new_pointer_type(BInt)
+    BIntArray = new_array_type(BIntP, None)
+    BStruct = new_struct_type("struct rec")
+    complete_struct_or_union(BStruct, [('a', BInt, -1), ('b', BInt, -1)])
+    BStructArray = new_array_type(new_pointer_type(BStruct), None)
+    data = newp(BIntArray, list(range(10000)))
+    fn = str(tmpdir.join('test_map_file'))
+    with open(fn, 'wb') as f:
+        f.write(buffer(data))
+    #
+    p = map_file(BIntArray, fn, advice=["sequential", "willneed"])
+    assert len(p) == 10000
+    assert p[0] == 0 and p[9999] == 9999
+    q = map_file(BStructArray, fn, offset=4 * 5001, length=4 * 9)
+    assert len(q) == 4     # the last partial item is ignored
+    assert (q[0].a, q[0].b, q[3].b) == (5001, 5002, 5008)
+    with open(fn, 'rb') as f:
+        r = map_file(BIntP, f, offset=8)
+        assert r[0] == 2
+        r = map_file(new_array_type(BIntP, 5), f.fileno(), length=20)
+        assert list(r) == [0, 1, 2, 3, 4]
+    #
+    c = map_file(BIntArray, fn, mode='c')
+    c[5] = -5
+    assert c[5] == -5 and p[5] == 5
+    w = map_file(BIntArray, fn, mode='w', offset=4 * 6000)
+    w[1] = -6001
+    msync(w)
+    msync(w, wait=False)
+    release(w)
+    py.test.raises(ValueError, msync, w)
+    assert p[6001] == -6001
+    with open(fn, 'rb') as f:
+        f.seek(4 * 6001)
+        assert f.read(4) == bytes(buffer(newp(BIntP, -6001)))
+    #
+    py.test.raises(TypeError, msync, data)
+    py.test.raises(ValueError, map_file, BIntArray, fn, mode='x')
+    py.test.raises(ValueError, map_file, BIntArray, fn, offset=40001)
+    py.test.raises(ValueError, map_file, BIntArray, fn, length=40001)
+    py.test.raises(ValueError, map_file, BIntArray, fn, offset=40000)
+    py.test.raises(ValueError, map_file, new_array_type(BIntP, 10001), fn)
+    py.test.raises(TypeError, map_file, BInt, fn)
+    BBig = new_struct_type("struct big")
+    complete_struct_or_union(BBig, [('a', new_array_type(BIntP, 20), -1)])
+    e = py.test.raises(ValueError, map_file, new_pointer_type(BBig), fn,
+                       length=16)
+    assert str(e.value) == ("range is too small (16 bytes) for "
+                            "'struct big' (80 bytes)")
+    BOpaque = new_struct_type("struct opaque")
+    py.test.raises(ValueError, map_file, new_pointer_type(BOpaque), fn)
+    py.test.raises(ValueError, map_file, new_pointer_type(new_void_type()),
+                   fn)
+    py.test.raises(OSError, map_file, BIntArray, fn + '.missing')
+
+def test_buffer_format():
+    if sys.version_info < (3,):
+        py.test.skip("memoryview.format and shape are only on Python 3")
+    BChar = new_primitive_type("char")
+    BShort = new_primitive_type("short")
+    BInt = new_primitive_type("int")
+    BUInt8 = new_primitive_type("uint8_t")
+    BDouble = new_primitive_type("double")
+    BIntP = new_pointer_type(BInt)
+    #
+    p = newp(new_array_type(BIntP, None), [5, 6, 7])
+    m = memoryview(buffer(p))
+    assert m.format == 'i' and m.itemsize == 4
+    assert m.shape == (3,) and m.strides == (4,) and m.nbytes == 12
+    assert m.tolist() == [5, 6, 7]
+    m[1] = -66
+    assert p[1] == -66
+    m = memoryview(buffer(p, 6))     # not a multiple of the item size
+    assert m.format == 'B' and m.shape == (6,)
+    assert len(bytes(buffer(p))) == 12
+    #
+    p = newp(new_array_type(new_pointer_type(BDouble), None), [1.5, 2.5])
+    assert memoryview(buffer(p)).tolist() == [1.5, 2.5]
+    p = newp(new_pointer_type(BUInt8), 200)
+    assert memoryview(buffer(p)).tolist() == [200]
+    # 'char' stays as bytes
+    p = newp(new_array_type(new_pointer_type(BChar), None), b"hi")
+    m = memoryview(buffer(p))
+    assert m.format == 'B' and m.tolist() == [104, 105, 0]
+    # multidimensional arrays
+    BArray3 = new_array_type(new_pointer_type(BShort), 3)
+    p = newp(new_array_type(new_pointer_type(BArray3), 2), [[1, 2, 3],
+                                                            [4, 5, 6]])
+    m = memoryview(buffer(p))
+    assert m.format == 'h' and m.shape == (2, 3) and m.strides == (6, 2)
+    assert m.tolist() == [[1, 2, 3], [4, 5, 6]]
+    #
+    BStruct = new_struct_type("struct foo")
+    BInner = new_struct_type("struct inner")
+    complete_struct_or_union(BInner, [('x', BShort, -1)])
+    complete_struct_or_union(BStruct, [('a', BInt, -1),
+                                       ('b', BDouble, -1),
+                                       ('c', new_array_type(
+                                           new_pointer_type(BChar), 3), -1),
+                                       ('s', BInner, -1)])
+    p = newp(new_array_type(new_pointer_type(BStruct), None), 2)
+    m = memoryview(buffer(p))
+    if alignof(BDouble) == 8 and alignof(BInt) == 4:
+        assert m.format == 'T{=i:a:4x=d:b:(3)=c:c:1xT{=h:x:}:s:2x}'
+    assert m.itemsize == sizeof(BStruct) and m.shape == (2,)
+    # no format for unions and bitfields
+    BUnion = new_union_type("union bar")
+    complete_struct_or_union(BUnion, [('a', BInt, -1), ('b', BShort, -1)])
+    p = newp(new_array_type(new_pointer_type(BUnion), None), 2)
+    assert memoryview(buffer(p)).format == 'B'
+    BStruct = new_struct_type("struct bits")
+    complete_struct_or_union(BStruct, [('a', BInt, 3)])
+    p = newp(new_array_type(new_pointer_type(BStruct), None), 2)
+    assert memoryview(buffer(p)).format == 'B'
+
+def test_to_dtype_from_dtype():
+    numpy = pytest.importorskip("numpy")
+    BChar = new_primitive_type("char")
+    BShort = new_primitive_type("short")
+    BInt = new_primitive_type("int")
+    BDouble = new_primitive_type("double")
+    BBool = new_primitive_type("_Bool")
+    assert to_dtype(BInt) == numpy.dtype('i%d' % sizeof(BInt))
+    assert to_dtype(new_primitive_type("unsigned short")) == numpy.uint16
+    assert to_dtype(BDouble) == numpy.float64
+    assert to_dtype(BBool) == numpy.bool_
+    assert to_dtype(BChar) == numpy.dtype('S1')
+    assert to_dtype(new_pointer_type(BInt)).itemsize == sizeof(
+        new_pointer_type(BInt))
+    BArray3 = new_array_type(new_pointer_type(BShort), 3)
+    BArray23 = new_array_type(new_pointer_type(BArray3), 2)
+    assert to_dtype(BArray23) == numpy.dtype((numpy.int16, (2, 3)))
+    py.test.raises(TypeError, to_dtype, new_array_type(new_pointer_type(BInt),
+                                                       None))
+    py.test.raises(TypeError, to_dtype, new_void_type())
+    py.test.raises(TypeError, to_dtype, new_struct_type("struct opaque"))
+    py.test.raises(TypeError, to_dtype, "int")
+    #
+    BInner = new_struct_type("struct inner")
+    complete_struct_or_union(BInner, [('x', BShort, -1)])
+    BStruct = new_struct_type("struct foo")
+    complete_struct_or_union(BStruct, [('a', BInt, -1),
+                                       ('b', BDouble, -1),
+                                       ('c', BArray3, -1),
+                                       ('s', BInner, -1)])
+    dt = to_dtype(BStruct)
+    assert dt.names == ('a', 'b', 'c', 's')
+    assert dt.itemsize == sizeof(BStruct)
+    for name, field in BStruct.fields:
+        assert dt.fields[name][1] == field.offset
+    assert dt['c'] == numpy.dtype((numpy.int16, (3,)))
+    assert dt['s'].names == ('x',)
+    p = newp(new_array_type(new_pointer_type(BStruct), None), 3)
+    p[1].b = 2.5
+    p[2].c[1] = 42
+    p[2].s.x = -7
+    a = numpy.frombuffer(buffer(p), dtype=dt)
+    assert list(a['b']) == [0.0, 2.5, 0.0]
+    assert a['c'][2][1] == 42 and a['s']['x'][2] == -7
+    #
+    BUnion = new_union_type("union u")
+    complete_struct_or_union(BUnion, [('i', BInt, -1), ('d', BDouble, -1)])
+    dt = to_dtype(BUnion)
+    assert dt.fields['i'][1] == dt.fields['d'][1] == 0
+    assert dt.itemsize == sizeof(BUnion)
+    BBitfield = new_struct_type("struct bf")
+    complete_struct_or_union(BBitfield, [('x', BInt, 3)])
+    e = py.test.raises(TypeError, to_dtype, BBitfield)
+    assert str(e.value) == ("field 'struct bf.x' is a bitfield, which cannot"
+                            " be described by a NumPy dtype")
+    # a var-sized array at the end is ignored
+    BVar = new_struct_type("struct var")
+    complete_struct_or_union(BVar, [('n', BInt, -1),
+                                    ('d', new_array_type(
+                                        new_pointer_type(BDouble), None), -1)])
+    dt = to_dtype(BVar)
+    assert dt.names == ('n',) and dt.itemsize == sizeof(BVar)
+
+def test_from_dtype():
+    numpy = pytest.importorskip("numpy")
+    assert repr(from_dtype('i4')) == "<ctype 'int32_t'>"
+    assert repr(from_dtype(numpy.uint8)) == "<ctype 'uint8_t'>"
+    assert repr(from_dtype('f8')) == "<ctype 'double'>"
+    assert repr(from_dtype('?')) == "<ctype '_Bool'>"
+    assert repr(from_dtype('S1')) == "<ctype 'char'>"
+    assert repr(from_dtype('S5')) == "<ctype 'char[5]'>"
+    assert repr(from_dtype('c16')) == "<ctype 'double _Complex'>"
+    assert repr(from_dtype(('i2', (2, 3)))) == "<ctype 'int16_t[2][3]'>"
+    py.test.raises(TypeError, from_dtype, 'O')
+    other = '>i4' if sys.byteorder == 'little' else '<i4'
+    py.test.raises(ValueError, from_dtype, other)
+    #
+    dt = numpy.dtype([('a', 'i4'), ('b', 'f8'), ('c', 'i2', (3,)),
+                      ('s', [('x', 'u1')])], align=True)
+    BStruct = from_dtype(dt, "rec")
+    assert repr(BStruct) == "<ctype 'struct rec'>"
+    assert sizeof(BStruct) == dt.itemsize
+    assert alignof(BStruct) == dt.alignment
+    fields = BStruct.fields
+    assert [(name, field.offset) for name, field in fields] == [
+        (name, dt.fields[name][1]) for name in dt.names]
+    assert repr(fields[2][1].type) == "<ctype 'int16_t[3]'>"
+    assert repr(fields[3][1].type) == "<ctype 'struct $dtype'>"
+    assert to_dtype(BStruct) == dt
+    # packed dtypes give structs with an alignment of 1
+    dt = numpy.dtype([('a', 'i1'), ('b', 'f8')])
+    BStruct = from_dtype(dt)
+    assert repr(BStruct) == "<ctype 'struct $dtype'>"
+    assert sizeof(BStruct) == 9 and alignof(BStruct) == 1
+    assert BStruct.fields[1][1].offset == 1
+    # view a numpy array as cdata
+    a = numpy.zeros(3, dtype=dt)
+    p = from_buffer(from_dtype((dt, a.shape)), a)
+    p[1].b = 3.5
+    assert list(a['b']) == [0.0, 3.5, 0.0]
+
+
+def test_unpack_fields():
+    import array
+    BChar = new_primitive_type("char")
+    BShort = new_primitive_type("short")
+    BInt = new_primitive_type("int")
+    BUInt = new_primitive_type("unsigned int")
+    BDouble = new_primitive_type("double")
+    BInner = new_struct_type("struct inner")
+    complete_struct_or_union(BInner, [('x', BShort, -1),
+                                      ('tag', BChar, -1)])
+    BStruct = new_struct_type("struct foo")
+    complete_struct_or_union(BStruct, [('a', BInt, -1),
+                                       ('b', BDouble, -1),
+                                       ('s', BInner, -1),
+                                       ('p', new_pointer_type(BInt), -1),
+                                       ('c', BUInt, 5)])
+    BStructP = new_pointer_type(BStruct)
+    p = newp(new_array_type(BStructP, None), 4)
+    for i in range(4):
+        p[i].a = i * 10
+        p[i].b = i / 2.0
+        p[i].s.x = -i
+        p[i].s.tag = b"wxyz"[i:i+1]
+    d = unpack_fields(p, 3)
+    assert sorted(d) == ['a', 'b', 's.tag', 's.x']   # not 'p' nor 'c'
+    assert d['a'] == array.array('i', [0, 10, 20])
+    assert d['b'] == array.array('d', [0.0, 0.5, 1.0])
+    assert d['s.x'] == array.array('h', [0, -1, -2])
+    assert d['s.tag'] == b"wxy"
+    d = unpack_fields(p, 4, ['s.x', 'a'])
+    assert list(d) == ['s.x', 'a'] or sys.version_info < (3, 7)
+    assert d['s.x'] == array.array('h', [0, -1, -2, -3])
+    assert d['a'] == array.array('i', [0, 10, 20, 30])
+    assert unpack_fields(cast(BStructP, p), 2, ['a']) == {
+        'a': array.array('i', [0, 10])}
+    assert unpack_fields(p, 0, ['a']) == {'a': array.array('i')}
+    #
+    e = py.test.raises(TypeError, unpack_fields, p, 4, ['p'])
+    assert str(e.value) == "field 'p' is of type 'int *', which cannot be unpacked"
+    py.test.raises(TypeError, unpack_fields, p, 4, ['s'])
+    py.test.raises(TypeError, unpack_fields, p, 4, ['c'])
+    py.test.raises(TypeError, unpack_fields, p, 4, 'a')
+    py.test.raises(KeyError, unpack_fields, p, 4, ['nope'])
+    py.test.raises(KeyError, unpack_fields, p, 4, ['s.nope'])
+    py.test.raises(ValueError, unpack_fields, p, -1)
+    e = py.test.raises(TypeError, unpack_fields,
+                       newp(new_array_type(new_pointer_type(BInt), 3)), 3)
+    assert str(e.value) == ("expected a pointer or array of structs or "
+                            "unions, got 'int[3]'")
+    py.test.raises(RuntimeError, unpack_fields, cast(BStructP, 0), 1)
+
+def test_newp_and_slice_from_numeric_buffer():
+    if sys.version_info < (3,):
+        py.test.skip("array.array has no new-style buffer on Python 2")
+    import array
+    BInt = new_primitive_type("int")
+    BInt8 = new_primitive_type("int8_t")
+    BUInt32 = new_primitive_type("uint32_t")
+    BDouble = new_primitive_type("double")
+    BBool = new_primitive_type("_Bool")
+    BIntArray = new_array_type(new_pointer_type(BInt), None)
+    BDoubleArray = new_array_type(new_pointer_type(BDouble), None)
+    # same type: copied directly
+    p = newp(BIntArray, array.array('i', [5, -6, 7]))
+    assert len(p) == 3 and list(p) == [5, -6, 7]
+    p = newp(new_array_type(new_pointer_type(BInt), 5), array.array('i', [1]))
+    assert list(p) == [1, 0, 0, 0, 0]
+    py.test.raises(IndexError, newp, new_array_type(new_pointer_type(BInt), 2),
+                   array.array('i', [1, 2, 3]))
+    # conversions
+    p = newp(BDoubleArray, array.array('q', [1, -2, 2**53]))
+    assert list(p) == [1.0, -2.0, 2.0**53]
+    p = newp(BDoubleArray, array.array('f', [0.5]))
+    assert list(p) == [0.5]
+    p = newp(BIntArray, array.array('h', [-3, 4]))
+    assert list(p) == [-3, 4]
+    p = newp(BIntArray, memoryview(bytearray(b"\x01\xff")))
+    assert list(p) == [1, 255]
+    p = newp(new_array_type(new_pointer_type(BBool), None),
+             array.array('B', [1, 0]))
+    assert list(p) == [True, False]
+    # overflow checks, like for lists
+    for BItem, init in [(BInt8, array.array('i', [1, 300])),
+                        (BUInt32, array.array('i', [-1])),
+                        (BBool, array.array('B', [2]))]:
+        BArray = new_array_type(new_pointer_type(BItem), None)
+        e = py.test.raises(OverflowError, newp, BArray, init)
+        assert str(e.value) == "integer %d does not fit '%s'" % (
+            init[-1], BItem.cname)
+    # floats are not converted to integers
+    py.test.raises(TypeError, newp, BIntArray, array.array('d', [1.5]))
+    # slices
+    p = newp(BDoubleArray, 4)
+    p[1:3] = array.array('i', [10, 20])
+    assert list(p) == [0.0, 10.0, 20.0, 0.0]
+    def set_slice(values):
+        p[0:2] = array.array('i', values)
+    e = py.test.raises(ValueError, set_slice, [1])
+    assert str(e.value) == "need 2 values to unpack, got 1"
+    e = py.test.raises(ValueError, set_slice, [1, 2, 3])
+    assert str(e.value) == "got more than 2 values to unpack"
+    p = newp(BIntArray, [1, 2, 3, 4])
+    p[1:4] = memoryview(buffer(p))[0:3]     # overlapping
+    assert list(p) == [1, 1, 2, 3]
+    # not contiguous: handled by iterating, like before
+    src = memoryview(array.array('i', range(12)))[::2]
+    p = newp(BDoubleArray, 6)
+    p[0:6] = src
+    assert list(p) == [0.0, 2.0, 4.0, 6.0, 8.0, 10.0]
+    py.test.raises(TypeError, newp, BIntArray, src)
+
+def test_newp_and_slice_from_numpy_array():
+    numpy = pytest.importorskip("numpy")
+    BInt = new_primitive_type("int")
+    BIntArray = new_array_type(new_pointer_type(BInt), None)
+    p = newp(BIntArray, numpy.arange(4, dtype=numpy.int64))
+    assert list(p) == [0, 1, 2, 3]
+    p = newp(BIntArray, 6)
+    p[0:6] = numpy.arange(12, dtype=numpy.int32)[::2]
+    assert list(p) == [0, 2, 4, 6, 8, 10]
+    p[2:6] = numpy.arange(12, dtype=numpy.int64)[::-3]
+    assert list(p) == [0, 2, 11, 8, 5, 2]
+    # several dimensions are not flattened
+    py.test.raises(TypeError, newp, BIntArray,
+                   numpy.arange(6, dtype=numpy.int32).reshape(2, 3))
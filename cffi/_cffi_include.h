@@ -61,6 +61,39 @@ extern "C" {
 #include <stddef.h>
 #include "parse_c_type.h"
 
+/* Functions with several arguments are built with METH_FASTCALL if
+   possible.  Otherwise (limited API before 3.10, Python < 3.7, PyPy)
+   the _cffi_f_*() functions are emitted with the METH_VARARGS signature
+   and registered as such, by using _CFFI_OP_CPYTHON_BLTN_V instead. */
+#if !defined(PYPY_VERSION) && defined(METH_FASTCALL) && \
+    PY_VERSION_HEX >= 0x03070000
+#  define _CFFI_USE_FASTCALL
+#else
+#  undef _CFFI_OP_CPYTHON_BLTN_F
+#  define _CFFI_OP_CPYTHON_BLTN_F  _CFFI_OP_CPYTHON_BLTN_V
+#endif
+
+/* The _cffi_f_*() functions can record call statistics, which are
+   enabled at runtime with ffi.enable_call_stats().  When disabled,
+   this costs one test of a global flag per call; when enabled, the
+   call goes to a copy of the function, _cffi_fs_*(), that records the
+   timings.  Modules built with it need a _cffi_backend module of
+   version >= 1.15; you can define _CFFI_NO_CALL_STATS to build
+   modules without it. */
+#if !defined(PYPY_VERSION) && !defined(_CFFI_NO_CALL_STATS)
+#  define _CFFI_USE_CALL_STATS
+#endif
+
+/* The pointer arguments of the _cffi_f_*() functions accept directly
+   the objects with the buffer interface, like bytearray or array.array,
+   if the type of the items match.  The buffer is not copied, but held
+   until the call returns.  Modules built with it need a _cffi_backend
+   module of version >= 1.15; you can define _CFFI_NO_BUFFER_ARGS to
+   build modules without it. */
+#if !defined(PYPY_VERSION) && !defined(_CFFI_NO_BUFFER_ARGS)
+#  define _CFFI_USE_BUFFER_ARGS
+#endif
+
 /* this block of #ifs should be kept exactly identical between
    c/_cffi_backend.c, cffi/vengine_cpy.py, cffi/vengine_gen.py
    and cffi/_cffi_include.h */
@@ -218,7 +251,18 @@ extern "C" {
     ((int(*)(PyObject *))_cffi_exports[26])
 #define _cffi_from_c_wchar3216_t                                         \
     ((PyObject *(*)(int))_cffi_exports[27])
-#define _CFFI_NUM_EXPORTS 28
+#define _cffi_call_stats_enabled                                         \
+    (*(int *)_cffi_exports[28])
+#define _cffi_call_stats_clock                                           \
+    ((long long(*)(void))_cffi_exports[29])
+#define _cffi_call_stats_record                                          \
+    ((void(*)(const char *, long long *))_cffi_exports[30])
+#define _cffi_prepare_pointer_call_argument_buf                          \
+    ((Py_ssize_t(*)(struct _cffi_ctypedescr *,                           \
+                    PyObject *, char **, void **))_cffi_exports[31])
+#define _cffi_release_pinned_arguments                                   \
+    ((void(*)(void *))_cffi_exports[32])
+#define _CFFI_NUM_EXPORTS 33
 
 struct _cffi_ctypedescr;
 
@@ -347,6 +391,26 @@ _cffi_free_array_arguments(struct _cffi_freeme_s *freeme)
     } while (freeme != NULL);
 }
 
+#ifdef _CFFI_USE_BUFFER_ARGS
+#  define _CFFI_RELEASE_PINNED_ARGUMENTS(pinned)                         \
+    if (pinned != NULL) _cffi_release_pinned_arguments(pinned)
+#else
+#  define _CFFI_RELEASE_PINNED_ARGUMENTS(pinned)  (void)pinned
+#endif
+
+#ifdef _CFFI_USE_FASTCALL
+_CFFI_UNUSED_FN static int
+_cffi_check_nargs(const char *name, Py_ssize_t nargs, Py_ssize_t expected)
+{
+    /* same error message as PyArg_UnpackTuple() */
+    if (nargs == expected)
+        return 0;
+    PyErr_Format(PyExc_TypeError, "%s expected %zd arguments, got %zd",
+                 name, expected, nargs);
+    return -1;
+}
+#endif
+
 /**********  end CPython-specific section  **********/
 #else
 _CFFI_UNUSED_FN
@@ -266,6 +266,80 @@ class FFI(object):
             cdecl = self._typeof(cdecl)
         return self._backend.newp(cdecl, init)
 
+    def new_many(self, cdecl, n, init=None):
+        """Allocate n objects at once, in a single block of memory, and
+        return a list of n owning pointers to them.  'cdecl' must be a
+        pointer type, like for ffi.new(); 'init', if given, is a list of
+        initializers for the first objects.  The block is freed when all
+        the pointers are gone.
+        """
+        if isinstance(cdecl, basestring):
+            cdecl = self._typeof(cdecl)
+        return self._backend.new_many(cdecl, n, init)
+
+    def new_mapped(self, cdecl, init=None, advice=None):
+        """Like ffi.new(), but the memory is a new anonymous mapping
+        obtained with mmap().  The pages are zero-initialized by the OS
+        when they are first used, so allocating a huge array is fast and
+        uses no memory until it is accessed.  'advice' is a string or a
+        sequence of strings among 'normal', 'random', 'sequential',
+        'willneed', 'hugepage', 'nohugepage', 'dontdump' and 'dodump',
+        passed to madvise() if supported on this platform.
+        ffi.release() unmaps the memory.
+        """
+        if isinstance(cdecl, basestring):
+            cdecl = self._typeof(cdecl)
+        return self._backend.new_mapped(cdecl, init, advice)
+
+    def map_file(self, cdecl, file, mode='r', offset=0, length=-1,
+                 advice=None):
+        """Map a file into memory with mmap(), and return a cdata of
+        type 'cdecl' (an array or pointer type) for it.  'file' is a
+        file name, or a file descriptor, or an object with a fileno()
+        method.  'mode' is 'r' (read-only), 'c' (copy-on-write) or 'w'
+        (shared: changes are written to the file).  'offset' and
+        'length' give the range of bytes to map; by default, up to the
+        end of the file.  For an open array type like 'struct rec[]',
+        the length of the array is the number of items that fit in the
+        range.  'advice' is like in ffi.new_mapped().  ffi.release()
+        unmaps the file.
+        """
+        if isinstance(cdecl, basestring):
+            cdecl = self._typeof(cdecl)
+        return self._backend.map_file(cdecl, file, mode, offset, length,
+                                      advice)
+
+    def msync(self, cdata, wait=True):
+        """Write back to the file the changes done to a cdata returned
+        by ffi.map_file(cdecl, file, 'w').  If 'wait' is false, only
+        schedule the writes.
+        """
+        self._backend.msync(cdata, wait)
+
+    def to_dtype(self, cdecl):
+        """Return a NumPy dtype with the same layout as the C type
+        'cdecl': the same size, and for structs and unions, the same
+        field names and offsets.  Bitfields are not supported.  NumPy
+        is imported when this is called.
+        """
+        if isinstance(cdecl, basestring):
+            cdecl = self._typeof(cdecl)
+        return self._backend.to_dtype(cdecl)
+
+    def from_dtype(self, dtype, name=None):
+        """Return a new C type with the same layout as the NumPy dtype.
+        Structured dtypes give new struct types, called 'struct name'
+        if a name is given.
+        """
+        return self._backend.from_dtype(dtype, name)
+
+    def set_mmap_threshold(self, nbytes, advice=None):
+        """Make ffi.new() of arrays of 'nbytes' or more work like
+        ffi.new_mapped(cdecl, init, advice).  0 disables this, which is
+        the default.  Returns the previous threshold.
+        """
+        return self._backend.set_mmap_threshold(nbytes, advice)
+
     def new_allocator(self, alloc=None, free=None,
                       should_clear_after_alloc=True):
         """Return a new allocator, i.e. a function that behaves like ffi.new()
@@ -274,7 +348,9 @@ class FFI(object):
         'alloc' is called with the size as argument.  If it returns NULL, a
         MemoryError is raised.  'free' is called with the result of 'alloc'
         as argument.  Both can be either Python function or directly C
-        functions.  If 'free' is None, then no free function is called.
+        functions.  C functions of types 'void *(*)(size_t)' and
+        'void(*)(void *)' are called directly, without going through
+        Python.  If 'free' is None, then no free function is called.
         If both 'alloc' and 'free' are None, the default is used.
 
         If 'should_clear_after_alloc' is set to False, then the memory
@@ -290,6 +366,17 @@ class FFI(object):
             return allocator(cdecl, init)
         return allocate
 
+    def new_arena(self, capacity=65536, debug=False):
+        """Return a new arena, i.e. a bump allocator: arena.new(cdecl,
+        init=None) behaves like ffi.new(), but takes the memory from
+        blocks of 'capacity' bytes, which are all freed at once by
+        arena.release() or at the end of a 'with arena:' block.  The
+        cdata objects must not be used after that.  In debug mode, the
+        released memory is poisoned and not reused, to catch such
+        mistakes.
+        """
+        return self._backend.new_arena(capacity, debug, self._typeof)
+
     def cast(self, cdecl, source):
         """Similar to a C cast: returns an instance of the named C
         type initialized with the given 'source'.  The source is
@@ -334,6 +421,19 @@ class FFI(object):
         """
         return self._backend.unpack(cdata, length)
 
+    def unpack_fields(self, cdata, length, fields=None):
+        """Unpack the fields of an array of structs or unions of the
+        given length, returning a dict {field name: array.array}.
+
+        'fields' is a list of names like 'x', or 'a.b' for the fields
+        of nested structs.  By default, all fields of primitive types
+        are returned.  Fields of type 'char' give a byte string.
+
+        This is a much faster equivalent to:
+        {name: array.array(tc, [cdata[i].name for i in range(length)])}
+        """
+        return self._backend.unpack_fields(cdata, length, fields)
+
    #def buffer(self, cdata, size=-1):
    #    """Return a read-write buffer object that references the raw C data
    #    pointed to by the given 'cdata'.  The 'cdata' must be a pointer or
@@ -381,18 +481,126 @@ class FFI(object):
         """
         return self._backend.memmove(dest, src, n)
 
-    def callback(self, cdecl, python_callable=None, error=None, onerror=None):
+    def call_many(self, func, *buffers, **kwds):
+        """ffi.call_many(func, *buffers, out=None) calls the C function
+        'func' once for every index in the buffers.
+
+        'func' must take and return primitive types (or void).  There
+        must be one buffer per argument: either a cdata array or any
+        contiguous Python buffer (array.array, memoryview, ...) whose
+        items have the argument's type.  All buffers must have the same
+        length n.  The whole loop runs in C with the GIL released.  The
+        results are stored into 'out', which must then be a writable
+        buffer of n items, or otherwise into a new cdata array which is
+        returned.
+        """
+        return self._backend.call_many(func, *buffers, **kwds)
+
+    def enable_call_stats(self, enable=True):
+        """Start or stop recording statistics about the calls to C
+        functions.  It can also be enabled from the start by setting the
+        environment variable CFFI_CALL_STATS=1.  See ffi.call_stats().
+        """
+        self._backend.enable_call_stats(enable)
+
+    def call_stats(self, reset=False):
+        """Return a dict {name: (calls, call_time, conversion_time)}.
+        For every C function called since the statistics were enabled,
+        gives the number of calls, the time spent in the C function
+        itself and the time spent converting the arguments and the
+        result, both in seconds.  If 'reset' is true, clear the
+        statistics.
+        """
+        return self._backend.call_stats(reset)
+
+    def memory_stats(self):
+        """Return a dict with the keys 'objects' and 'bytes', the number
+        of live cdata objects that own memory and the total size of that
+        memory; 'by_type', a dict {ctype name: (objects, bytes)}; and
+        'tracemalloc_domain', the tracemalloc domain in which this memory
+        is also registered.  This counts the memory from ffi.new(), from
+        the allocators of ffi.new_allocator(), and given as 'size' to
+        ffi.gc().
+        """
+        return self._backend.memory_stats()
+
+    def set_memory_pressure_threshold(self, nbytes):
+        """When the memory counted by ffi.memory_stats() grows by more
+        than 'nbytes' since the last time, run a full gc.collect().  0
+        disables this, which is the default.  Returns the previous
+        threshold.
+        """
+        return self._backend.set_memory_pressure_threshold(nbytes)
+
+    def set_freelist_size(self, size):
+        """Set how many freed small cdata objects are kept, per size
+        class, to be reused by the next ones; 0 disables the freelists.
+        Returns the previous size.
+        """
+        return self._backend.set_freelist_size(size)
+
+    def freelist_stats(self, reset=False):
+        """Return a dict with the keys 'hits', 'misses', 'cached' and
+        'size': how many small cdata objects were allocated from the
+        freelists or not, how many free ones are kept now, and the
+        current size set with ffi.set_freelist_size().  If 'reset' is
+        true, the hits and misses are cleared.
+        """
+        return self._backend.freelist_stats(reset)
+
+    def new_callback_queue(self, size=1024, item_size=64, notify=False):
+        """Return a queue for deferred callbacks.  The callbacks attached
+        to it with ffi.callback(..., queue=q) or @ffi.def_extern(queue=q)
+        don't run the Python function when they are called from C: they
+        copy their arguments into the queue, without taking the GIL, and
+        return their 'error' value.  q.drain() then runs the Python
+        functions for all the queued events.  The queue has 'size' slots
+        of 'item_size' bytes for the arguments; events are dropped when
+        it is full.  With notify=True, q.fileno() is a file descriptor
+        that becomes readable when events are pending.
+        """
+        return self._backend.new_callback_queue(size, item_size, notify)
+
+    def reserve_callbacks(self, n):
+        """Make sure that at least 'n' more callbacks can be created by
+        ffi.callback() without requesting more executable memory from
+        the OS.
+        """
+        self._backend.reserve_callbacks(n)
+
+    def callback_pool_stats(self):
+        """Return a dict with the keys 'free', 'in_use' and 'pages': the
+        number of callbacks that can still be created from the pool, the
+        number of callbacks alive, and the number of memory pages that
+        the pool currently holds.
+        """
+        return self._backend.callback_pool_stats()
+
+    def trim_callback_pool(self, keep=0):
+        """Give back to the OS the memory pages of the callback pool that
+        contain no live callback, but without going below 'keep' free
+        callbacks.  Returns the number of pages released.
+        """
+        return self._backend.trim_callback_pool(keep)
+
+    def callback(self, cdecl, python_callable=None, error=None, onerror=None,
+                 queue=None):
         """Return a callback object or a decorator making such a
         callback object.  'cdecl' must name a C function pointer type.
         The callback invokes the specified 'python_callable' (which may
         be provided either directly or via a decorator).  Important: the
         callback object must be manually kept alive for as long as the
-        callback may be invoked from the C level.
+        callback may be invoked from the C level.  With 'queue', a queue
+        made by ffi.new_callback_queue(), the calls are deferred until
+        queue.drain().
         """
         def callback_decorator_wrap(python_callable):
             if not callable(python_callable):
                 raise TypeError("the 'python_callable' argument "
                                 "is not callable")
+            if queue is not None:
+                return self._backend.callback(cdecl, python_callable,
+                                              error, onerror, queue)
             return self._backend.callback(cdecl, python_callable,
                                           error, onerror)
         if isinstance(cdecl, basestring):
@@ -418,17 +626,50 @@ class FFI(object):
             replace_with = ' ' + replace_with
         return self._backend.getcname(cdecl, replace_with)
 
-    def gc(self, cdata, destructor, size=0):
+    def gc(self, cdata, destructor, size=0, defer=False):
         """Return a new cdata object that points to the same
         data.  Later, when this new cdata object is garbage-collected,
         'destructor(old_cdata_object)' will be called.
 
         The optional 'size' gives an estimate of the size, used to
-        trigger the garbage collection more eagerly.  So far only used
-        on PyPy.  It tells the GC that the returned object keeps alive
-        roughly 'size' bytes of external memory.
+        trigger the garbage collection more eagerly.  It tells the GC
+        that the returned object keeps alive roughly 'size' bytes of
+        external memory.
+
+        If 'defer' is true, the destructor is not called immediately
+        but queued, and called later by ffi.run_deferred_gc() or by the
+        thread of ffi.start_deferred_gc_thread(), or else at the next
+        safe point of the main thread.
         """
-        return self._backend.gcp(cdata, destructor, size)
+        return self._backend.gcp(cdata, destructor, size, defer)
+
+    def run_deferred_gc(self):
+        """Call now the destructors queued by ffi.gc(..., defer=True),
+        and return how many were called.
+        """
+        return self._backend.run_deferred_gc()
+
+    def start_deferred_gc_thread(self):
+        """Start a background thread that calls the destructors queued
+        by ffi.gc(..., defer=True).  The destructors that are C
+        functions with the signature 'void(void *)', like free(), are
+        called without the GIL.  Does nothing if the thread was already
+        started.
+        """
+        self._backend.start_deferred_gc_thread()
+
+    def deferred_gc_stats(self, reset=False):
+        """Return a dict with statistics about the destructors queued
+        by ffi.gc(..., defer=True): 'queued' is the current number of
+        queued destructors, 'max_queued' the highest number so far,
+        'run' the number of destructors called, 'total_lag' and
+        'max_lag' the total and highest time (in seconds) that they
+        waited in the queue, and 'thread' tells if the background
+        thread was started.  If 'reset' is true, all numbers but
+        'queued' are reset afterwards.  This is global, i.e. not
+        specific to this 'ffi' instance.
+        """
+        return self._backend.deferred_gc_stats(reset)
 
     def _get_cached_btype(self, type):
         assert self._lock.acquire(False) is False
@@ -543,6 +784,17 @@ class FFI(object):
     def from_handle(self, x):
         return self._backend.from_handle(x)
 
+    def new_handle_table(self, size=0):
+        """Return a table of handles, an alternative to new_handle() and
+        from_handle() for many objects.  t.add(x) returns a 'void *'
+        handle for 'x', without creating a new object to keep alive;
+        t.get(handle) returns 'x'; t.remove(handle) returns 'x' and
+        releases the handle; and t.clear() releases all handles.  Using
+        a handle that was released raises ValueError instead of
+        crashing.  'size' preallocates room for that many handles.
+        """
+        return self._backend.new_handle_table(self.BVoidP, size)
+
     def release(self, x):
         self._backend.release(x)
 
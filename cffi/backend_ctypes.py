@@ -1009,7 +1009,7 @@ class CTypesBackend(object):
 
     _weakref_cache_ref = None
 
-    def gcp(self, cdata, destructor, size=0):
+    def gcp(self, cdata, destructor, size=0, defer=False):
         if self._weakref_cache_ref is None:
             import weakref
             class MyRef(weakref.ref):
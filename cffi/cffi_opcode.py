@@ -55,6 +55,7 @@ OP_DLOPEN_FUNC     = 35
 OP_DLOPEN_CONST    = 37
 OP_GLOBAL_VAR_F    = 39
 OP_EXTERN_PYTHON   = 41
+OP_CPYTHON_BLTN_F  = 43   # fastcall (or varargs if not available)
 
 PRIM_VOID          = 0
 PRIM_BOOL          = 1
@@ -39,6 +39,8 @@ _r_int_literal = re.compile(r"-?0?x?[0-9a-f]+[lu]*$", re.IGNORECASE)
 _r_stdcall1 = re.compile(r"\b(__stdcall|WINAPI)\b")
 _r_stdcall2 = re.compile(r"[(]\s*(__stdcall|WINAPI)\b")
 _r_cdecl = re.compile(r"\b__cdecl\b")
+_r_fast1 = re.compile(r"\b__cffi_fast\b")
+_r_fast2 = re.compile(r"[(](\s*(?:(?:__stdcall|WINAPI)\s+)?)__cffi_fast\b")
 _r_extern_python = re.compile(r'\bextern\s*"'
                               r'(Python|Python\s*\+\s*C|C\s*\+\s*Python)"\s*.')
 _r_star_const_space = re.compile(       # matches "* const "
@@ -211,6 +213,11 @@ def _preprocess(csource):
     # "volatile volatile const", so we abuse it to detect __stdcall...
     # Hack number 2 is that "int(volatile *fptr)();" is not valid C
     # syntax, so we place the "volatile" before the opening parenthesis.
+    # Same hack for the cffi-specific "__cffi_fast", with "volatile
+    # volatile restrict".  It is done first, in order to move it out of
+    # the parentheses in "(__stdcall __cffi_fast *)" too.
+    csource = _r_fast2.sub(r' volatile volatile restrict(\1', csource)
+    csource = _r_fast1.sub(' volatile volatile restrict ', csource)
     csource = _r_stdcall2.sub(' volatile volatile const(', csource)
     csource = _r_stdcall1.sub(' volatile volatile const ', csource)
     csource = _r_cdecl.sub(' ', csource)
@@ -727,12 +734,20 @@ class Parser(object):
         result, quals = self._get_type_and_quals(typenode.type)
         # the 'quals' on the result type are ignored.  HACK: we absure them
         # to detect __stdcall functions: we textually replace "__stdcall"
-        # with "volatile volatile const" above.
+        # with "volatile volatile const" above.  Similarly, "__cffi_fast"
+        # was replaced with "volatile volatile restrict".
         abi = None
-        if hasattr(typenode.type, 'quals'): # else, probable syntax error anyway
-            if typenode.type.quals[-3:] == ['volatile', 'volatile', 'const']:
-                abi = '__stdcall'
-        return model.RawFunctionType(tuple(args), result, ellipsis, abi)
+        fast = False
+        # (no 'quals' means probable syntax error anyway)
+        rquals = getattr(typenode.type, 'quals', [])
+        for i in range(len(rquals) - 2):
+            if rquals[i:i+2] == ['volatile', 'volatile']:
+                if rquals[i+2] == 'const':
+                    abi = '__stdcall'
+                elif rquals[i+2] == 'restrict':
+                    fast = True
+        return model.RawFunctionType(tuple(args), result, ellipsis, abi,
+                                     fast)
 
     def _as_func_arg(self, type, quals):
         if isinstance(type, model.ArrayType):
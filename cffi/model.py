@@ -202,19 +202,22 @@ class UnknownFloatType(BasePrimitiveType):
 
 
 class BaseFunctionType(BaseType):
-    _attrs_ = ('args', 'result', 'ellipsis', 'abi')
+    _attrs_ = ('args', 'result', 'ellipsis', 'abi', 'fast')
 
-    def __init__(self, args, result, ellipsis, abi=None):
+    def __init__(self, args, result, ellipsis, abi=None, fast=False):
         self.args = args
         self.result = result
         self.ellipsis = ellipsis
         self.abi = abi
+        self.fast = fast
         #
         reprargs = [arg._get_c_name() for arg in self.args]
         if self.ellipsis:
             reprargs.append('...')
         reprargs = reprargs or ['void']
         replace_with = self._base_pattern % (', '.join(reprargs),)
+        # note: 'fast' is only a flag, not written in the C name, which
+        # is used to generate real C code where '__cffi_fast' is unknown
         if abi is not None:
             replace_with = replace_with[:1] + abi + ' ' + replace_with[1:]
         self.c_name_with_marker = (
@@ -233,7 +236,8 @@ class RawFunctionType(BaseFunctionType):
                         "type, not a pointer-to-function type" % (self,))
 
     def as_function_pointer(self):
-        return FunctionPtrType(self.args, self.result, self.ellipsis, self.abi)
+        return FunctionPtrType(self.args, self.result, self.ellipsis, self.abi,
+                               self.fast)
 
 
 class FunctionPtrType(BaseFunctionType):
@@ -251,11 +255,19 @@ class FunctionPtrType(BaseFunctionType):
                     abi_args = (ffi._backend.FFI_STDCALL,)
                 except AttributeError:
                     pass
+        if self.fast:
+            try:
+                abi_args = abi_args or (ffi._backend.FFI_DEFAULT_ABI,)
+            except AttributeError:
+                pass     # not supported by this backend: ignored
+            else:
+                abi_args += (True,)
         return global_cache(self, ffi, 'new_function_type',
                             tuple(args), result, self.ellipsis, *abi_args)
 
     def as_raw_function(self):
-        return RawFunctionType(self.args, self.result, self.ellipsis, self.abi)
+        return RawFunctionType(self.args, self.result, self.ellipsis, self.abi,
+                               self.fast)
 
 
 class PointerType(BaseType):
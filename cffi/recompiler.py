@@ -6,6 +6,9 @@ from .cffi_opcode import *
 VERSION_BASE = 0x2601
 VERSION_EMBEDDED = 0x2701
 VERSION_CHAR16CHAR32 = 0x2801
+VERSION_FASTCALL = 0x2901
+VERSION_CALL_STATS = 0x2a01
+VERSION_BUFFER_ARGS = 0x2a01
 
 USE_LIMITED_API = (sys.platform != 'win32' or sys.version_info < (3, 0) or
                    sys.version_info >= (3, 5))
@@ -125,6 +128,9 @@ class TypenameExpr:
 
 class Recompiler:
     _num_externpy = 0
+    _num_fastcall = 0
+    _num_call_stats = 0
+    _num_buffer_args = 0
 
     def __init__(self, ffi, module_name, target_is_python=False):
         self.ffi = ffi
@@ -448,15 +454,13 @@ class Recompiler:
         prnt('PyMODINIT_FUNC')
         prnt('PyInit_%s(void)' % (base_module_name,))
         prnt('{')
-        prnt('  return _cffi_init("%s", 0x%x, &_cffi_type_context);' % (
-            self.module_name, self._version))
+        self._write_cffi_init_call('  return ')
         prnt('}')
         prnt('#else')
         prnt('PyMODINIT_FUNC')
         prnt('init%s(void)' % (base_module_name,))
         prnt('{')
-        prnt('  _cffi_init("%s", 0x%x, &_cffi_type_context);' % (
-            self.module_name, self._version))
+        self._write_cffi_init_call('  ')
         prnt('}')
         prnt('#endif')
         prnt()
@@ -465,6 +469,33 @@ class Recompiler:
         prnt('#endif')
         self._version = None
 
+    def _write_cffi_init_call(self, prefix):
+        # the version tag depends on features that the C compiler may
+        # or may not enable (see _cffi_include.h)
+        prnt = self._prnt
+        optional = []
+        if self._num_call_stats:
+            # only if some _cffi_f_*() function records call statistics
+            optional.append(('_CFFI_USE_CALL_STATS', VERSION_CALL_STATS))
+        if self._num_buffer_args:
+            # only if some _cffi_f_*() function takes a pointer argument
+            optional.append(('_CFFI_USE_BUFFER_ARGS', VERSION_BUFFER_ARGS))
+        if self._num_fastcall:
+            # only if _CFFI_OP_CPYTHON_BLTN_F really ends up in the tables
+            optional.append(('_CFFI_USE_FASTCALL', VERSION_FASTCALL))
+        directive = '#if'
+        for macro, version in optional:
+            prnt('%s defined(%s)' % (directive, macro))
+            prnt('%s_cffi_init("%s", 0x%x, &_cffi_type_context);' % (
+                prefix, self.module_name, max(self._version, version)))
+            directive = '#elif'
+        if optional:
+            prnt('#else')
+        prnt('%s_cffi_init("%s", 0x%x, &_cffi_type_context);' % (
+            prefix, self.module_name, self._version))
+        if optional:
+            prnt('#endif')
+
     def _to_py(self, x):
         if isinstance(x, str):
             return "b'%s'" % (x,)
@@ -580,13 +611,22 @@ class Recompiler:
         if isinstance(tp, model.PointerType):
             localvars.add('Py_ssize_t datasize')
             localvars.add('struct _cffi_freeme_s *large_args_free = NULL')
+            localvars.add('void *pinned_args = NULL')
             freelines.add('if (large_args_free != NULL)'
                           ' _cffi_free_array_arguments(large_args_free);')
+            freelines.add('_CFFI_RELEASE_PINNED_ARGUMENTS(pinned_args);')
 
     def _convert_funcarg_to_c_ptr_or_array(self, tp, fromvar, tovar, errcode):
+        self._num_buffer_args += 1
+        self._prnt('#ifdef _CFFI_USE_BUFFER_ARGS')
+        self._prnt('  datasize = _cffi_prepare_pointer_call_argument_buf(')
+        self._prnt('      _cffi_type(%d), %s, (char **)&%s, &pinned_args);' % (
+            self._gettypenum(tp), fromvar, tovar))
+        self._prnt('#else')
         self._prnt('  datasize = _cffi_prepare_pointer_call_argument(')
         self._prnt('      _cffi_type(%d), %s, (char **)&%s);' % (
             self._gettypenum(tp), fromvar, tovar))
+        self._prnt('#endif')
         self._prnt('  if (datasize != 0) {')
         self._prnt('    %s = ((size_t)datasize) <= 640 ? '
                    '(%s)alloca((size_t)datasize) : NULL;' % (
@@ -706,73 +746,19 @@ class Recompiler:
         #
         prnt('#ifndef PYPY_VERSION')        # ------------------------------
         #
-        prnt('static PyObject *')
-        prnt('_cffi_f_%s(PyObject *self, PyObject *%s)' % (name, argname))
-        prnt('{')
-        #
-        context = 'argument of %s' % name
-        for i, type in enumerate(tp.args):
-            arg = type.get_c_name(' x%d' % i, context)
-            prnt('  %s;' % arg)
-        #
-        localvars = set()
-        freelines = set()
-        for type in tp.args:
-            self._extra_local_variables(type, localvars, freelines)
-        for decl in sorted(localvars):
-            prnt('  %s;' % (decl,))
-        #
+        prnt('#ifdef _CFFI_USE_CALL_STATS')
+        self._generate_cpy_function_wrapper(tp, name, stats=True)
+        prnt('#endif')
+        self._generate_cpy_function_wrapper(tp, name, stats=False)
+        self._num_call_stats += 1
         if not isinstance(tp.result, model.VoidType):
             result_code = 'result = '
             context = 'result of %s' % name
             result_decl = '  %s;' % tp.result.get_c_name(' result', context)
-            prnt(result_decl)
-            prnt('  PyObject *pyresult;')
         else:
             result_decl = None
             result_code = ''
         #
-        if len(tp.args) > 1:
-            rng = range(len(tp.args))
-            for i in rng:
-                prnt('  PyObject *arg%d;' % i)
-            prnt()
-            prnt('  if (!PyArg_UnpackTuple(args, "%s", %d, %d, %s))' % (
-                name, len(rng), len(rng),
-                ', '.join(['&arg%d' % i for i in rng])))
-            prnt('    return NULL;')
-        prnt()
-        #
-        for i, type in enumerate(tp.args):
-            self._convert_funcarg_to_c(type, 'arg%d' % i, 'x%d' % i,
-                                       'return NULL')
-            prnt()
-        #
-        prnt('  Py_BEGIN_ALLOW_THREADS')
-        prnt('  _cffi_restore_errno();')
-        call_arguments = ['x%d' % i for i in range(len(tp.args))]
-        call_arguments = ', '.join(call_arguments)
-        prnt('  { %s%s(%s); }' % (result_code, name, call_arguments))
-        prnt('  _cffi_save_errno();')
-        prnt('  Py_END_ALLOW_THREADS')
-        prnt()
-        #
-        prnt('  (void)self; /* unused */')
-        if numargs == 0:
-            prnt('  (void)noarg; /* unused */')
-        if result_code:
-            prnt('  pyresult = %s;' %
-                 self._convert_expr_from_c(tp.result, 'result', 'result type'))
-            for freeline in freelines:
-                prnt('  ' + freeline)
-            prnt('  return pyresult;')
-        else:
-            for freeline in freelines:
-                prnt('  ' + freeline)
-            prnt('  Py_INCREF(Py_None);')
-            prnt('  return Py_None;')
-        prnt('}')
-        #
         prnt('#else')        # ------------------------------
         #
         # the PyPy version: need to replace struct/union arguments with
@@ -824,6 +810,147 @@ class Recompiler:
         prnt('#endif')        # ------------------------------
         prnt()
 
+    def _generate_cpy_function_wrapper(self, tp, name, stats):
+        # the CPython wrapper '_cffi_f_<name>', or with 'stats' its copy
+        # '_cffi_fs_<name>' that also records the call statistics
+        prnt = self._prnt
+        numargs = len(tp.args)
+        if numargs == 0:
+            argname = 'noarg'
+        elif numargs == 1:
+            argname = 'arg0'
+        else:
+            argname = 'args'
+        funcname = '_cffi_%s_%s' % ('fs' if stats else 'f', name)
+        #
+        prnt('static PyObject *')
+        if numargs > 1:
+            prnt('#ifdef _CFFI_USE_FASTCALL')
+            prnt('%s(PyObject *self, PyObject *const *args, '
+                 'Py_ssize_t nargs)' % (funcname,))
+            prnt('#else')
+            prnt('%s(PyObject *self, PyObject *args)' % (funcname,))
+            prnt('#endif')
+        else:
+            prnt('%s(PyObject *self, PyObject *%s)' % (funcname, argname))
+        prnt('{')
+        #
+        context = 'argument of %s' % name
+        for i, type in enumerate(tp.args):
+            arg = type.get_c_name(' x%d' % i, context)
+            prnt('  %s;' % arg)
+        #
+        localvars = set()
+        freelines = set()
+        for type in tp.args:
+            self._extra_local_variables(type, localvars, freelines)
+        for decl in sorted(localvars):
+            prnt('  %s;' % (decl,))
+        #
+        if not isinstance(tp.result, model.VoidType):
+            result_code = 'result = '
+            context = 'result of %s' % name
+            result_decl = '  %s;' % tp.result.get_c_name(' result', context)
+            prnt(result_decl)
+            prnt('  PyObject *pyresult;')
+        else:
+            result_decl = None
+            result_code = ''
+        #
+        rng = range(len(tp.args))
+        if len(tp.args) > 1:
+            for i in rng:
+                prnt('  PyObject *arg%d;' % i)
+        if stats:
+            prnt('  long long _cffi_stats_t[3];')
+            prnt()
+            prnt('  _cffi_stats_t[0] = _cffi_call_stats_clock();')
+        else:
+            # a single, predicted, branch if the statistics are disabled
+            prnt()
+            prnt('#ifdef _CFFI_USE_CALL_STATS')
+            prnt('  if (_cffi_call_stats_enabled)')
+            if numargs > 1:
+                prnt('#ifdef _CFFI_USE_FASTCALL')
+                prnt('    return _cffi_fs_%s(self, args, nargs);' % (name,))
+                prnt('#else')
+                prnt('    return _cffi_fs_%s(self, args);' % (name,))
+                prnt('#endif')
+            else:
+                prnt('    return _cffi_fs_%s(self, %s);' % (name, argname))
+            prnt('#endif')
+        if len(tp.args) > 1:
+            prnt('#ifdef _CFFI_USE_FASTCALL')
+            prnt('  if (_cffi_check_nargs("%s", nargs, %d) < 0)' % (
+                name, len(rng)))
+            prnt('    return NULL;')
+            for i in rng:
+                prnt('  arg%d = args[%d];' % (i, i))
+            prnt('#else')
+            prnt('  if (!PyArg_UnpackTuple(args, "%s", %d, %d, %s))' % (
+                name, len(rng), len(rng),
+                ', '.join(['&arg%d' % i for i in rng])))
+            prnt('    return NULL;')
+            prnt('#endif')
+        prnt()
+        #
+        if freelines:
+            # release the temporary arguments also in case of error
+            errcode = 'goto _cffi_fail'
+        else:
+            errcode = 'return NULL'
+        for i, type in enumerate(tp.args):
+            self._convert_funcarg_to_c(type, 'arg%d' % i, 'x%d' % i, errcode)
+            prnt()
+        #
+        call_arguments = ['x%d' % i for i in range(len(tp.args))]
+        call_arguments = ', '.join(call_arguments)
+        if tp.fast:
+            # declared with '__cffi_fast': keep the GIL, ignore errno
+            if stats:
+                prnt('  _cffi_stats_t[1] = _cffi_call_stats_clock();')
+            prnt('  { %s%s(%s); }' % (result_code, name, call_arguments))
+            if stats:
+                prnt('  _cffi_stats_t[2] = _cffi_call_stats_clock();')
+        else:
+            prnt('  Py_BEGIN_ALLOW_THREADS')
+            prnt('  _cffi_restore_errno();')
+            if stats:
+                prnt('  _cffi_stats_t[1] = _cffi_call_stats_clock();')
+            prnt('  { %s%s(%s); }' % (result_code, name, call_arguments))
+            if stats:
+                prnt('  _cffi_stats_t[2] = _cffi_call_stats_clock();')
+            prnt('  _cffi_save_errno();')
+            prnt('  Py_END_ALLOW_THREADS')
+        prnt()
+        #
+        prnt('  (void)self; /* unused */')
+        if numargs == 0:
+            prnt('  (void)noarg; /* unused */')
+        freelines = sorted(freelines)
+        if result_code:
+            prnt('  pyresult = %s;' %
+                 self._convert_expr_from_c(tp.result, 'result', 'result type'))
+            for freeline in freelines:
+                prnt('  ' + freeline)
+            if stats:
+                prnt('  _cffi_call_stats_record("%s", _cffi_stats_t);' % name)
+            prnt('  return pyresult;')
+        else:
+            for freeline in freelines:
+                prnt('  ' + freeline)
+            if stats:
+                prnt('  _cffi_call_stats_record("%s", _cffi_stats_t);' % name)
+            prnt('  Py_INCREF(Py_None);')
+            prnt('  return Py_None;')
+        if freelines:
+            prnt()
+            prnt(' _cffi_fail:')
+            for freeline in freelines:
+                prnt('  ' + freeline)
+            prnt('  return NULL;')
+        prnt('}')
+
     def _generate_cpy_function_ctx(self, tp, name):
         if tp.ellipsis and not self.target_is_python:
             self._generate_cpy_constant_ctx(tp, name)
@@ -837,7 +964,10 @@ class Recompiler:
         elif numargs == 1:
             meth_kind = OP_CPYTHON_BLTN_O   # 'METH_O'
         else:
-            meth_kind = OP_CPYTHON_BLTN_V   # 'METH_VARARGS'
+            # 'METH_FASTCALL', or 'METH_VARARGS' if the C compiler doesn't
+            # define _CFFI_USE_FASTCALL (see _cffi_include.h)
+            meth_kind = OP_CPYTHON_BLTN_F
+            self._num_fastcall += 1
         self._lsts["global"].append(
             GlobalExpr(name, '_cffi_f_%s' % name,
                        CffiOp(meth_kind, type_index),
@@ -1374,6 +1504,8 @@ class Recompiler:
                 flags |= 2
             else:
                 raise NotImplementedError("abi=%r" % (tp.abi,))
+        if tp.fast:
+            flags |= 0x100
         self.cffi_types[index] = CffiOp(OP_FUNCTION_END, flags)
 
     def _emit_bytecode_PointerType(self, tp, index):
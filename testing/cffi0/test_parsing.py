@@ -538,6 +538,29 @@ def test_stdcall():
                         "long(*)(), "
                         "short(%s*)(short))'>" % (stdcall, stdcall))
 
+def test_cffi_fast():
+    ffi = FFI()
+    ffi.cdef("int __cffi_fast foo(int); int bar(int);"
+             "long (__cffi_fast *baz)(long);")
+    decls = ffi._parser._declarations
+    assert decls['function foo'][0].fast is True
+    assert decls['function bar'][0].fast is False
+    assert decls['variable baz'][0].fast is True
+    assert decls['function foo'][0] != decls['function bar'][0]
+    tp = ffi.typeof("int(*)(int __cffi_fast x(int),"
+                    "       long (__cffi_fast*y)(void),"
+                    "       short(WINAPI __cffi_fast *z)(short),"
+                    "       short(__cffi_fast WINAPI *t)(short))")
+    if sys.platform == 'win32' and sys.maxsize < 2**32:
+        stdcall = '__stdcall '
+    else:
+        stdcall = ''
+    assert str(tp) == (
+        "<ctype 'int(*)(int(__cffi_fast *)(int), "
+                        "long(__cffi_fast *)(), "
+                        "short(%s__cffi_fast *)(short), "
+                        "short(%s__cffi_fast *)(short))'>" % (stdcall, stdcall))
+
 def test_extern_python():
     ffi = FFI()
     ffi.cdef("""
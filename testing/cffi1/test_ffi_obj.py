@@ -204,6 +204,177 @@ def test_handle_unique():
     assert ffi.new_handle(None) is not ffi.new_handle(None)
     assert ffi.new_handle(None) != ffi.new_handle(None)
 
+def test_handle_table():
+    ffi = _cffi1_backend.FFI()
+    t = ffi.new_handle_table(size=10)
+    x = [2, 4, 6]
+    xp = t.add(x)
+    assert ffi.typeof(xp) == ffi.typeof("void *")
+    assert t.get(xp) is x
+    assert t.remove(xp) is x
+    py.test.raises(ValueError, t.get, xp)
+
+def test_arena():
+    ffi = _cffi1_backend.FFI()
+    with ffi.new_arena(capacity=4096) as a:
+        p = a.new("int[]", [10, 20, 30])
+        assert ffi.typeof(p) == ffi.typeof("int[]")
+        assert list(p) == [10, 20, 30]
+        q = a.new(ffi.typeof("long *"), 5)
+        assert q[0] == 5
+        assert a.used >= 3 * ffi.sizeof("int") + ffi.sizeof("long")
+    assert a.used == 0
+
+def test_freelists():
+    ffi = _cffi1_backend.FFI()
+    old_size = ffi.set_freelist_size(10)
+    try:
+        assert ffi.freelist_stats()['size'] == 10
+        for i in range(20):
+            p = ffi.new("int *", i)
+        assert ffi.freelist_stats(reset=True)['hits'] > 0
+        assert ffi.freelist_stats()['hits'] == 0
+    finally:
+        ffi.set_freelist_size(old_size)
+
+def test_new_many():
+    ffi = _cffi1_backend.FFI()
+    lst = ffi.new_many("long *", 5, init=[10, 20])
+    assert len(lst) == 5
+    assert ffi.typeof(lst[0]) is ffi.typeof("long *")
+    assert [p[0] for p in lst] == [10, 20, 0, 0, 0]
+    assert ffi.cast("char *", lst[1]) - ffi.cast("char *", lst[0]) == \
+           ffi.sizeof("long")
+
+def test_memory_stats():
+    ffi = _cffi1_backend.FFI()
+    before = ffi.memory_stats()
+    p = ffi.new("double[]", 500)
+    after = ffi.memory_stats()
+    assert after['objects'] == before['objects'] + 1
+    assert after['bytes'] >= before['bytes'] + 4000
+    assert after['by_type']['double[]'][1] >= 4000
+    del p
+    assert ffi.memory_stats()['bytes'] == before['bytes']
+
+def test_memory_pressure():
+    ffi = _cffi1_backend.FFI()
+    old = ffi.set_memory_pressure_threshold(10 ** 6)
+    try:
+        start = ffi.memory_stats()['gc_collections']
+        p = ffi.new("char[]", 2 * 10 ** 6)
+        assert ffi.memory_stats()['gc_collections'] == start + 1
+        assert ffi.memory_stats()['pressure'] == 0
+    finally:
+        assert ffi.set_memory_pressure_threshold(old) == 10 ** 6
+
+def test_gc_defer_thread():
+    import time
+    ffi = _cffi1_backend.FFI()
+    seen = []
+    ffi.start_deferred_gc_thread()
+    ffi.start_deferred_gc_thread()     # no effect the 2nd time
+    assert ffi.deferred_gc_stats()['thread'] is True
+    for i in range(10):
+        p = ffi.gc(ffi.cast("int *", i + 1), seen.append, defer=True)
+        del p
+    for i in range(500):
+        if len(seen) == 10:
+            break
+        time.sleep(0.01)
+    assert sorted(int(ffi.cast("intptr_t", x)) for x in seen) == list(
+        range(1, 11))
+    assert ffi.deferred_gc_stats()['queued'] == 0
+
+def test_new_mapped():
+    ffi = _cffi1_backend.FFI()
+    p = ffi.new_mapped("double[]", 10**7, advice=["willneed"])
+    assert ffi.typeof(p) is ffi.typeof("double[]")
+    assert len(p) == 10**7 and p[10**7 - 1] == 0.0
+    s = ffi.new_mapped("int[3]", [4, 5])
+    assert list(s) == [4, 5, 0]
+    old = ffi.set_mmap_threshold(1024)
+    try:
+        p = ffi.new("char[]", 1024)
+        assert "owning" not in repr(p)
+    finally:
+        assert ffi.set_mmap_threshold(old) == 1024
+
+def test_map_file(tmpdir):
+    ffi = _cffi1_backend.FFI()
+    fn = str(tmpdir.join('test_map_file'))
+    with open(fn, 'wb') as f:
+        f.write(ffi.buffer(ffi.new("short[]", list(range(100)))))
+    p = ffi.map_file("short[]", fn, offset=20)
+    assert ffi.typeof(p) is ffi.typeof("short[]")
+    assert len(p) == 90 and p[0] == 10 and p[89] == 99
+    ffi.release(p)
+
+def test_buffer_format_numpy():
+    numpy = pytest.importorskip("numpy")
+    ffi = _cffi1_backend.FFI()
+    p = ffi.new("int32_t[]", [1, 2, 3])
+    a = numpy.asarray(ffi.buffer(p))
+    assert a.dtype == numpy.int32 and list(a) == [1, 2, 3]
+    a[1] = 42
+    assert p[1] == 42
+    #
+    dtype = numpy.dtype([('x', 'i4'), ('d', 'f8', (2,))])
+    p = ffi.new(ffi.from_dtype((dtype, (2,))),
+                [(1, [2.5, 3.5]), (4, [5.5, 6.5])])
+    a = numpy.asarray(ffi.buffer(p))
+    assert a.dtype.names == ('x', 'd') and a.shape == (2,)
+    assert a['x'].tolist() == [1, 4]
+    assert a['d'].tolist() == [[2.5, 3.5], [5.5, 6.5]]
+    #
+    p = ffi.new("char16_t[]", u"ab")
+    a = numpy.asarray(ffi.buffer(p))
+    assert a.dtype == numpy.uint16 and a.tolist() == [97, 98, 0]
+    #
+    x = ffi.new("int *")
+    p = ffi.new("void *[]", [x, ffi.NULL])
+    a = numpy.asarray(ffi.buffer(p))
+    assert a.dtype.kind == 'u' and a.itemsize == ffi.sizeof("void *")
+    assert a.tolist() == [int(ffi.cast("uintptr_t", x)), 0]
+
+def test_to_dtype_from_dtype():
+    numpy = pytest.importorskip("numpy")
+    ffi = _cffi1_backend.FFI()
+    assert ffi.to_dtype("int32_t") == numpy.int32
+    assert ffi.to_dtype(ffi.typeof("double[4]")) == numpy.dtype(('f8', (4,)))
+    ct = ffi.from_dtype([('x', 'i4'), ('y', 'f8')], name="point")
+    assert repr(ct) == "<ctype 'struct point'>"
+    assert ffi.to_dtype(ct) == numpy.dtype([('x', 'i4'), ('y', 'f8')])
+    a = numpy.zeros(3, dtype=ffi.to_dtype(ct))
+    p = ffi.from_buffer(ffi.from_dtype((a.dtype, a.shape)), a)
+    p[2].y = 1.5
+    assert list(a['y']) == [0.0, 0.0, 1.5]
+
+def test_new_from_numeric_buffer():
+    if sys.version_info < (3,):
+        py.test.skip("array.array has no new-style buffer on Python 2")
+    import array
+    ffi = _cffi1_backend.FFI()
+    p = ffi.new("double[]", array.array('q', [1, 2, 3]))
+    assert list(p) == [1.0, 2.0, 3.0]
+    p[0:2] = array.array('b', [-1, -2])
+    assert list(p) == [-1.0, -2.0, 3.0]
+    # bytes are a buffer of numbers too, except for arrays of chars
+    for src in [b"abcd", bytearray(b"abcd"), memoryview(b"abcd")]:
+        p = ffi.new("int[]", src)
+        assert list(p) == [97, 98, 99, 100]
+        p = ffi.new("uint8_t[]", src)
+        if isinstance(src, bytes):
+            assert list(p) == [97, 98, 99, 100, 0]    # like a string
+        else:
+            assert list(p) == [97, 98, 99, 100]
+    assert ffi.new("char[]", b"abcd")[4] == b"\x00"
+    numpy = pytest.importorskip("numpy")
+    p = ffi.new("int32_t[]", numpy.arange(5, dtype=numpy.int64))
+    assert list(p) == [0, 1, 2, 3, 4]
+    p = ffi.new("int[]", numpy.int64(3))     # a length, not a buffer
+    assert list(p) == [0, 0, 0]
+
 def test_ffi_cast():
     ffi = _cffi1_backend.FFI()
     assert ffi.cast("int(*)(int)", 0) == ffi.NULL
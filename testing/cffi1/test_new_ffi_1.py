@@ -1829,3 +1829,19 @@ class TestNewFFI1:
         assert len(z) == 2
         assert list(z) == [u+'\U00012345', u+'\x00'] # maybe a 2-unichars strin
         assert ffi.string(z) == u+'\U00012345'
+
+    def test_unpack_fields(self):
+        import array
+        p = ffi.new("struct nesting[]", 3)
+        for i in range(3):
+            p[i].d.a = i
+            p[i].e.c = -i
+        d = ffi.unpack_fields(p, 3, ["e.c", "d.a"])
+        assert d == {"e.c": array.array('i', [0, -1, -2]),
+                     "d.a": array.array('i', [0, 1, 2])}
+        assert sorted(ffi.unpack_fields(p, 3)) == [
+            "d.a", "d.b", "d.c", "e.a", "e.b", "e.c"]
+        # anonymous nested structs are flattened
+        p = ffi.new("struct nested_anon[]", 2)
+        p[1].a = 5
+        assert ffi.unpack_fields(p, 2, ["a"]) == {"a": array.array('i', [0, 5])}
@@ -370,3 +370,19 @@ def test_stdcall_cdecl():
     parse_error("__cdecl int", "identifier expected", 0)
     parse_error("int __stdcall", "expected '('", 13)
     parse_error("int __cdecl", "expected '('", 11)
+
+def test_cffi_fast():
+    assert parse("int __cffi_fast(int)") == [Prim(lib._CFFI_PRIM_INT),
+                                             '->', Func(0), NoOp(4),
+                                             FuncEnd(0x100),
+                                             Prim(lib._CFFI_PRIM_INT)]
+    assert parse("int __cffi_fast func(int)") == parse("int __cffi_fast(int)")
+    assert parse("int (__cffi_fast *)(int, ...)") == [
+        Prim(lib._CFFI_PRIM_INT), NoOp(3), '->', Pointer(1), Func(0),
+        NoOp(7), FuncEnd(0x101), 0, Prim(lib._CFFI_PRIM_INT)]
+    assert parse("int (__stdcall __cffi_fast *)()") == [
+        Prim(lib._CFFI_PRIM_INT), NoOp(3), '->', Pointer(1), Func(0),
+        FuncEnd(0x102), 0]
+    assert (parse("int (__cffi_fast __stdcall *)()") ==
+            parse("int (__stdcall __cffi_fast *)()"))
+    parse_error("int __cffi_fast", "expected '('", 15)
@@ -0,0 +1,136 @@
+"""Micro-benchmarks.  They only print timings; run them with 'py.test -s'
+to see the output.  They never fail because of the numbers they get."""
+import sys, time
+import py
+from cffi import FFI
+
+if sys.platform == 'win32':
+    py.test.skip("dlopen(None) cannot work on Windows")
+
+
+def measure(stmt, **namespace):
+    """Return the time taken by one execution of 'stmt', in seconds."""
+    src = "def run(n):\n    for i in range(n):\n        %s\n" % (stmt,)
+    exec(src, namespace)
+    run = namespace['run']
+    iterations = 1000
+    while True:
+        start = time.time()
+        run(iterations)
+        elapsed = time.time() - start
+        if elapsed > 0.1:
+            return elapsed / iterations
+        iterations *= 4
+
+def report(title, **timings):
+    print('=' * 79)
+    print(title)
+    for key in sorted(timings):
+        print('    %-30s %.3g ns per call' % (key, timings[key] * 1e9))
+    print('=' * 79)
+
+
+def test_abi_call_vectorcall_vs_tp_call():
+    ffi = FFI()
+    ffi.cdef("int abs(int);")
+    lib = ffi.dlopen(None)
+    f = lib.abs
+    assert f(-42) == 42
+    assert f.__call__(-42) == 42
+    t_vectorcall = measure("f(-42)", f=f)
+    t_tp_call = measure("f(-42)", f=f.__call__)    # forces an argument tuple
+    report("ABI mode, calling 'int abs(int)'",
+           vectorcall=t_vectorcall, tp_call=t_tp_call)
+
+def test_api_call_fastcall_vs_varargs():
+    from .test_recompiler import verify
+    source = "static int add3(int a, int b, int c) { return a + b + c; }"
+    libs = {}
+    for name, macros in [('varargs', []),
+                         ('fastcall', [('_CFFI_NO_LIMITED_API', None)])]:
+        ffi = FFI()
+        ffi.cdef("int add3(int, int, int);")
+        libs[name] = verify(ffi, "test_perf_call_" + name, source,
+                            define_macros=macros)
+        assert libs[name].add3(40, 1, 1) == 42
+    timings = {}
+    for name in libs:
+        timings[name] = measure("f(40, 1, 1)", f=libs[name].add3)
+    report("API mode, calling 'int add3(int, int, int)'", **timings)
+
+def test_callback_vs_extern_python_dispatch():
+    from .test_recompiler import verify
+    ffi = FFI()
+    ffi.cdef("""
+        int call_callback_100(int(*)(int, int));
+        extern "Python" int py_add(int, int);
+        int call_extern_python_100(void);
+    """)
+    lib = verify(ffi, "test_perf_callback_dispatch", """
+        static int py_add(int, int);
+        static int call_callback_100(int(*cb)(int, int)) {
+            int i, total = 0;
+            for (i = 0; i < 100; i++)
+                total += cb(i, 1);
+            return total;
+        }
+        static int call_extern_python_100(void) {
+            int i, total = 0;
+            for (i = 0; i < 100; i++)
+                total += py_add(i, 1);
+            return total;
+        }
+    """)
+    def add(x, y):
+        return x + y
+    ffi.def_extern(name="py_add")(add)
+    cb = ffi.callback("int(int, int)", add)
+    assert lib.call_callback_100(cb) == 5050
+    assert lib.call_extern_python_100() == 5050
+    t_callback = measure("f(cb)", f=lib.call_callback_100, cb=cb)
+    t_extern = measure("f()", f=lib.call_extern_python_100)
+    report("Dispatching 'int(int, int)' from C to Python",
+           ffi_callback=t_callback / 100, extern_python=t_extern / 100)
+
+def test_linked_list_with_and_without_freelists():
+    ffi = FFI()
+    ffi.cdef("struct node { int value; struct node *next; };")
+    keep = []
+    head = ffi.NULL
+    for i in range(100):
+        node = ffi.new("struct node *", [i, head])
+        keep.append(node)
+        head = node
+    ns = {'ffi': ffi, 'head': head}
+    stmt = ("p = head\n"
+            "        while p:\n"
+            "            p = p.next\n"
+            "        x = ffi.new('int *', 42)")
+    old_size = ffi.set_freelist_size(0)
+    try:
+        t_without = measure(stmt, **ns)
+        ffi.set_freelist_size(max(old_size, 100))
+        ffi.freelist_stats(reset=True)
+        t_with = measure(stmt, **ns)
+        stats = ffi.freelist_stats()
+    finally:
+        ffi.set_freelist_size(old_size)
+    assert stats['hits'] > stats['misses']
+    report("Walking a 100-node linked list, plus one ffi.new('int *')",
+           without_freelists=t_without, with_freelists=t_with)
+
+def test_new_allocator_c_functions_vs_python_callables():
+    ffi = FFI()
+    ffi.cdef("void *malloc(size_t); void free(void *);")
+    lib = ffi.dlopen(None)
+    c_malloc = lib.malloc
+    c_free = lib.free
+    alloc_c = ffi.new_allocator(c_malloc, c_free)
+    alloc_py = ffi.new_allocator(lambda size: c_malloc(size),
+                                 lambda p: c_free(p))
+    assert alloc_c("int[]", 10)[9] == 0
+    assert alloc_py("int[]", 10)[9] == 0
+    t_c = measure("alloc('int[]', 10)", alloc=alloc_c)
+    t_py = measure("alloc('int[]', 10)", alloc=alloc_py)
+    report("ffi.new_allocator(malloc, free)('int[]', 10)",
+           c_functions=t_c, python_callables=t_py)
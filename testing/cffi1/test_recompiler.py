@@ -903,6 +903,215 @@ def test_unpack_args():
     assert st1(e7.value) in ["foo2 expected 2 arguments, got 3",
                              "foo2() takes exactly 2 arguments (3 given)"]
 
+def test_unpack_args_fastcall():
+    # without the limited API, functions with several arguments are
+    # built with METH_FASTCALL on CPython >= 3.7
+    ffi = FFI()
+    ffi.cdef("int foo2(int, int); double foo3(int, double, char *);")
+    lib = verify(ffi, "test_unpack_args_fastcall", """
+    int foo2(int x, int y) { return x - y; }
+    double foo3(int x, double y, char *z) { return x + y + z[0]; }
+    """, define_macros=[('_CFFI_NO_LIMITED_API', None)])
+    assert lib.foo2(45, 3) == 42
+    assert lib.foo2(*[45, 3]) == 42
+    assert lib.foo3(1, 0.5, b"\x02") == 3.5
+    e1 = py.test.raises(TypeError, lib.foo2)
+    e2 = py.test.raises(TypeError, lib.foo2, 42)
+    e3 = py.test.raises(TypeError, lib.foo2, 45, 46, 47)
+    e4 = py.test.raises(TypeError, lib.foo2, 45, y=46)
+    assert str(e1.value) in ["foo2 expected 2 arguments, got 0",
+                             "foo2() takes exactly 2 arguments (0 given)"]
+    assert str(e2.value) in ["foo2 expected 2 arguments, got 1",
+                             "foo2() takes exactly 2 arguments (1 given)"]
+    assert str(e3.value) in ["foo2 expected 2 arguments, got 3",
+                             "foo2() takes exactly 2 arguments (3 given)"]
+    assert "keyword arguments" in str(e4.value)
+    py.test.raises(TypeError, lib.foo3, 1, 0.5, 42)
+    assert ffi.typeof(lib.foo3) == ffi.typeof("double(*)(int, double, char *)")
+    p = ffi.addressof(lib, "foo2")
+    assert p(45, 3) == 42
+
+def test_cffi_fast():
+    # '__cffi_fast' functions don't release the GIL and don't save errno
+    ffi = FFI()
+    ffi.cdef("""
+        int __cffi_fast gil_held_fast(int, int);
+        int gil_held(int, int);
+        void __cffi_fast set_errno_fast(int);
+        void set_errno(int);
+    """)
+    lib = verify(ffi, "test_cffi_fast", """
+        #include <errno.h>
+        static int gil_held_fast(int a, int b) {
+        #if PY_VERSION_HEX >= 0x03040000 && !defined(Py_LIMITED_API)
+            return PyGILState_Check() + a + b;
+        #else
+            return 1 + a + b;
+        #endif
+        }
+        static int gil_held(int a, int b) {
+        #if PY_VERSION_HEX >= 0x03040000 && !defined(Py_LIMITED_API)
+            return PyGILState_Check() + a + b;
+        #else
+            return a + b;
+        #endif
+        }
+        static void set_errno_fast(int x) { errno = x; }
+        static void set_errno(int x) { errno = x; }
+    """, define_macros=[('_CFFI_NO_LIMITED_API', None)])
+    assert lib.gil_held_fast(10, 20) == 31
+    assert lib.gil_held(10, 20) == 30
+    ffi.errno = 0
+    lib.set_errno_fast(42)
+    assert ffi.errno == 0
+    lib.set_errno(43)
+    assert ffi.errno == 43
+    assert ffi.typeof(lib.gil_held_fast).fast is True
+    assert ffi.typeof(lib.gil_held).fast is False
+    assert ffi.typeof(lib.gil_held_fast) == ffi.typeof(
+        "int(__cffi_fast *)(int, int)")
+    p = ffi.addressof(lib, "gil_held_fast")
+    assert p(10, 20) == 31
+    p = ffi.addressof(lib, "gil_held")
+    assert p(10, 20) == 30
+
+def test_cffi_fast_function_pointers():
+    # '__cffi_fast' is not written in the generated C code, which would
+    # not compile otherwise
+    ffi = FFI()
+    ffi.cdef("""
+        typedef int (__cffi_fast *fn_t)(int);
+        int apply(fn_t, int);
+        struct cb_s { int (__cffi_fast *cb)(int); };
+        extern int (__cffi_fast *global_cb)(int);
+        int triple(int);
+    """)
+    lib = verify(ffi, "test_cffi_fast_function_pointers", """
+        typedef int (*fn_t)(int);
+        static int apply(fn_t f, int x) { return f(x); }
+        struct cb_s { int (*cb)(int); };
+        static int triple(int x) { return x * 3; }
+        static int (*global_cb)(int) = triple;
+    """)
+    assert ffi.typeof("fn_t").fast is True
+    assert ffi.typeof("fn_t") == ffi.typeof("int(__cffi_fast *)(int)")
+    f = ffi.cast("fn_t", ffi.addressof(lib, "triple"))
+    assert lib.apply(f, 5) == 15
+    assert lib.global_cb(7) == 21
+    p = ffi.new("struct cb_s *", [lib.global_cb])
+    assert ffi.typeof(p.cb).fast is True
+    assert p.cb(2) == 6
+    assert lib.apply(p.cb, 4) == 12
+
+def test_call_many():
+    import array
+    ffi = FFI()
+    ffi.cdef("""
+        double scale(double, int);
+        int __cffi_fast gil_held_fast(int);
+    """)
+    lib = verify(ffi, "test_call_many", """
+        static double scale(double x, int n) { return x * n; }
+        static int gil_held_fast(int a) {
+        #if PY_VERSION_HEX >= 0x03040000 && !defined(Py_LIMITED_API)
+            return PyGILState_Check() + a;
+        #else
+            return 1 + a;
+        #endif
+        }
+    """, define_macros=[('_CFFI_NO_LIMITED_API', None)])
+    xs = array.array('d', [1.5, 2.5, 3.5])
+    res = ffi.call_many(lib.scale, xs, ffi.new("int[]", [2, 4, 6]))
+    assert ffi.typeof(res) is ffi.typeof("double[]")
+    assert list(res) == [3.0, 10.0, 21.0]
+    out = array.array('d', [0.0] * 3)
+    assert ffi.call_many(ffi.addressof(lib, "scale"), xs,
+                         array.array('i', [1, 1, 1]), out=out) is out
+    assert list(out) == [1.5, 2.5, 3.5]
+    res = ffi.call_many(lib.gil_held_fast, array.array('i', [10, 20]))
+    assert list(res) == [11, 21]
+
+def test_call_stats():
+    ffi = FFI()
+    ffi.cdef("""
+        int add_stats(int, int);
+        void noarg_stats(void);
+        int __cffi_fast fast_stats(int);
+    """)
+    lib = verify(ffi, "test_call_stats", """
+        static int add_stats(int a, int b) { return a + b; }
+        static void noarg_stats(void) { }
+        static int fast_stats(int a) { return a * 2; }
+    """)
+    ffi.call_stats(reset=True)
+    ffi.enable_call_stats()
+    try:
+        for i in range(3):
+            assert lib.add_stats(i, 10) == i + 10
+        lib.noarg_stats()
+        assert lib.fast_stats(21) == 42
+        py.test.raises(TypeError, lib.add_stats, "x", 10)  # not recorded
+    finally:
+        ffi.enable_call_stats(False)
+    lib.noarg_stats()
+    stats = ffi.call_stats(reset=True)
+    assert stats['add_stats'][0] == 3
+    assert stats['noarg_stats'][0] == 1
+    assert stats['fast_stats'][0] == 1
+    for calls, call_time, conversion_time in stats.values():
+        assert 0.0 <= call_time < 10.0
+        assert 0.0 <= conversion_time < 10.0
+    assert 'add_stats' not in ffi.call_stats()
+
+def test_call_stats_not_compiled_in():
+    ffi = FFI()
+    ffi.cdef("int add_nostats(int, int);")
+    lib = verify(ffi, "test_call_stats_not_compiled_in", """
+        static int add_nostats(int a, int b) { return a + b; }
+    """, define_macros=[('_CFFI_NO_CALL_STATS', None)])
+    ffi.call_stats(reset=True)
+    ffi.enable_call_stats()
+    try:
+        assert lib.add_nostats(2, 3) == 5
+    finally:
+        ffi.enable_call_stats(False)
+    assert 'add_nostats' not in ffi.call_stats(reset=True)
+
+def test_buffer_arguments():
+    import array
+    ffi = FFI()
+    ffi.cdef("""
+        int sum_ints(int *, int);
+        int first_byte(char *, int);
+        void fill_bytes(void *, int, int);
+    """)
+    lib = verify(ffi, "test_buffer_arguments", """
+        static int sum_ints(int *p, int n) {
+            int i, result = 0;
+            for (i = 0; i < n; i++) result += p[i];
+            return result;
+        }
+        static int first_byte(char *p, int n) { return n > 0 ? p[0] : -1; }
+        static void fill_bytes(void *p, int c, int n) { memset(p, c, n); }
+    """)
+    assert lib.sum_ints(array.array('i', [1, 2, 3]), 3) == 6
+    assert lib.sum_ints(memoryview(array.array('i', [4, 5])), 2) == 9
+    py.test.raises(TypeError, lib.sum_ints, array.array('h', [1, 2]), 2)
+    assert lib.first_byte(bytearray(b"xyz"), 3) == ord('x')
+    ba = bytearray(b"abcd")
+    lib.fill_bytes(ba, ord('-'), 3)     # no copy
+    assert ba == bytearray(b"---d")
+    # the buffer is released even if a later argument is invalid
+    py.test.raises(TypeError, lib.first_byte, ba, "not an int")
+    ba.extend(b"!")
+    assert ba == bytearray(b"---d!")
+    # read-only buffers are not passed implicitly
+    b = b"\x00" * 8
+    py.test.raises(TypeError, lib.fill_bytes, memoryview(b), ord('-'), 3)
+    py.test.raises(TypeError, lib.first_byte, memoryview(b), 3)
+    assert b == b"\x00" * 8
+    assert lib.first_byte(ffi.from_buffer(memoryview(b"xyz")), 3) == ord('x')
+
 def test_address_of_function():
     ffi = FFI()
     ffi.cdef("long myfunc(long x);")
@@ -1852,6 +2061,76 @@ def test_extern_python_plus_c():
     assert lib.bar(100) == 6300
     assert lib.call_me(100) == -2100
 
+def test_extern_python_queue():
+    ffi = FFI()
+    ffi.cdef("""
+        struct pt { int x, y; };
+        extern "Python" int on_event(int, struct pt, double);
+        int produce(int);
+        int produce_in_threads(int, int);
+    """)
+    lib = verify(ffi, 'test_extern_python_queue', """
+        struct pt { int x, y; };
+        static int on_event(int, struct pt, double);
+        static int produce(int n) {
+            int i, total = 0;
+            for (i = 0; i < n; i++) {
+                struct pt p = { i, -i };
+                total += on_event(i, p, i * 0.25);
+            }
+            return total;
+        }
+        #ifdef _WIN32
+        static int produce_in_threads(int nthreads, int n) { return -1; }
+        #else
+        #include <pthread.h>
+        static void *producer(void *arg) {
+            produce((int)(long)arg);
+            return NULL;
+        }
+        static int produce_in_threads(int nthreads, int n) {
+            pthread_t th[8];
+            int i;
+            for (i = 0; i < nthreads; i++)
+                if (pthread_create(&th[i], NULL, producer, (void *)(long)n))
+                    return -1;
+            for (i = 0; i < nthreads; i++)
+                pthread_join(th[i], NULL);
+            return 0;
+        }
+        #endif
+    """)
+    q = ffi.new_callback_queue(size=4096)
+    seen = []
+    @ffi.def_extern(error=-1, queue=q)
+    def on_event(n, p, x):
+        seen.append((n, p.x, p.y, x))
+    assert lib.produce(3) == -3
+    assert seen == []
+    assert q.drain() == 3
+    assert seen == [(0, 0, 0, 0.0), (1, 1, -1, 0.25), (2, 2, -2, 0.5)]
+    #
+    del seen[:]
+    if lib.produce_in_threads(4, 1000) < 0:
+        py.test.skip("no threads")
+    assert q.dropped == 0
+    assert q.drain() == 4000
+    assert sorted(seen) == sorted([(i, i, -i, i * 0.25)
+                                   for i in range(1000)] * 4)
+    #
+    # the function is called without the GIL from then on, so it cannot
+    # be redefined any more
+    def on_event_2(n, p, x):
+        return n * 10
+    e = py.test.raises(ffi.error, ffi.def_extern("on_event"), on_event_2)
+    assert str(e.value) == ("ffi.def_extern('on_event'): this function is "
+                            "attached to a queue and cannot be redefined")
+    e = py.test.raises(ffi.error, ffi.def_extern("on_event", queue=q),
+                       on_event_2)
+    assert lib.produce(2) == -2
+    assert q.drain() == 2
+    assert seen[-2:] == [(0, 0, 0, 0.0), (1, 1, -1, 0.25)]
+
 def test_introspect_function():
     ffi = FFI()
     ffi.cdef("float f1(double);")
@@ -2493,3 +2772,64 @@ def test_passing_large_list():
     arg = list(range(20000000))
     lib.passing_large_list(arg)
     # assert did not segfault
+
+def test_new_allocator_with_c_functions():
+    ffi = FFI()
+    ffi.cdef("""
+        void *my_alloc(size_t);
+        void my_free(void *);
+        int n_alloc, n_free;
+    """)
+    lib = verify(ffi, "test_new_allocator_with_c_functions", """
+        #include <stdlib.h>
+        static int n_alloc, n_free;
+        static void *my_alloc(size_t size) { n_alloc++; return malloc(size); }
+        static void my_free(void *p) { n_free++; free(p); }
+    """)
+    alloc = ffi.new_allocator(ffi.addressof(lib, "my_alloc"),
+                              ffi.addressof(lib, "my_free"))
+    p = alloc("int[]", 100)
+    assert lib.n_alloc == 1 and lib.n_free == 0
+    assert ffi.typeof(p) is ffi.typeof("int[]")
+    assert len(p) == 100 and p[99] == 0
+    s = alloc("long[2]", [5, 6])
+    assert list(s) == [5, 6]
+    assert lib.n_alloc == 2
+    del p, s
+    for i in range(5):
+        if lib.n_free == 2:
+            break
+        import gc; gc.collect()
+    assert lib.n_free == 2
+    #
+    # ffi.gc() also calls such a C function directly
+    x = ffi.gc(ffi.cast("void *", lib.my_alloc(10)),
+               ffi.addressof(lib, "my_free"))
+    assert lib.n_alloc == 3
+    ffi.release(x)
+    assert lib.n_free == 3
+
+def test_gc_defer_with_c_function():
+    import time
+    ffi = FFI()
+    ffi.cdef("""
+        void *my_alloc(size_t);
+        void my_free(void *);
+        int n_free;
+    """)
+    lib = verify(ffi, "test_gc_defer_with_c_function", """
+        #include <stdlib.h>
+        static int n_free;
+        static void *my_alloc(size_t size) { return malloc(size); }
+        static void my_free(void *p) { n_free++; free(p); }
+    """)
+    ffi.start_deferred_gc_thread()
+    for i in range(20):
+        x = ffi.gc(ffi.cast("void *", lib.my_alloc(10)),
+                   ffi.addressof(lib, "my_free"), defer=True)
+        del x
+    for i in range(500):
+        if lib.n_free == 20:
+            break
+        time.sleep(0.01)
+    assert lib.n_free == 20